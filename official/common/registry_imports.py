@@ -12,9 +12,12 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-"""All necessary imports for registration."""
+"""All necessary imports for registration.
+
+The vision and NLP experiments and tasks are registered lazily, their modules
+are only imported when an experiment or task is looked up.
+"""
 # pylint: disable=unused-import
 from official import vision
 from official.nlp import tasks
-from official.nlp.configs import experiment_configs
 from official.utils.testing import mock_task
@@ -0,0 +1,95 @@
+# Copyright 2023 The TensorFlow Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+r"""Benchmarks the startup time of the training entry points.
+
+Every measurement runs in a fresh Python interpreter, so it includes all module
+imports. Two kinds of startup are reported:
+
+  * The time for an entry point to import its modules and parse its flags,
+    measured by running it with `--helpshort`.
+  * The time to look up an experiment and the class of its task, with the lazy
+    registry and, for comparison, after eagerly importing every module of the
+    vision and NLP registry indexes as the registry imports used to do.
+
+Example usage:
+    python -m official.common.startup_benchmark \
+      --experiments=resnet_imagenet,bert/squad
+"""
+
+import statistics
+import subprocess
+import sys
+import time
+
+from absl import app
+from absl import flags
+from absl import logging
+
+from official.nlp import registry_index as nlp_registry_index
+from official.vision import registry_index as vision_registry_index
+
+flags.DEFINE_list('entry_points',
+                  ['official.vision.train', 'official.nlp.train'],
+                  'Modules of the entry points to start.')
+flags.DEFINE_list('experiments', ['resnet_imagenet', 'bert/squad'],
+                  'Experiments to look up.')
+flags.DEFINE_integer('num_runs', 3, 'Number of runs of each measurement.')
+
+FLAGS = flags.FLAGS
+
+_LOOKUP_CODE = """
+from official.common import registry_imports
+from official.core import exp_factory
+from official.core import task_factory
+config = exp_factory.get_exp_config({name!r})
+task_factory.get_task_cls(config.task.__class__)
+"""
+
+
+def _eager_imports():
+  """Returns the code importing all modules of the registry indexes."""
+  module_paths = set()
+  for index in (vision_registry_index, nlp_registry_index):
+    module_paths.update(index.EXPERIMENTS)
+    module_paths.update(index.TASKS.values())
+  return ''.join(
+      f'import {module_path}\n' for module_path in sorted(module_paths))
+
+
+def _median_run_time(args):
+  """Returns the median wall time of FLAGS.num_runs runs of `python args`."""
+  run_times = []
+  for _ in range(FLAGS.num_runs):
+    start = time.time()
+    subprocess.run([sys.executable] + args, check=True, capture_output=True)
+    run_times.append(time.time() - start)
+  return statistics.median(run_times)
+
+
+def main(_):
+  for entry_point in FLAGS.entry_points:
+    run_time = _median_run_time(['-m', entry_point, '--helpshort'])
+    logging.info('%s startup: %.2f s', entry_point, run_time)
+
+  for name in FLAGS.experiments:
+    lookup_code = _LOOKUP_CODE.format(name=name)
+    lazy_time = _median_run_time(['-c', lookup_code])
+    eager_time = _median_run_time(['-c', _eager_imports() + lookup_code])
+    logging.info('%s lookup: lazy %.2f s, eager %.2f s', name, lazy_time,
+                 eager_time)
+
+
+if __name__ == '__main__':
+  app.run(main)
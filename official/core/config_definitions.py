@@ -106,6 +106,14 @@ class DataConfig(base_config.Config):
       high.
     autotune_algorithm: If specified, use this algorithm for AUTOTUNE. See:
       https://www.tensorflow.org/api_docs/python/tf/data/experimental/AutotuneAlgorithm
+    file_manifest_dir: An optional directory where the listing of every file
+      pattern of `input_path` (paths and sizes) is cached, so
+      that the patterns are globbed only once across jobs.
+    num_file_listing_threads: The number of threads used to glob the file
+      patterns and to stat the files.
+    file_shard_policy: How the input files are assigned to the input
+      pipelines: 'round_robin' shards the shuffled list of files, while
+      'size_balanced' gives every input pipeline a similar total file size.
   """
   input_path: Union[Sequence[str], str, base_config.Config] = ""
   tfds_name: Union[str, base_config.Config] = ""
@@ -131,6 +139,9 @@ class DataConfig(base_config.Config):
   seed: Optional[int] = None
   prefetch_buffer_size: Optional[int] = None
   autotune_algorithm: Optional[str] = None
+  file_manifest_dir: Optional[str] = None
+  num_file_listing_threads: int = 16
+  file_shard_policy: str = "round_robin"
 
 
 @dataclasses.dataclass
@@ -243,6 +254,17 @@ class TrainerConfig(base_config.Config):
     validation_summary_subdir: A 'str', sub directory for saving eval summary.
     preemption_on_demand_checkpoint: whether or not to save on-demand
       checkpoints after a preemption.
+    instrument_loops: whether or not to record the wall time of each phase
+      (input, train steps, actions, summaries, checkpointing, evaluation) of
+      every train and eval loop, and write them as summaries under `timing`.
+    overlapped_validation: whether or not to validate on a separate copy of the
+      model on a background thread in `train_and_eval` mode, so that training
+      continues during validation. Each validation restores the checkpoint
+      saved at its `validation_interval`.
+    profile_steps: comma separated `start,stop` global step pairs, e.g.
+      "100,110,5000,5010". A profiler trace is captured to `model_dir` while the
+      global step is in each `[start, stop)` window. Setting this implies
+      `instrument_loops`.
   """
   optimizer_config: OptimizationConfig = OptimizationConfig()
   # Orbit settings.
@@ -277,6 +299,10 @@ class TrainerConfig(base_config.Config):
   validation_summary_subdir: str = "validation"
   # Preemption on-demand checkpoint.
   preemption_on_demand_checkpoint: bool = True  # copybara-replace
+  overlapped_validation: bool = False
+  # Loop instrumentation and profiling.
+  instrument_loops: bool = False
+  profile_steps: str = ""
 
 
 @dataclasses.dataclass
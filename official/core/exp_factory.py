@@ -26,6 +26,19 @@ def register_config_factory(name):
   return registry.register(_REGISTERED_CONFIGS, name)
 
 
+def register_lazy_config_factory(name, module_path):
+  """Registers the module defining an ExperimentConfig factory method.
+
+  The module is imported when `name` is first looked up by `get_exp_config`,
+  so binaries do not need to import the modules of all known experiments.
+
+  Args:
+    name: the experiment name, as passed to `register_config_factory`.
+    module_path: the full name of the module registering `name`.
+  """
+  registry.register_lazy(_REGISTERED_CONFIGS, name, module_path)
+
+
 def get_exp_config(exp_name: str) -> cfg.ExperimentConfig:
   """Looks up the `ExperimentConfig` according to the `exp_name`."""
   exp_creater = registry.lookup(_REGISTERED_CONFIGS, exp_name)
@@ -13,8 +13,14 @@
 # limitations under the License.
 
 """A common dataset reader."""
+from concurrent import futures
 import dataclasses
+import hashlib
+import heapq
+import json
+import os
 import random
+import threading
 from typing import Any, Callable, Dict, List, Optional, Sequence, Text, Union
 
 from absl import logging
@@ -35,10 +41,29 @@ def _maybe_map_fn(dataset: tf.data.Dataset,
       fn, num_parallel_calls=tf.data.experimental.AUTOTUNE)
 
 
-def match_files(input_path: Union[Sequence[str], str]) -> List[str]:
-  """Matches files from an input_path."""
-  matched_files = []
-  # Read dataset from files.
+@dataclasses.dataclass
+class FileInfo:
+  """An entry of a file manifest.
+
+  Attributes:
+    path: The file path.
+    size: The file size in bytes.
+  """
+  path: str
+  size: int
+
+
+# File sizes known from file manifests, keyed by path.
+_file_sizes = {}
+_file_sizes_lock = threading.Lock()
+
+
+def _is_glob_pattern(input_pattern: str) -> bool:
+  return '*' in input_pattern or '?' in input_pattern
+
+
+def _split_input_patterns(input_path: Union[Sequence[str], str]) -> List[str]:
+  """Splits an input_path into its file paths/patterns."""
   usage = ('`input_path` should be either (1) a str indicating a file '
            'path/pattern, or (2) a str indicating multiple file '
            'paths/patterns separated by comma (e.g "a, b, c" or no spaces '
@@ -54,19 +79,136 @@ def match_files(input_path: Union[Sequence[str], str]) -> List[str]:
   else:
     raise ValueError(usage % input_path)
 
+  input_patterns = []
   for input_path in input_path_list:
-    input_patterns = input_path.strip().split(',')
-    for input_pattern in input_patterns:
+    for input_pattern in input_path.strip().split(','):
       input_pattern = input_pattern.strip()
-      if not input_pattern:
-        continue
-      if '*' in input_pattern or '?' in input_pattern:
-        tmp_matched_files = tf.io.gfile.glob(input_pattern)
-        if not tmp_matched_files:
-          raise ValueError('%s does not match any files.' % input_pattern)
-        matched_files.extend(tmp_matched_files)
-      else:
-        matched_files.append(input_pattern)
+      if input_pattern:
+        input_patterns.append(input_pattern)
+  return input_patterns
+
+
+def _map_concurrently(fn: Callable[[Any], Any], items: Sequence[Any],
+                      num_threads: int) -> List[Any]:
+  """Returns `[fn(x) for x in items]`, computed with up to num_threads."""
+  if num_threads <= 1 or len(items) <= 1:
+    return [fn(x) for x in items]
+  with futures.ThreadPoolExecutor(min(num_threads, len(items))) as executor:
+    return list(executor.map(fn, items))
+
+
+def _get_file_info(path: str) -> FileInfo:
+  return FileInfo(path=path, size=tf.io.gfile.stat(path).length)
+
+
+def get_file_manifest(input_pattern: str,
+                      manifest_dir: Optional[str] = None,
+                      num_threads: int = 1) -> List[FileInfo]:
+  """Returns the paths and sizes of the files of a pattern.
+
+  When `manifest_dir` is set, the manifest of the pattern is stored there on
+  first use and read back on later calls, so large or remote datasets are only
+  listed once. Delete the manifest file to pick up changes of the files.
+
+  Args:
+    input_pattern: A file path or glob pattern.
+    manifest_dir: An optional directory of cached file manifests.
+    num_threads: The number of threads used to stat the files.
+
+  Returns:
+    A list of `FileInfo`, in glob order.
+
+  Raises:
+    ValueError: If the pattern does not match any files.
+  """
+  manifest_path = None
+  manifest = None
+  if manifest_dir:
+    key = hashlib.sha256(input_pattern.encode('utf-8')).hexdigest()
+    manifest_path = os.path.join(manifest_dir, key + '.json')
+    if tf.io.gfile.exists(manifest_path):
+      with tf.io.gfile.GFile(manifest_path, 'r') as f:
+        manifest = [
+            FileInfo(path=x['path'], size=x['size'])
+            for x in json.load(f)['files']
+        ]
+
+  if manifest is None:
+    if _is_glob_pattern(input_pattern):
+      files = tf.io.gfile.glob(input_pattern)
+    else:
+      files = [input_pattern]
+    if not files:
+      raise ValueError('%s does not match any files.' % input_pattern)
+    manifest = _map_concurrently(
+        _get_file_info, files, num_threads)
+    if manifest_path:
+      tf.io.gfile.makedirs(manifest_dir)
+      # Writes to a temporary file first so that concurrent readers never see
+      # a partial manifest.
+      tmp_path = '%s.tmp-%d-%d' % (manifest_path, os.getpid(),
+                                   threading.get_ident())
+      with tf.io.gfile.GFile(tmp_path, 'w') as f:
+        json.dump({'pattern': input_pattern,
+                   'files': [dataclasses.asdict(x) for x in manifest]}, f)
+      tf.io.gfile.rename(tmp_path, manifest_path, overwrite=True)
+
+  with _file_sizes_lock:
+    _file_sizes.update((x.path, x.size) for x in manifest)
+  return manifest
+
+
+def get_file_sizes(files: Sequence[str], num_threads: int = 1) -> List[int]:
+  """Returns the sizes of files, reusing sizes from loaded file manifests."""
+  with _file_sizes_lock:
+    sizes = [_file_sizes.get(path) for path in files]
+  missing = [path for path, size in zip(files, sizes) if size is None]
+  if missing:
+    missing_sizes = dict(zip(missing, _map_concurrently(
+        lambda path: tf.io.gfile.stat(path).length, missing, num_threads)))
+    sizes = [missing_sizes[path] if size is None else size
+             for path, size in zip(files, sizes)]
+  return sizes
+
+
+def match_files(input_path: Union[Sequence[str], str],
+                manifest_dir: Optional[str] = None,
+                num_threads: int = 1) -> List[str]:
+  """Matches files from an input_path.
+
+  Args:
+    input_path: A str of comma separated file paths/patterns, or a list of
+      them.
+    manifest_dir: An optional directory of cached file manifests, see
+      `get_file_manifest`.
+    num_threads: The number of patterns globbed concurrently.
+
+  Returns:
+    The list of matched files.
+
+  Raises:
+    ValueError: If `input_path` is invalid or a pattern does not match any
+      files.
+  """
+  input_patterns = _split_input_patterns(input_path)
+
+  def _match_pattern(input_pattern):
+    if manifest_dir:
+      return [
+          x.path for x in get_file_manifest(
+              input_pattern, manifest_dir, num_threads=num_threads)
+      ]
+    if _is_glob_pattern(input_pattern):
+      tmp_matched_files = tf.io.gfile.glob(input_pattern)
+      if not tmp_matched_files:
+        raise ValueError('%s does not match any files.' % input_pattern)
+      return tmp_matched_files
+    return [input_pattern]
+
+  matched_files = []
+  for tmp_matched_files in _map_concurrently(_match_pattern, input_patterns,
+                                             num_threads):
+    matched_files.extend(tmp_matched_files)
 
   if not matched_files:
     raise ValueError('%s does not match any files.' % input_path)
@@ -74,6 +216,33 @@ def match_files(input_path: Union[Sequence[str], str]) -> List[str]:
   return matched_files
 
 
+def balance_files_by_size(files: Sequence[str], sizes: Sequence[int],
+                          num_shards: int) -> List[List[str]]:
+  """Assigns files to shards so that the shards have similar total sizes.
+
+  Files are assigned from the largest to the smallest to the shard with the
+  smallest total size so far, and among those to the shard with the fewest
+  files, so that empty files are spread over the shards as well. The assignment
+  is deterministic, so that every input pipeline computes the same one.
+
+  Args:
+    files: The file paths.
+    sizes: The file sizes.
+    num_shards: The number of shards.
+
+  Returns:
+    A list of `num_shards` lists of files, each in the order of `files`.
+  """
+  order = sorted(range(len(files)), key=lambda i: (-sizes[i], i))
+  shard_loads = [(0, 0, shard) for shard in range(num_shards)]
+  shard_indices = [[] for _ in range(num_shards)]
+  for i in order:
+    load, num_files, shard = heapq.heappop(shard_loads)
+    shard_indices[shard].append(i)
+    heapq.heappush(shard_loads, (load + sizes[i], num_files + 1, shard))
+  return [[files[i] for i in sorted(indices)] for indices in shard_indices]
+
+
 def _read_files_then_shard(matched_files: List[str],
                            dataset_fn,
                            input_context: Optional[
@@ -111,8 +280,21 @@ def _shard_files_then_read(matched_files: List[str],
                            cache: bool = False,
                            cycle_length: Optional[int] = None,
                            block_length: Optional[int] = None,
-                           deterministic: bool = False) -> tf.data.Dataset:
-  """Shards the data files and then sent a split to every worker to read."""
+                           deterministic: bool = False,
+                           file_sizes: Optional[List[int]] = None
+                           ) -> tf.data.Dataset:
+  """Shards the data files and then sent a split to every worker to read.
+
+  If `file_sizes` is given, the files are assigned to the input pipelines by
+  size with `balance_files_by_size`, instead of in a round robin way.
+  """
+  if (file_sizes is not None and sharding and input_context and
+      (input_context.num_input_pipelines > 1)):
+    matched_files = balance_files_by_size(
+        matched_files, file_sizes,
+        input_context.num_input_pipelines)[input_context.input_pipeline_id]
+    # The files are already sharded.
+    sharding = False
   dataset = tf.data.Dataset.from_tensor_slices(matched_files)
 
   # Shuffle and repeat at file level.
@@ -274,8 +456,15 @@ class InputReader:
       raise ValueError(
           'A combine_fn is required if `input_path` or `tfds_name` is a dict.')
 
+    if params.file_shard_policy not in ('round_robin', 'size_balanced'):
+      raise ValueError('Unsupported `file_shard_policy`: %s' %
+                       params.file_shard_policy)
+
     self._tfds_name = params.tfds_name
     self._tfds_data_dir = params.tfds_data_dir
+    self._file_manifest_dir = params.file_manifest_dir
+    self._num_file_listing_threads = params.num_file_listing_threads
+    self._file_shard_policy = params.file_shard_policy
     self._matched_files = None
     if not params.input_path:
       # Read dataset from TFDS.
@@ -362,10 +551,16 @@ class InputReader:
     if isinstance(input_path, cfg.base_config.Config):
       matched_files = {}
       for k, v in input_path.as_dict().items():
-        matched_files[k] = match_files(v)
+        matched_files[k] = match_files(
+            v,
+            manifest_dir=self._file_manifest_dir,
+            num_threads=self._num_file_listing_threads)
     # single dataset
     else:
-      matched_files = match_files(input_path)
+      matched_files = match_files(
+          input_path,
+          manifest_dir=self._file_manifest_dir,
+          num_threads=self._num_file_listing_threads)
     return matched_files
 
   def _read_data_source(
@@ -395,6 +590,10 @@ class InputReader:
               sharding=self._sharding,
               repeat=self._is_training and not self._cache)
         else:
+          file_sizes = None
+          if (self._file_shard_policy == 'size_balanced' and self._sharding and
+              input_context and input_context.num_input_pipelines > 1):
+            file_sizes = get_file_sizes(files, self._num_file_listing_threads)
           return _shard_files_then_read(
               files,
               dataset_fn,
@@ -405,7 +604,8 @@ class InputReader:
               cache=self._cache,
               cycle_length=self._cycle_length,
               block_length=self._block_length,
-              deterministic=self._deterministic)
+              deterministic=self._deterministic,
+              file_sizes=file_sizes)
       elif len(files) == 1:
         return _read_files_then_shard(
             files,
@@ -0,0 +1,121 @@
+# Copyright 2023 The TensorFlow Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Tests for input_reader."""
+
+import os
+
+from absl.testing import parameterized
+import tensorflow as tf
+
+from official.core import config_definitions as cfg
+from official.core import input_reader
+
+
+def _write_tfrecords(path, num_records, record_size=8):
+  with tf.io.TFRecordWriter(path) as writer:
+    for i in range(num_records):
+      writer.write(b'%0*d' % (record_size, i))
+
+
+class InputReaderTest(tf.test.TestCase, parameterized.TestCase):
+
+  def setUp(self):
+    super().setUp()
+    self._data_dir = self.create_tempdir().full_path
+    self._num_records = [3, 1, 5, 2, 7, 4]
+    for i, num_records in enumerate(self._num_records):
+      _write_tfrecords(
+          os.path.join(self._data_dir, 'data-%d.tfrecord' % i), num_records)
+
+  def test_match_files_concurrently(self):
+    input_path = [
+        os.path.join(self._data_dir, 'data-[0-2].*'),
+        os.path.join(self._data_dir, 'data-[3-5].*') + ',' +
+        os.path.join(self._data_dir, 'data-0.tfrecord')
+    ]
+    self.assertEqual(
+        input_reader.match_files(input_path),
+        input_reader.match_files(input_path, num_threads=4))
+
+  def test_match_files_no_match(self):
+    with self.assertRaises(ValueError):
+      input_reader.match_files(os.path.join(self._data_dir, 'missing-*'),
+                               num_threads=4)
+
+  def test_file_manifest_is_cached(self):
+    manifest_dir = os.path.join(self.create_tempdir().full_path, 'manifests')
+    input_pattern = os.path.join(self._data_dir, 'data-*')
+    manifest = input_reader.get_file_manifest(
+        input_pattern, manifest_dir, num_threads=2)
+    self.assertEqual([os.path.getsize(x.path) for x in manifest],
+                     [x.size for x in manifest])
+
+    # The cached manifest is used instead of globbing again.
+    os.remove(manifest[0].path)
+    self.assertEqual(
+        manifest,
+        input_reader.get_file_manifest(input_pattern, manifest_dir))
+    self.assertEqual([x.path for x in manifest],
+                     input_reader.match_files(
+                         input_pattern, manifest_dir=manifest_dir))
+
+  def test_balance_files_by_size(self):
+    files = ['a', 'b', 'c', 'd', 'e', 'f']
+    sizes = [10, 1, 6, 3, 4, 2]
+    shards = input_reader.balance_files_by_size(files, sizes, 2)
+    self.assertEqual([['a', 'd'], ['b', 'c', 'e', 'f']], shards)
+    self.assertCountEqual(files, sum(shards, []))
+
+  def test_balance_files_by_size_with_empty_files(self):
+    files = ['a', 'b', 'c', 'd', 'e']
+    # Empty files are spread over the shards instead of all going to the first
+    # one, so that no shard is left without files.
+    self.assertEqual([['a', 'c', 'e'], ['b', 'd']],
+                     input_reader.balance_files_by_size(files, [0] * 5, 2))
+    self.assertEqual([['a'], ['b', 'e'], ['c'], ['d']],
+                     input_reader.balance_files_by_size(
+                         files, [5, 0, 0, 0, 0], 4))
+
+  @parameterized.parameters('round_robin', 'size_balanced')
+  def test_read_shards(self, file_shard_policy):
+    num_input_pipelines = 2
+    params = cfg.DataConfig(
+        input_path=os.path.join(self._data_dir, 'data-*'),
+        global_batch_size=num_input_pipelines,
+        is_training=False,
+        drop_remainder=False,
+        file_shard_policy=file_shard_policy)
+    num_records = []
+    for input_pipeline_id in range(num_input_pipelines):
+      input_context = tf.distribute.InputContext(
+          num_input_pipelines=num_input_pipelines,
+          input_pipeline_id=input_pipeline_id,
+          num_replicas_in_sync=num_input_pipelines)
+      dataset = input_reader.InputReader(params).read(input_context)
+      num_records.append(len(list(dataset)))
+    self.assertEqual(sum(self._num_records), sum(num_records))
+    if file_shard_policy == 'size_balanced':
+      self.assertEqual([11, 11], num_records)
+
+  def test_invalid_file_shard_policy(self):
+    params = cfg.DataConfig(
+        input_path=os.path.join(self._data_dir, 'data-*'),
+        file_shard_policy='random')
+    with self.assertRaises(ValueError):
+      input_reader.InputReader(params)
+
+
+if __name__ == '__main__':
+  tf.test.main()
@@ -14,6 +14,45 @@
 
 """Registry utility."""
 
+import importlib
+
+
+class _LazyEntry:
+  """Placeholder for an entry registered when its module is imported."""
+
+  def __init__(self, module_path):
+    self.module_path = module_path
+
+
+def _leaf_collection(registered_collection, reg_key):
+  """Returns the collection holding reg_key and its key in that collection.
+
+  Intermediate collections of a hierarchical reg_key are created as needed.
+
+  Args:
+    registered_collection: a dictionary.
+    reg_key: the key of a function or class. If reg_key is a string, it can be
+      hierarchical like my_model/my_exp/my_config_0
+  Returns:
+    A tuple of the collection dictionary and the leaf key.
+  Raises:
+    KeyError: when a collection path is already registered as a function or
+      class.
+  """
+  if not isinstance(reg_key, str):
+    return registered_collection, reg_key
+  hierarchy = reg_key.split("/")
+  collection = registered_collection
+  for h_idx, entry_name in enumerate(hierarchy[:-1]):
+    if entry_name not in collection:
+      collection[entry_name] = {}
+    collection = collection[entry_name]
+    if not isinstance(collection, dict):
+      raise KeyError(
+          "Collection path {} at position {} already registered as "
+          "a function or class.".format(entry_name, h_idx))
+  return collection, hierarchy[-1]
+
 
 def register(registered_collection, reg_key):
   """Register decorated function or class to collection.
@@ -23,7 +62,8 @@ def register(registered_collection, reg_key):
   the decorated function or class is stored under
   registered_collection["my_model"]["my_exp"]["my_config_0"].
   This decorator is supposed to be used together with the lookup() function in
-  this file.
+  this file. A key registered with register_lazy() is replaced by the decorated
+  function or class.
 
   Args:
     registered_collection: a dictionary. The decorated function or class will be
@@ -37,23 +77,9 @@ def register(registered_collection, reg_key):
   """
   def decorator(fn_or_cls):
     """Put fn_or_cls in the dictionary."""
-    if isinstance(reg_key, str):
-      hierarchy = reg_key.split("/")
-      collection = registered_collection
-      for h_idx, entry_name in enumerate(hierarchy[:-1]):
-        if entry_name not in collection:
-          collection[entry_name] = {}
-        collection = collection[entry_name]
-        if not isinstance(collection, dict):
-          raise KeyError(
-              "Collection path {} at position {} already registered as "
-              "a function or class.".format(entry_name, h_idx))
-      leaf_reg_key = hierarchy[-1]
-    else:
-      collection = registered_collection
-      leaf_reg_key = reg_key
-
-    if leaf_reg_key in collection:
+    collection, leaf_reg_key = _leaf_collection(registered_collection, reg_key)
+    if (leaf_reg_key in collection and
+        not isinstance(collection[leaf_reg_key], _LazyEntry)):
       raise KeyError("Function or class {} registered multiple times.".format(
           leaf_reg_key))
 
@@ -62,6 +88,42 @@ def register(registered_collection, reg_key):
   return decorator
 
 
+def register_lazy(registered_collection, reg_key, module_path):
+  """Registers the module that registers reg_key, without importing it.
+
+  The module is imported by the first lookup() of reg_key, which lets binaries
+  know about many functions or classes while only importing the modules of the
+  ones they use. Importing the module must register reg_key with register().
+  Registering a key that is already registered by its module is a no-op.
+
+  Args:
+    registered_collection: a dictionary. The placeholder of reg_key is put into
+      this collection.
+    reg_key: The key for retrieving the registered function or class. If reg_key
+      is a string, it can be hierarchical like my_model/my_exp/my_config_0
+    module_path: the full name of the module that registers reg_key, like
+      official.vision.configs.retinanet.
+  Raises:
+    KeyError: when reg_key is already registered lazily with another module.
+  """
+  collection, leaf_reg_key = _leaf_collection(registered_collection, reg_key)
+  entry = collection.get(leaf_reg_key)
+  if entry is None:
+    collection[leaf_reg_key] = _LazyEntry(module_path)
+  elif isinstance(entry, _LazyEntry) and entry.module_path != module_path:
+    raise KeyError("Function or class {} registered lazily with modules {} and "
+                   "{}.".format(leaf_reg_key, entry.module_path, module_path))
+
+
+def import_lazy_modules(registered_collection):
+  """Imports the modules of all lazily registered keys in the collection."""
+  for entry in list(registered_collection.values()):
+    if isinstance(entry, dict):
+      import_lazy_modules(entry)
+    elif isinstance(entry, _LazyEntry):
+      importlib.import_module(entry.module_path)
+
+
 def lookup(registered_collection, reg_key):
   """Lookup and return decorated function or class in the collection.
 
@@ -81,6 +143,19 @@ def lookup(registered_collection, reg_key):
   Raises:
     LookupError: when reg_key cannot be found.
   """
+  entry = _lookup(registered_collection, reg_key)
+  if isinstance(entry, _LazyEntry):
+    importlib.import_module(entry.module_path)
+    entry = _lookup(registered_collection, reg_key)
+    if isinstance(entry, _LazyEntry):
+      raise LookupError(
+          f"registration key {reg_key} is expected to be registered by module "
+          f"{entry.module_path}, but importing it did not register the key.")
+  return entry
+
+
+def _lookup(registered_collection, reg_key):
+  """Returns the entry of reg_key, which may be a lazy placeholder."""
   if isinstance(reg_key, str):
     hierarchy = reg_key.split("/")
     collection = registered_collection
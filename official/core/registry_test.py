@@ -14,8 +14,35 @@
 
 """Tests for registry."""
 
+import importlib
+import os
+import sys
+
+from absl.testing import parameterized
 import tensorflow as tf
+from official.core import exp_factory
 from official.core import registry
+from official.core import task_factory
+
+# Collection filled by the modules that the lazy registration tests write.
+LAZY_COLLECTION = {}
+
+# Modules holding the lazy registration index of a package.
+REGISTRY_INDEX_MODULES = (
+    'official.nlp.registry_index',
+    'official.vision.registry_index',
+)
+
+# pylint: disable=protected-access
+
+
+def _registered_experiments(collection, prefix=''):
+  """Yields the (module, name) pairs of the registered experiment factories."""
+  for key, entry in collection.items():
+    if isinstance(entry, dict):
+      yield from _registered_experiments(entry, f'{prefix}{key}/')
+    elif not isinstance(entry, registry._LazyEntry):
+      yield entry.__module__, f'{prefix}{key}'
 
 
 class RegistryTest(tf.test.TestCase):
@@ -83,6 +110,86 @@ class RegistryTest(tf.test.TestCase):
     with self.assertRaises(LookupError):
       registry.lookup(collection, 'non-exist')
 
+  def _write_module(self, module_name, reg_key):
+    """Writes a module registering reg_key into LAZY_COLLECTION."""
+    module_dir = self.get_temp_dir()
+    if module_dir not in sys.path:
+      sys.path.append(module_dir)
+    with open(os.path.join(module_dir, module_name + '.py'), 'w') as f:
+      f.write('import sys\n'
+              'from official.core import registry\n'
+              f'collection = sys.modules[{__name__!r}].LAZY_COLLECTION\n'
+              f'@registry.register(collection, {reg_key!r})\n'
+              'def func():\n'
+              '  pass\n')
+
+  def test_register_lazy(self):
+    self._write_module('lazy_module_0', 'lazy/func_0')
+    registry.register_lazy(LAZY_COLLECTION, 'lazy/func_0', 'lazy_module_0')
+    self.assertNotIn('lazy_module_0', sys.modules)
+
+    func = registry.lookup(LAZY_COLLECTION, 'lazy/func_0')
+    self.assertIn('lazy_module_0', sys.modules)
+    self.assertIs(func, sys.modules['lazy_module_0'].func)
+
+    # Registering an already imported key lazily keeps the registered function.
+    registry.register_lazy(LAZY_COLLECTION, 'lazy/func_0', 'lazy_module_0')
+    self.assertIs(registry.lookup(LAZY_COLLECTION, 'lazy/func_0'), func)
+
+  def test_register_lazy_error(self):
+    self._write_module('lazy_module_1', 'lazy/func_1')
+    registry.register_lazy(LAZY_COLLECTION, 'lazy/func_2', 'lazy_module_1')
+    with self.assertRaises(KeyError):
+      registry.register_lazy(LAZY_COLLECTION, 'lazy/func_2', 'other_module')
+    with self.assertRaisesRegex(LookupError, 'did not register'):
+      registry.lookup(LAZY_COLLECTION, 'lazy/func_2')
+
+  def test_import_lazy_modules(self):
+    self._write_module('lazy_module_2', 'lazy/func_3')
+    registry.register_lazy(LAZY_COLLECTION, 'lazy/func_3', 'lazy_module_2')
+    registry.import_lazy_modules(LAZY_COLLECTION)
+    self.assertIs(LAZY_COLLECTION['lazy']['func_3'],
+                  sys.modules['lazy_module_2'].func)
+
+
+@parameterized.parameters(*REGISTRY_INDEX_MODULES)
+class RegistryIndexTest(tf.test.TestCase, parameterized.TestCase):
+
+  def test_experiments_match_registrations(self, index_module):
+    registry_index = importlib.import_module(index_module)
+    for module_path in registry_index.EXPERIMENTS:
+      importlib.import_module(module_path)
+
+    registered = {
+        (module_path, name) for module_path, name in _registered_experiments(
+            exp_factory._REGISTERED_CONFIGS)
+        if module_path in registry_index.EXPERIMENTS
+    }
+    expected = {(module_path, name)
+                for module_path, names in registry_index.EXPERIMENTS.items()
+                for name in names}
+    self.assertEqual(registered, expected)
+
+  def test_tasks_match_registrations(self, index_module):
+    registry_index = importlib.import_module(index_module)
+    task_modules = set(registry_index.TASKS.values())
+    for module_path in task_modules:
+      importlib.import_module(module_path)
+
+    registered = {}
+    for config_cls, task_cls in task_factory._REGISTERED_TASK_CLS.items():
+      if task_cls.__module__ in task_modules:
+        config_cls_name = f'{config_cls.__module__}.{config_cls.__qualname__}'
+        registered[config_cls_name] = task_cls.__module__
+    self.assertEqual(registered, registry_index.TASKS)
+
+  def test_lookup_resolves_experiment_and_task(self, index_module):
+    registry_index = importlib.import_module(index_module)
+    names = next(iter(registry_index.EXPERIMENTS.values()))
+    config = exp_factory.get_exp_config(names[0])
+    task_cls = task_factory.get_task_cls(config.task.__class__)
+    self.assertIn(task_cls.__module__, registry_index.TASKS.values())
+
 
 if __name__ == '__main__':
   tf.test.main()
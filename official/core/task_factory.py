@@ -14,9 +14,14 @@
 
 """A global factory to register and access all registered tasks."""
 
+import importlib
+
 from official.core import registry
 
 _REGISTERED_TASK_CLS = {}
+# Maps the full names of TaskConfig classes to the modules registering their
+# tasks, for tasks registered with `register_lazy_task_cls`.
+_LAZY_TASK_MODULES = {}
 
 
 # TODO(b/158741360): Add type annotations once pytype checks across modules.
@@ -55,6 +60,31 @@ def register_task_cls(task_config_cls):
   return registry.register(_REGISTERED_TASK_CLS, task_config_cls)
 
 
+def register_lazy_task_cls(task_config_cls_name, module_path):
+  """Registers the module defining the Task of a TaskConfig subclass.
+
+  The module is imported when a Task is first requested for the config class,
+  so binaries do not need to import the modules of all known tasks. The config
+  class is referred to by name so that its module is not imported either.
+
+  Args:
+    task_config_cls_name: the full name of a subclass of TaskConfig, like
+      official.vision.configs.retinanet.RetinaNetTask.
+    module_path: the full name of the module that registers the Task with
+      `register_task_cls`.
+
+  Raises:
+    KeyError: when the config class is already registered lazily with another
+      module.
+  """
+  registered_module_path = _LAZY_TASK_MODULES.setdefault(
+      task_config_cls_name, module_path)
+  if registered_module_path != module_path:
+    raise KeyError(
+        "Task config class {} registered lazily with modules {} and {}.".format(
+            task_config_cls_name, registered_module_path, module_path))
+
+
 def get_task(task_config, **kwargs):
   """Creates a Task (of suitable subclass type) from task_config."""
   # TODO(hongkuny): deprecate the task factory to use config.BUILDER.
@@ -66,5 +96,10 @@ def get_task(task_config, **kwargs):
 # The user-visible get_task() is defined after classes have been registered.
 # TODO(b/158741360): Add type annotations once pytype checks across modules.
 def get_task_cls(task_config_cls):
+  if task_config_cls not in _REGISTERED_TASK_CLS:
+    module_path = _LAZY_TASK_MODULES.get(
+        f"{task_config_cls.__module__}.{task_config_cls.__qualname__}")
+    if module_path is not None:
+      importlib.import_module(module_path)
   task_cls = registry.lookup(_REGISTERED_TASK_CLS, task_config_cls)
   return task_cls
@@ -109,12 +109,18 @@ class OrbitExperimentRunner:
         train='train' in mode,
         evaluate=('eval' in mode) or run_post_eval)
     assert self.trainer is not None
+    # Overlapped validation runs on a separate copy of the model, restored from
+    # the checkpoints saved while training continues.
+    if mode == 'train_and_eval' and params.trainer.overlapped_validation:
+      self._evaluator = self._build_trainer(task, train=False, evaluate=True)
+    else:
+      self._evaluator = self.trainer
     self._checkpoint_manager = self._maybe_build_checkpoint_manager()
     self._summary_manager = summary_manager
     self._eval_summary_manager = eval_summary_manager
     self._controller = self._build_controller(
         trainer=self.trainer if 'train' in mode else None,
-        evaluator=self.trainer,
+        evaluator=self._evaluator,
         save_summary=save_summary,
         train_actions=train_actions,
         eval_actions=eval_actions,
@@ -249,9 +255,30 @@ class OrbitExperimentRunner:
         eval_summary_manager=self._eval_summary_manager
         if hasattr(self, '_eval_summary_manager')
         else None,
+        eval_checkpoint=evaluator.checkpoint
+        if evaluator is not None and evaluator is not self.trainer
+        else None,
+        instrumentation=self._maybe_build_instrumentation(),
     )
     return controller
 
+  def _maybe_build_instrumentation(
+      self) -> Optional[orbit.utils.Instrumentation]:
+    """Builds the loop instrumentation if enabled by the trainer config."""
+    trainer_params = self.params.trainer
+    profile_steps = [
+        int(step) for step in trainer_params.profile_steps.split(',') if step
+    ]
+    if not trainer_params.instrument_loops and not profile_steps:
+      return None
+    if len(profile_steps) % 2:
+      raise ValueError(
+          '`trainer.profile_steps` must contain `start,stop` pairs, got '
+          f'{trainer_params.profile_steps!r}.')
+    return orbit.utils.Instrumentation(
+        profile_steps=list(zip(profile_steps[::2], profile_steps[1::2])),
+        profile_dir=self.model_dir)
+
   def run(self) -> Tuple[tf.keras.Model, Mapping[str, Any]]:
     """Run experiments by mode.
 
@@ -259,6 +259,80 @@ class TrainTest(tf.test.TestCase, parameterized.TestCase):
       for left, right in zip(before_weights, after_weights):
         self.assertAllEqual(left, right)
 
+  def test_instrument_loops(self):
+    model_dir = self.get_temp_dir()
+    self._test_config['trainer']['instrument_loops'] = True
+    flags_dict = dict(
+        experiment='mock',
+        mode='train_and_eval',
+        model_dir=model_dir,
+        params_override=json.dumps(self._test_config))
+    with flagsaver.flagsaver(**flags_dict):
+      params = train_utils.parse_configuration(flags.FLAGS)
+      task = task_factory.get_task(params.task, logging_dir=model_dir)
+      runner = train_lib.OrbitExperimentRunner(
+          distribution_strategy=tf.distribute.get_strategy(),
+          task=task,
+          mode='train_and_eval',
+          params=params,
+          model_dir=model_dir)
+      runner.run()
+
+    history = runner.controller.instrumentation.history
+    self.assertEqual([record['kind'] for record in history], ['train', 'eval'])
+    self.assertIn('checkpoint', history[0]['phases'])
+    self.assertNotEmpty(
+        tf.io.gfile.listdir(os.path.join(model_dir, 'train', 'timing')))
+
+  def test_overlapped_validation(self):
+    model_dir = self.get_temp_dir()
+    self._test_config['trainer']['overlapped_validation'] = True
+    flags_dict = dict(
+        experiment='mock',
+        mode='train_and_eval',
+        model_dir=model_dir,
+        params_override=json.dumps(self._test_config))
+    with flagsaver.flagsaver(**flags_dict):
+      params = train_utils.parse_configuration(flags.FLAGS)
+      task = task_factory.get_task(params.task, logging_dir=model_dir)
+      runner = train_lib.OrbitExperimentRunner(
+          distribution_strategy=tf.distribute.get_strategy(),
+          task=task,
+          mode='train_and_eval',
+          params=params,
+          model_dir=model_dir,
+          run_post_eval=True)
+      _, logs = runner.run()
+
+    self.assertIsNot(runner.controller.evaluator, runner.trainer)
+    self.assertNotEmpty(logs)
+    self.assertNotEmpty(
+        tf.io.gfile.listdir(
+            os.path.join(model_dir, params.trainer.validation_summary_subdir)))
+    for train_weight, eval_weight in zip(
+        runner.trainer.model.get_weights(),
+        runner.controller.evaluator.model.get_weights()):
+      self.assertAllClose(train_weight, eval_weight)
+
+  def test_profile_steps_must_be_pairs(self):
+    model_dir = self.get_temp_dir()
+    self._test_config['trainer']['profile_steps'] = '2,4,6'
+    flags_dict = dict(
+        experiment='mock',
+        mode='train',
+        model_dir=model_dir,
+        params_override=json.dumps(self._test_config))
+    with flagsaver.flagsaver(**flags_dict):
+      params = train_utils.parse_configuration(flags.FLAGS)
+      task = task_factory.get_task(params.task, logging_dir=model_dir)
+      with self.assertRaisesRegex(ValueError, 'start,stop'):
+        train_lib.OrbitExperimentRunner(
+            distribution_strategy=tf.distribute.get_strategy(),
+            task=task,
+            mode='train',
+            params=params,
+            model_dir=model_dir)
+
   def test_parse_configuration(self):
     model_dir = self.get_temp_dir()
     flags_dict = dict(
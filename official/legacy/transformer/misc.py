@@ -199,6 +199,20 @@ def define_transformer_flags():
           'use padded_decode, it has not been tested. In addition, this method '
           'will introduce unnecessary overheads which grow quadratically with '
           'the max sequence length.'))
+  flags.DEFINE_bool(
+      name='compact_finished_beams',
+      default=False,
+      help=flags_core.help_wrap(
+          'Whether beam search removes the batch items whose search has '
+          'finished from the decoding loop, which reduces the decoding time '
+          'of batches with mixed output lengths. Cannot be used with '
+          'padded_decode.'))
+  flags.DEFINE_float(
+      name='beam_pruning_threshold',
+      default=None,
+      help=flags_core.help_wrap(
+          'If set, beam search prunes the beams whose log probability is more '
+          'than this threshold below the best beam.'))
   flags.DEFINE_bool(
       name='enable_checkpointing',
       default=True,
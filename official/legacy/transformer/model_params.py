@@ -53,6 +53,9 @@ BASE_PARAMS = collections.defaultdict(
     extra_decode_length=50,
     beam_size=4,
     alpha=0.6,  # used to calculate length normalization in beam search
+    # Removes finished batch items from the beam search loop.
+    compact_finished_beams=False,
+    beam_pruning_threshold=None,
 
     # TPU specific parameters
     use_tpu=False,
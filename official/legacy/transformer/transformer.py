@@ -330,7 +330,9 @@ class Transformer(tf.keras.Model):
         max_decode_length=max_decode_length,
         eos_id=EOS_ID,
         padded_decode=self.params["padded_decode"],
-        dtype=self.params["dtype"])
+        dtype=self.params["dtype"],
+        compact_finished_batches=self.params["compact_finished_beams"],
+        pruning_threshold=self.params["beam_pruning_threshold"])
 
     # Get the top sequence for each batch element
     top_decoded_ids = decoded_ids[:, 0, 1:]
@@ -149,6 +149,8 @@ class TransformerTask(object):
     params["decode_batch_size"] = flags_obj.decode_batch_size
     params["decode_max_length"] = flags_obj.decode_max_length
     params["padded_decode"] = flags_obj.padded_decode
+    params["compact_finished_beams"] = flags_obj.compact_finished_beams
+    params["beam_pruning_threshold"] = flags_obj.beam_pruning_threshold
     params["max_io_parallelism"] = (
         flags_obj.num_parallel_calls or tf.data.experimental.AUTOTUNE)
 
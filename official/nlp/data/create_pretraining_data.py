@@ -15,7 +15,9 @@
 """Create masked LM/next sentence masked_lm TF examples for BERT."""
 
 import collections
+import functools
 import itertools
+import multiprocessing
 import random
 
 # Import libraries
@@ -33,7 +35,9 @@ flags.DEFINE_string("input_file", None,
 
 flags.DEFINE_string(
     "output_file", None,
-    "Output TF example file (or comma-separated list of files).")
+    "Output TF example file (or comma-separated list of files). With "
+    "`--num_workers`, a single path to which the shard suffix "
+    "`-xxxxx-of-yyyyy` of each input file is appended.")
 
 flags.DEFINE_string("vocab_file", None,
                     "The vocabulary file that the BERT model was trained on.")
@@ -79,6 +83,14 @@ flags.DEFINE_float(
     "Probability of creating sequences which are shorter than the "
     "maximum length.")
 
+flags.DEFINE_integer(
+    "num_workers", 0,
+    "If positive, every input file is processed as an independent shard by "
+    "one of `num_workers` processes, which writes its own output file. Only "
+    "one input file per worker is held in memory, and the random next "
+    "sentences are drawn from the same input file. If 0, all input files are "
+    "read into memory and processed together.")
+
 
 class TrainingInstance(object):
   """A single training instance (sentence pair)."""
@@ -110,7 +122,8 @@ class TrainingInstance(object):
 
 def write_instance_to_example_files(instances, tokenizer, max_seq_length,
                                     max_predictions_per_seq, output_files,
-                                    gzip_compress, use_v2_feature_names):
+                                    gzip_compress, use_v2_feature_names,
+                                    num_logged_instances=20):
   """Creates TF example files from `TrainingInstance`s."""
   writers = []
   for output_file in output_files:
@@ -168,7 +181,7 @@ def write_instance_to_example_files(instances, tokenizer, max_seq_length,
 
     total_written += 1
 
-    if inst_index < 20:
+    if inst_index < num_logged_instances:
       logging.info("*** Example ***")
       logging.info("tokens: %s", " ".join(
           [tokenization.printable_text(x) for x in instance.tokens]))
@@ -209,6 +222,25 @@ def create_training_instances(input_files,
                               do_whole_word_mask=False,
                               max_ngram_size=None):
   """Create `TrainingInstance`s from raw text."""
+  all_documents = _read_documents(input_files, tokenizer)
+  rng.shuffle(all_documents)
+
+  vocab_words = list(tokenizer.vocab.keys())
+  instances = []
+  for _ in range(dupe_factor):
+    for document_index in range(len(all_documents)):
+      instances.extend(
+          create_instances_from_document(
+              all_documents, document_index, max_seq_length, short_seq_prob,
+              masked_lm_prob, max_predictions_per_seq, vocab_words, rng,
+              do_whole_word_mask, max_ngram_size))
+
+  rng.shuffle(instances)
+  return instances
+
+
+def _read_documents(input_files, tokenizer):
+  """Reads and tokenizes the non-empty documents of the input files."""
   all_documents = [[]]
 
   # Input file format:
@@ -233,21 +265,108 @@ def create_training_instances(input_files,
           all_documents[-1].append(tokens)
 
   # Remove empty documents
-  all_documents = [x for x in all_documents if x]
-  rng.shuffle(all_documents)
+  return [x for x in all_documents if x]
 
-  vocab_words = list(tokenizer.vocab.keys())
-  instances = []
-  for _ in range(dupe_factor):
-    for document_index in range(len(all_documents)):
-      instances.extend(
-          create_instances_from_document(
-              all_documents, document_index, max_seq_length, short_seq_prob,
-              masked_lm_prob, max_predictions_per_seq, vocab_words, rng,
-              do_whole_word_mask, max_ngram_size))
 
-  rng.shuffle(instances)
-  return instances
+def get_shard_output_file(output_file, shard_index, num_shards):
+  """Returns the output file of an input shard in the sharded mode."""
+  return "%s-%05d-of-%05d" % (output_file, shard_index, num_shards)
+
+
+def _create_shard_example_file(shard, tokenizer, num_shards, output_file,
+                               random_seed, gzip_compress, use_v2_feature_names,
+                               **instance_kwargs):
+  """Creates the TF example file of one input shard and returns its size."""
+  shard_index, input_file = shard
+  # Seeds every shard differently but independently of the worker running it.
+  rng = random.Random("%d-%d" % (random_seed, shard_index))
+  instances = create_training_instances(
+      [input_file], tokenizer, rng=rng, **instance_kwargs)
+  write_instance_to_example_files(
+      instances,
+      tokenizer,
+      instance_kwargs["max_seq_length"],
+      instance_kwargs["max_predictions_per_seq"],
+      [get_shard_output_file(output_file, shard_index, num_shards)],
+      gzip_compress,
+      use_v2_feature_names,
+      num_logged_instances=20 if shard_index == 0 else 0)
+  return len(instances)
+
+
+def create_sharded_example_files(input_files,
+                                 output_file,
+                                 tokenizer,
+                                 max_seq_length,
+                                 dupe_factor,
+                                 short_seq_prob,
+                                 masked_lm_prob,
+                                 max_predictions_per_seq,
+                                 random_seed,
+                                 num_workers,
+                                 do_whole_word_mask=False,
+                                 max_ngram_size=None,
+                                 gzip_compress=False,
+                                 use_v2_feature_names=False):
+  """Creates a TF example file per input file in parallel processes.
+
+  Every input file is an independent shard: its documents are read, turned into
+  `TrainingInstance`s and written by a single worker, with a random generator
+  seeded by `random_seed` and the shard index. The output is therefore the same
+  for any `num_workers`, and only the input files being processed are held in
+  memory.
+
+  Args:
+    input_files: A list of raw text files.
+    output_file: The path to which the shard suffix is appended to get the
+      output file of each input file, see `get_shard_output_file`.
+    tokenizer: A `tokenization.FullTokenizer`.
+    max_seq_length: Maximum sequence length.
+    dupe_factor: Number of times to duplicate the input data.
+    short_seq_prob: Probability of creating shorter sequences.
+    masked_lm_prob: Masked LM probability.
+    max_predictions_per_seq: Maximum number of masked LM predictions per
+      sequence.
+    random_seed: Random seed for data generation.
+    num_workers: Number of worker processes. If 1, the shards are processed
+      in this process.
+    do_whole_word_mask: Whether to use whole word masking.
+    max_ngram_size: Maximum size of the masked n-grams.
+    gzip_compress: Whether to GZIP compress the output files.
+    use_v2_feature_names: Whether to use the feature names consistent with the
+      models.
+
+  Returns:
+    The list of output files.
+  """
+  num_shards = len(input_files)
+  create_shard_fn = functools.partial(
+      _create_shard_example_file,
+      tokenizer=tokenizer,
+      num_shards=num_shards,
+      output_file=output_file,
+      random_seed=random_seed,
+      gzip_compress=gzip_compress,
+      use_v2_feature_names=use_v2_feature_names,
+      max_seq_length=max_seq_length,
+      dupe_factor=dupe_factor,
+      short_seq_prob=short_seq_prob,
+      masked_lm_prob=masked_lm_prob,
+      max_predictions_per_seq=max_predictions_per_seq,
+      do_whole_word_mask=do_whole_word_mask,
+      max_ngram_size=max_ngram_size)
+  shards = list(enumerate(input_files))
+  if num_workers > 1 and num_shards > 1:
+    # TensorFlow is not fork-safe, so the workers are spawned.
+    context = multiprocessing.get_context("spawn")
+    with context.Pool(min(num_workers, num_shards)) as pool:
+      num_instances = list(pool.imap(create_shard_fn, shards))
+  else:
+    num_instances = [create_shard_fn(shard) for shard in shards]
+  logging.info("Wrote %d total instances to %d files", sum(num_instances),
+               num_shards)
+  return [get_shard_output_file(output_file, i, num_shards)
+          for i in range(num_shards)]
 
 
 def create_instances_from_document(
@@ -502,8 +621,8 @@ def _masking_ngrams(grams, max_ngram_size, max_masked_tokens, rng):
   while (sum(masked_tokens) < max_masked_tokens and
          sum(len(s) for s in ngrams.values())):
     # Pick an n-gram size based on our weights.
-    sz = random.choices(range(1, max_ngram_size+1),
-                        cum_weights=cummulative_weights)[0]
+    sz = rng.choices(range(1, max_ngram_size+1),
+                     cum_weights=cummulative_weights)[0]
 
     # Ensure this size doesn't result in too many masked tokens.
     # E.g., a two-gram contains _at least_ two tokens.
@@ -645,6 +764,17 @@ def main(_):
   for input_file in input_files:
     logging.info("  %s", input_file)
 
+  if FLAGS.num_workers > 0:
+    logging.info("*** Writing a shard of each input file to %s ***",
+                 FLAGS.output_file)
+    create_sharded_example_files(
+        input_files, FLAGS.output_file, tokenizer, FLAGS.max_seq_length,
+        FLAGS.dupe_factor, FLAGS.short_seq_prob, FLAGS.masked_lm_prob,
+        FLAGS.max_predictions_per_seq, FLAGS.random_seed, FLAGS.num_workers,
+        FLAGS.do_whole_word_mask, FLAGS.max_ngram_size, FLAGS.gzip_compress,
+        FLAGS.use_v2_feature_names)
+    return
+
   rng = random.Random(FLAGS.random_seed)
   instances = create_training_instances(
       input_files, tokenizer, FLAGS.max_seq_length, FLAGS.dupe_factor,
@@ -13,11 +13,13 @@
 # limitations under the License.
 
 """Tests for official.nlp.data.create_pretraining_data."""
+import os
 import random
 
 import tensorflow as tf
 
 from official.nlp.data import create_pretraining_data as cpd
+from official.nlp.tools import tokenization
 
 _VOCAB_WORDS = ["vocab_1", "vocab_2"]
 
@@ -123,6 +125,61 @@ class CreatePretrainingDataTest(tf.test.TestCase):
       self.assertEqual(len(masked_labels), 76)
       self.assertTokens(tokens, output_tokens, masked_positions, masked_labels)
 
+  def test_create_sharded_example_files(self):
+    vocab_tokens = ["[PAD]", "[UNK]", "[CLS]", "[SEP]", "[MASK]"] + [
+        "word{}".format(i) for i in range(20)]
+    vocab_file = os.path.join(self.get_temp_dir(), "vocab.txt")
+    with tf.io.gfile.GFile(vocab_file, "w") as f:
+      f.write("\n".join(vocab_tokens) + "\n")
+    tokenizer = tokenization.FullTokenizer(vocab_file)
+
+    rng = random.Random(0)
+    input_files = []
+    for shard_index in range(3):
+      lines = []
+      for _ in range(4):
+        for _ in range(rng.randint(2, 5)):
+          lines.append(" ".join(
+              "word{}".format(rng.randint(0, 19))
+              for _ in range(rng.randint(3, 12))))
+        lines.append("")
+      input_file = os.path.join(self.get_temp_dir(),
+                                "input{}.txt".format(shard_index))
+      with tf.io.gfile.GFile(input_file, "w") as f:
+        f.write("\n".join(lines))
+      input_files.append(input_file)
+
+    outputs = []
+    for num_workers in (1, 2):
+      output_file = os.path.join(self.get_temp_dir(),
+                                 "output{}.tfrecord".format(num_workers))
+      output_files = cpd.create_sharded_example_files(
+          input_files,
+          output_file,
+          tokenizer,
+          max_seq_length=16,
+          dupe_factor=2,
+          short_seq_prob=0.1,
+          masked_lm_prob=0.15,
+          max_predictions_per_seq=3,
+          random_seed=1,
+          num_workers=num_workers,
+          do_whole_word_mask=True,
+          max_ngram_size=2)
+      self.assertEqual(output_files, [
+          cpd.get_shard_output_file(output_file, i, 3) for i in range(3)])
+      outputs.append([[
+          tf.train.Example.FromString(record)
+          for record in tf.compat.v1.io.tf_record_iterator(f)
+      ] for f in output_files])
+
+    # The output does not depend on the number of workers.
+    self.assertEqual(outputs[0], outputs[1])
+    for records in outputs[0]:
+      self.assertNotEmpty(records)
+    # Every shard uses its own random generator.
+    self.assertNotEqual(outputs[0][0][:1], outputs[0][1][:1])
+
 
 if __name__ == "__main__":
   tf.test.main()
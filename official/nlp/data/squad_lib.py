@@ -16,13 +16,17 @@
 # pylint: disable=g-bad-import-order
 import collections
 import copy
+import functools
+import itertools
 import json
 import math
+import multiprocessing
 import os
 
 import six
 
 from absl import logging
+import numpy as np
 import tensorflow as tf
 
 from official.nlp.tools import tokenization
@@ -257,204 +261,62 @@ def convert_examples_to_features(examples,
                                  is_training,
                                  output_fn,
                                  xlnet_format=False,
-                                 batch_size=None):
-  """Loads a data file into a list of `InputBatch`s."""
+                                 batch_size=None,
+                                 num_workers=1,
+                                 examples_per_task=64):
+  """Loads a data file into a list of `InputBatch`s.
+
+  The features of consecutive questions on the same context share the
+  tokenization of the context. If `num_workers` is greater than 1, the examples
+  are converted by a pool of processes in chunks of `examples_per_task`, and
+  `output_fn` is still called on the features in the order of the examples.
+  The tokenizer is sent to every worker once, when the worker starts.
+  """
+
+  convert_fn = functools.partial(
+      _convert_example_chunk_to_features,
+      max_seq_length=max_seq_length,
+      doc_stride=doc_stride,
+      max_query_length=max_query_length,
+      is_training=is_training,
+      xlnet_format=xlnet_format)
+  indexed_examples = list(enumerate(examples))
+  chunks = [
+      indexed_examples[i:i + examples_per_task]
+      for i in range(0, len(indexed_examples), examples_per_task)
+  ]
+  pool = None
+  if num_workers > 1 and len(chunks) > 1:
+    # TensorFlow is not fork-safe, so the workers are spawned.
+    pool = multiprocessing.get_context("spawn").Pool(
+        num_workers,
+        initializer=_init_convert_worker,
+        initargs=(tokenizer,))
+    chunk_features = pool.imap(convert_fn, chunks)
+  else:
+    chunk_features = map(
+        functools.partial(convert_fn, tokenizer=tokenizer), chunks)
 
   base_id = 1000000000
   unique_id = base_id
   feature = None
-  for (example_index, example) in enumerate(examples):
-    query_tokens = tokenizer.tokenize(example.question_text)
-
-    if len(query_tokens) > max_query_length:
-      query_tokens = query_tokens[0:max_query_length]
-
-    tok_to_orig_index = []
-    orig_to_tok_index = []
-    all_doc_tokens = []
-    for (i, token) in enumerate(example.doc_tokens):
-      orig_to_tok_index.append(len(all_doc_tokens))
-      sub_tokens = tokenizer.tokenize(token)
-      for sub_token in sub_tokens:
-        tok_to_orig_index.append(i)
-        all_doc_tokens.append(sub_token)
-
-    tok_start_position = None
-    tok_end_position = None
-    if is_training and example.is_impossible:
-      tok_start_position = -1
-      tok_end_position = -1
-    if is_training and not example.is_impossible:
-      tok_start_position = orig_to_tok_index[example.start_position]
-      if example.end_position < len(example.doc_tokens) - 1:
-        tok_end_position = orig_to_tok_index[example.end_position + 1] - 1
-      else:
-        tok_end_position = len(all_doc_tokens) - 1
-      (tok_start_position, tok_end_position) = _improve_answer_span(
-          all_doc_tokens, tok_start_position, tok_end_position, tokenizer,
-          example.orig_answer_text)
-
-    # The -3 accounts for [CLS], [SEP] and [SEP]
-    max_tokens_for_doc = max_seq_length - len(query_tokens) - 3
-
-    # We can have documents that are longer than the maximum sequence length.
-    # To deal with this we do a sliding window approach, where we take chunks
-    # of the up to our max length with a stride of `doc_stride`.
-    _DocSpan = collections.namedtuple(  # pylint: disable=invalid-name
-        "DocSpan", ["start", "length"])
-    doc_spans = []
-    start_offset = 0
-    while start_offset < len(all_doc_tokens):
-      length = len(all_doc_tokens) - start_offset
-      if length > max_tokens_for_doc:
-        length = max_tokens_for_doc
-      doc_spans.append(_DocSpan(start=start_offset, length=length))
-      if start_offset + length == len(all_doc_tokens):
-        break
-      start_offset += min(length, doc_stride)
-
-    for (doc_span_index, doc_span) in enumerate(doc_spans):
-      tokens = []
-      token_to_orig_map = {}
-      token_is_max_context = {}
-      segment_ids = []
-
-      # Paragraph mask used in XLNet.
-      # 1 represents paragraph and class tokens.
-      # 0 represents query and other special tokens.
-      paragraph_mask = []
-
-      # pylint: disable=cell-var-from-loop
-      def process_query(seg_q):
-        for token in query_tokens:
-          tokens.append(token)
-          segment_ids.append(seg_q)
-          paragraph_mask.append(0)
-        tokens.append("[SEP]")
-        segment_ids.append(seg_q)
-        paragraph_mask.append(0)
-
-      def process_paragraph(seg_p):
-        for i in range(doc_span.length):
-          split_token_index = doc_span.start + i
-          token_to_orig_map[len(tokens)] = tok_to_orig_index[split_token_index]
-
-          is_max_context = _check_is_max_context(doc_spans, doc_span_index,
-                                                 split_token_index)
-          token_is_max_context[len(tokens)] = is_max_context
-          tokens.append(all_doc_tokens[split_token_index])
-          segment_ids.append(seg_p)
-          paragraph_mask.append(1)
-        tokens.append("[SEP]")
-        segment_ids.append(seg_p)
-        paragraph_mask.append(0)
-
-      def process_class(seg_class):
-        class_index = len(segment_ids)
-        tokens.append("[CLS]")
-        segment_ids.append(seg_class)
-        paragraph_mask.append(1)
-        return class_index
-
-      if xlnet_format:
-        seg_p, seg_q, seg_class, seg_pad = 0, 1, 2, 3
-        process_paragraph(seg_p)
-        process_query(seg_q)
-        class_index = process_class(seg_class)
-      else:
-        seg_p, seg_q, seg_class, seg_pad = 1, 0, 0, 0
-        class_index = process_class(seg_class)
-        process_query(seg_q)
-        process_paragraph(seg_p)
-
-      input_ids = tokenizer.convert_tokens_to_ids(tokens)
-
-      # The mask has 1 for real tokens and 0 for padding tokens. Only real
-      # tokens are attended to.
-      input_mask = [1] * len(input_ids)
-
-      # Zero-pad up to the sequence length.
-      while len(input_ids) < max_seq_length:
-        input_ids.append(0)
-        input_mask.append(0)
-        segment_ids.append(seg_pad)
-        paragraph_mask.append(0)
-
-      assert len(input_ids) == max_seq_length
-      assert len(input_mask) == max_seq_length
-      assert len(segment_ids) == max_seq_length
-      assert len(paragraph_mask) == max_seq_length
-
-      start_position = 0
-      end_position = 0
-      span_contains_answer = False
-
-      if is_training and not example.is_impossible:
-        # For training, if our document chunk does not contain an annotation
-        # we throw it out, since there is nothing to predict.
-        doc_start = doc_span.start
-        doc_end = doc_span.start + doc_span.length - 1
-        span_contains_answer = (tok_start_position >= doc_start and
-                                tok_end_position <= doc_end)
-        if span_contains_answer:
-          doc_offset = 0 if xlnet_format else len(query_tokens) + 2
-          start_position = tok_start_position - doc_start + doc_offset
-          end_position = tok_end_position - doc_start + doc_offset
-
-      if example_index < 20:
-        logging.info("*** Example ***")
-        logging.info("unique_id: %s", (unique_id))
-        logging.info("example_index: %s", (example_index))
-        logging.info("doc_span_index: %s", (doc_span_index))
-        logging.info("tokens: %s",
-                     " ".join([tokenization.printable_text(x) for x in tokens]))
-        logging.info(
-            "token_to_orig_map: %s", " ".join([
-                "%d:%d" % (x, y) for (x, y) in six.iteritems(token_to_orig_map)
-            ]))
-        logging.info(
-            "token_is_max_context: %s", " ".join([
-                "%d:%s" % (x, y)
-                for (x, y) in six.iteritems(token_is_max_context)
-            ]))
-        logging.info("input_ids: %s", " ".join([str(x) for x in input_ids]))
-        logging.info("input_mask: %s", " ".join([str(x) for x in input_mask]))
-        logging.info("segment_ids: %s", " ".join([str(x) for x in segment_ids]))
-        logging.info("paragraph_mask: %s", " ".join(
-            [str(x) for x in paragraph_mask]))
-        logging.info("class_index: %d", class_index)
+  try:
+    for example_features in itertools.chain.from_iterable(chunk_features):
+      for feature in example_features:
+        feature.unique_id = unique_id
+        if feature.example_index < 20:
+          _log_feature(feature, is_training)
+
+        # Run callback
         if is_training:
-          if span_contains_answer:
-            answer_text = " ".join(tokens[start_position:(end_position + 1)])
-            logging.info("start_position: %d", (start_position))
-            logging.info("end_position: %d", (end_position))
-            logging.info("answer: %s", tokenization.printable_text(answer_text))
-          else:
-            logging.info("document span doesn't contain answer")
-
-      feature = InputFeatures(
-          unique_id=unique_id,
-          example_index=example_index,
-          doc_span_index=doc_span_index,
-          tokens=tokens,
-          paragraph_mask=paragraph_mask,
-          class_index=class_index,
-          token_to_orig_map=token_to_orig_map,
-          token_is_max_context=token_is_max_context,
-          input_ids=input_ids,
-          input_mask=input_mask,
-          segment_ids=segment_ids,
-          start_position=start_position,
-          end_position=end_position,
-          is_impossible=not span_contains_answer)
-
-      # Run callback
-      if is_training:
-        output_fn(feature)
-      else:
-        output_fn(feature, is_padding=False)
+          output_fn(feature)
+        else:
+          output_fn(feature, is_padding=False)
 
-      unique_id += 1
+        unique_id += 1
+  finally:
+    if pool is not None:
+      pool.terminate()
 
   if not is_training and feature:
     assert batch_size
@@ -474,6 +336,258 @@ def convert_examples_to_features(examples,
   return unique_id - base_id
 
 
+_DocSpan = collections.namedtuple(  # pylint: disable=invalid-name
+    "DocSpan", ["start", "length"])
+
+
+class _ContextTokenizer(object):
+  """Tokenizes contexts, reusing the result of the previous context.
+
+  The questions on the same paragraph are consecutive examples, which share
+  their `doc_tokens`.
+  """
+
+  def __init__(self, tokenizer):
+    self._tokenizer = tokenizer
+    self._doc_tokens = None
+    self._tokenized_context = None
+
+  def tokenize(self, doc_tokens):
+    """Returns `tok_to_orig_index`, `orig_to_tok_index` and `all_doc_tokens`."""
+    if (doc_tokens is not self._doc_tokens and
+        doc_tokens != self._doc_tokens):
+      tok_to_orig_index = []
+      orig_to_tok_index = []
+      all_doc_tokens = []
+      for (i, token) in enumerate(doc_tokens):
+        orig_to_tok_index.append(len(all_doc_tokens))
+        sub_tokens = self._tokenizer.tokenize(token)
+        tok_to_orig_index.extend([i] * len(sub_tokens))
+        all_doc_tokens.extend(sub_tokens)
+      self._doc_tokens = doc_tokens
+      self._tokenized_context = (tok_to_orig_index, orig_to_tok_index,
+                                 all_doc_tokens)
+    return self._tokenized_context
+
+
+# The tokenizer of a `convert_examples_to_features` worker process.
+_worker_tokenizer = None
+
+
+def _init_convert_worker(tokenizer):
+  global _worker_tokenizer
+  _worker_tokenizer = tokenizer
+
+
+def _convert_example_chunk_to_features(indexed_examples,
+                                       tokenizer=None,
+                                       **kwargs):
+  """Converts a list of `(example_index, example)` to lists of features.
+
+  If `tokenizer` is None, the tokenizer installed by `_init_convert_worker` in
+  the current worker process is used.
+  """
+  if tokenizer is None:
+    tokenizer = _worker_tokenizer
+  context_tokenizer = _ContextTokenizer(tokenizer)
+  return [
+      _convert_example_to_features(example_index, example, tokenizer,
+                                   context_tokenizer, **kwargs)
+      for example_index, example in indexed_examples
+  ]
+
+
+def _convert_example_to_features(example_index, example, tokenizer,
+                                 context_tokenizer, max_seq_length, doc_stride,
+                                 max_query_length, is_training, xlnet_format):
+  """Converts a `SquadExample` to `InputFeatures` without their unique id."""
+  query_tokens = tokenizer.tokenize(example.question_text)
+
+  if len(query_tokens) > max_query_length:
+    query_tokens = query_tokens[0:max_query_length]
+
+  (tok_to_orig_index, orig_to_tok_index,
+   all_doc_tokens) = context_tokenizer.tokenize(example.doc_tokens)
+
+  tok_start_position = None
+  tok_end_position = None
+  if is_training and example.is_impossible:
+    tok_start_position = -1
+    tok_end_position = -1
+  if is_training and not example.is_impossible:
+    tok_start_position = orig_to_tok_index[example.start_position]
+    if example.end_position < len(example.doc_tokens) - 1:
+      tok_end_position = orig_to_tok_index[example.end_position + 1] - 1
+    else:
+      tok_end_position = len(all_doc_tokens) - 1
+    (tok_start_position, tok_end_position) = _improve_answer_span(
+        all_doc_tokens, tok_start_position, tok_end_position, tokenizer,
+        example.orig_answer_text)
+
+  # The -3 accounts for [CLS], [SEP] and [SEP]
+  max_tokens_for_doc = max_seq_length - len(query_tokens) - 3
+
+  # We can have documents that are longer than the maximum sequence length.
+  # To deal with this we do a sliding window approach, where we take chunks
+  # of the up to our max length with a stride of `doc_stride`.
+  doc_spans = []
+  start_offset = 0
+  while start_offset < len(all_doc_tokens):
+    length = len(all_doc_tokens) - start_offset
+    if length > max_tokens_for_doc:
+      length = max_tokens_for_doc
+    doc_spans.append(_DocSpan(start=start_offset, length=length))
+    if start_offset + length == len(all_doc_tokens):
+      break
+    start_offset += min(length, doc_stride)
+  max_context_span_indexes = _get_max_context_span_indexes(
+      doc_spans, len(all_doc_tokens))
+
+  features = []
+  for (doc_span_index, doc_span) in enumerate(doc_spans):
+    tokens = []
+    token_to_orig_map = {}
+    token_is_max_context = {}
+    segment_ids = []
+
+    # Paragraph mask used in XLNet.
+    # 1 represents paragraph and class tokens.
+    # 0 represents query and other special tokens.
+    paragraph_mask = []
+
+    # pylint: disable=cell-var-from-loop
+    def process_query(seg_q):
+      for token in query_tokens:
+        tokens.append(token)
+        segment_ids.append(seg_q)
+        paragraph_mask.append(0)
+      tokens.append("[SEP]")
+      segment_ids.append(seg_q)
+      paragraph_mask.append(0)
+
+    def process_paragraph(seg_p):
+      for i in range(doc_span.length):
+        split_token_index = doc_span.start + i
+        token_to_orig_map[len(tokens)] = tok_to_orig_index[split_token_index]
+
+        is_max_context = (
+            max_context_span_indexes[split_token_index] == doc_span_index)
+        token_is_max_context[len(tokens)] = is_max_context
+        tokens.append(all_doc_tokens[split_token_index])
+        segment_ids.append(seg_p)
+        paragraph_mask.append(1)
+      tokens.append("[SEP]")
+      segment_ids.append(seg_p)
+      paragraph_mask.append(0)
+
+    def process_class(seg_class):
+      class_index = len(segment_ids)
+      tokens.append("[CLS]")
+      segment_ids.append(seg_class)
+      paragraph_mask.append(1)
+      return class_index
+
+    if xlnet_format:
+      seg_p, seg_q, seg_class, seg_pad = 0, 1, 2, 3
+      process_paragraph(seg_p)
+      process_query(seg_q)
+      class_index = process_class(seg_class)
+    else:
+      seg_p, seg_q, seg_class, seg_pad = 1, 0, 0, 0
+      class_index = process_class(seg_class)
+      process_query(seg_q)
+      process_paragraph(seg_p)
+
+    input_ids = tokenizer.convert_tokens_to_ids(tokens)
+
+    # The mask has 1 for real tokens and 0 for padding tokens. Only real
+    # tokens are attended to.
+    input_mask = [1] * len(input_ids)
+
+    # Zero-pad up to the sequence length.
+    while len(input_ids) < max_seq_length:
+      input_ids.append(0)
+      input_mask.append(0)
+      segment_ids.append(seg_pad)
+      paragraph_mask.append(0)
+
+    assert len(input_ids) == max_seq_length
+    assert len(input_mask) == max_seq_length
+    assert len(segment_ids) == max_seq_length
+    assert len(paragraph_mask) == max_seq_length
+
+    start_position = 0
+    end_position = 0
+    span_contains_answer = False
+
+    if is_training and not example.is_impossible:
+      # For training, if our document chunk does not contain an annotation
+      # we throw it out, since there is nothing to predict.
+      doc_start = doc_span.start
+      doc_end = doc_span.start + doc_span.length - 1
+      span_contains_answer = (tok_start_position >= doc_start and
+                              tok_end_position <= doc_end)
+      if span_contains_answer:
+        doc_offset = 0 if xlnet_format else len(query_tokens) + 2
+        start_position = tok_start_position - doc_start + doc_offset
+        end_position = tok_end_position - doc_start + doc_offset
+
+    features.append(
+        InputFeatures(
+            unique_id=None,
+            example_index=example_index,
+            doc_span_index=doc_span_index,
+            tokens=tokens,
+            paragraph_mask=paragraph_mask,
+            class_index=class_index,
+            token_to_orig_map=token_to_orig_map,
+            token_is_max_context=token_is_max_context,
+            input_ids=input_ids,
+            input_mask=input_mask,
+            segment_ids=segment_ids,
+            start_position=start_position,
+            end_position=end_position,
+            is_impossible=not span_contains_answer))
+  return features
+
+
+def _log_feature(feature, is_training):
+  """Logs the content of an `InputFeatures`."""
+  logging.info("*** Example ***")
+  logging.info("unique_id: %s", (feature.unique_id))
+  logging.info("example_index: %s", (feature.example_index))
+  logging.info("doc_span_index: %s", (feature.doc_span_index))
+  logging.info("tokens: %s",
+               " ".join([tokenization.printable_text(x)
+                         for x in feature.tokens]))
+  logging.info(
+      "token_to_orig_map: %s", " ".join([
+          "%d:%d" % (x, y)
+          for (x, y) in six.iteritems(feature.token_to_orig_map)
+      ]))
+  logging.info(
+      "token_is_max_context: %s", " ".join([
+          "%d:%s" % (x, y)
+          for (x, y) in six.iteritems(feature.token_is_max_context)
+      ]))
+  logging.info("input_ids: %s", " ".join([str(x) for x in feature.input_ids]))
+  logging.info("input_mask: %s", " ".join([str(x) for x in feature.input_mask]))
+  logging.info("segment_ids: %s",
+               " ".join([str(x) for x in feature.segment_ids]))
+  logging.info("paragraph_mask: %s", " ".join(
+      [str(x) for x in feature.paragraph_mask]))
+  logging.info("class_index: %d", feature.class_index)
+  if is_training:
+    if not feature.is_impossible:
+      answer_text = " ".join(
+          feature.tokens[feature.start_position:(feature.end_position + 1)])
+      logging.info("start_position: %d", (feature.start_position))
+      logging.info("end_position: %d", (feature.end_position))
+      logging.info("answer: %s", tokenization.printable_text(answer_text))
+    else:
+      logging.info("document span doesn't contain answer")
+
+
 def _improve_answer_span(doc_tokens, input_start, input_end, tokenizer,
                          orig_answer_text):
   """Returns tokenized answer spans that better match the annotated answer."""
@@ -511,41 +625,46 @@ def _improve_answer_span(doc_tokens, input_start, input_end, tokenizer,
   return (input_start, input_end)
 
 
-def _check_is_max_context(doc_spans, cur_span_index, position):
-  """Check if this is the 'max context' doc span for the token."""
+def _get_max_context_span_indexes(doc_spans, num_tokens):
+  """Returns the index of the 'max context' doc span of every token.
 
-  # Because of the sliding window approach taken to scoring documents, a single
-  # token can appear in multiple documents. E.g.
-  #  Doc: the man went to the store and bought a gallon of milk
-  #  Span A: the man went to the
-  #  Span B: to the store and bought
-  #  Span C: and bought a gallon of
-  #  ...
-  #
-  # Now the word 'bought' will have two scores from spans B and C. We only
-  # want to consider the score with "maximum context", which we define as
-  # the *minimum* of its left and right context (the *sum* of left and
-  # right context will always be the same, of course).
-  #
-  # In the example the maximum context for 'bought' would be span C since
-  # it has 1 left context and 3 right context, while span B has 4 left context
-  # and 0 right context.
-  best_score = None
-  best_span_index = None
+  Because of the sliding window approach taken to scoring documents, a single
+  token can appear in multiple doc spans. E.g.
+    Doc: the man went to the store and bought a gallon of milk
+    Span A: the man went to the
+    Span B: to the store and bought
+    Span C: and bought a gallon of
+    ...
+
+  Now the word 'bought' will have two scores from spans B and C. We only want
+  to consider the score with "maximum context", which we define as the
+  *minimum* of its left and right context (the *sum* of left and right context
+  will always be the same, of course). In the example the maximum context for
+  'bought' would be span C since it has 1 left context and 3 right context,
+  while span B has 4 left context and 0 right context.
+
+  Every token of every doc span is visited once.
+
+  Args:
+    doc_spans: A list of `_DocSpan`s.
+    num_tokens: The number of tokens of the document.
+
+  Returns:
+    A list of `num_tokens` doc span indexes.
+  """
+  best_scores = [None] * num_tokens
+  best_span_indexes = [None] * num_tokens
   for (span_index, doc_span) in enumerate(doc_spans):
     end = doc_span.start + doc_span.length - 1
-    if position < doc_span.start:
-      continue
-    if position > end:
-      continue
-    num_left_context = position - doc_span.start
-    num_right_context = end - position
-    score = min(num_left_context, num_right_context) + 0.01 * doc_span.length
-    if best_score is None or score > best_score:
-      best_score = score
-      best_span_index = span_index
-
-  return cur_span_index == best_span_index
+    for position in range(doc_span.start, end + 1):
+      num_left_context = position - doc_span.start
+      num_right_context = end - position
+      score = min(num_left_context, num_right_context) + 0.01 * doc_span.length
+      best_score = best_scores[position]
+      if best_score is None or score > best_score:
+        best_scores[position] = score
+        best_span_indexes[position] = span_index
+  return best_span_indexes
 
 
 def write_predictions(all_examples,
@@ -559,7 +678,8 @@ def write_predictions(all_examples,
                       output_null_log_odds_file,
                       version_2_with_negative=False,
                       null_score_diff_threshold=0.0,
-                      verbose=False):
+                      verbose=False,
+                      num_workers=1):
   """Write final predictions to the json file and log-odds of null if needed."""
   logging.info("Writing predictions to: %s", (output_prediction_file))
   logging.info("Writing nbest to: %s", (output_nbest_file))
@@ -574,7 +694,8 @@ def write_predictions(all_examples,
           do_lower_case=do_lower_case,
           version_2_with_negative=version_2_with_negative,
           null_score_diff_threshold=null_score_diff_threshold,
-          verbose=verbose))
+          verbose=verbose,
+          num_workers=num_workers))
 
   write_to_json_files(all_predictions, output_prediction_file)
   write_to_json_files(all_nbest_json, output_nbest_file)
@@ -582,6 +703,11 @@ def write_predictions(all_examples,
     write_to_json_files(scores_diff_json, output_null_log_odds_file)
 
 
+_PrelimPrediction = collections.namedtuple(  # pylint: disable=invalid-name
+    "PrelimPrediction",
+    ["feature_index", "start_index", "end_index", "start_logit", "end_logit"])
+
+
 def postprocess_output(all_examples,
                        all_features,
                        all_results,
@@ -591,8 +717,16 @@ def postprocess_output(all_examples,
                        version_2_with_negative=False,
                        null_score_diff_threshold=0.0,
                        xlnet_format=False,
-                       verbose=False):
-  """Postprocess model output, to form predicton results."""
+                       verbose=False,
+                       num_workers=1):
+  """Postprocess model output, to form predicton results.
+
+  The candidate spans of every feature are scored and filtered with NumPy, and
+  the answer texts are only reconstructed for the candidates needed to fill the
+  n-best lists. If `num_workers` is greater than 1, the texts of the
+  `n_best_size` best candidates of all examples are reconstructed ahead of time
+  by a pool of processes.
+  """
 
   example_index_to_features = collections.defaultdict(list)
   for feature in all_features:
@@ -601,14 +735,12 @@ def postprocess_output(all_examples,
   for result in all_results:
     unique_id_to_result[result.unique_id] = result
 
-  _PrelimPrediction = collections.namedtuple(  # pylint: disable=invalid-name
-      "PrelimPrediction",
-      ["feature_index", "start_index", "end_index", "start_logit", "end_logit"])
-
   all_predictions = collections.OrderedDict()
   all_nbest_json = collections.OrderedDict()
   scores_diff_json = collections.OrderedDict()
 
+  all_prelim_predictions = []
+  all_null_predictions = []
   for (example_index, example) in enumerate(all_examples):
     features = example_index_to_features[example_index]
 
@@ -635,36 +767,10 @@ def postprocess_output(all_examples,
           min_null_feature_index = feature_index
           null_start_logit = result.start_logits[0]
           null_end_logit = result.end_logits[0]
-      for (start_index, start_logit,
-           end_index, end_logit) in _get_best_indexes_and_logits(
-               result=result,
-               n_best_size=n_best_size,
-               xlnet_format=xlnet_format):
-        # We could hypothetically create invalid predictions, e.g., predict
-        # that the start of the span is in the question. We throw out all
-        # invalid predictions.
-        if start_index >= len(feature.tokens):
-          continue
-        if end_index >= len(feature.tokens):
-          continue
-        if start_index not in feature.token_to_orig_map:
-          continue
-        if end_index not in feature.token_to_orig_map:
-          continue
-        if not feature.token_is_max_context.get(start_index, False):
-          continue
-        if end_index < start_index:
-          continue
-        length = end_index - start_index + 1
-        if length > max_answer_length:
-          continue
-        prelim_predictions.append(
-            _PrelimPrediction(
-                feature_index=feature_index,
-                start_index=start_index,
-                end_index=end_index,
-                start_logit=start_logit,
-                end_logit=end_logit))
+      prelim_predictions.extend(
+          _get_valid_prelim_predictions(feature_index, feature, result,
+                                        n_best_size, max_answer_length,
+                                        xlnet_format))
 
     if version_2_with_negative and not xlnet_format:
       prelim_predictions.append(
@@ -674,13 +780,44 @@ def postprocess_output(all_examples,
               end_index=0,
               start_logit=null_start_logit,
               end_logit=null_end_logit))
-    prelim_predictions = sorted(
-        prelim_predictions,
-        key=lambda x: (x.start_logit + x.end_logit),
-        reverse=True)
+    # A stable sort by decreasing score, as `sorted(..., reverse=True)`.
+    scores = np.array(
+        [float(pred.start_logit + pred.end_logit)
+         for pred in prelim_predictions], dtype=np.float64)
+    order = np.argsort(-scores, kind="stable")
+    all_prelim_predictions.append([prelim_predictions[i] for i in order])
+    all_null_predictions.append(
+        (score_null, null_start_logit, null_end_logit))
+
+  final_texts = {}
+  if num_workers > 1:
+    keys = []
+    text_args = []
+    for (example_index, example) in enumerate(all_examples):
+      features = example_index_to_features[example_index]
+      for pred in all_prelim_predictions[example_index][:n_best_size]:
+        if pred.start_index > 0 or xlnet_format:
+          key = (example_index, pred.feature_index, pred.start_index,
+                 pred.end_index)
+          keys.append(key)
+          text_args.append(
+              _get_prediction_texts(example, features[pred.feature_index],
+                                    pred) + (do_lower_case, verbose))
+    # TensorFlow is not fork-safe, so the workers are spawned.
+    with multiprocessing.get_context("spawn").Pool(num_workers) as pool:
+      texts = pool.starmap(
+          get_final_text, text_args,
+          chunksize=max(1, len(text_args) // (4 * num_workers)))
+    final_texts = dict(zip(keys, texts))
+
+  _NbestPrediction = collections.namedtuple(  # pylint: disable=invalid-name
+      "NbestPrediction", ["text", "start_logit", "end_logit"])
 
-    _NbestPrediction = collections.namedtuple(  # pylint: disable=invalid-name
-        "NbestPrediction", ["text", "start_logit", "end_logit"])
+  for (example_index, example) in enumerate(all_examples):
+    features = example_index_to_features[example_index]
+    prelim_predictions = all_prelim_predictions[example_index]
+    score_null, null_start_logit, null_end_logit = (
+        all_null_predictions[example_index])
 
     seen_predictions = {}
     nbest = []
@@ -689,23 +826,14 @@ def postprocess_output(all_examples,
         break
       feature = features[pred.feature_index]
       if pred.start_index > 0 or xlnet_format:  # this is a non-null prediction
-        tok_tokens = feature.tokens[pred.start_index:(pred.end_index + 1)]
-        orig_doc_start = feature.token_to_orig_map[pred.start_index]
-        orig_doc_end = feature.token_to_orig_map[pred.end_index]
-        orig_tokens = example.doc_tokens[orig_doc_start:(orig_doc_end + 1)]
-        tok_text = " ".join(tok_tokens)
-
-        # De-tokenize WordPieces that have been split off.
-        tok_text = tok_text.replace(" ##", "")
-        tok_text = tok_text.replace("##", "")
-
-        # Clean whitespace
-        tok_text = tok_text.strip()
-        tok_text = " ".join(tok_text.split())
-        orig_text = " ".join(orig_tokens)
-
-        final_text = get_final_text(
-            tok_text, orig_text, do_lower_case, verbose=verbose)
+        key = (example_index, pred.feature_index, pred.start_index,
+               pred.end_index)
+        if key in final_texts:
+          final_text = final_texts[key]
+        else:
+          tok_text, orig_text = _get_prediction_texts(example, feature, pred)
+          final_text = get_final_text(
+              tok_text, orig_text, do_lower_case, verbose=verbose)
         if final_text in seen_predictions:
           continue
 
@@ -819,14 +947,10 @@ def get_final_text(pred_text, orig_text, do_lower_case, verbose=False):
   # can fail in certain cases in which case we just return `orig_text`.
 
   def _strip_spaces(text):
-    ns_chars = []
-    ns_to_s_map = collections.OrderedDict()
-    for (i, c) in enumerate(text):
-      if c == " ":
-        continue
-      ns_to_s_map[len(ns_chars)] = i
-      ns_chars.append(c)
-    ns_text = "".join(ns_chars)
+    # `ns_to_s_map[i]` is the index in `text` of the i-th non-space character.
+    chars = np.frombuffer(text.encode("utf-32-le"), dtype=np.uint32)
+    ns_to_s_map = np.flatnonzero(chars != ord(" "))
+    ns_text = text.replace(" ", "")
     return (ns_text, ns_to_s_map)
 
   # We first tokenize `orig_text`, strip whitespace from the result
@@ -855,26 +979,21 @@ def get_final_text(pred_text, orig_text, do_lower_case, verbose=False):
 
   # We then project the characters in `pred_text` back to `orig_text` using
   # the character-to-character alignment.
-  tok_s_to_ns_map = {}
-  for (i, tok_index) in six.iteritems(tok_ns_to_s_map):
-    tok_s_to_ns_map[tok_index] = i
+  def _tok_to_orig_position(tok_position):
+    ns_position = np.searchsorted(tok_ns_to_s_map, tok_position)
+    if (ns_position < len(tok_ns_to_s_map) and
+        tok_ns_to_s_map[ns_position] == tok_position):
+      return int(orig_ns_to_s_map[ns_position])
+    return None
 
-  orig_start_position = None
-  if start_position in tok_s_to_ns_map:
-    ns_start_position = tok_s_to_ns_map[start_position]
-    if ns_start_position in orig_ns_to_s_map:
-      orig_start_position = orig_ns_to_s_map[ns_start_position]
+  orig_start_position = _tok_to_orig_position(start_position)
 
   if orig_start_position is None:
     if verbose:
       logging.info("Couldn't map start position")
     return orig_text
 
-  orig_end_position = None
-  if end_position in tok_s_to_ns_map:
-    ns_end_position = tok_s_to_ns_map[end_position]
-    if ns_end_position in orig_ns_to_s_map:
-      orig_end_position = orig_ns_to_s_map[ns_end_position]
+  orig_end_position = _tok_to_orig_position(end_position)
 
   if orig_end_position is None:
     if verbose:
@@ -885,29 +1004,92 @@ def get_final_text(pred_text, orig_text, do_lower_case, verbose=False):
   return output_text
 
 
-def _get_best_indexes_and_logits(result,
-                                 n_best_size,
-                                 xlnet_format=False):
-  """Generates the n-best indexes and logits from a list."""
+def _get_best_index_pairs(result, n_best_size, xlnet_format=False):
+  """Returns the n-best pairs of start and end indexes.
+
+  Args:
+    result: A raw result with the `start_logits` and `end_logits` of a feature,
+      and its `start_indexes` and `end_indexes` if `xlnet_format`.
+    n_best_size: The number of best start and end indexes.
+    xlnet_format: Whether the result has the XLNet top predictions.
+
+  Returns:
+    The arrays `start_indexes`, `start_positions`, `end_indexes` and
+    `end_positions` of the pairs, where `start_positions` and `end_positions`
+    are the positions of the logits of the indexes in the result. The pairs
+    are ordered by start index and then by end index, from the best to the
+    worst logit.
+  """
   if xlnet_format:
-    for i in range(n_best_size):
-      for j in range(n_best_size):
-        j_index = i * n_best_size + j
-        yield (result.start_indexes[i], result.start_logits[i],
-               result.end_indexes[j_index], result.end_logits[j_index])
-  else:
-    start_index_and_score = sorted(enumerate(result.start_logits),
-                                   key=lambda x: x[1], reverse=True)
-    end_index_and_score = sorted(enumerate(result.end_logits),
-                                 key=lambda x: x[1], reverse=True)
-    for i in range(len(start_index_and_score)):
-      if i >= n_best_size:
-        break
-      for j in range(len(end_index_and_score)):
-        if j >= n_best_size:
-          break
-        yield (start_index_and_score[i][0], start_index_and_score[i][1],
-               end_index_and_score[j][0], end_index_and_score[j][1])
+    start_positions = np.repeat(np.arange(n_best_size), n_best_size)
+    end_positions = np.arange(n_best_size * n_best_size)
+    start_indexes = np.asarray(result.start_indexes)[start_positions]
+    end_indexes = np.asarray(result.end_indexes)[end_positions]
+    return start_indexes, start_positions, end_indexes, end_positions
+
+  # Stable sorts keep the lower index first among equal logits.
+  start_order = np.argsort(
+      -np.asarray(result.start_logits), kind="stable")[:n_best_size]
+  end_order = np.argsort(
+      -np.asarray(result.end_logits), kind="stable")[:n_best_size]
+  start_indexes = np.repeat(start_order, len(end_order))
+  end_indexes = np.tile(end_order, len(start_order))
+  return start_indexes, start_indexes, end_indexes, end_indexes
+
+
+def _get_valid_prelim_predictions(feature_index, feature, result, n_best_size,
+                                  max_answer_length, xlnet_format):
+  """Returns the valid n-best `_PrelimPrediction`s of a feature."""
+  start_indexes, start_positions, end_indexes, end_positions = (
+      _get_best_index_pairs(result, n_best_size, xlnet_format))
+  num_tokens = len(feature.tokens)
+
+  # We could hypothetically create invalid predictions, e.g., predict
+  # that the start of the span is in the question. We throw out all
+  # invalid predictions. Every distinct index is only checked once.
+  unique_starts, start_inverse = np.unique(start_indexes, return_inverse=True)
+  is_valid_start = np.array([
+      start < num_tokens and start in feature.token_to_orig_map and
+      bool(feature.token_is_max_context.get(start, False))
+      for start in unique_starts.tolist()
+  ], dtype=bool)[start_inverse]
+  unique_ends, end_inverse = np.unique(end_indexes, return_inverse=True)
+  is_valid_end = np.array([
+      end < num_tokens and end in feature.token_to_orig_map
+      for end in unique_ends.tolist()
+  ], dtype=bool)[end_inverse]
+  is_valid = (
+      is_valid_start & is_valid_end & (end_indexes >= start_indexes) &
+      (end_indexes - start_indexes + 1 <= max_answer_length))
+
+  return [
+      _PrelimPrediction(
+          feature_index=feature_index,
+          start_index=int(start_indexes[k]),
+          end_index=int(end_indexes[k]),
+          start_logit=result.start_logits[start_positions[k]],
+          end_logit=result.end_logits[end_positions[k]])
+      for k in np.flatnonzero(is_valid)
+  ]
+
+
+def _get_prediction_texts(example, feature, pred):
+  """Returns the tokenized and the original text of a non-null prediction."""
+  tok_tokens = feature.tokens[pred.start_index:(pred.end_index + 1)]
+  orig_doc_start = feature.token_to_orig_map[pred.start_index]
+  orig_doc_end = feature.token_to_orig_map[pred.end_index]
+  orig_tokens = example.doc_tokens[orig_doc_start:(orig_doc_end + 1)]
+  tok_text = " ".join(tok_tokens)
+
+  # De-tokenize WordPieces that have been split off.
+  tok_text = tok_text.replace(" ##", "")
+  tok_text = tok_text.replace("##", "")
+
+  # Clean whitespace
+  tok_text = tok_text.strip()
+  tok_text = " ".join(tok_text.split())
+  orig_text = " ".join(orig_tokens)
+  return tok_text, orig_text
 
 
 def _compute_softmax(scores):
@@ -942,7 +1124,8 @@ def generate_tf_record_from_json_file(input_file_path,
                                       max_query_length=64,
                                       doc_stride=128,
                                       version_2_with_negative=False,
-                                      xlnet_format=False):
+                                      xlnet_format=False,
+                                      num_workers=1):
   """Generates and saves training data into a tf record file."""
   train_examples = read_squad_examples(
       input_file=input_file_path,
@@ -960,7 +1143,8 @@ def generate_tf_record_from_json_file(input_file_path,
       max_query_length=max_query_length,
       is_training=True,
       output_fn=train_writer.process_feature,
-      xlnet_format=xlnet_format)
+      xlnet_format=xlnet_format,
+      num_workers=num_workers)
   train_writer.close()
 
   meta_data = {
@@ -0,0 +1,278 @@
+# Copyright 2023 The TensorFlow Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Tests for official.nlp.data.squad_lib."""
+
+import collections
+import os
+
+from absl.testing import parameterized
+import numpy as np
+import tensorflow as tf
+
+from official.nlp.data import squad_lib
+from official.nlp.data import squad_lib_sp
+from official.nlp.tools import tokenization
+
+
+_RawResult = collections.namedtuple("RawResult",
+                                    ["unique_id", "start_logits", "end_logits"])
+
+
+def _scalar_prelim_predictions(feature_index, feature, result, n_best_size,
+                               max_answer_length):
+  """The n-best span search as it was done before it was vectorized."""
+  prelim_predictions = []
+  for (start_index, start_logit, end_index,
+       end_logit) in squad_lib_sp._get_best_indexes_and_logits(
+           result=result, n_best_size=n_best_size):
+    if start_index >= len(feature.tokens):
+      continue
+    if end_index >= len(feature.tokens):
+      continue
+    if start_index not in feature.token_to_orig_map:
+      continue
+    if end_index not in feature.token_to_orig_map:
+      continue
+    if not feature.token_is_max_context.get(start_index, False):
+      continue
+    if end_index < start_index:
+      continue
+    length = end_index - start_index + 1
+    if length > max_answer_length:
+      continue
+    prelim_predictions.append(
+        squad_lib._PrelimPrediction(
+            feature_index=feature_index,
+            start_index=start_index,
+            end_index=end_index,
+            start_logit=start_logit,
+            end_logit=end_logit))
+  return prelim_predictions
+
+
+def _scalar_get_final_text(pred_text, orig_text, do_lower_case):
+  """`get_final_text` as it was done before it used `np.searchsorted`."""
+
+  def _strip_spaces(text):
+    ns_chars = []
+    ns_to_s_map = collections.OrderedDict()
+    for (i, c) in enumerate(text):
+      if c == " ":
+        continue
+      ns_to_s_map[len(ns_chars)] = i
+      ns_chars.append(c)
+    return ("".join(ns_chars), ns_to_s_map)
+
+  tokenizer = tokenization.BasicTokenizer(do_lower_case=do_lower_case)
+  tok_text = " ".join(tokenizer.tokenize(orig_text))
+  start_position = tok_text.find(pred_text)
+  if start_position == -1:
+    return orig_text
+  end_position = start_position + len(pred_text) - 1
+
+  (orig_ns_text, orig_ns_to_s_map) = _strip_spaces(orig_text)
+  (tok_ns_text, tok_ns_to_s_map) = _strip_spaces(tok_text)
+  if len(orig_ns_text) != len(tok_ns_text):
+    return orig_text
+
+  tok_s_to_ns_map = {v: k for k, v in tok_ns_to_s_map.items()}
+  if (start_position not in tok_s_to_ns_map or
+      end_position not in tok_s_to_ns_map):
+    return orig_text
+  orig_start_position = orig_ns_to_s_map[tok_s_to_ns_map[start_position]]
+  orig_end_position = orig_ns_to_s_map[tok_s_to_ns_map[end_position]]
+  return orig_text[orig_start_position:(orig_end_position + 1)]
+
+
+class SquadLibTest(tf.test.TestCase, parameterized.TestCase):
+
+  def setUp(self):
+    super().setUp()
+    vocab_tokens = [
+        "[PAD]", "[UNK]", "[CLS]", "[SEP]", "the", "man", "went", "to",
+        "store", "and", "bought", "a", "gallon", "of", "milk", "who", "what",
+        "##s", "where", "did", "go", "?"
+    ]
+    vocab_file = os.path.join(self.get_temp_dir(), "vocab.txt")
+    with tf.io.gfile.GFile(vocab_file, "w") as f:
+      f.write("".join(token + "\n" for token in vocab_tokens))
+    self.tokenizer = tokenization.FullTokenizer(vocab_file)
+
+  def _make_examples(self, num_contexts, questions_per_context):
+    contexts = [
+        "the man went to the store and bought a gallon of milk",
+        "the man bought milk and went to the store",
+        "a man went and bought the milks",
+    ]
+    questions = ["who went to the store?", "what did the man buy?",
+                 "where did the man go?"]
+    examples = []
+    for i in range(num_contexts):
+      doc_tokens = contexts[i % len(contexts)].split()
+      for j in range(questions_per_context):
+        examples.append(
+            squad_lib.SquadExample(
+                qas_id="%d_%d" % (i, j),
+                question_text=questions[j % len(questions)],
+                doc_tokens=doc_tokens))
+    return examples
+
+  def _convert(self, examples, num_workers):
+    features = []
+
+    def output_fn(feature, is_padding):
+      features.append((is_padding, vars(feature)))
+
+    num_features = squad_lib.convert_examples_to_features(
+        examples=examples,
+        tokenizer=self.tokenizer,
+        max_seq_length=16,
+        doc_stride=3,
+        max_query_length=6,
+        is_training=False,
+        output_fn=output_fn,
+        batch_size=4,
+        num_workers=num_workers,
+        examples_per_task=2)
+    return num_features, features
+
+  def test_convert_examples_to_features_with_workers(self):
+    examples = self._make_examples(num_contexts=5, questions_per_context=3)
+    expected_num_features, expected = self._convert(examples, num_workers=1)
+    num_features, features = self._convert(examples, num_workers=2)
+
+    self.assertGreater(expected_num_features, len(examples))
+    self.assertEqual(num_features, expected_num_features)
+    self.assertEqual(features, expected)
+
+  @parameterized.parameters((1, 5, 3), (12, 5, 3), (12, 4, 4), (30, 7, 2),
+                            (9, 9, 1))
+  def test_max_context_span_indexes(self, num_tokens, max_tokens, doc_stride):
+    doc_spans = []
+    start_offset = 0
+    while start_offset < num_tokens:
+      length = min(num_tokens - start_offset, max_tokens)
+      doc_spans.append(squad_lib._DocSpan(start=start_offset, length=length))
+      if start_offset + length == num_tokens:
+        break
+      start_offset += min(length, doc_stride)
+
+    max_context_span_indexes = squad_lib._get_max_context_span_indexes(
+        doc_spans, num_tokens)
+    for span_index, doc_span in enumerate(doc_spans):
+      for position in range(doc_span.start, doc_span.start + doc_span.length):
+        self.assertEqual(
+            max_context_span_indexes[position] == span_index,
+            squad_lib_sp._check_is_max_context(doc_spans, span_index,
+                                               position))
+
+  def _make_feature(self, num_tokens, context_start, max_context):
+    return squad_lib.InputFeatures(
+        unique_id=0,
+        example_index=0,
+        doc_span_index=0,
+        tokens=["t%d" % i for i in range(num_tokens)],
+        token_to_orig_map={
+            i: i - context_start for i in range(context_start, num_tokens)
+        },
+        token_is_max_context={
+            i: bool(max_context[i - context_start])
+            for i in range(context_start, num_tokens)
+        },
+        input_ids=None,
+        input_mask=None,
+        segment_ids=None)
+
+  @parameterized.parameters((5, 1), (5, 3), (20, 4), (3, 20), (20, 20))
+  def test_valid_prelim_predictions(self, n_best_size, max_answer_length):
+    rng = np.random.RandomState(n_best_size * 100 + max_answer_length)
+    for _ in range(20):
+      num_tokens = 16
+      feature = self._make_feature(
+          num_tokens=12,
+          context_start=4,
+          max_context=rng.randint(0, 4, size=8) > 0)
+      # Few distinct values, so that there are many ties. The logits cover the
+      # padding positions past the tokens of the feature as well.
+      result = _RawResult(
+          unique_id=0,
+          start_logits=rng.randint(0, 4, size=num_tokens).astype(
+              np.float32).tolist(),
+          end_logits=rng.randint(0, 4, size=num_tokens).astype(
+              np.float32).tolist())
+
+      self.assertEqual(
+          squad_lib._get_valid_prelim_predictions(
+              3, feature, result, n_best_size, max_answer_length,
+              xlnet_format=False),
+          _scalar_prelim_predictions(3, feature, result, n_best_size,
+                                     max_answer_length))
+
+  @parameterized.parameters(
+      ("steve smith", "Steve Smith's", True),
+      ("smith", "Steve   Smith's", True),
+      ("steve smith ' s", "Steve Smith's", True),
+      ("jones", "Steve Smith's", True),
+      ("cafe", "Caf\u00e9 au lait", True),
+      ("Steve", "Steve Smith's", False),
+      ("au lait", "caf\u00e9  au  lait!", True),
+  )
+  def test_get_final_text(self, pred_text, orig_text, do_lower_case):
+    self.assertEqual(
+        squad_lib.get_final_text(pred_text, orig_text, do_lower_case),
+        _scalar_get_final_text(pred_text, orig_text, do_lower_case))
+
+  @parameterized.parameters(True, False)
+  def test_postprocess_output_with_workers(self, version_2_with_negative):
+    examples = self._make_examples(num_contexts=4, questions_per_context=2)
+    features = []
+    squad_lib.convert_examples_to_features(
+        examples=examples,
+        tokenizer=self.tokenizer,
+        max_seq_length=16,
+        doc_stride=3,
+        max_query_length=6,
+        is_training=False,
+        output_fn=lambda feature, is_padding: features.append(feature),
+        batch_size=1)
+    rng = np.random.RandomState(0)
+    results = [
+        _RawResult(
+            unique_id=feature.unique_id,
+            start_logits=rng.randint(0, 5, size=16).astype(float).tolist(),
+            end_logits=rng.randint(0, 5, size=16).astype(float).tolist())
+        for feature in features
+    ]
+
+    outputs = [
+        squad_lib.postprocess_output(
+            examples,
+            features,
+            results,
+            n_best_size=4,
+            max_answer_length=3,
+            do_lower_case=True,
+            version_2_with_negative=version_2_with_negative,
+            num_workers=num_workers) for num_workers in (1, 2)
+    ]
+    self.assertEqual(outputs[1], outputs[0])
+    all_predictions, all_nbest_json, _ = outputs[0]
+    self.assertLen(all_predictions, len(examples))
+    for nbest_json in all_nbest_json.values():
+      self.assertBetween(len(nbest_json), 1, 5)
+
+
+if __name__ == "__main__":
+  tf.test.main()
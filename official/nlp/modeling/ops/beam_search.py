@@ -14,6 +14,8 @@
 
 """Beam search to find the translated sequence with the highest probability."""
 
+from typing import Optional
+
 import numpy as np
 import tensorflow as tf
 
@@ -70,6 +72,25 @@ class _StateKeys(object):
   # True -> finished sequence, False -> filler. Shape [batch_size, beam_size]
   FINISHED_FLAGS = "FINISHED_FLAGS"
 
+  # The following keys are only used when finished batch items are compacted
+  # out of the loop state. The batch_size of the other keys is then the number
+  # of batch items that are still searched.
+  # Positions of the searched batch items in the input batch. Shape [batch_size]
+  BATCH_INDICES = "BATCH_INDICES"
+  # Output sequences and scores of the batch items whose search has finished.
+  # Shapes [input_batch_size, beam_size, max_decode_length + 1] and
+  # [input_batch_size, beam_size].
+  OUTPUT_SEQ = "OUTPUT_SEQ"
+  OUTPUT_SCORES = "OUTPUT_SCORES"
+
+  # Number of active alive beams, i.e. beams that are not pruned in the batch
+  # items that are still searched, at each step. Shape [max_decode_length]
+  ACTIVE_BEAM_COUNTS = "ACTIVE_BEAM_COUNTS"
+
+  # Keys of the tensors with a leading batch dimension.
+  BATCH_KEYS = (ALIVE_SEQ, ALIVE_LOG_PROBS, ALIVE_CACHE, FINISHED_SEQ,
+                FINISHED_SCORES, FINISHED_FLAGS, BATCH_INDICES)
+
 
 def _expand_to_same_rank(tensor, target):
   """Expands a given tensor to target's rank to be broadcastable.
@@ -111,6 +132,9 @@ class SequenceBeamSearch(tf.Module):
       dtype=tf.float32,
       noise_multiplier: float = 0.0,
       decoding_name=None,
+      compact_finished_batches: bool = False,
+      pruning_threshold: Optional[float] = None,
+      output_active_beam_counts: bool = False,
   ):
     """Initialize sequence beam search.
 
@@ -135,7 +159,23 @@ class SequenceBeamSearch(tf.Module):
         tf.float32.
       noise_multiplier: The amount of noise.
       decoding_name: an optional name for the decoding loop tensors.
+      compact_finished_batches: A bool. If True, batch items are removed from
+        the loop state as soon as they have beam_size finished sequences that
+        can no longer change, so that the following steps only run on the
+        remaining batch items. The results are the same as without compaction.
+        Requires `padded_decode` to be False.
+      pruning_threshold: An optional float. If set, alive beams whose log
+        probability is more than `pruning_threshold` below the best alive beam
+        of the same batch item are pruned and not extended any further.
+      output_active_beam_counts: A bool. If True, `search` also returns the
+        number of active alive beams at each step.
+
+    Raises:
+      ValueError: If `compact_finished_batches` is used with `padded_decode`.
     """
+    if compact_finished_batches and padded_decode:
+      raise ValueError(
+          "compact_finished_batches requires padded_decode to be False.")
     self.symbols_to_logits_fn = symbols_to_logits_fn
     self.vocab_size = vocab_size
     self.beam_size = beam_size
@@ -146,6 +186,9 @@ class SequenceBeamSearch(tf.Module):
     self.dtype = tf.as_dtype(dtype)
     self.decoding_name = decoding_name
     self.noise_multiplier = noise_multiplier
+    self.compact_finished_batches = compact_finished_batches
+    self.pruning_threshold = pruning_threshold
+    self.output_active_beam_counts = output_active_beam_counts
 
   def search(self, initial_ids, initial_cache):
     """Beam search for sequences with highest scores.
@@ -157,7 +200,8 @@ class SequenceBeamSearch(tf.Module):
         symbols_to_logits_fn.
 
     Returns:
-      finished_seq and finished_scores.
+      finished_seq and finished_scores, followed by the active beam counts of
+      shape [max_decode_length] if `output_active_beam_counts` is set.
     """
     batch_size = (
         initial_ids.shape.as_list()[0]
@@ -165,7 +209,7 @@ class SequenceBeamSearch(tf.Module):
     state, state_shapes = self._create_initial_state(initial_ids, initial_cache,
                                                      batch_size)
 
-    def _grow_alive_seq(state):
+    def _grow_alive_seq(state, batch_size):
       """Grow alive sequences by one token, collect top 2*beam_size sequences.
 
       2*beam_size sequences are collected because some sequences may have
@@ -174,6 +218,7 @@ class SequenceBeamSearch(tf.Module):
 
       Args:
         state: A dictionary with the current loop state.
+        batch_size: The batch size of the loop state.
 
       Returns:
         Tuple of
@@ -250,7 +295,7 @@ class SequenceBeamSearch(tf.Module):
       return topk_seq, topk_log_probs, topk_ids, new_cache
 
     def _get_new_alive_state(new_seq, new_log_probs, new_finished_flags,
-                             new_cache):
+                             new_cache, batch_size):
       """Gather the top k sequences that are still alive.
 
       Args:
@@ -261,6 +306,7 @@ class SequenceBeamSearch(tf.Module):
         new_finished_flags: A boolean Tensor indicates which sequences are live
           inside the beam.
         new_cache: Dict of cached values for each sequence.
+        batch_size: The batch size of the loop state.
 
       Returns:
         Dictionary with alive keys from _StateKeys:
@@ -278,6 +324,14 @@ class SequenceBeamSearch(tf.Module):
           self._gather_beams([new_seq, new_log_probs, new_cache],
                              topk_indexes, batch_size, self.beam_size))
 
+      if self.pruning_threshold is not None:
+        # Pruned beams get the same -inf log probability as the initial filler
+        # beams, so neither their extensions nor their EOS are kept.
+        best_alive_log_probs = top_alive_log_probs[:, :1]
+        top_alive_log_probs = tf.where(
+            top_alive_log_probs < best_alive_log_probs - self.pruning_threshold,
+            tf.cast(-np.inf, self.dtype), top_alive_log_probs)
+
       return {
           _StateKeys.ALIVE_SEQ: top_alive_seq,
           _StateKeys.ALIVE_LOG_PROBS: top_alive_log_probs,
@@ -285,7 +339,7 @@ class SequenceBeamSearch(tf.Module):
       }
 
     def _get_new_finished_state(state, new_seq, new_log_probs,
-                                new_finished_flags):
+                                new_finished_flags, batch_size):
       """Combine new and old finished sequences, and gather the top k sequences.
 
       Args:
@@ -296,6 +350,7 @@ class SequenceBeamSearch(tf.Module):
           shape [batch_size, beam_size]
         new_finished_flags: A boolean Tensor indicates which sequences are live
           inside the beam.
+        batch_size: The batch size of the loop state.
 
       Returns:
         Dictionary with finished keys from _StateKeys:
@@ -359,22 +414,54 @@ class SequenceBeamSearch(tf.Module):
       Returns:
         new state dictionary.
       """
+      if self.compact_finished_batches:
+        step_batch_size = tf.shape(state[_StateKeys.ALIVE_LOG_PROBS])[0]
+      else:
+        step_batch_size = batch_size
+
       # Grow alive sequences by one token.
-      new_seq, new_log_probs, topk_ids, new_cache = _grow_alive_seq(state)
+      new_seq, new_log_probs, topk_ids, new_cache = _grow_alive_seq(
+          state, step_batch_size)
       new_finished_flags = tf.equal(topk_ids, self.eos_id)
       # Collect top beam_size alive sequences
       alive_state = _get_new_alive_state(new_seq, new_log_probs,
-                                         new_finished_flags, new_cache)
+                                         new_finished_flags, new_cache,
+                                         step_batch_size)
 
       # Combine newly finished sequences with existing finished sequences, and
       # collect the top k scoring sequences.
       finished_state = _get_new_finished_state(state, new_seq, new_log_probs,
-                                               new_finished_flags)
+                                               new_finished_flags,
+                                               step_batch_size)
 
-      # Increment loop index and create new state dictionary
-      new_state = {_StateKeys.CUR_INDEX: state[_StateKeys.CUR_INDEX] + 1}
+      # Increment loop index and create new state dictionary. The remaining
+      # keys are carried over.
+      new_state = dict(state)
+      new_state[_StateKeys.CUR_INDEX] = state[_StateKeys.CUR_INDEX] + 1
       new_state.update(alive_state)
       new_state.update(finished_state)
+
+      if self.output_active_beam_counts or self.compact_finished_batches:
+        search_finished = self._search_finished_flags(new_state)
+      if self.output_active_beam_counts:
+        active_beams = tf.logical_and(
+            new_state[_StateKeys.ALIVE_LOG_PROBS] > -inf(self.dtype),
+            tf.logical_not(search_finished)[:, None])
+        new_state[_StateKeys.ACTIVE_BEAM_COUNTS] = (
+            tf.tensor_scatter_nd_update(
+                state[_StateKeys.ACTIVE_BEAM_COUNTS],
+                [[state[_StateKeys.CUR_INDEX]]],
+                [tf.reduce_sum(tf.cast(active_beams, tf.int32))]))
+      if self.compact_finished_batches:
+        # Batch items with filler finished sequences are kept, since the
+        # fillers may still be replaced by worse finished sequences.
+        search_finished = tf.logical_and(
+            search_finished,
+            tf.reduce_all(new_state[_StateKeys.FINISHED_FLAGS], axis=1))
+        new_state = tf.cond(
+            tf.reduce_any(search_finished),
+            lambda: self._compact_finished_batches(new_state, search_finished),
+            lambda: new_state)
       return [new_state]
 
     finished_state = tf.nest.map_structure(
@@ -387,7 +474,67 @@ class SequenceBeamSearch(tf.Module):
             parallel_iterations=1,
             name=self.decoding_name))
     finished_state = finished_state[0]
-    return self._process_finished_state(finished_state)
+    if self.compact_finished_batches:
+      outputs = self._write_outputs(
+          finished_state,
+          tf.ones_like(finished_state[_StateKeys.BATCH_INDICES], tf.bool))
+      length = finished_state[_StateKeys.CUR_INDEX] + 1
+      outputs = (outputs[_StateKeys.OUTPUT_SEQ][:, :, :length],
+                 outputs[_StateKeys.OUTPUT_SCORES])
+    else:
+      outputs = self._process_finished_state(finished_state)
+    if self.output_active_beam_counts:
+      outputs = tuple(outputs) + (
+          finished_state[_StateKeys.ACTIVE_BEAM_COUNTS],)
+    return outputs
+
+  def _write_outputs(self, state, batch_mask):
+    """Writes the results of the masked batch items to the output tensors.
+
+    Args:
+      state: A dictionary with the loop state.
+      batch_mask: A boolean tensor with shape [batch_size] selecting the batch
+        items to write.
+
+    Returns:
+      Dictionary with the updated OUTPUT_SEQ and OUTPUT_SCORES.
+    """
+    seq, scores = self._process_finished_state(state)
+    indices = tf.expand_dims(
+        tf.boolean_mask(state[_StateKeys.BATCH_INDICES], batch_mask), axis=1)
+    output_seq = state[_StateKeys.OUTPUT_SEQ]
+    # Pads the sequences with 0s to the length of the output sequences.
+    seq = tf.pad(
+        tf.boolean_mask(seq, batch_mask),
+        [[0, 0], [0, 0], [0, tf.shape(output_seq)[2] - tf.shape(seq)[2]]])
+    return {
+        _StateKeys.OUTPUT_SEQ:
+            tf.tensor_scatter_nd_update(output_seq, indices, seq),
+        _StateKeys.OUTPUT_SCORES:
+            tf.tensor_scatter_nd_update(state[_StateKeys.OUTPUT_SCORES],
+                                        indices,
+                                        tf.boolean_mask(scores, batch_mask)),
+    }
+
+  def _compact_finished_batches(self, state, search_finished):
+    """Moves the batch items whose search has finished out of the loop state.
+
+    Args:
+      state: A dictionary with the loop state.
+      search_finished: A boolean tensor with shape [batch_size], True for the
+        batch items whose search has finished.
+
+    Returns:
+      The loop state of the remaining batch items, with the results of the
+      finished batch items written to the output tensors.
+    """
+    new_state = dict(state)
+    new_state.update(self._write_outputs(state, search_finished))
+    alive_batches = tf.logical_not(search_finished)
+    for key in _StateKeys.BATCH_KEYS:
+      new_state[key] = tf.nest.map_structure(
+          lambda t: tf.boolean_mask(t, alive_batches), state[key])
+    return new_state
 
   def _process_finished_state(self, finished_state):
     alive_seq = finished_state[_StateKeys.ALIVE_SEQ]
@@ -502,6 +649,27 @@ class SequenceBeamSearch(tf.Module):
               tf.TensorShape([None, self.beam_size])
       }
 
+    if self.compact_finished_batches:
+      state.update({
+          _StateKeys.BATCH_INDICES:
+              tf.range(batch_size),
+          _StateKeys.OUTPUT_SEQ:
+              tf.zeros([batch_size, self.beam_size, self.max_decode_length + 1],
+                       tf.int32),
+          _StateKeys.OUTPUT_SCORES:
+              tf.zeros([batch_size, self.beam_size], self.dtype),
+      })
+      state_shape_invariants.update({
+          _StateKeys.BATCH_INDICES: tf.TensorShape([None]),
+          _StateKeys.OUTPUT_SEQ: tf.TensorShape([None, self.beam_size, None]),
+          _StateKeys.OUTPUT_SCORES: tf.TensorShape([None, self.beam_size]),
+      })
+    if self.output_active_beam_counts:
+      state[_StateKeys.ACTIVE_BEAM_COUNTS] = tf.zeros([self.max_decode_length],
+                                                      tf.int32)
+      state_shape_invariants[_StateKeys.ACTIVE_BEAM_COUNTS] = (
+          state[_StateKeys.ACTIVE_BEAM_COUNTS].shape)
+
     return state, state_shape_invariants
 
   def _continue_search(self, state):
@@ -521,12 +689,28 @@ class SequenceBeamSearch(tf.Module):
       terminate.
     """
     i = state[_StateKeys.CUR_INDEX]
+    not_at_max_decode_length = tf.less(i, self.max_decode_length)
+    all_search_finished = tf.reduce_all(self._search_finished_flags(state))
+    return tf.logical_and(not_at_max_decode_length,
+                          tf.logical_not(all_search_finished))
+
+  def _search_finished_flags(self, state):
+    """Returns whether the finished sequences of each batch item are final.
+
+    The finished sequences of a batch item can no longer change when the worst
+    score in its finished sequences is better than the best score in its alive
+    sequences.
+
+    Args:
+      state: A dictionary with the current loop state.
+
+    Returns:
+      Bool tensor with shape [batch_size].
+    """
     alive_log_probs = state[_StateKeys.ALIVE_LOG_PROBS]
     finished_scores = state[_StateKeys.FINISHED_SCORES]
     finished_flags = state[_StateKeys.FINISHED_FLAGS]
 
-    not_at_max_decode_length = tf.less(i, self.max_decode_length)
-
     # Calculate largest length penalty (the larger penalty, the better score).
     max_length_norm = _length_normalization(
         self.alpha, self.max_decode_length, dtype=self.dtype)
@@ -548,12 +732,7 @@ class SequenceBeamSearch(tf.Module):
     lowest_finished_scores += ((1.0 - tf.cast(finished_batches, self.dtype)) *
                                -inf(self.dtype))
 
-    worst_finished_score_better_than_best_alive_score = tf.reduce_all(
-        tf.greater(lowest_finished_scores, best_alive_scores))
-
-    return tf.logical_and(
-        not_at_max_decode_length,
-        tf.logical_not(worst_finished_score_better_than_best_alive_score))
+    return tf.greater(lowest_finished_scores, best_alive_scores)
 
   @staticmethod
   def _gather_beams(nested, beam_indices, batch_size, new_beam_size):
@@ -606,6 +785,9 @@ def sequence_beam_search(
     dtype="float32",
     noise_multiplier: float = 0.0,
     decoding_name=None,
+    compact_finished_batches: bool = False,
+    pruning_threshold: Optional[float] = None,
+    output_active_beam_counts: bool = False,
 ):
   """Search for sequence of subtoken ids with the largest probability.
 
@@ -633,10 +815,18 @@ def sequence_beam_search(
       tf.float32.
     noise_multiplier: The amount of noise.
     decoding_name: an optional name for the decoding loop tensors.
+    compact_finished_batches: A bool, whether to remove the batch items whose
+      search has finished from the loop state. Requires `padded_decode` to be
+      False.
+    pruning_threshold: An optional float. Alive beams whose log probability is
+      more than this threshold below the best alive beam are pruned.
+    output_active_beam_counts: A bool, whether to also return the number of
+      active alive beams at each step.
 
   Returns:
     Top decoded sequences [batch_size, beam_size, max_decode_length]
     sequence scores [batch_size, beam_size]
+    active beam counts [max_decode_length], if `output_active_beam_counts`.
   """
   sbs = SequenceBeamSearch(
       symbols_to_logits_fn,
@@ -649,6 +839,9 @@ def sequence_beam_search(
       dtype,
       noise_multiplier,
       decoding_name,
+      compact_finished_batches,
+      pruning_threshold,
+      output_active_beam_counts,
   )
   return sbs.search(initial_ids, initial_cache)
 
@@ -103,6 +103,71 @@ class BeamSearchTests(tf.test.TestCase, parameterized.TestCase):
     else:
       self.assertAllEqual([[[0, 1, 0, 1], [0, 1, 1, 2]]], predictions)
 
+  def _search_with_random_model(self, batch_size, **kwargs):
+    vocab_size = 6
+    max_decode_length = 8
+    transitions = tf.random.stateless_normal([vocab_size, vocab_size],
+                                             seed=[1, 2])
+    # EOS (id 1) gets more likely at every step.
+    eos_bias = tf.one_hot(1, vocab_size) * 0.6
+
+    def symbols_to_logits_fn(ids, i, cache):
+      logits = (tf.gather(transitions, ids[:, -1]) + cache['bias'] +
+                tf.cast(i, tf.float32) * eos_bias)
+      return logits, cache
+
+    cache = {
+        'bias':
+            tf.random.stateless_normal([batch_size, vocab_size], seed=[3, 4],
+                                       stddev=2.0)
+    }
+    return beam_search.sequence_beam_search(
+        symbols_to_logits_fn=symbols_to_logits_fn,
+        initial_ids=tf.zeros([batch_size], dtype=tf.int32),
+        initial_cache=cache,
+        vocab_size=vocab_size,
+        beam_size=3,
+        alpha=0.6,
+        max_decode_length=max_decode_length,
+        eos_id=1,
+        **kwargs)
+
+  def test_compact_finished_batches(self):
+    seq, scores, counts = self._search_with_random_model(
+        8, output_active_beam_counts=True)
+    compact_seq, compact_scores, compact_counts = (
+        self._search_with_random_model(
+            8, compact_finished_batches=True, output_active_beam_counts=True))
+    self.assertAllEqual(seq, compact_seq)
+    self.assertAllEqual(scores, compact_scores)
+    self.assertAllEqual(counts, compact_counts)
+    # Batch items drop out of the active beams as their search finishes.
+    self.assertAllEqual([21, 21, 21, 21, 15, 12, 9, 9], counts)
+
+  @parameterized.parameters(True, False)
+  def test_pruning_threshold(self, padded_decode):
+    seq, scores, counts = self._search_with_random_model(
+        4, padded_decode=padded_decode, output_active_beam_counts=True)
+    pruned_seq, pruned_scores, pruned_counts = self._search_with_random_model(
+        4, padded_decode=padded_decode, pruning_threshold=0.5,
+        output_active_beam_counts=True)
+    self.assertAllEqual(tf.ones_like(counts, tf.bool), pruned_counts <= counts)
+    self.assertLess(tf.reduce_sum(pruned_counts), tf.reduce_sum(counts))
+    self.assertAllEqual(seq.shape[:2], pruned_seq.shape[:2])
+    self.assertAllEqual(scores.shape, pruned_scores.shape)
+
+  def test_compact_finished_batches_padded_decode_raises(self):
+    with self.assertRaises(ValueError):
+      beam_search.SequenceBeamSearch(
+          symbols_to_logits_fn=None,
+          vocab_size=3,
+          beam_size=2,
+          alpha=0.6,
+          max_decode_length=3,
+          eos_id=1,
+          padded_decode=True,
+          compact_finished_batches=True)
+
 
 if __name__ == '__main__':
   tf.test.main()
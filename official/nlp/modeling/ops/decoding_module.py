@@ -82,6 +82,29 @@ def get_shape_keep_last_dim(tensor):
   return tf.TensorShape(shape_list_obj)
 
 
+def update_seq_at_index(seq, ids, index):
+  """Writes one token per row of `seq` at the given step index.
+
+  The update is a scatter of `batch_size` elements, so preallocated sequence
+  buffers can be updated in place instead of being transposed or concatenated
+  at every decoding step.
+
+  Args:
+    seq: int tensor with shape [batch_size, length].
+    ids: int tensor with shape [batch_size] or [batch_size, 1] with the tokens
+      to write.
+    index: scalar int tensor, the position to write the tokens at.
+
+  Returns:
+    Tensor with the same shape as `seq` where `seq[:, index]` is set to `ids`.
+  """
+  ids = tf.reshape(ids, [-1])
+  batch_size = shape_list(ids)[0]
+  indices = tf.stack(
+      [tf.range(batch_size), tf.fill([batch_size], index)], axis=1)
+  return tf.tensor_scatter_nd_update(seq, indices, ids)
+
+
 def expand_to_same_rank(tensor, target):
   """Expands a given tensor to target's rank to be broadcastable.
 
@@ -60,7 +60,7 @@ def sample_top_k(logits, top_k):
   top_k_logits = tf.math.top_k(logits, k=top_k)
   indices_to_remove = logits < tf.expand_dims(top_k_logits[0][..., -1], -1)
   top_k_logits = set_tensor_by_indices_to_value(logits, indices_to_remove,
-                                                np.NINF)
+                                                -np.inf)
   return top_k_logits
 
 
@@ -103,7 +103,7 @@ def sample_top_p(logits, top_p):
   indices_to_remove = scatter_values_on_batch_indices(sorted_indices_to_remove,
                                                       sorted_indices)
   top_p_logits = set_tensor_by_indices_to_value(logits, indices_to_remove,
-                                                np.NINF)
+                                                -np.inf)
   return top_p_logits
 
 
@@ -148,7 +148,18 @@ def set_tensor_by_indices_to_value(input_tensor, indices, value):
 
 
 class SamplingModule(decoding_module.DecodingModule, metaclass=abc.ABCMeta):
-  """Implementation for sampling strategies (go/decoding-tf-nlp)."""
+  """Implementation for sampling strategies (go/decoding-tf-nlp).
+
+  With `padded_decode`, the sequences are preallocated to
+  [batch_size, max_decode_length + 1] and every step writes the sampled tokens
+  in place at the current step index. With `mask_finished_outputs`, the tokens
+  sampled for a batch element after its EOS are masked instead of written, so
+  its alive sequence is also its final sequence and no separate finished
+  sequence buffer is maintained. This only saves memory and sequence updates:
+  finished elements are still run through `symbols_to_logits_fn` at full batch
+  size, and the loop stops once every element is finished either way. The
+  decoded sequences and scores are the same as without `mask_finished_outputs`.
+  """
 
   def __init__(self,
                symbols_to_logits_fn,
@@ -164,7 +175,8 @@ class SamplingModule(decoding_module.DecodingModule, metaclass=abc.ABCMeta):
                enable_greedy: bool = True,
                dtype: tf.DType = tf.float32,
                decoding_name: Optional[str] = None,
-               extra_cache_output: bool = False):
+               extra_cache_output: bool = False,
+               mask_finished_outputs: bool = False):
     """Initialize sampling module."""
     self.symbols_to_logits_fn = symbols_to_logits_fn
     self.length_normalization_fn = length_normalization_fn
@@ -180,6 +192,7 @@ class SamplingModule(decoding_module.DecodingModule, metaclass=abc.ABCMeta):
     self.enable_greedy = enable_greedy
     self.decoding_name = decoding_name
     self.extra_cache_output = extra_cache_output
+    self.mask_finished_outputs = mask_finished_outputs
     super(SamplingModule, self).__init__(
         length_normalization_fn=length_normalization_fn,
         dtype=dtype,
@@ -241,13 +254,19 @@ class SamplingModule(decoding_module.DecodingModule, metaclass=abc.ABCMeta):
           sampled_logits, dtype=tf.int32, num_samples=1)
       topk_log_probs = tf.gather(
           original_log_probs, topk_ids, axis=1, batch_dims=1)
+    new_ids = topk_ids
     if self.padded_decode:
-      topk_seq = tf.transpose(alive_seq, perm=[1, 0])
-      topk_seq = tf.tensor_scatter_nd_update(
-          topk_seq, [[i + 1]], tf.expand_dims(tf.squeeze(topk_ids, -1), 0))
-      topk_seq = tf.transpose(topk_seq, perm=[1, 0])
+      if self.mask_finished_outputs:
+        # Finished sequences keep their padding.
+        new_ids = tf.where(
+            state[decoding_module.StateKeys.FINISHED_FLAGS],
+            tf.slice(alive_seq, [0, i + 1], [batch_size, 1]), new_ids)
+      topk_seq = decoding_module.update_seq_at_index(alive_seq, new_ids, i + 1)
     else:
-      topk_seq = tf.concat([alive_seq, topk_ids], axis=-1)
+      if self.mask_finished_outputs:
+        new_ids = tf.where(state[decoding_module.StateKeys.FINISHED_FLAGS],
+                           tf.zeros_like(new_ids), new_ids)
+      topk_seq = tf.concat([alive_seq, new_ids], axis=-1)
     return topk_seq, topk_log_probs, topk_ids, new_cache
 
   def _create_initial_state(
@@ -284,9 +303,6 @@ class SamplingModule(decoding_module.DecodingModule, metaclass=abc.ABCMeta):
 
     alive_cache = initial_cache
 
-    # Initialize tensor storing finished sequences [batch_size, 1, 1].
-    finished_seq = tf.zeros(tf.shape(alive_seq), tf.int32)
-
     # Set scores of the initial finished seqs to negative infinity.
     finished_scores = tf.zeros([batch_size, 1], dtype=self.dtype)
 
@@ -299,7 +315,6 @@ class SamplingModule(decoding_module.DecodingModule, metaclass=abc.ABCMeta):
         decoding_module.StateKeys.ALIVE_SEQ: alive_seq,
         decoding_module.StateKeys.ALIVE_LOG_PROBS: alive_log_probs,
         decoding_module.StateKeys.ALIVE_CACHE: alive_cache,
-        decoding_module.StateKeys.FINISHED_SEQ: finished_seq,
         decoding_module.StateKeys.FINISHED_SCORES: finished_scores,
         decoding_module.StateKeys.FINISHED_FLAGS: finished_flags
     }
@@ -315,8 +330,6 @@ class SamplingModule(decoding_module.DecodingModule, metaclass=abc.ABCMeta):
           decoding_module.StateKeys.ALIVE_CACHE:
               tf.nest.map_structure(lambda state: state.get_shape(),
                                     alive_cache),
-          decoding_module.StateKeys.FINISHED_SEQ:
-              tf.TensorShape([batch_size, self.max_decode_length + 1]),
           decoding_module.StateKeys.FINISHED_SCORES:
               tf.TensorShape([batch_size, 1]),
           decoding_module.StateKeys.FINISHED_FLAGS:
@@ -333,14 +346,19 @@ class SamplingModule(decoding_module.DecodingModule, metaclass=abc.ABCMeta):
           decoding_module.StateKeys.ALIVE_CACHE:
               tf.nest.map_structure(decoding_module.get_shape_keep_last_dim,
                                     alive_cache),
-          decoding_module.StateKeys.FINISHED_SEQ:
-              tf.TensorShape([None, None]),
           decoding_module.StateKeys.FINISHED_SCORES:
               tf.TensorShape([None, 1]),
           decoding_module.StateKeys.FINISHED_FLAGS:
               tf.TensorShape([None, 1])
       }
 
+    if not self.mask_finished_outputs:
+      # Initialize tensor storing finished sequences.
+      state[decoding_module.StateKeys.FINISHED_SEQ] = tf.zeros(
+          tf.shape(alive_seq), tf.int32)
+      state_shape_invariants[decoding_module.StateKeys.FINISHED_SEQ] = (
+          state_shape_invariants[decoding_module.StateKeys.ALIVE_SEQ])
+
     if self.extra_cache_output:
       state.update(
           {decoding_module.StateKeys.INITIAL_OUTPUT_CACHE: alive_cache})
@@ -364,7 +382,9 @@ class SamplingModule(decoding_module.DecodingModule, metaclass=abc.ABCMeta):
                            new_cache: Dict[str, tf.Tensor]) -> Dict[str, Any]:
     """Gather the sequences that are still alive.
 
-    This function resets the sequences in the alive_state that are finished.
+    This function resets the sequences in the alive_state that are finished,
+    unless `mask_finished_outputs` is set, in which case finished sequences stay
+    in the alive_state unchanged.
 
     Args:
       new_seq: New sequences generated by growing the current alive sequences
@@ -378,8 +398,9 @@ class SamplingModule(decoding_module.DecodingModule, metaclass=abc.ABCMeta):
     Returns:
       Dictionary with alive keys.
     """
-    new_seq = tf.multiply(
-        new_seq, tf.cast(tf.logical_not(new_finished_flags), new_seq.dtype))
+    if not self.mask_finished_outputs:
+      new_seq = tf.multiply(
+          new_seq, tf.cast(tf.logical_not(new_finished_flags), new_seq.dtype))
     return {
         decoding_module.StateKeys.ALIVE_SEQ: new_seq,
         decoding_module.StateKeys.ALIVE_LOG_PROBS: new_log_probs,
@@ -405,39 +426,44 @@ class SamplingModule(decoding_module.DecodingModule, metaclass=abc.ABCMeta):
       Dictionary with finished keys from StateKeys.
     """
     i = state[decoding_module.StateKeys.CUR_INDEX]
-    finished_seq = state[decoding_module.StateKeys.FINISHED_SEQ]
     finished_scores = state[decoding_module.StateKeys.FINISHED_SCORES]
     finished_flags = state[decoding_module.StateKeys.FINISHED_FLAGS]
 
-    if not self.padded_decode:
-      finished_seq = tf.concat(
-          [finished_seq, tf.zeros([batch_size, 1], tf.int32)], axis=-1)
     new_scores = new_log_probs
     if self.length_normalization_fn is not None:
       length_norm = self.length_normalization_fn(i + 1, self.dtype)
       new_scores = new_log_probs / length_norm
-    new_seq = tf.multiply(
-        new_seq, tf.cast(tf.logical_not(finished_flags), new_seq.dtype))
     new_scores = tf.multiply(
         new_scores, tf.cast(tf.logical_not(finished_flags), new_scores.dtype))
-
-    finished_seq += tf.multiply(new_seq,
-                                tf.cast(new_finished_flags, new_seq.dtype))
     finished_scores += tf.multiply(
         new_scores, tf.cast(new_finished_flags, new_scores.dtype))
-    new_finished_flags = tf.logical_or(new_finished_flags, finished_flags)
-    return {
-        decoding_module.StateKeys.FINISHED_SEQ: finished_seq,
+    new_finished_state = {
         decoding_module.StateKeys.FINISHED_SCORES: finished_scores,
-        decoding_module.StateKeys.FINISHED_FLAGS: new_finished_flags
+        decoding_module.StateKeys.FINISHED_FLAGS:
+            tf.logical_or(new_finished_flags, finished_flags)
     }
+    if self.mask_finished_outputs:
+      # The alive sequences already hold the finished sequences.
+      return new_finished_state
+
+    finished_seq = state[decoding_module.StateKeys.FINISHED_SEQ]
+    if not self.padded_decode:
+      finished_seq = tf.concat(
+          [finished_seq, tf.zeros([batch_size, 1], tf.int32)], axis=-1)
+    new_seq = tf.multiply(
+        new_seq, tf.cast(tf.logical_not(finished_flags), new_seq.dtype))
+    finished_seq += tf.multiply(new_seq,
+                                tf.cast(new_finished_flags, new_seq.dtype))
+    new_finished_state[decoding_module.StateKeys.FINISHED_SEQ] = finished_seq
+    return new_finished_state
 
   def _process_finished_state(
       self, finished_state: Dict[str, Any]) -> decoding_module.Output:
     """Process the alive/finished state to return final sequences and scores."""
     alive_seq = finished_state[decoding_module.StateKeys.ALIVE_SEQ]
     alive_log_probs = finished_state[decoding_module.StateKeys.ALIVE_LOG_PROBS]
-    finished_seq = finished_state[decoding_module.StateKeys.FINISHED_SEQ]
+    finished_seq = finished_state.get(decoding_module.StateKeys.FINISHED_SEQ,
+                                      alive_seq)
     finished_scores = finished_state[decoding_module.StateKeys.FINISHED_SCORES]
     finished_flags = finished_state[decoding_module.StateKeys.FINISHED_FLAGS]
     finished_cond = tf.reduce_any(finished_flags, 1, name="finished_cond")
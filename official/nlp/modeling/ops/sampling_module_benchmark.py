@@ -0,0 +1,138 @@
+# Copyright 2023 The TensorFlow Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+r"""Benchmarks `SamplingModule` decoding throughput.
+
+A single layer attention decoder with a key/value cache generates
+`max_decode_length` tokens for every combination of decoding strategy, batch
+size and decode length, and the generated tokens per second are reported. With
+`padded_decode` the cache and the sequences are preallocated and updated in
+place at the current step index, otherwise they grow by one position per step.
+
+Example usage:
+    python sampling_module_benchmark.py --padded_decode \
+      --batch_sizes=1,8,64 --decode_lengths=64,256,1024
+"""
+
+import time
+
+from absl import app
+from absl import flags
+from absl import logging
+import tensorflow as tf
+
+from official.nlp.modeling.ops import sampling_module
+
+flags.DEFINE_list('strategies', ['greedy', 'top_k', 'top_p'],
+                  'Decoding strategies to benchmark.')
+flags.DEFINE_list('batch_sizes', ['1', '8', '64'], 'Batch sizes to benchmark.')
+flags.DEFINE_list('decode_lengths', ['64', '256', '1024'],
+                  'Maximum decode lengths to benchmark.')
+flags.DEFINE_bool('padded_decode', True,
+                  'Whether to use preallocated sequences and caches.')
+flags.DEFINE_bool('mask_finished_outputs', True,
+                  'Whether tokens sampled after EOS are masked instead of '
+                  'kept in a separate finished sequence buffer.')
+flags.DEFINE_bool('jit_compile', False, 'Whether to compile the decoding loop '
+                  'with XLA. Requires `padded_decode`.')
+flags.DEFINE_integer('vocab_size', 32000, 'Vocabulary size.')
+flags.DEFINE_integer('hidden_size', 512, 'Hidden size of the toy decoder.')
+flags.DEFINE_integer('top_k', 40, 'Top-k used by the `top_k` strategy.')
+flags.DEFINE_float('top_p', 0.9, 'Top-p used by the `top_p` strategy.')
+flags.DEFINE_integer('num_iterations', 3,
+                     'Number of timed runs per configuration.')
+
+FLAGS = flags.FLAGS
+
+# An id which is never sampled, so that every sequence has the full length.
+_NEVER_EOS_ID = -1
+
+
+def _get_symbols_to_logits_fn(padded_decode):
+  """Returns a single layer attention decoder over the cached ids."""
+  hidden_size = FLAGS.hidden_size
+  embeddings = tf.random.stateless_normal(
+      [FLAGS.vocab_size, hidden_size], seed=[0, 1], stddev=0.02)
+  projection = tf.random.stateless_normal(
+      [hidden_size, 3 * hidden_size], seed=[2, 3], stddev=0.02)
+
+  def symbols_to_logits_fn(ids, i, cache):
+    inputs = tf.gather(embeddings, ids[:, -1])
+    query, key, value = tf.split(tf.matmul(inputs, projection), 3, axis=-1)
+    if padded_decode:
+      # The cache is [length, batch_size, hidden_size] so that the current
+      # step is a scatter on the leading dimension.
+      keys = tf.tensor_scatter_nd_update(cache['key'], [[i]], key[None])
+      values = tf.tensor_scatter_nd_update(cache['value'], [[i]], value[None])
+      mask = tf.range(tf.shape(keys)[0]) <= i
+    else:
+      keys = tf.concat([cache['key'], key[None]], axis=0)
+      values = tf.concat([cache['value'], value[None]], axis=0)
+      mask = tf.ones([tf.shape(keys)[0]], tf.bool)
+    attention_logits = tf.einsum('bh,lbh->bl', query, keys)
+    attention_logits = tf.where(mask[None], attention_logits, -1e9)
+    outputs = tf.einsum('bl,lbh->bh', tf.nn.softmax(attention_logits), values)
+    logits = tf.matmul(outputs + inputs, embeddings, transpose_b=True)
+    return logits, {'key': keys, 'value': values}
+
+  return symbols_to_logits_fn
+
+
+def _benchmark(strategy, batch_size, decode_length):
+  """Returns the generated tokens per second of one configuration."""
+  padded_decode = FLAGS.padded_decode
+  sampler = sampling_module.SamplingModule(
+      symbols_to_logits_fn=_get_symbols_to_logits_fn(padded_decode),
+      vocab_size=FLAGS.vocab_size,
+      max_decode_length=decode_length,
+      eos_id=_NEVER_EOS_ID,
+      padded_decode=padded_decode,
+      enable_greedy=strategy == 'greedy',
+      top_k=FLAGS.top_k if strategy == 'top_k' else 0,
+      top_p=FLAGS.top_p if strategy == 'top_p' else 1.0,
+      mask_finished_outputs=FLAGS.mask_finished_outputs)
+  cache_length = decode_length if padded_decode else 0
+  cache = {
+      'key': tf.zeros([cache_length, batch_size, FLAGS.hidden_size]),
+      'value': tf.zeros([cache_length, batch_size, FLAGS.hidden_size]),
+  }
+  initial_ids = tf.zeros([batch_size], tf.int32)
+
+  @tf.function(jit_compile=FLAGS.jit_compile)
+  def generate(initial_ids, cache):
+    ids, _ = sampler.generate(initial_ids=initial_ids, initial_cache=cache)
+    return ids
+
+  # Traces and warms up.
+  generate(initial_ids, cache).numpy()
+  start = time.time()
+  for _ in range(FLAGS.num_iterations):
+    generate(initial_ids, cache).numpy()
+  elapsed = (time.time() - start) / FLAGS.num_iterations
+  return batch_size * decode_length / elapsed
+
+
+def main(_):
+  for strategy in FLAGS.strategies:
+    for batch_size in FLAGS.batch_sizes:
+      for decode_length in FLAGS.decode_lengths:
+        tokens_per_second = _benchmark(strategy, int(batch_size),
+                                       int(decode_length))
+        logging.info(
+            'strategy=%s batch_size=%s decode_length=%s: %.1f tokens/sec',
+            strategy, batch_size, decode_length, tokens_per_second)
+
+
+if __name__ == '__main__':
+  app.run(main)
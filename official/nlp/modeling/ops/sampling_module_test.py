@@ -0,0 +1,114 @@
+# Copyright 2023 The TensorFlow Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Test sampling module."""
+
+from absl.testing import parameterized
+import numpy as np
+import tensorflow as tf
+
+from official.nlp.modeling.ops import decoding_module
+from official.nlp.modeling.ops import sampling_module
+
+_BATCH_SIZE = 6
+_VOCAB_SIZE = 5
+_MAX_DECODE_LENGTH = 7
+_EOS_ID = 1
+
+
+def _get_test_symbols_to_logits_fn(padded_decode):
+  """Test function that returns logits depending on the previous token."""
+  transitions = tf.random.stateless_normal(
+      [_VOCAB_SIZE, _VOCAB_SIZE], seed=[1, 2])
+  position_logits = tf.random.stateless_normal(
+      [_MAX_DECODE_LENGTH, _VOCAB_SIZE], seed=[3, 4])
+
+  def symbols_to_logits_fn(ids, i, cache):
+    last_ids = ids[:, -1]
+    logits = tf.gather(transitions, last_ids) + tf.gather(position_logits, i)
+    logits += cache['bias']
+    if padded_decode:
+      # Writes the step input into a preallocated cache.
+      cache['ids'] = decoding_module.update_seq_at_index(
+          cache['ids'], tf.cast(last_ids, tf.float32), i)
+    else:
+      cache['ids'] = tf.concat(
+          [cache['ids'], tf.cast(last_ids[:, None], tf.float32)], axis=1)
+    return logits, cache
+
+  return symbols_to_logits_fn
+
+
+class SamplingModuleTest(tf.test.TestCase, parameterized.TestCase):
+
+  def test_update_seq_at_index(self):
+    seq = tf.reshape(tf.range(12), [3, 4])
+    seq = decoding_module.update_seq_at_index(seq, [[-1], [-2], [-3]], 2)
+    self.assertAllEqual([[0, 1, -1, 3], [4, 5, -2, 7], [8, 9, -3, 11]], seq)
+
+  def _generate(self, padded_decode, mask_finished_outputs, **kwargs):
+    cache_length = _MAX_DECODE_LENGTH if padded_decode else 0
+    cache = {
+        'bias': tf.random.stateless_normal(
+            [_BATCH_SIZE, _VOCAB_SIZE], seed=[5, 6]),
+        'ids': tf.zeros([_BATCH_SIZE, cache_length]),
+    }
+    sampler = sampling_module.SamplingModule(
+        symbols_to_logits_fn=_get_test_symbols_to_logits_fn(padded_decode),
+        vocab_size=_VOCAB_SIZE,
+        max_decode_length=_MAX_DECODE_LENGTH,
+        eos_id=_EOS_ID,
+        padded_decode=padded_decode,
+        length_normalization_fn=lambda length, dtype: tf.cast(length, dtype),
+        mask_finished_outputs=mask_finished_outputs,
+        **kwargs)
+    tf.random.set_seed(1)
+    return sampler.generate(
+        initial_ids=tf.fill([_BATCH_SIZE], 2), initial_cache=cache)
+
+  @parameterized.product(
+      padded_decode=[True, False],
+      sampling_kwargs=[
+          dict(enable_greedy=True),
+          dict(enable_greedy=False, top_k=3),
+          dict(enable_greedy=False, top_p=0.9, sample_temperature=0.7),
+      ])
+  def test_mask_finished_outputs(self, padded_decode, sampling_kwargs):
+    expected_ids, expected_scores = self._generate(
+        padded_decode, mask_finished_outputs=False, **sampling_kwargs)
+    ids, scores = self._generate(
+        padded_decode, mask_finished_outputs=True, **sampling_kwargs)
+    self.assertAllEqual(expected_ids, ids)
+    self.assertAllClose(expected_scores, scores)
+
+  def test_padded_decode_matches_dynamic_decode(self):
+    padded_ids, padded_scores = self._generate(
+        padded_decode=True, mask_finished_outputs=True)
+    ids, scores = self._generate(
+        padded_decode=False, mask_finished_outputs=True)
+    # After EOS, padded sequences keep the initial id while dynamic sequences
+    # are filled with zeros, and dynamic sequences end once all are finished.
+    padded_ids = padded_ids.numpy()
+    is_eos = padded_ids[:, 1:] == _EOS_ID
+    after_eos = np.cumsum(is_eos, axis=1) - is_eos > 0
+    padded_ids[:, 1:][after_eos] = 0
+    decode_length = ids.shape[1]
+    self.assertAllEqual(padded_ids[:, :decode_length], ids)
+    self.assertAllEqual(padded_ids[:, decode_length:],
+                        np.zeros_like(padded_ids[:, decode_length:]))
+    self.assertAllClose(padded_scores, scores)
+
+
+if __name__ == '__main__':
+  tf.test.main()
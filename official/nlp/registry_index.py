@@ -0,0 +1,71 @@
+# Copyright 2023 The TensorFlow Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Lazy registration of the experiments and tasks of `official.nlp`.
+
+Importing this module registers every experiment name of
+`official.nlp.configs.experiment_configs` and every task of `official.nlp.tasks`
+without importing the modules defining them. The modules are imported when the
+experiment or task is first looked up.
+
+`official/core/registry_test.py` checks that these entries match the ones
+registered by importing the modules.
+"""
+
+from official.core import exp_factory
+from official.core import task_factory
+
+# Experiment names registered by each config module.
+EXPERIMENTS = {
+    'official.nlp.configs.finetuning_experiments': [
+        'bert/sentence_prediction',
+        'bert/sentence_prediction_text',
+        'bert/squad',
+        'bert/tagging',
+    ],
+    'official.nlp.configs.pretraining_experiments': [
+        'bert/pretraining',
+        'bert/pretraining_dynamic',
+        'bert/text_wiki_pretraining',
+    ],
+    'official.nlp.configs.wmt_transformer_experiments': [
+        'wmt_transformer/large',
+    ],
+}
+
+# Modules registering the task of each TaskConfig class.
+TASKS = {
+    'official.nlp.tasks.dual_encoder.DualEncoderConfig':
+        'official.nlp.tasks.dual_encoder',
+    'official.nlp.tasks.electra_task.ElectraPretrainConfig':
+        'official.nlp.tasks.electra_task',
+    'official.nlp.tasks.masked_lm.MaskedLMConfig':
+        'official.nlp.tasks.masked_lm',
+    'official.nlp.tasks.question_answering.QuestionAnsweringConfig':
+        'official.nlp.tasks.question_answering',
+    'official.nlp.tasks.question_answering.XLNetQuestionAnsweringConfig':
+        'official.nlp.tasks.question_answering',
+    'official.nlp.tasks.sentence_prediction.SentencePredictionConfig':
+        'official.nlp.tasks.sentence_prediction',
+    'official.nlp.tasks.tagging.TaggingConfig':
+        'official.nlp.tasks.tagging',
+    'official.nlp.tasks.translation.TranslationConfig':
+        'official.nlp.tasks.translation',
+}
+
+for _module_path, _names in EXPERIMENTS.items():
+  for _name in _names:
+    exp_factory.register_lazy_config_factory(_name, _module_path)
+for _task_config_cls_name, _module_path in TASKS.items():
+  task_factory.register_lazy_task_cls(_task_config_cls_name, _module_path)
@@ -13,10 +13,35 @@
 # limitations under the License.
 
 """TensorFlow Models NLP Tasks."""
-# pylint: disable=g-multiple-import
-from official.nlp.tasks.electra_task import ElectraPretrainConfig, ElectraPretrainTask
-from official.nlp.tasks.masked_lm import MaskedLMConfig, MaskedLMTask
-from official.nlp.tasks.question_answering import QuestionAnsweringConfig, QuestionAnsweringTask
-from official.nlp.tasks.sentence_prediction import SentencePredictionConfig, SentencePredictionTask
-from official.nlp.tasks.tagging import TaggingConfig, TaggingTask
-from official.nlp.tasks.translation import TranslationConfig, TranslationTask
+import importlib
+
+# Registers all NLP experiments and tasks. The task modules are imported on
+# first lookup or attribute access, so that importing one task does not import
+# all of them.
+from official.nlp import registry_index  # pylint: disable=unused-import
+
+_TASK_MODULES = {
+    'ElectraPretrainConfig': 'electra_task',
+    'ElectraPretrainTask': 'electra_task',
+    'MaskedLMConfig': 'masked_lm',
+    'MaskedLMTask': 'masked_lm',
+    'QuestionAnsweringConfig': 'question_answering',
+    'QuestionAnsweringTask': 'question_answering',
+    'SentencePredictionConfig': 'sentence_prediction',
+    'SentencePredictionTask': 'sentence_prediction',
+    'TaggingConfig': 'tagging',
+    'TaggingTask': 'tagging',
+    'TranslationConfig': 'translation',
+    'TranslationTask': 'translation',
+}
+
+__all__ = list(_TASK_MODULES)
+
+
+def __getattr__(name):
+  if name in _TASK_MODULES:
+    module = importlib.import_module(f'{__name__}.{_TASK_MODULES[name]}')
+    return getattr(module, name)
+  if name in _TASK_MODULES.values():
+    return importlib.import_module(f'{__name__}.{name}')
+  raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
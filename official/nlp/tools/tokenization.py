@@ -175,12 +175,12 @@ class FullTokenizer(object):
     self.wordpiece_tokenizer = WordpieceTokenizer(vocab=self.vocab)
 
   def tokenize(self, text):
-    split_tokens = []
-    for token in self.basic_tokenizer.tokenize(text):
-      for sub_token in self.wordpiece_tokenizer.tokenize(token):
-        split_tokens.append(sub_token)
+    return self.wordpiece_tokenizer.tokenize_words(
+        self.basic_tokenizer.tokenize(text))
 
-    return split_tokens
+  def tokenize_batch(self, texts):
+    """Tokenizes a list of texts, returning a list of token lists."""
+    return [self.tokenize(text) for text in texts]
 
   def convert_tokens_to_ids(self, tokens):
     return convert_by_vocab(self.vocab, tokens)
@@ -233,91 +233,56 @@ class BasicTokenizer(object):
 
   def _run_strip_accents(self, text):
     """Strips accents from a piece of text."""
+    if text.isascii():
+      return text
     text = unicodedata.normalize("NFD", text)
-    output = []
-    for char in text:
-      cat = unicodedata.category(char)
-      if cat == "Mn":
-        continue
-      output.append(char)
-    return "".join(output)
+    return text.translate(_ACCENT_TABLE)
 
   def _run_split_on_punc(self, text):
-    """Splits punctuation on a piece of text."""
-    chars = list(text)
-    i = 0
-    start_new_word = True
-    output = []
-    while i < len(chars):
-      char = chars[i]
-      if _is_punctuation(char):
-        output.append([char])
-        start_new_word = True
-      else:
-        if start_new_word:
-          output.append([])
-        start_new_word = False
-        output[-1].append(char)
-      i += 1
-
-    return ["".join(x) for x in output]
+    """Splits punctuation on a single whitespace separated token."""
+    return text.translate(_PUNCTUATION_TABLE).split()
 
   def _tokenize_chinese_chars(self, text):
     """Adds whitespace around any CJK character."""
-    output = []
-    for char in text:
-      cp = ord(char)
-      if self._is_chinese_char(cp):
-        output.append(" ")
-        output.append(char)
-        output.append(" ")
-      else:
-        output.append(char)
-    return "".join(output)
+    return text.translate(_CHINESE_CHAR_TABLE)
 
   def _is_chinese_char(self, cp):
     """Checks whether CP is the codepoint of a CJK character."""
-    # This defines a "chinese character" as anything in the CJK Unicode block:
-    #   https://en.wikipedia.org/wiki/CJK_Unified_Ideographs_(Unicode_block)
-    #
-    # Note that the CJK Unicode block is NOT all Japanese and Korean characters,
-    # despite its name. The modern Korean Hangul alphabet is a different block,
-    # as is Japanese Hiragana and Katakana. Those alphabets are used to write
-    # space-separated words, so they are not treated specially and handled
-    # like the all of the other languages.
-    if ((cp >= 0x4E00 and cp <= 0x9FFF) or  #
-        (cp >= 0x3400 and cp <= 0x4DBF) or  #
-        (cp >= 0x20000 and cp <= 0x2A6DF) or  #
-        (cp >= 0x2A700 and cp <= 0x2B73F) or  #
-        (cp >= 0x2B740 and cp <= 0x2B81F) or  #
-        (cp >= 0x2B820 and cp <= 0x2CEAF) or
-        (cp >= 0xF900 and cp <= 0xFAFF) or  #
-        (cp >= 0x2F800 and cp <= 0x2FA1F)):  #
-      return True
-
-    return False
+    return _is_chinese_char(cp)
 
   def _clean_text(self, text):
     """Performs invalid character removal and whitespace cleanup on text."""
-    output = []
-    for char in text:
-      cp = ord(char)
-      if cp == 0 or cp == 0xfffd or _is_control(char):
-        continue
-      if _is_whitespace(char):
-        output.append(" ")
-      else:
-        output.append(char)
-    return "".join(output)
+    return text.translate(_CLEAN_TEXT_TABLE)
 
 
 class WordpieceTokenizer(object):
   """Runs WordPiece tokenziation."""
 
-  def __init__(self, vocab, unk_token="[UNK]", max_input_chars_per_word=400):
+  def __init__(self,
+               vocab,
+               unk_token="[UNK]",
+               max_input_chars_per_word=400,
+               cache_size=65536):
+    """Constructs a WordpieceTokenizer.
+
+    Args:
+      vocab: A dict of the vocabulary tokens. It must not be modified after the
+        first call to `tokenize`.
+      unk_token: The token of words that cannot be tokenized.
+      max_input_chars_per_word: Words longer than this are tokenized as
+        `unk_token`.
+      cache_size: The maximum number of words whose word pieces are kept in a
+        least recently used cache. 0 disables the cache.
+    """
     self.vocab = vocab
     self.unk_token = unk_token
     self.max_input_chars_per_word = max_input_chars_per_word
+    self.cache_size = cache_size
+    self._cache = collections.OrderedDict()
+    # Tries of the vocabulary for the first and the following word pieces of a
+    # word, built on first use.
+    self._word_start_trie = None
+    self._word_continuation_trie = None
 
   def tokenize(self, text):
     """Tokenizes a piece of text into its word pieces.
@@ -336,41 +301,108 @@ class WordpieceTokenizer(object):
     Returns:
       A list of wordpiece tokens.
     """
+    return self.tokenize_words(whitespace_tokenize(convert_to_unicode(text)))
 
-    text = convert_to_unicode(text)
+  def tokenize_batch(self, texts):
+    """Tokenizes a list of texts, returning a list of wordpiece token lists."""
+    return [self.tokenize(text) for text in texts]
 
+  def tokenize_words(self, words):
+    """Tokenizes a list of words without whitespace into word pieces."""
+    if self._word_start_trie is None:
+      self._build_tries()
     output_tokens = []
-    for token in whitespace_tokenize(text):
-      chars = list(token)
-      if len(chars) > self.max_input_chars_per_word:
-        output_tokens.append(self.unk_token)
-        continue
-
-      is_bad = False
-      start = 0
-      sub_tokens = []
-      while start < len(chars):
-        end = len(chars)
-        cur_substr = None
-        while start < end:
-          substr = "".join(chars[start:end])
-          if start > 0:
-            substr = "##" + substr
-          if substr in self.vocab:
-            cur_substr = substr
-            break
-          end -= 1
-        if cur_substr is None:
-          is_bad = True
+    for word in words:
+      output_tokens.extend(self._tokenize_word(word))
+    return output_tokens
+
+  def _build_tries(self):
+    """Builds the tries used to look up the longest word pieces."""
+    self._word_start_trie = {}
+    self._word_continuation_trie = {}
+    for token in self.vocab:
+      _add_to_trie(self._word_start_trie, token, token)
+      if token.startswith("##"):
+        _add_to_trie(self._word_continuation_trie, token[2:], token)
+
+  def _tokenize_word(self, word):
+    """Returns the word pieces of a word, using the cache if possible."""
+    sub_tokens = self._cache.get(word)
+    if sub_tokens is not None:
+      self._cache.move_to_end(word)
+      return sub_tokens
+
+    sub_tokens = self._match_word_pieces(word)
+    if self.cache_size > 0:
+      self._cache[word] = sub_tokens
+      if len(self._cache) > self.cache_size:
+        self._cache.popitem(last=False)
+    return sub_tokens
+
+  def _match_word_pieces(self, word):
+    """Greedily matches the longest word pieces of a word in the tries."""
+    if len(word) > self.max_input_chars_per_word:
+      return (self.unk_token,)
+
+    sub_tokens = []
+    trie = self._word_start_trie
+    start = 0
+    while start < len(word):
+      node = trie
+      cur_token = None
+      end = start
+      for i in range(start, len(word)):
+        node = node.get(word[i])
+        if node is None:
           break
-        sub_tokens.append(cur_substr)
-        start = end
+        token = node.get(_TRIE_TOKEN_KEY)
+        if token is not None:
+          cur_token = token
+          end = i + 1
+      if cur_token is None:
+        return (self.unk_token,)
+      sub_tokens.append(cur_token)
+      start = end
+      trie = self._word_continuation_trie
+    return tuple(sub_tokens)
+
+
+# The key of the vocabulary token in a trie node. It cannot collide with the
+# single character keys of the child nodes.
+_TRIE_TOKEN_KEY = ""
+
+
+def _add_to_trie(trie, chars, token):
+  """Adds `token`, matched by the non-empty string `chars`, to a trie."""
+  if not chars:
+    return
+  node = trie
+  for char in chars:
+    node = node.setdefault(char, {})
+  node[_TRIE_TOKEN_KEY] = token
+
+
+def _is_chinese_char(cp):
+  """Checks whether CP is the codepoint of a CJK character."""
+  # This defines a "chinese character" as anything in the CJK Unicode block:
+  #   https://en.wikipedia.org/wiki/CJK_Unified_Ideographs_(Unicode_block)
+  #
+  # Note that the CJK Unicode block is NOT all Japanese and Korean characters,
+  # despite its name. The modern Korean Hangul alphabet is a different block,
+  # as is Japanese Hiragana and Katakana. Those alphabets are used to write
+  # space-separated words, so they are not treated specially and handled
+  # like the all of the other languages.
+  if ((cp >= 0x4E00 and cp <= 0x9FFF) or  #
+      (cp >= 0x3400 and cp <= 0x4DBF) or  #
+      (cp >= 0x20000 and cp <= 0x2A6DF) or  #
+      (cp >= 0x2A700 and cp <= 0x2B73F) or  #
+      (cp >= 0x2B740 and cp <= 0x2B81F) or  #
+      (cp >= 0x2B820 and cp <= 0x2CEAF) or
+      (cp >= 0xF900 and cp <= 0xFAFF) or  #
+      (cp >= 0x2F800 and cp <= 0x2FA1F)):  #
+    return True
 
-      if is_bad:
-        output_tokens.append(self.unk_token)
-      else:
-        output_tokens.extend(sub_tokens)
-    return output_tokens
+  return False
 
 
 def _is_whitespace(char):
@@ -413,6 +445,57 @@ def _is_punctuation(char):
   return False
 
 
+class _CharTable(dict):
+  """A `str.translate` table that maps each character on first lookup.
+
+  `char_fn` maps a character to its replacement string, or to None to delete
+  it. `str.translate` then replaces the characters without calling back into
+  Python for the characters seen before.
+  """
+
+  def __init__(self, char_fn):
+    super(_CharTable, self).__init__()
+    self._char_fn = char_fn
+
+  def __missing__(self, cp):
+    value = self._char_fn(six.unichr(cp))
+    self[cp] = value
+    return value
+
+
+def _clean_char(char):
+  cp = ord(char)
+  if cp == 0 or cp == 0xfffd or _is_control(char):
+    return None
+  if _is_whitespace(char):
+    return " "
+  return char
+
+
+def _strip_accent_char(char):
+  if unicodedata.category(char) == "Mn":
+    return None
+  return char
+
+
+def _space_chinese_char(char):
+  if _is_chinese_char(ord(char)):
+    return " " + char + " "
+  return char
+
+
+def _space_punctuation_char(char):
+  if _is_punctuation(char):
+    return " " + char + " "
+  return char
+
+
+_CLEAN_TEXT_TABLE = _CharTable(_clean_char)
+_ACCENT_TABLE = _CharTable(_strip_accent_char)
+_CHINESE_CHAR_TABLE = _CharTable(_space_chinese_char)
+_PUNCTUATION_TABLE = _CharTable(_space_punctuation_char)
+
+
 def preprocess_text(inputs, remove_space=True, lower=False):
   """Preprocesses data by removing extra space and normalize data.
 
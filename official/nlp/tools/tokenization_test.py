@@ -109,6 +109,25 @@ class TokenizationTest(tf.test.TestCase):
     self.assertAllEqual(
         tokenizer.tokenize("unwantedX running"), ["[UNK]", "runn", "##ing"])
 
+  def test_wordpiece_tokenizer_cache(self):
+    vocab_tokens = [
+        "[UNK]", "want", "##want", "##ed", "wa", "un", "runn", "##ing", "#",
+        "##"
+    ]
+    vocab = {token: i for (i, token) in enumerate(vocab_tokens)}
+    tokenizer = tokenization.WordpieceTokenizer(vocab=vocab, cache_size=2)
+
+    expected_tokens = [["un", "##want", "##ed", "runn", "##ing"],
+                       ["runn", "##ing", "[UNK]", "un", "##want", "##ed"],
+                       ["wa", "#", "##"], []]
+    texts = [
+        "unwanted running", "running unwantedX unwanted", "wa # ##", ""
+    ]
+    self.assertEqual(tokenizer.tokenize_batch(texts), expected_tokens)
+    # The results are the same after words were evicted from the cache.
+    self.assertEqual(tokenizer.tokenize_batch(texts), expected_tokens)
+    self.assertLen(tokenizer._cache, 2)
+
   def test_convert_tokens_to_ids(self):
     vocab_tokens = [
         "[UNK]", "[CLS]", "[SEP]", "want", "##want", "##ed", "wa", "un", "runn",
@@ -77,6 +77,8 @@ class DetrTask(cfg.TaskConfig):
   init_checkpoint_modules: Union[str, List[str]] = 'all'  # all, backbone
   annotation_file: Optional[str] = None
   per_category_metrics: bool = False
+  # Algorithm assigning targets to predictions: hungarian, jonker_volgenant.
+  matcher: str = 'hungarian'
 
 
 COCO_INPUT_PATH_BASE = 'coco'
@@ -487,3 +487,221 @@ def hungarian_matching(weights):
       back_prop=False)
   return weights, assignment
 
+
+def _one_hot_bool(indices, depth):
+  return tf.one_hot(
+      indices, depth, on_value=True, off_value=False, dtype=tf.bool)
+
+
+def _shortest_augmenting_path(cost, u, v, row4col, cur_row, active):
+  """Runs Dijkstra's search for a shortest augmenting path on a batch.
+
+  The search starts from the unassigned row `cur_row` and stops once it reaches
+  an unassigned column. Each iteration of the loop advances the search of all
+  batch elements by one column, batch elements whose search has finished are
+  left unchanged.
+
+  Args:
+    cost: A float32 [batch_size, num_rows, num_cols] tensor.
+    u: A float32 [batch_size, num_rows] tensor with the dual row variables.
+    v: A float32 [batch_size, num_cols] tensor with the dual column variables.
+    row4col: An int32 [batch_size, num_cols] tensor with the row assigned to
+      each column or -1 for unassigned columns.
+    cur_row: An int32 scalar tensor, the row to augment from.
+    active: A bool [batch_size] tensor, False for batch elements in which
+      `cur_row` does not need to be assigned.
+
+  Returns:
+    sink: An int32 [batch_size] tensor with the unassigned column ending the
+      path.
+    min_val: A float32 [batch_size] tensor with the reduced cost of the path.
+    path: An int32 [batch_size, num_cols] tensor with the row preceding each
+      column on the shortest paths.
+    shortest_path_costs: A float32 [batch_size, num_cols] tensor with the
+      shortest path cost to each column.
+    scanned_rows: A bool [batch_size, num_rows] tensor, True for the rows
+      visited by the search.
+    scanned_cols: A bool [batch_size, num_cols] tensor, True for the columns
+      visited by the search.
+  """
+  batch_size, num_rows, num_cols = tf_utils.get_shape_list(cost, 3)
+  is_free = tf.less(row4col, 0)
+
+  def _not_done(done, *args):
+    del args
+    return tf.reduce_any(tf.logical_not(done))
+
+  def _advance(done, row, sink, min_val, path, shortest_path_costs,
+               scanned_rows, scanned_cols):
+    running = tf.logical_not(done)
+    scanned_rows |= _one_hot_bool(row, num_rows) & running[:, None]
+
+    # Relaxes the edges from `row` to all unscanned columns.
+    reduced_cost = (
+        min_val[:, None] + tf.gather(cost, row, batch_dims=1) -
+        tf.gather(u, row, batch_dims=1)[:, None] - v)
+    improved = (
+        running[:, None] & tf.logical_not(scanned_cols) &
+        tf.less(reduced_cost, shortest_path_costs))
+    path = tf.where(improved, row[:, None], path)
+    shortest_path_costs = tf.where(improved, reduced_cost, shortest_path_costs)
+
+    # Scans the closest unscanned column, preferring unassigned ones on ties
+    # since they end the search.
+    remaining_costs = tf.where(scanned_cols, float('inf'), shortest_path_costs)
+    lowest = tf.reduce_min(remaining_costs, axis=1)
+    is_lowest = tf.logical_not(scanned_cols) & tf.equal(
+        remaining_costs, lowest[:, None])
+    col = tf.argmax(
+        tf.cast(is_lowest, tf.int32) + tf.cast(is_lowest & is_free, tf.int32),
+        axis=1,
+        output_type=tf.int32)
+    min_val = tf.where(running, lowest, min_val)
+    scanned_cols |= _one_hot_bool(col, num_cols) & running[:, None]
+
+    found = running & tf.gather(is_free, col, batch_dims=1)
+    sink = tf.where(found, col, sink)
+    row = tf.where(running & tf.logical_not(found),
+                   tf.gather(row4col, col, batch_dims=1), row)
+    return (done | found, row, sink, min_val, path, shortest_path_costs,
+            scanned_rows, scanned_cols)
+
+  loop_vars = (
+      tf.logical_not(active),
+      tf.fill([batch_size], cur_row),
+      -tf.ones([batch_size], tf.int32),
+      tf.zeros([batch_size], tf.float32),
+      -tf.ones([batch_size, num_cols], tf.int32),
+      tf.fill([batch_size, num_cols], float('inf')),
+      tf.zeros([batch_size, num_rows], tf.bool),
+      tf.zeros([batch_size, num_cols], tf.bool),
+  )
+  loop_vars = tf.while_loop(
+      _not_done,
+      _advance,
+      loop_vars,
+      maximum_iterations=num_cols,
+      back_prop=False)
+  return loop_vars[2:]
+
+
+def _augment(path, sink, row4col, col4row, cur_row, active):
+  """Flips the assignment along the augmenting paths ending in `sink`."""
+  _, num_rows = tf_utils.get_shape_list(col4row, 2)
+  _, num_cols = tf_utils.get_shape_list(row4col, 2)
+
+  def _not_done(done, *args):
+    del args
+    return tf.reduce_any(tf.logical_not(done))
+
+  def _flip(done, col, row4col, col4row):
+    running = tf.logical_not(done)
+    row = tf.gather(path, tf.maximum(col, 0), batch_dims=1)
+    row4col = tf.where(
+        _one_hot_bool(col, num_cols) & running[:, None], row[:, None], row4col)
+    previous_col = tf.gather(col4row, tf.maximum(row, 0), batch_dims=1)
+    col4row = tf.where(
+        _one_hot_bool(row, num_rows) & running[:, None], col[:, None], col4row)
+    done |= tf.equal(row, cur_row)
+    col = tf.where(running, previous_col, col)
+    return done, col, row4col, col4row
+
+  _, _, row4col, col4row = tf.while_loop(
+      _not_done,
+      _flip, (tf.logical_not(active), sink, row4col, col4row),
+      maximum_iterations=num_rows,
+      back_prop=False)
+  return row4col, col4row
+
+
+def jonker_volgenant_matching(weights, valid_mask=None):
+  """Computes the minimum linear sum assignment with shortest augmenting paths.
+
+  This is a batched version of the Jonker-Volgenant algorithm, in the variant
+  of D. F. Crouse, "On implementing 2D rectangular assignment algorithms"
+  (IEEE Transactions on Aerospace and Electronic Systems, 2016), which is also
+  used by `scipy.optimize.linear_sum_assignment`. Targets are assigned one at a
+  time, and each assignment advances all batch elements together, so the number
+  of loop iterations does not grow with the batch size. The assignment has the
+  same total cost as the one of scipy, but may differ from it when several
+  assignments are optimal.
+
+  Columns of padded targets have a constant cost in DETR, so every assignment
+  of the unmatched predictions to them has the same cost. They are therefore
+  removed from the problem: only the valid targets are assigned optimally and
+  the padded targets then take the remaining predictions in order.
+
+  Args:
+    weights: A float [batch_size, num_preds, num_targets] tensor, where each
+      inner matrix represents the cost of matching a prediction (row) to a
+      target (column). num_targets must not be larger than num_preds.
+    valid_mask: An optional bool [batch_size, num_targets] tensor, False for
+      padded targets. Defaults to all targets being valid.
+
+  Returns:
+    A bool [batch_size, num_preds, num_targets] tensor, where each element of
+    the inner matrix represents whether the prediction has been matched to the
+    target. Every target is matched to exactly one prediction.
+  """
+  weights = tf.cast(weights, tf.float32)
+  batch_size, num_preds, num_targets = tf_utils.get_shape_list(weights, 3)
+  if valid_mask is None:
+    valid_mask = tf.ones([batch_size, num_targets], tf.bool)
+
+  # Solves the problem with targets as rows and predictions as columns. The
+  # rows of valid targets are moved first, so only `max(num_valid)` rows need
+  # to be assigned.
+  sorted_targets = tf.argsort(
+      tf.cast(tf.logical_not(valid_mask), tf.int32), axis=1, stable=True)
+  num_valid = tf.reduce_sum(tf.cast(valid_mask, tf.int32), axis=1)
+  cost = tf.gather(
+      tf.transpose(weights, [0, 2, 1]), sorted_targets, batch_dims=1)
+
+  def _rows_remaining(cur_row, *args):
+    del args
+    return tf.less(cur_row, tf.reduce_max(num_valid))
+
+  def _assign_row(cur_row, u, v, row4col, col4row):
+    active = tf.less(cur_row, num_valid)
+    (sink, min_val, path, shortest_path_costs, scanned_rows,
+     scanned_cols) = _shortest_augmenting_path(cost, u, v, row4col, cur_row,
+                                               active)
+
+    # Updates the dual variables so that reduced costs stay non-negative.
+    min_val = tf.where(active, min_val, 0.)
+    is_cur_row = _one_hot_bool(tf.fill([batch_size], cur_row), num_targets)
+    scanned_rows &= tf.logical_not(is_cur_row)
+    u += tf.where(is_cur_row, min_val[:, None], 0.)
+    u += tf.where(
+        scanned_rows, min_val[:, None] - tf.gather(
+            shortest_path_costs, tf.maximum(col4row, 0), batch_dims=1), 0.)
+    v -= tf.where(scanned_cols, min_val[:, None] - shortest_path_costs, 0.)
+
+    row4col, col4row = _augment(path, sink, row4col, col4row, cur_row, active)
+    return cur_row + 1, u, v, row4col, col4row
+
+  _, _, _, row4col, col4row = tf.while_loop(
+      _rows_remaining,
+      _assign_row,
+      (tf.constant(0, tf.int32), tf.zeros([batch_size, num_targets]),
+       tf.zeros([batch_size, num_preds]),
+       -tf.ones([batch_size, num_preds], tf.int32),
+       -tf.ones([batch_size, num_targets], tf.int32)),
+      back_prop=False)
+
+  # Scatters the assigned rows back to the original target order.
+  is_row_valid = tf.range(num_targets)[None, :] < num_valid[:, None]
+  assignment = tf.einsum(
+      'btp,btq->bpq', tf.one_hot(col4row, num_preds),
+      tf.one_hot(tf.where(is_row_valid, sorted_targets, -1), num_targets))
+  assignment = tf.greater(assignment, 0.)
+
+  # Padded targets take the unassigned predictions in order.
+  is_free = tf.less(row4col, 0)
+  is_padded = tf.logical_not(valid_mask)
+  free_rank = tf.cumsum(tf.cast(is_free, tf.int32), axis=1)
+  padded_rank = tf.cumsum(tf.cast(is_padded, tf.int32), axis=1)
+  assignment |= (
+      is_free[:, :, None] & is_padded[:, None, :] &
+      tf.equal(free_rank[:, :, None], padded_rank[:, None, :]))
+  return assignment
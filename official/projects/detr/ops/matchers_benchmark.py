@@ -0,0 +1,93 @@
+# Copyright 2023 The TensorFlow Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+r"""Benchmarks the DETR matchers over a range of query counts.
+
+Cost matrices are generated in the same layout as the DETR detection task:
+targets are padded to the number of queries and padded targets have a constant
+cost. The wall time of `hungarian_matching` and `jonker_volgenant_matching`,
+both wrapped in a `tf.function`, is reported for every query count.
+
+Example usage:
+    python matchers_benchmark.py --batch_size=8 --num_queries=100,300,900
+"""
+
+import time
+
+from absl import app
+from absl import flags
+from absl import logging
+import numpy as np
+import tensorflow as tf
+
+from official.projects.detr.ops import matchers
+
+flags.DEFINE_integer('batch_size', 8, 'Number of images in a batch.')
+flags.DEFINE_list('num_queries', ['100', '300', '500', '700', '900'],
+                  'Query counts to benchmark.')
+flags.DEFINE_integer('max_num_targets', 50,
+                     'Maximum number of valid targets per image.')
+flags.DEFINE_list('matchers', ['hungarian', 'jonker_volgenant'],
+                  'Matchers to benchmark.')
+flags.DEFINE_integer('num_iterations', 5, 'Number of timed iterations.')
+flags.DEFINE_bool('jit_compile', False, 'Whether to compile with XLA.')
+flags.DEFINE_integer('seed', 0, 'Random seed of the synthetic costs.')
+
+FLAGS = flags.FLAGS
+
+
+def _random_costs(rng, num_queries):
+  """Creates padded DETR-like cost matrices and their valid target masks."""
+  num_targets = rng.randint(
+      1, min(FLAGS.max_num_targets, num_queries) + 1, size=FLAGS.batch_size)
+  valid_mask = np.arange(num_queries)[None, :] < num_targets[:, None]
+  costs = rng.uniform(
+      -2., 4., size=(FLAGS.batch_size, num_queries, num_queries))
+  costs = np.where(valid_mask[:, None, :], costs, 4.).astype(np.float32)
+  return tf.constant(costs), tf.constant(valid_mask)
+
+
+def _build_matcher(name):
+  if name == 'hungarian':
+    fn = lambda costs, valid_mask: matchers.hungarian_matching(costs)[1]
+  elif name == 'jonker_volgenant':
+    fn = matchers.jonker_volgenant_matching
+  else:
+    raise ValueError('Unknown matcher: %s' % name)
+  return tf.function(fn, jit_compile=FLAGS.jit_compile)
+
+
+def _time(fn, costs, valid_mask):
+  """Returns the best wall time of FLAGS.num_iterations calls of fn."""
+  fn(costs, valid_mask).numpy()
+  best_time = float('inf')
+  for _ in range(FLAGS.num_iterations):
+    start = time.time()
+    fn(costs, valid_mask).numpy()
+    best_time = min(best_time, time.time() - start)
+  return best_time
+
+
+def main(_):
+  rng = np.random.RandomState(FLAGS.seed)
+  for num_queries in [int(n) for n in FLAGS.num_queries]:
+    costs, valid_mask = _random_costs(rng, num_queries)
+    for name in FLAGS.matchers:
+      elapsed = _time(_build_matcher(name), costs, valid_mask)
+      logging.info('num_queries=%d %s: %.1f ms/batch', num_queries, name,
+                   elapsed * 1e3)
+
+
+if __name__ == '__main__':
+  app.run(main)
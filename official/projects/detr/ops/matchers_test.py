@@ -91,5 +91,64 @@ class MatchersOpsTest(tf.test.TestCase):
 
       self.assertAllEqual(hungarian_assignment, scipy_assignment)
 
+  def testJonkerVolgenantMatchesScipy(self):
+    """Check that the batched Jonker-Volgenant matcher matches Scipy's cost."""
+    batch_size, num_elems = 3, 25
+    weights = tf.random.normal((batch_size, num_elems, num_elems))
+    assignment = matchers.jonker_volgenant_matching(weights).numpy()
+
+    # Every prediction is matched to exactly one target.
+    self.assertAllEqual(np.sum(assignment, axis=2),
+                        np.ones((batch_size, num_elems)))
+    self.assertAllEqual(np.sum(assignment, axis=1),
+                        np.ones((batch_size, num_elems)))
+    for idx in range(batch_size):
+      preds, targets = optimize.linear_sum_assignment(weights.numpy()[idx])
+      self.assertAllClose(
+          np.sum(weights.numpy()[idx][assignment[idx]]),
+          np.sum(weights.numpy()[idx][preds, targets]))
+
+  def testJonkerVolgenantWithTies(self):
+    """Check that the matcher is optimal when several assignments are."""
+    weights = tf.constant([[[1., 1., 2.], [1., 1., 2.], [2., 2., 0.]]])
+    assignment = matchers.jonker_volgenant_matching(weights).numpy()[0]
+
+    self.assertAllEqual(np.sum(assignment, axis=0), np.ones(3))
+    self.assertAllEqual(np.sum(assignment, axis=1), np.ones(3))
+    self.assertAllClose(np.sum(weights.numpy()[0][assignment]), 2.)
+
+  def testJonkerVolgenantWithPaddedTargets(self):
+    """Check that valid targets are matched optimally and pads to the rest."""
+    batch_size, num_preds, num_targets = 4, 30, 12
+    weights = tf.random.uniform((batch_size, num_preds, num_targets))
+    valid_mask = np.random.uniform(size=(batch_size, num_targets)) < 0.5
+    valid_mask[0, :] = True
+    valid_mask[1, :] = False
+    assignment = matchers.jonker_volgenant_matching(
+        weights, tf.constant(valid_mask)).numpy()
+
+    # Every target is matched to exactly one prediction.
+    self.assertAllEqual(np.sum(assignment, axis=1),
+                        np.ones((batch_size, num_targets)))
+    self.assertAllLessEqual(np.sum(assignment, axis=2), 1)
+    for idx in range(batch_size):
+      valid_targets = np.where(valid_mask[idx])[0]
+      valid_weights = weights.numpy()[idx][:, valid_targets]
+      preds, targets = optimize.linear_sum_assignment(valid_weights)
+      self.assertAllClose(
+          np.sum(valid_weights[assignment[idx][:, valid_targets]]),
+          np.sum(valid_weights[preds, targets]))
+
+  def testJonkerVolgenantInFunction(self):
+    """Check that the matcher gives the same result in a compiled function."""
+    weights = tf.random.uniform((2, 10, 10))
+    valid_mask = tf.constant([[True] * 6 + [False] * 4, [True] * 10])
+    eager_assignment = matchers.jonker_volgenant_matching(weights, valid_mask)
+    compiled_assignment = tf.function(
+        matchers.jonker_volgenant_matching, jit_compile=True)(weights,
+                                                              valid_mask)
+    self.assertAllEqual(eager_assignment, compiled_assignment)
+
+
 if __name__ == '__main__':
   tf.test.main()
@@ -160,6 +160,18 @@ class DetectionTask(base_task.Task):
 
     return total_cost
 
+  def _match(self, cost, cls_targets):
+    """Assigns targets to predictions with the configured matcher."""
+    if self._task_config.matcher == 'hungarian':
+      _, indices = matchers.hungarian_matching(cost)
+    elif self._task_config.matcher == 'jonker_volgenant':
+      # Padded targets are excluded from the matching problem.
+      indices = matchers.jonker_volgenant_matching(
+          cost, valid_mask=tf.not_equal(cls_targets, 0))
+    else:
+      raise ValueError('Unknown matcher: %s' % self._task_config.matcher)
+    return indices
+
   def build_losses(self, outputs, labels, aux_losses=None):
     """Builds DETR losses."""
     cls_outputs = outputs['cls_outputs']
@@ -170,8 +182,7 @@ class DetectionTask(base_task.Task):
     cost = self._compute_cost(
         cls_outputs, box_outputs, cls_targets, box_targets)
 
-    _, indices = matchers.hungarian_matching(cost)
-    indices = tf.stop_gradient(indices)
+    indices = tf.stop_gradient(self._match(cost, cls_targets))
 
     target_index = tf.math.argmax(indices, axis=1)
     cls_assigned = tf.gather(cls_outputs, target_index, batch_dims=1, axis=1)
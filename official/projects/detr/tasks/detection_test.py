@@ -14,6 +14,7 @@
 
 """Tests for detection."""
 
+from absl.testing import parameterized
 import numpy as np
 import tensorflow as tf
 import tensorflow_datasets as tfds
@@ -56,9 +57,10 @@ def _as_dataset(self, *args, **kwargs):
   )
 
 
-class DetectionTest(tf.test.TestCase):
+class DetectionTest(tf.test.TestCase, parameterized.TestCase):
 
-  def test_train_step(self):
+  @parameterized.parameters('hungarian', 'jonker_volgenant')
+  def test_train_step(self, matcher):
     config = detr_cfg.DetrTask(
         model=detr_cfg.Detr(
             input_size=[1333, 1333, 3],
@@ -74,7 +76,8 @@ class DetectionTest(tf.test.TestCase):
             tfds_split='validation',
             is_training=True,
             global_batch_size=2,
-        ))
+        ),
+        matcher=matcher)
     with tfds.testing.mock_data(as_dataset_fn=_as_dataset):
       task = detection.DetectionTask(config)
       model = task.build_model()
@@ -147,6 +147,7 @@ class PanopticQualityEvaluator(hyperparams.Config):
       default_factory=list)
   rescale_predictions: bool = False
   report_per_class_metrics: bool = False
+  num_workers: int = 0
 
 
 @dataclasses.dataclass
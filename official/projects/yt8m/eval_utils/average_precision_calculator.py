@@ -51,13 +51,84 @@ ap3 = calculator.peek_ap_at_n()
 ```
 """
 
-import heapq
 import numbers
 import random
 
 import numpy
 
 
+def select_top_n(predictions, n):
+  """Selects the indices of the top n predictions.
+
+  Among predictions tied at the n-th largest value, the earliest ones are kept.
+
+  Args:
+    predictions: a numpy 1-D array of prediction scores.
+    n: the number of predictions to select.
+
+  Returns:
+    A sorted numpy 1-D integer array with at most n indices into `predictions`.
+  """
+  if n >= predictions.size:
+    return numpy.arange(predictions.size)
+  if n <= 0:
+    return numpy.zeros([0], dtype=numpy.int64)
+  threshold = numpy.partition(predictions, predictions.size - n)[
+      predictions.size - n]
+  keep = predictions > threshold
+  num_tied_to_keep = n - numpy.count_nonzero(keep)
+  keep[numpy.flatnonzero(predictions == threshold)[:num_tied_to_keep]] = True
+  return numpy.flatnonzero(keep)
+
+
+def segment_ap_at_n(segment_ids, predictions, actuals, num_segments,
+                    num_positives, n=None):
+  """Calculates the non-interpolated average precision of many ranked lists.
+
+  Each segment is an independent list; within a segment, items are ranked by
+  decreasing prediction, and ties keep their order in the inputs. For each
+  segment this matches `AveragePrecisionCalculator.ap_at_n` on its items,
+  without the shuffling.
+
+  Args:
+    segment_ids: a numpy 1-D integer array with the segment of each item, in
+      [0, num_segments).
+    predictions: a numpy 1-D array storing the prediction scores.
+    actuals: a numpy 1-D array storing the ground truth labels. Any value larger
+      than 0 will be treated as positives, otherwise as negatives.
+    num_segments: the number of segments.
+    num_positives: a numpy 1-D array with the total number of positives of each
+      segment.
+    n: the top n items of each segment to be considered in ap@n, or None.
+
+  Returns:
+    A numpy 1-D float64 array with the average precision of each segment. It is
+    0 for segments without positives.
+  """
+  order = numpy.lexsort((-predictions, segment_ids))
+  segment_ids = segment_ids[order]
+  is_positive = actuals[order] > 0
+
+  starts = numpy.searchsorted(segment_ids, numpy.arange(num_segments))
+  item_starts = starts[segment_ids]
+  ranks = numpy.arange(segment_ids.size) - item_starts
+  cum_positives = numpy.cumsum(is_positive)
+  if cum_positives.size:
+    cum_positives -= (cum_positives - is_positive)[item_starts]
+
+  num_positives = numpy.asarray(num_positives, dtype=numpy.float64)
+  if n is not None:
+    num_positives = numpy.minimum(num_positives, n)
+    is_positive &= ranks < n
+  is_positive &= num_positives[segment_ids] > 0
+
+  segment_ids = segment_ids[is_positive]
+  delta_recall = 1.0 / num_positives[segment_ids]
+  precisions = cum_positives[is_positive] / (ranks[is_positive] + 1)
+  return numpy.bincount(
+      segment_ids, weights=precisions * delta_recall, minlength=num_segments)
+
+
 class AveragePrecisionCalculator(object):
   """Calculate the average precision and average precision at n."""
 
@@ -78,12 +149,19 @@ class AveragePrecisionCalculator(object):
 
     self._top_n = top_n  # average precision at n
     self._total_positives = 0  # total number of positives have seen
-    self._heap = []  # max heap of (prediction, actual)
+    # Batches of (prediction, actual) arrays. If top_n is set, they are
+    # compacted to the top_n predictions once they hold more than
+    # 2 * top_n items.
+    self._predictions = []
+    self._actuals = []
+    self._size = 0
 
   @property
   def heap_size(self):
-    """Gets the heap size maintained in the class."""
-    return len(self._heap)
+    """Gets the number of predictions kept by the class."""
+    if self._top_n is None:
+      return self._size
+    return min(self._size, self._top_n)
 
   @property
   def num_accumulated_positives(self):
@@ -123,20 +201,54 @@ class AveragePrecisionCalculator(object):
     else:
       self._total_positives += numpy.size(
           numpy.where(numpy.array(actuals) > 1e-5))
-    topk = self._top_n
-    heap = self._heap
+    predictions = numpy.asarray(predictions).reshape([-1])
+    actuals = numpy.asarray(actuals).reshape([-1])
+    if predictions.size:
+      self._predictions.append(predictions)
+      self._actuals.append(actuals)
+      self._size += predictions.size
+      if self._top_n is not None and self._size > 2 * self._top_n:
+        self._compact()
+
+  def merge(self, other):
+    """Merges the predictions accumulated by another calculator.
+
+    Args:
+      other: an AveragePrecisionCalculator with the same top_n, eg from another
+        worker.
 
-    for i in range(numpy.size(predictions)):
-      if topk is None or len(heap) < topk:
-        heapq.heappush(heap, (predictions[i], actuals[i]))
-      else:
-        if predictions[i] > heap[0][0]:  # heap[0] is the smallest
-          heapq.heappop(heap)
-          heapq.heappush(heap, (predictions[i], actuals[i]))
+    Raises:
+      ValueError: If the calculators have different top_n.
+    """
+    if other._top_n != self._top_n:  # pylint: disable=protected-access
+      raise ValueError("Cannot merge calculators with different top_n.")
+    predictions, actuals = other._get_predictions_and_actuals()  # pylint: disable=protected-access
+    self.accumulate(
+        predictions, actuals, num_positives=other.num_accumulated_positives)
+
+  def _compact(self):
+    """Keeps only the top_n accumulated predictions."""
+    predictions = numpy.concatenate(self._predictions)
+    actuals = numpy.concatenate(self._actuals)
+    if self._top_n is not None:
+      keep = select_top_n(predictions, self._top_n)
+      predictions = predictions[keep]
+      actuals = actuals[keep]
+    self._predictions = [predictions]
+    self._actuals = [actuals]
+    self._size = predictions.size
+
+  def _get_predictions_and_actuals(self):
+    if not self._predictions:
+      return numpy.zeros([0]), numpy.zeros([0])
+    self._compact()
+    return self._predictions[0], self._actuals[0]
 
   def clear(self):
     """Clear the accumulated predictions."""
-    self._heap = []
+    self._predictions = []
+    self._actuals = []
+    self._size = 0
     self._total_positives = 0
 
   def peek_ap_at_n(self):
@@ -149,11 +261,11 @@ class AveragePrecisionCalculator(object):
     """
     if self.heap_size <= 0:
       return 0
-    predlists = numpy.array(list(zip(*self._heap)))
+    predictions, actuals = self._get_predictions_and_actuals()
 
     ap = self.ap_at_n(
-        predlists[0],
-        predlists[1],
+        predictions,
+        actuals,
         n=self._top_n,
         total_num_positives=self._total_positives)
     return ap
@@ -209,16 +321,12 @@ class AveragePrecisionCalculator(object):
         raise ValueError("n must be 'None' or a positive integer."
                          " It was '%s'." % n)
 
-    ap = 0.0
-
-    predictions = numpy.array(predictions)
-    actuals = numpy.array(actuals)
+    predictions = numpy.array(predictions, dtype=numpy.float64)
+    actuals = numpy.array(actuals, dtype=numpy.float64)
 
     # add a shuffler to avoid overestimating the ap
     predictions, actuals = AveragePrecisionCalculator._shuffle(
         predictions, actuals)
-    sortidx = sorted(
-        range(len(predictions)), key=lambda k: predictions[k], reverse=True)
 
     if total_num_positives is None:
       numpos = numpy.size(numpy.where(actuals > 0))
@@ -228,20 +336,14 @@ class AveragePrecisionCalculator(object):
     if numpos == 0:
       return 0
 
-    if n is not None:
-      numpos = min(numpos, n)
-    delta_recall = 1.0 / numpos
-    poscount = 0.0
-
-    # calculate the ap
-    r = len(sortidx)
-    if n is not None:
-      r = min(r, n)
-    for i in range(r):
-      if actuals[sortidx[i]] > 0:
-        poscount += 1
-        ap += poscount / (i + 1) * delta_recall
-    return ap
+    ap = segment_ap_at_n(
+        numpy.zeros(predictions.shape, dtype=numpy.int64),
+        predictions,
+        actuals,
+        num_segments=1,
+        num_positives=[numpos],
+        n=n)
+    return float(ap[0])
 
   @staticmethod
   def _shuffle(predictions, actuals):
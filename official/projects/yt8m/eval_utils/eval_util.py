@@ -61,14 +61,26 @@ def calculate_precision_at_equal_recall_rate(predictions, actuals):
   if num_videos == 0:
     logging.warning("Num_videos is 0, returning 0.0 aggregated_precision.")
     return aggregated_precision
-  for row in np.arange(num_videos):
-    num_labels = int(np.sum(actuals[row]))
-    top_indices = np.argpartition(predictions[row], -num_labels)[-num_labels:]
-    item_precision = 0.0
-    for label_index in top_indices:
-      if predictions[row][label_index] > 0:
-        item_precision += actuals[row][label_index]
-    item_precision /= top_indices.size
+  num_labels = np.sum(actuals, axis=1).astype(np.int64)
+  # Videos without labels yield 0 precision.
+  item_precisions = np.zeros([num_videos])
+  max_num_labels = np.max(num_labels)
+  if max_num_labels > 0:
+    # Ranks the top max_num_labels classes of each video, and selects the top
+    # num_labels of them.
+    top_indices = np.argpartition(
+        -predictions, max_num_labels - 1, axis=1)[:, :max_num_labels]
+    top_predictions = np.take_along_axis(predictions, top_indices, axis=1)
+    order = np.argsort(-top_predictions, axis=1, kind="stable")
+    top_predictions = np.take_along_axis(top_predictions, order, axis=1)
+    top_actuals = np.take_along_axis(
+        actuals, np.take_along_axis(top_indices, order, axis=1), axis=1)
+    is_top = np.arange(max_num_labels) < num_labels[:, np.newaxis]
+    hits = np.sum(
+        np.where(is_top & (top_predictions > 0), top_actuals, 0), axis=1)
+    has_labels = num_labels > 0
+    item_precisions[has_labels] = hits[has_labels] / num_labels[has_labels]
+  for item_precision in item_precisions:
     aggregated_precision += item_precision
   aggregated_precision /= num_videos
   return aggregated_precision
@@ -90,13 +102,39 @@ def calculate_gap(predictions, actuals, top_k=20):
     float: The global average precision.
   """
   gap_calculator = ap_calculator.AveragePrecisionCalculator()
-  sparse_predictions, sparse_labels, num_positives = top_k_by_class(
-      predictions, actuals, top_k)
-  gap_calculator.accumulate(
-      flatten(sparse_predictions), flatten(sparse_labels), sum(num_positives))
+  _, sparse_predictions, sparse_labels = top_k_sparse(predictions, actuals,
+                                                      top_k)
+  gap_calculator.accumulate(sparse_predictions, sparse_labels,
+                            np.sum(actuals))
   return gap_calculator.peek_ap_at_n()
 
 
+def top_k_sparse(predictions, labels, k=20):
+  """Extracts the top k predictions for each video, as flat arrays.
+
+  Args:
+    predictions: A numpy matrix containing the outputs of the model. Dimensions
+      are 'batch' x 'num_classes'.
+    labels: A numpy matrix containing the ground truth labels. Dimensions are
+      'batch' x 'num_classes'.
+    k: the top k entries to preserve in each prediction.
+
+  Returns:
+    A tuple (class_ids, predictions, labels) of numpy 1-D arrays with
+    'batch' x k entries, ordered by video.
+
+  Raises:
+    ValueError: An error occurred when the k is not a positive integer.
+  """
+  if k <= 0:
+    raise ValueError("k must be a positive integer.")
+  k = min(k, predictions.shape[1])
+  class_ids = np.argpartition(predictions, -k, axis=1)[:, -k:]
+  return (class_ids.reshape([-1]),
+          np.take_along_axis(predictions, class_ids, axis=1).reshape([-1]),
+          np.take_along_axis(labels, class_ids, axis=1).reshape([-1]))
+
+
 def top_k_by_class(predictions, labels, k=20):
   """Extracts the top k predictions for each video, sorted by class.
 
@@ -119,20 +157,16 @@ def top_k_by_class(predictions, labels, k=20):
   Raises:
     ValueError: An error occurred when the k is not a positive integer.
   """
-  if k <= 0:
-    raise ValueError("k must be a positive integer.")
-  k = min(k, predictions.shape[1])
   num_classes = predictions.shape[1]
-  prediction_triplets = []
-  for video_index in range(predictions.shape[0]):
-    prediction_triplets.extend(
-        top_k_triplets(predictions[video_index], labels[video_index], k))
-  out_predictions = [[] for _ in range(num_classes)]
-  out_labels = [[] for _ in range(num_classes)]
-  for triplet in prediction_triplets:
-    out_predictions[triplet[0]].append(triplet[1])
-    out_labels[triplet[0]].append(triplet[2])
-  out_true_positives = [np.sum(labels[:, i]) for i in range(num_classes)]
+  class_ids, sparse_predictions, sparse_labels = top_k_sparse(
+      predictions, labels, k)
+  order = np.argsort(class_ids, kind="stable")
+  splits = np.cumsum(np.bincount(class_ids, minlength=num_classes))[:-1]
+  out_predictions = [
+      p.tolist() for p in np.split(sparse_predictions[order], splits)
+  ]
+  out_labels = [l.tolist() for l in np.split(sparse_labels[order], splits)]
+  out_true_positives = list(np.sum(labels, axis=0))
 
   return out_predictions, out_labels, out_true_positives
 
@@ -205,12 +239,13 @@ class EvaluationMetrics(object):
     mean_perr = calculate_precision_at_equal_recall_rate(predictions, labels)
 
     # Take the top 20 predictions.
-    sparse_predictions, sparse_labels, num_positives = top_k_by_class(
+    class_ids, sparse_predictions, sparse_labels = top_k_sparse(
         predictions, labels, self.top_k)
-    self.map_calculator.accumulate(sparse_predictions, sparse_labels,
-                                   num_positives)
-    self.global_ap_calculator.accumulate(
-        flatten(sparse_predictions), flatten(sparse_labels), sum(num_positives))
+    num_positives = np.sum(labels, axis=0)
+    self.map_calculator.accumulate_sparse(class_ids, sparse_predictions,
+                                          sparse_labels, num_positives)
+    self.global_ap_calculator.accumulate(sparse_predictions, sparse_labels,
+                                         np.sum(num_positives))
 
     self.num_examples += batch_size
     self.sum_hit_at_one += mean_hit_at_one * batch_size
@@ -256,6 +291,20 @@ class EvaluationMetrics(object):
 
     return epoch_info_dict
 
+  def merge(self, other):
+    """Merges the metrics accumulated by another EvaluationMetrics object.
+
+    This allows evaluating shards of the data on separate workers.
+
+    Args:
+      other: An EvaluationMetrics object with the same configuration.
+    """
+    self.sum_hit_at_one += other.sum_hit_at_one
+    self.sum_perr += other.sum_perr
+    self.map_calculator.merge(other.map_calculator)
+    self.global_ap_calculator.merge(other.global_ap_calculator)
+    self.num_examples += other.num_examples
+
   def clear(self):
     """Clear the evaluation metrics and reset the EvaluationMetrics object."""
     self.sum_hit_at_one = 0.0
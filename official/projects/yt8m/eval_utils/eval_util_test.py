@@ -17,6 +17,8 @@ from absl.testing import parameterized
 import numpy as np
 import tensorflow as tf
 
+from official.projects.yt8m.eval_utils import eval_util
+from official.projects.yt8m.eval_utils import mean_average_precision_calculator
 from official.projects.yt8m.eval_utils.average_precision_calculator import AveragePrecisionCalculator
 
 
@@ -66,6 +68,72 @@ class YT8MAveragePrecisionCalculatorTest(parameterized.TestCase,
       ap = calculator.ap_at_n(self.prediction[i], self.ground_truth[i], n)
       logging.info('DEBUG %dth AP: %r', i + 1, ap)
 
+  @parameterized.parameters((None,), (3,), (20,))
+  def test_ap_calculator_accumulate_matches_ap_at_n(self, n):
+    rng = np.random.RandomState(0)
+    predictions = rng.rand(50)
+    actuals = (rng.rand(50) < 0.3).astype(np.int64)
+
+    calculator = AveragePrecisionCalculator(n)
+    for start in range(0, 50, 7):
+      calculator.accumulate(predictions[start:start + 7],
+                            actuals[start:start + 7])
+
+    self.assertEqual(calculator.heap_size, 50 if n is None else n)
+    self.assertAllClose(
+        calculator.peek_ap_at_n(),
+        AveragePrecisionCalculator.ap_at_n(
+            predictions, actuals, n=n, total_num_positives=np.sum(actuals)))
+
+  @parameterized.parameters((None,), (4,))
+  def test_map_calculator_matches_ap_calculators(self, n):
+    rng = np.random.RandomState(1)
+    num_classes = 5
+    predictions = [rng.rand(rng.randint(0, 30)) for _ in range(num_classes)]
+    actuals = [(rng.rand(len(p)) < 0.4).astype(np.int64) for p in predictions]
+
+    calculator = mean_average_precision_calculator.MeanAveragePrecisionCalculator(
+        num_classes, filter_empty_classes=False, top_n=n)
+    calculator.accumulate(predictions, actuals)
+
+    expected_aps = []
+    for p, a in zip(predictions, actuals):
+      ap_calculator = AveragePrecisionCalculator(n)
+      ap_calculator.accumulate(p, a)
+      expected_aps.append(ap_calculator.peek_ap_at_n())
+    self.assertAllClose(calculator.peek_map_at_n(), expected_aps)
+
+  def test_evaluation_metrics_merge(self):
+    rng = np.random.RandomState(2)
+    num_classes = 10
+    metrics = eval_util.EvaluationMetrics(num_classes, top_k=3, top_n=None)
+    shard_metrics = [
+        eval_util.EvaluationMetrics(num_classes, top_k=3, top_n=None)
+        for _ in range(2)
+    ]
+    for i in range(4):
+      predictions = tf.constant(rng.rand(8, num_classes))
+      labels = tf.constant((rng.rand(8, num_classes) < 0.2).astype(np.int64))
+      metrics.accumulate(predictions=(predictions,), labels=(labels,))
+      shard_metrics[i % 2].accumulate(
+          predictions=(predictions,), labels=(labels,))
+    shard_metrics[0].merge(shard_metrics[1])
+
+    expected = metrics.get()
+    merged = shard_metrics[0].get()
+    for key in expected:
+      self.assertAllClose(merged[key], expected[key])
+
+  def test_calculate_precision_at_equal_recall_rate(self):
+    predictions = np.array([[0.9, 0.8, 0.1, 0.3], [0.2, 0.7, 0.6, 0.1],
+                            [0.5, 0.4, 0.3, 0.2]])
+    actuals = np.array([[1, 0, 0, 1], [0, 1, 0, 0], [0, 0, 0, 0]])
+    # Top 2 of the first video hit 1 label, top 1 of the second video hits 1
+    # label, and the third video has no labels.
+    self.assertAllClose(
+        eval_util.calculate_precision_at_equal_recall_rate(
+            predictions, actuals), (0.5 + 1.0 + 0.0) / 3)
+
 
 if __name__ == '__main__':
   tf.test.main()
@@ -59,13 +59,21 @@ class MeanAveragePrecisionCalculator(object):
     """
     if not isinstance(num_class, int) or num_class <= 1:
       raise ValueError("num_class must be a positive integer.")
+    if not ((isinstance(top_n, int) and top_n >= 0) or top_n is None):
+      raise ValueError("top_n must be a positive integer or None.")
 
-    self._ap_calculators = []  # member of AveragePrecisionCalculator
     self._num_class = num_class  # total number of classes
     self._filter_empty_classes = filter_empty_classes
-    for _ in range(num_class):
-      self._ap_calculators.append(
-          average_precision_calculator.AveragePrecisionCalculator(top_n=top_n))
+    self._top_n = top_n
+    # Predictions of all classes are kept in batches of flat (class id,
+    # prediction, actual) arrays. If top_n is set, they are compacted to the
+    # top_n predictions of each class once they hold more than
+    # 2 * top_n * num_class items.
+    self._class_ids = []
+    self._predictions = []
+    self._actuals = []
+    self._size = 0
+    self._num_positives = np.zeros([num_class])
 
   def accumulate(self, predictions, actuals, num_positives=None):
     """Accumulate the predictions and their ground truth labels.
@@ -86,18 +94,116 @@ class MeanAveragePrecisionCalculator(object):
     """
     if not num_positives:
       num_positives = [None for i in range(self._num_class)]
-
-    calculators = self._ap_calculators
+    num_positives = list(num_positives)
+
+    lengths = [len(p) for p in predictions[:self._num_class]]
+    if lengths != [len(a) for a in actuals[:self._num_class]]:
+      raise ValueError("the shape of predictions and actuals does not match.")
+    class_ids = np.repeat(np.arange(self._num_class), lengths)
+    predictions = np.concatenate(
+        [np.asarray(p, dtype=np.float64).reshape([-1])
+         for p in predictions[:self._num_class]])
+    actuals = np.concatenate(
+        [np.asarray(a, dtype=np.float64).reshape([-1])
+         for a in actuals[:self._num_class]])
+
+    inferred_num_positives = np.bincount(
+        class_ids, weights=actuals > 1e-5, minlength=self._num_class)
     for i in range(self._num_class):
-      calculators[i].accumulate(predictions[i], actuals[i], num_positives[i])
+      if num_positives[i] is None:
+        num_positives[i] = inferred_num_positives[i]
+      elif num_positives[i] < 0:
+        raise ValueError(
+            "'num_positives' was provided but it was a negative number.")
+    self.accumulate_sparse(class_ids, predictions, actuals, num_positives)
+
+  def accumulate_sparse(self, class_ids, predictions, actuals, num_positives):
+    """Accumulate a batch of predictions of any classes.
+
+    Args:
+      class_ids: A numpy 1-D integer array with the class of each prediction.
+      predictions: A numpy 1-D array storing the prediction scores.
+      actuals: A numpy 1-D array storing the ground truth labels. Any value
+        larger than 0 will be treated as positives, otherwise as negatives.
+      num_positives: A numpy 1-D array with the number of true positives of
+        each class.
+    """
+    self._num_positives += np.asarray(num_positives, dtype=np.float64)
+    if not len(class_ids):  # pylint: disable=g-explicit-length-test
+      return
+    self._class_ids.append(np.asarray(class_ids))
+    self._predictions.append(np.asarray(predictions))
+    self._actuals.append(np.asarray(actuals))
+    self._size += len(class_ids)
+    if (self._top_n is not None and
+        self._size > 2 * self._top_n * self._num_class):
+      self._compact()
+
+  def merge(self, other):
+    """Merges the predictions accumulated by another calculator.
+
+    Args:
+      other: A MeanAveragePrecisionCalculator with the same number of classes
+        and top_n, eg from another worker.
+
+    Raises:
+      ValueError: If the calculators are not compatible.
+    """
+    # pylint: disable=protected-access
+    if (other._num_class != self._num_class or other._top_n != self._top_n):
+      raise ValueError("Cannot merge calculators with different num_class or "
+                       "top_n.")
+    self.accumulate_sparse(*other._get_accumulated(),
+                           num_positives=other._num_positives)
+    # pylint: enable=protected-access
+
+  def _compact(self):
+    """Concatenates batches, keeping only the top_n predictions per class."""
+    class_ids = np.concatenate(self._class_ids)
+    predictions = np.concatenate(self._predictions)
+    actuals = np.concatenate(self._actuals)
+    if self._top_n is not None:
+      # Ranks predictions within each class; ties keep the earliest ones.
+      order = np.lexsort((-predictions, class_ids))
+      sorted_class_ids = class_ids[order]
+      class_starts = np.searchsorted(sorted_class_ids,
+                                     np.arange(self._num_class))
+      ranks = np.arange(order.size) - class_starts[sorted_class_ids]
+      keep = np.sort(order[ranks < self._top_n])
+      class_ids = class_ids[keep]
+      predictions = predictions[keep]
+      actuals = actuals[keep]
+    self._class_ids = [class_ids]
+    self._predictions = [predictions]
+    self._actuals = [actuals]
+    self._size = class_ids.size
+
+  def _get_accumulated(self):
+    if not self._size:
+      return np.zeros([0], np.int64), np.zeros([0]), np.zeros([0])
+    self._compact()
+    return self._class_ids[0], self._predictions[0], self._actuals[0]
+
+  def _class_aps(self):
+    """Returns the average precision at n of every class."""
+    class_ids, predictions, actuals = self._get_accumulated()
+    return average_precision_calculator.segment_ap_at_n(
+        class_ids,
+        predictions,
+        actuals,
+        num_segments=self._num_class,
+        num_positives=self._num_positives,
+        n=self._top_n)
 
   def clear(self):
-    for calculator in self._ap_calculators:
-      calculator.clear()
+    self._class_ids = []
+    self._predictions = []
+    self._actuals = []
+    self._size = 0
+    self._num_positives = np.zeros([self._num_class])
 
   def is_empty(self):
-    return ([calculator.heap_size for calculator in self._ap_calculators
-            ] == [0 for _ in range(self._num_class)])
+    return self._size == 0
 
   def peek_map_at_n(self):
     """Peek the non-interpolated mean average precision at n.
@@ -106,12 +212,11 @@ class MeanAveragePrecisionCalculator(object):
       An array of non-interpolated average precision at n (default 0) for each
       class.
     """
+    class_aps = self._class_aps()
     aps = []
     for i in range(self._num_class):
-      if (not self._filter_empty_classes or
-          self._ap_calculators[i].num_accumulated_positives > 0):
-        ap = self._ap_calculators[i].peek_ap_at_n()
-        aps.append(ap)
+      if not self._filter_empty_classes or self._num_positives[i] > 0:
+        aps.append(float(class_aps[i]))
     return aps
 
   def peek_log_weighted_map_at_n(self):
@@ -120,12 +225,13 @@ class MeanAveragePrecisionCalculator(object):
     Returns:
       Log weighted mean average precision.
     """
+    class_aps = self._class_aps()
     sum_log_weighted_ap = 0
     sum_log_weights = 0
     for i in range(self._num_class):
-      pos = self._ap_calculators[i].num_accumulated_positives
+      pos = self._num_positives[i]
       if not self._filter_empty_classes or pos > 0:
-        ap = self._ap_calculators[i].peek_ap_at_n()
+        ap = class_aps[i]
         # TODO(b/286928055)
         log_pos = np.log(1 + pos)
         sum_log_weights += log_pos
@@ -20,6 +20,7 @@ from __future__ import print_function
 
 import atexit
 import functools
+import mmap
 import os
 import sys
 import tempfile
@@ -55,12 +56,72 @@ Eval:
 {spacer}Batch count per epoch:   {eval_batch_ct}"""
 
 
+def _shared_array(shape, dtype):
+  """Allocates an array backed by anonymous shared memory.
+
+  The memory is shared with processes forked after the allocation, so workers
+  can write into the array without the results being pickled back. This relies
+  on the "fork" start method, which `popen_helper.get_forkpool` always uses.
+
+  Args:
+    shape: The shape of the array.
+    dtype: The dtype of the array.
+
+  Returns:
+    A NumPy array of zeros.
+  """
+  dtype = np.dtype(dtype)
+  size = int(np.prod(shape))
+  buffer = mmap.mmap(-1, max(size * dtype.itemsize, 1))
+  return np.frombuffer(buffer, dtype=dtype, count=size).reshape(shape)
+
+
+_WORKER_CONSTRUCTOR = None
+
+
+def _init_construction_worker(constructor):
+  global _WORKER_CONSTRUCTOR
+  _WORKER_CONSTRUCTOR = constructor
+
+
+def _fill_training_batches(args):
+  """Builds a range of training batches in a forked worker.
+
+  The batches are written into the shared epoch buffers of the constructor
+  which was passed to `_init_construction_worker`.
+
+  Args:
+    args: A size three tuple of the first batch index, the end batch index and
+      the random seed used for negative sampling in this range.
+  """
+  start, stop, seed = args
+  constructor = _WORKER_CONSTRUCTOR
+  # A local random state leaves the global one alone, which matters when the
+  # "worker" is the calling process itself (e.g. with a FauxPool).
+  random_state = np.random.RandomState(seed)  # pylint: disable=no-member
+  # pylint: disable=protected-access
+  users_buffer, items_buffer, labels_buffer = constructor._epoch_buffers
+  for i in range(start, stop):
+    users, items, labels, _ = constructor._make_training_batch(
+        i, random_state=random_state)
+    users_buffer[i] = users
+    items_buffer[i] = items
+    labels_buffer[i] = labels
+  # pylint: enable=protected-access
+
+
 class DatasetManager(object):
   """Helper class for handling TensorFlow specific data tasks.
 
   This class takes the (relatively) framework agnostic work done by the data
   constructor classes and handles the TensorFlow specific portions (TFRecord
   management, tf.Dataset creation, etc.).
+
+  Batches can be handed to `tf.data` in three ways: through an in-memory queue
+  and `Dataset.from_generator`, as serialized `tf.train.Example` file shards
+  (stream_files=True), or as raw fixed width arrays in memory-mapped .npy files
+  which are read batch by batch through `Dataset.from_generator` without any
+  protobuf encoding (memmap_files=True).
   """
 
   def __init__(self,
@@ -69,8 +130,9 @@ class DatasetManager(object):
                batches_per_epoch,
                shard_root=None,
                deterministic=False,
-               num_train_epochs=None):
-    # type: (bool, bool, int, typing.Optional[str], bool, int) -> None
+               num_train_epochs=None,
+               memmap_files=False):
+    # type: (bool, bool, int, typing.Optional[str], bool, int, bool) -> None
     """Constructs a `DatasetManager` instance.
 
     Args:
@@ -85,10 +147,16 @@ class DatasetManager(object):
       deterministic: Forgo non-deterministic speedups. (i.e. sloppy=True)
       num_train_epochs: Number of epochs to generate. If None, then each call to
         `get_dataset()` increments the number of epochs requested.
+      memmap_files: Boolean indicating whether each epoch should be written as
+        memory-mapped NumPy arrays under shard_root, which must be a local
+        directory. Ignored if stream_files=True.
     """
     self._is_training = is_training
     self._deterministic = deterministic
     self._stream_files = stream_files
+    self._memmap_files = memmap_files and not stream_files
+    self._memmap_arrays = {}
+    self._memmap_lock = threading.Lock()
     self._writers = []
     self._write_locks = [
         threading.RLock() for _ in range(rconst.NUM_FILE_SHARDS)
@@ -200,6 +268,47 @@ class DatasetManager(object):
               labels
       }
 
+  def _memmap_keys(self):
+    if self._is_training:
+      return [
+          movielens.USER_COLUMN, movielens.ITEM_COLUMN, rconst.VALID_POINT_MASK,
+          "labels"
+      ]
+    return [movielens.USER_COLUMN, movielens.ITEM_COLUMN, rconst.DUPLICATE_MASK]
+
+  def _write_memmap_batch(self, index, data):
+    """Write a batch into row `index` of the memory-mapped epoch arrays."""
+    with self._memmap_lock:
+      if not self._memmap_arrays:
+        # The arrays are created from the first batch so that their dtypes and
+        # shapes are taken from the data.
+        for key in self._memmap_keys():
+          self._memmap_arrays[key] = np.lib.format.open_memmap(
+              os.path.join(self.current_data_root, key + ".npy"),
+              mode="w+",
+              dtype=data[key].dtype,
+              shape=(self._batches_per_epoch,) + data[key].shape)
+
+    for key, array in self._memmap_arrays.items():
+      array[index] = data[key]
+
+  def _load_memmap_epoch(self, epoch_data_dir, batch_size):
+    """Memory-map the arrays of an epoch written by `_write_memmap_batch`."""
+    data = {}
+    for key in self._memmap_keys():
+      data[key] = np.load(
+          os.path.join(epoch_data_dir, key + ".npy"), mmap_mode="r")
+      if data[key].shape[1] != batch_size:
+        raise ValueError("Stored batch size ({}) differs from requested batch "
+                         "size ({})".format(data[key].shape[1], batch_size))
+    return data
+
+  @staticmethod
+  def _split_labels(data):
+    features = dict(data)
+    labels = features.pop("labels")
+    return features, labels
+
   def put(self, index, data):
     # type: (int, dict) -> None
     """Store data for later consumption.
@@ -225,6 +334,9 @@ class DatasetManager(object):
       with self._write_locks[index % rconst.NUM_FILE_SHARDS]:
         self._writers[index % rconst.NUM_FILE_SHARDS].write(example_bytes)
 
+    elif self._memmap_files:
+      self._write_memmap_batch(index, data)
+
     else:
       self._result_queue.put((
           data, data.pop("labels")) if self._is_training else data)
@@ -237,6 +349,8 @@ class DatasetManager(object):
           tf.io.TFRecordWriter(template.format(i))
           for i in range(rconst.NUM_FILE_SHARDS)
       ]
+    elif self._memmap_files:
+      tf.io.gfile.makedirs(self.current_data_root)
 
   def end_construction(self):
     if self._stream_files:
@@ -244,6 +358,12 @@ class DatasetManager(object):
       self._writers = []
       self._result_queue.put(self.current_data_root)
 
+    elif self._memmap_files:
+      for array in self._memmap_arrays.values():
+        array.flush()
+      self._memmap_arrays = {}
+      self._result_queue.put(self.current_data_root)
+
     self._epochs_completed += 1
 
   def data_generator(self, epochs_between_evals):
@@ -268,20 +388,50 @@ class DatasetManager(object):
           self._result_reuse.append(result)
           yield result
 
+  def memmap_data_generator(self, batch_size, epochs_between_evals):
+    """Yields batches read from memory-mapped epochs during local training.
+
+    Only the batch being yielded is read from disk. Training epochs are deleted
+    once they have been consumed, while the eval epoch is reused.
+
+    Args:
+      batch_size: The expected batch size of the stored epochs.
+      epochs_between_evals: How many epochs worth of data to yield.
+    """
+    assert self._memmap_files
+    assert self._is_training or epochs_between_evals == 1
+
+    for _ in range(epochs_between_evals):
+      epoch_data_dir = self._result_queue.get(timeout=300)
+      if not self._is_training:
+        self._result_queue.put(epoch_data_dir)  # Eval data is reused.
+
+      data = self._load_memmap_epoch(epoch_data_dir, batch_size)
+      for i in range(self._batches_per_epoch):
+        # Copy the row so that no reference to the mapping outlives the epoch.
+        batch = {key: np.array(array[i]) for key, array in data.items()}
+        yield self._split_labels(batch) if self._is_training else batch
+
+      if self._is_training:
+        data = None
+        tf.io.gfile.rmtree(epoch_data_dir)
+
   def increment_request_epoch(self):
     self._epochs_requested += 1
 
   def get_dataset(self, batch_size, epochs_between_evals):
     """Construct the dataset to be used for training and eval.
 
-    For local training, data is provided through Dataset.from_generator. For
-    remote training (TPUs) the data is first serialized to files and then sent
-    to the TPU through a StreamingFilesDataset.
+    For local training, data is provided through Dataset.from_generator, either
+    from the in-memory queue or read one batch at a time from memory-mapped
+    arrays if memmap_files=True. For remote training (TPUs) the data is first
+    serialized to files and then sent to the TPU through a
+    StreamingFilesDataset.
 
     Args:
       batch_size: The per-replica batch size of the dataset.
       epochs_between_evals: How many epochs worth of data to yield. (Generator
-        mode only.)
+        and memmap modes only.)
     """
     self.increment_request_epoch()
     if self._stream_files:
@@ -327,8 +477,14 @@ class DatasetManager(object):
         types[rconst.DUPLICATE_MASK] = bool
         shapes[rconst.DUPLICATE_MASK] = tf.TensorShape([batch_size, 1])
 
-      data_generator = functools.partial(
-          self.data_generator, epochs_between_evals=epochs_between_evals)
+      if self._memmap_files:
+        data_generator = functools.partial(
+            self.memmap_data_generator,
+            batch_size=batch_size,
+            epochs_between_evals=epochs_between_evals)
+      else:
+        data_generator = functools.partial(
+            self.data_generator, epochs_between_evals=epochs_between_evals)
       dataset = tf.data.Dataset.from_generator(
           generator=data_generator, output_types=types, output_shapes=shapes)
 
@@ -389,7 +545,9 @@ class BaseDataConstructor(threading.Thread):
       deterministic=False,  # type: bool
       epoch_dir=None,  # type: str
       num_train_epochs=None,  # type: int
-      create_data_offline=False  # type: bool
+      create_data_offline=False,  # type: bool
+      num_train_workers=None,  # type: int
+      memmap_files=False  # type: bool
   ):
     # General constants
     self._maximum_number_epochs = maximum_number_epochs
@@ -407,6 +565,7 @@ class BaseDataConstructor(threading.Thread):
     self.eval_batch_size = eval_batch_size
     self.num_train_epochs = num_train_epochs
     self.create_data_offline = create_data_offline
+    self._num_train_workers = num_train_workers
 
     # Training
     if self._train_pos_users.shape != self._train_pos_items.shape:
@@ -432,10 +591,11 @@ class BaseDataConstructor(threading.Thread):
 
     # Intermediate artifacts
     self._current_epoch_order = np.empty(shape=(0,))
+    self._epoch_buffers = None
     self._shuffle_iterator = None
 
     self._shuffle_with_forkpool = not stream_files
-    if stream_files:
+    if stream_files or memmap_files:
       self._shard_root = epoch_dir or tempfile.mkdtemp(prefix="ncf_")
       if not create_data_offline:
         atexit.register(tf.io.gfile.rmtree, self._shard_root)
@@ -445,11 +605,11 @@ class BaseDataConstructor(threading.Thread):
     self._train_dataset = DatasetManager(True, stream_files,
                                          self.train_batches_per_epoch,
                                          self._shard_root, deterministic,
-                                         num_train_epochs)
+                                         num_train_epochs, memmap_files)
     self._eval_dataset = DatasetManager(False, stream_files,
                                         self.eval_batches_per_epoch,
                                         self._shard_root, deterministic,
-                                        num_train_epochs)
+                                        num_train_epochs, memmap_files)
 
     # Threading details
     super(BaseDataConstructor, self).__init__()
@@ -523,12 +683,17 @@ class BaseDataConstructor(threading.Thread):
     imap = pool.imap if self.deterministic else pool.imap_unordered
     self._shuffle_iterator = imap(stat_utils.permutation, args)
 
-  def _get_training_batch(self, i):
-    """Construct a single batch of training data.
+  def _make_training_batch(self, i, random_state=None):
+    """Sample a single padded batch of training data.
 
     Args:
-      i: The index of the batch. This is used when stream_files=True to assign
-        data to file shards.
+      i: The index of the batch within the current epoch order.
+      random_state: An optional `np.random.RandomState` used to sample the
+        negatives. Defaults to the global NumPy random state.
+
+    Returns:
+      Users, items and labels arrays of length train_batch_size, and the number
+      of elements in the batch which are not padding.
     """
     batch_indices = self._current_epoch_order[i *
                                               self.train_batch_size:(i + 1) *
@@ -541,7 +706,8 @@ class BaseDataConstructor(threading.Thread):
     negative_indices = np.greater_equal(batch_indices, self._train_pos_count)
     negative_users = users[negative_indices]
 
-    negative_items = self.lookup_negative_items(negative_users=negative_users)
+    negative_items = self.lookup_negative_items(
+        negative_users=negative_users, random_state=random_state)
 
     items = self._train_pos_items[batch_ind_mod]
     items[negative_indices] = negative_items
@@ -561,6 +727,19 @@ class BaseDataConstructor(threading.Thread):
       items = np.concatenate([items, item_pad])
       labels = np.concatenate([labels, label_pad])
 
+    return users, items, labels, mask_start_index
+
+  def _get_training_batch(self, i):
+    """Construct a single batch of training data.
+
+    Args:
+      i: The index of the batch. This is used when stream_files=True to assign
+        data to file shards.
+    """
+    users, items, labels, mask_start_index = self._make_training_batch(i)
+    self._put_training_batch(i, users, items, labels, mask_start_index)
+
+  def _put_training_batch(self, i, users, items, labels, mask_start_index):
     self._train_dataset.put(
         i, {
             movielens.USER_COLUMN:
@@ -592,19 +771,55 @@ class BaseDataConstructor(threading.Thread):
       return
 
     self._train_dataset.start_construction()
-    map_args = list(range(self.train_batches_per_epoch))
     self._current_epoch_order = next(self._shuffle_iterator)
 
-    get_pool = (
-        popen_helper.get_fauxpool
-        if self.deterministic else popen_helper.get_threadpool)
-    with get_pool(6) as pool:
-      pool.map(self._get_training_batch, map_args)
+    if self._num_train_workers:
+      self._construct_training_epoch_with_processes()
+    else:
+      map_args = list(range(self.train_batches_per_epoch))
+      get_pool = (
+          popen_helper.get_fauxpool
+          if self.deterministic else popen_helper.get_threadpool)
+      with get_pool(6) as pool:
+        pool.map(self._get_training_batch, map_args)
     self._train_dataset.end_construction()
 
     logging.info("Epoch construction complete. Time: {:.1f} seconds".format(
         timeit.default_timer() - start_time))
 
+  def _construct_training_epoch_with_processes(self):
+    """Build the batches of an epoch in forked workers.
+
+    Workers sample negatives for disjoint ranges of batches and write them into
+    shared memory buffers, which are then handed to the dataset manager in
+    order. Each range uses its own seed drawn here, so the output does not
+    depend on how the ranges are scheduled.
+    """
+    shape = (self.train_batches_per_epoch, self.train_batch_size)
+    self._epoch_buffers = (_shared_array(shape, rconst.USER_DTYPE),
+                           _shared_array(shape, rconst.ITEM_DTYPE),
+                           _shared_array(shape, bool))
+
+    num_ranges = min(self._num_train_workers * 4, self.train_batches_per_epoch)
+    bounds = np.linspace(
+        0, self.train_batches_per_epoch, num_ranges + 1).astype(np.int64)
+    map_args = [(bounds[j], bounds[j + 1], stat_utils.random_int32())
+                for j in range(num_ranges)]
+    with popen_helper.get_forkpool(
+        self._num_train_workers,
+        init_worker=functools.partial(_init_construction_worker,
+                                      self)) as pool:
+      pool.map(_fill_training_batches, map_args)
+
+    users_buffer, items_buffer, labels_buffer = self._epoch_buffers
+    self._epoch_buffers = None
+    for i in range(self.train_batches_per_epoch):
+      mask_start_index = min(
+          max(self._elements_in_epoch - i * self.train_batch_size, 0),
+          self.train_batch_size)
+      self._put_training_batch(i, users_buffer[i], items_buffer[i],
+                               labels_buffer[i], mask_start_index)
+
   @staticmethod
   def _assemble_eval_batch(users, positive_items, negative_items,
                            users_per_batch):
@@ -857,9 +1072,10 @@ class MaterializedDataConstructor(BaseDataConstructor):
     logging.info("Negative sample table built. Time: {:.1f} seconds".format(
         timeit.default_timer() - start_time))
 
-  def lookup_negative_items(self, negative_users, **kwargs):
+  def lookup_negative_items(self, negative_users, random_state=None,
+                            **kwargs):
     negative_item_choice = stat_utils.very_slightly_biased_randint(
-        self._per_user_neg_count[negative_users])
+        self._per_user_neg_count[negative_users], random_state=random_state)
     return self._negative_table[negative_users, negative_item_choice]
 
 
@@ -879,15 +1095,6 @@ class BisectionDataConstructor(BaseDataConstructor):
     self._sorted_train_pos_items = None
     self._total_negatives = None
 
-  def _index_segment(self, user):
-    lower, upper = self.index_bounds[user:user + 2]
-    items = self._sorted_train_pos_items[lower:upper]
-
-    negatives_since_last_positive = np.concatenate(
-        [items[0][np.newaxis], items[1:] - items[:-1] - 1])
-
-    return np.cumsum(negatives_since_last_positive)
-
   def construct_lookup_variables(self):
     start_time = timeit.default_timer()
     inner_bounds = np.argwhere(self._train_pos_users[1:] -
@@ -899,19 +1106,24 @@ class BisectionDataConstructor(BaseDataConstructor):
     assert np.array_equal(self._train_pos_users[self.index_bounds[:-1]],
                           np.arange(self._num_users))
 
-    self._sorted_train_pos_items = self._train_pos_items.copy()
-
-    for i in range(self._num_users):
-      lower, upper = self.index_bounds[i:i + 2]
-      self._sorted_train_pos_items[lower:upper].sort()
+    # Sort the items within each user segment. Since the users are already in
+    # ascending order a single lexsort keeps the segments in place.
+    self._sorted_train_pos_items = self._train_pos_items[np.lexsort(
+        (self._train_pos_items, self._train_pos_users))]
 
-    self._total_negatives = np.concatenate(
-        [self._index_segment(i) for i in range(self._num_users)])
+    # The number of negatives before the kth positive of a user is the item id
+    # minus the k positives which precede it.
+    position_in_segment = (
+        np.arange(upper_bound) -
+        np.repeat(self.index_bounds[:-1], np.diff(self.index_bounds)))
+    self._total_negatives = (
+        self._sorted_train_pos_items.astype(np.int64) - position_in_segment)
 
     logging.info("Negative total vector built. Time: {:.1f} seconds".format(
         timeit.default_timer() - start_time))
 
-  def lookup_negative_items(self, negative_users, **kwargs):
+  def lookup_negative_items(self, negative_users, random_state=None,
+                            **kwargs):
     output = np.zeros(shape=negative_users.shape, dtype=rconst.ITEM_DTYPE) - 1
 
     left_index = self.index_bounds[negative_users]
@@ -919,7 +1131,8 @@ class BisectionDataConstructor(BaseDataConstructor):
 
     num_positives = right_index - left_index + 1
     num_negatives = self._num_items - num_positives
-    neg_item_choice = stat_utils.very_slightly_biased_randint(num_negatives)
+    neg_item_choice = stat_utils.very_slightly_biased_randint(
+        num_negatives, random_state=random_state)
 
     # Shortcuts:
     # For points where the negative is greater than or equal to the tally before
@@ -205,8 +205,9 @@ def instantiate_pipeline(dataset,
                          constructor_type=None,
                          deterministic=False,
                          epoch_dir=None,
-                         generate_data_offline=False):
-  # type: (str, str, dict, typing.Optional[str], bool, typing.Optional[str], bool) -> (int, int, data_pipeline.BaseDataConstructor)
+                         generate_data_offline=False,
+                         num_train_workers=None):
+  # type: (str, str, dict, typing.Optional[str], bool, typing.Optional[str], bool, typing.Optional[int]) -> (int, int, data_pipeline.BaseDataConstructor)
   """Load and digest data CSV into a usable form.
 
   Args:
@@ -219,6 +220,8 @@ def instantiate_pipeline(dataset,
     epoch_dir: Directory in which to store the training epochs.
     generate_data_offline: Boolean, whether current pipeline is done offline or
       while training.
+    num_train_workers: Number of processes used to construct each training
+      epoch. If None or 0, training batches are constructed with threads.
   """
   logging.info("Beginning data preprocessing.")
 
@@ -253,9 +256,11 @@ def instantiate_pipeline(dataset,
       eval_batch_size=params["eval_batch_size"],
       batches_per_eval_step=params["batches_per_step"],
       stream_files=params["stream_files"],
+      memmap_files=params.get("memmap_files", False),
       deterministic=deterministic,
       epoch_dir=epoch_dir,
-      create_data_offline=generate_data_offline)
+      create_data_offline=generate_data_offline,
+      num_train_workers=num_train_workers)
 
   run_time = timeit.default_timer() - st
   logging.info(
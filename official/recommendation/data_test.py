@@ -32,6 +32,7 @@ from official.recommendation import constants as rconst
 from official.recommendation import data_preprocessing
 from official.recommendation import movielens
 from official.recommendation import popen_helper
+from official.recommendation import stat_utils
 
 DATASET = "ml-test"
 NUM_USERS = 1000
@@ -50,6 +51,11 @@ def mock_download(*args, **kwargs):
   return
 
 
+# Kept so that tests can build an epoch with real worker processes outside of
+# the producer thread.
+_GET_FORKPOOL = popen_helper.get_forkpool
+
+
 # The forkpool used by data producers interacts badly with the threading
 # used by TestCase. Without this patch tests will hang, and no amount
 # of diligent closing and joining within the producer will prevent it.
@@ -132,8 +138,9 @@ class BaseTest(tf.test.TestCase):
           break
     return output
 
-  def _test_end_to_end(self, constructor_type):
+  def _test_end_to_end(self, constructor_type, memmap_files=False):
     params = self.make_params(train_epochs=1)
+    params["memmap_files"] = memmap_files
     _, _, producer = data_preprocessing.instantiate_pipeline(
         dataset=DATASET,
         data_dir=self.temp_data_dir,
@@ -157,6 +164,10 @@ class BaseTest(tf.test.TestCase):
       dataset = input_fn(params)
 
     first_epoch = self.drain_dataset(dataset=dataset, g=g)
+    if memmap_files:
+      # Memory-mapped training epochs are deleted once they are consumed.
+      self.assertFalse(tf.io.gfile.exists(os.path.join(
+          producer._shard_root, rconst.TRAIN_FOLDER_TEMPLATE.format(0))))
 
     counts = defaultdict(int)
     train_examples = {
@@ -343,12 +354,115 @@ class BaseTest(tf.test.TestCase):
 
       self.assertLess(deviation, 0.2)
 
+  def _test_training_epoch_with_processes(self, constructor_type):
+    params = self.make_params(train_epochs=1)
+    _, _, producer = data_preprocessing.instantiate_pipeline(
+        dataset=DATASET,
+        data_dir=self.temp_data_dir,
+        params=params,
+        constructor_type=constructor_type,
+        deterministic=True,
+        num_train_workers=2)
+
+    producer.start()
+    producer.join()
+    assert producer._fatal_exception is None
+
+    user_inv_map = {v: k for k, v in producer.user_map.items()}
+    item_inv_map = {v: k for k, v in producer.item_map.items()}
+
+    g = tf.Graph()
+    with g.as_default():
+      input_fn = producer.make_input_fn(is_training=True)
+      dataset = input_fn(params)
+
+    positive_counts = defaultdict(int)
+    num_points = 0
+    for features, labels in self.drain_dataset(dataset=dataset, g=g):
+      data_list = [
+          features[movielens.USER_COLUMN].flatten(),
+          features[movielens.ITEM_COLUMN].flatten(),
+          features[rconst.VALID_POINT_MASK].flatten(),
+          labels.flatten()
+      ]
+      for u, i, v, l in zip(*data_list):
+        if not v:
+          continue  # ignore padding
+
+        num_points += 1
+        u_raw = user_inv_map[u]
+        i_raw = item_inv_map[i]
+        if l:
+          positive_counts[(u_raw, i_raw)] += 1
+        elif (u_raw, i_raw) in self.seen_pairs:
+          # The evaluation item can appear as a negative example.
+          self.assertEqual(i_raw, self.holdout[u_raw][1])
+
+    num_positives = producer._train_pos_users.shape[0]
+    self.assertEqual(num_points, num_positives * (1 + NUM_NEG))
+    self.assertLen(positive_counts, num_positives)
+    self.assertAllEqual(list(positive_counts.values()), [1] * num_positives)
+
+  def test_training_epoch_with_processes_materialized(self):
+    self._test_training_epoch_with_processes("materialized")
+
+  def test_training_epoch_with_processes_bisection(self):
+    self._test_training_epoch_with_processes("bisection")
+
+  def _construct_epoch_with_processes(self, seed):
+    """Builds one training epoch with workers on the calling thread."""
+    params = self.make_params(train_epochs=1)
+    _, _, producer = data_preprocessing.instantiate_pipeline(
+        dataset=DATASET,
+        data_dir=self.temp_data_dir,
+        params=params,
+        constructor_type="bisection",
+        deterministic=True,
+        num_train_workers=2)
+    producer.construct_lookup_variables()
+    producer._current_epoch_order = np.arange(
+        producer._elements_in_epoch, dtype=np.int32)
+
+    # The per range seeds are drawn from the global random state.
+    np.random.seed(seed)
+    producer._construct_training_epoch_with_processes()
+    result_queue = producer._train_dataset._result_queue
+    return producer, [result_queue.get_nowait()
+                      for _ in range(producer.train_batches_per_epoch)]
+
+  def test_training_epoch_with_real_processes(self):
+    _, expected = self._construct_epoch_with_processes(seed=1)
+    with mock.patch.object(popen_helper, "get_forkpool", _GET_FORKPOOL):
+      _, actual = self._construct_epoch_with_processes(seed=1)
+
+    self.assertLen(actual, len(expected))
+    for (features, labels), (expected_features, expected_labels) in zip(
+        actual, expected):
+      self.assertAllEqual(labels, expected_labels)
+      for key, value in expected_features.items():
+        self.assertAllEqual(features[key], value)
+
+  def test_training_epoch_with_processes_keeps_global_random_state(self):
+    producer, _ = self._construct_epoch_with_processes(seed=1)
+    next_value = np.random.randint(1 << 30)
+
+    # Negative sampling must not touch the global random state, which only
+    # advances by the per range seeds.
+    num_ranges = min(2 * 4, producer.train_batches_per_epoch)
+    np.random.seed(1)
+    for _ in range(num_ranges):
+      stat_utils.random_int32()
+    self.assertEqual(next_value, np.random.randint(1 << 30))
+
   def test_end_to_end_materialized(self):
     self._test_end_to_end("materialized")
 
   def test_end_to_end_bisection(self):
     self._test_end_to_end("bisection")
 
+  def test_end_to_end_bisection_memmap(self):
+    self._test_end_to_end("bisection", memmap_files=True)
+
   def test_fresh_randomness_materialized(self):
     self._test_fresh_randomness("materialized")
 
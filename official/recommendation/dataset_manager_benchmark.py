@@ -0,0 +1,123 @@
+# Copyright 2023 The TensorFlow Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+r"""Benchmarks the storage modes of the NCF `DatasetManager`.
+
+Random training batches are put into a `DatasetManager` using the in-memory
+queue, serialized TFRecord shards and memory-mapped arrays, and the resulting
+`tf.data` pipelines are drained. The examples/sec of writing and of reading
+each epoch are reported.
+
+Example usage:
+    python dataset_manager_benchmark.py --num_batches=200 --batch_size=99000
+"""
+
+import os
+import tempfile
+import time
+
+from absl import app
+from absl import flags
+from absl import logging
+import numpy as np
+import tensorflow as tf
+
+from official.recommendation import constants as rconst
+from official.recommendation import data_pipeline
+from official.recommendation import movielens
+
+flags.DEFINE_integer('num_batches', 100, 'Number of batches in an epoch.')
+flags.DEFINE_integer('batch_size', 99000, 'Number of examples in a batch.')
+flags.DEFINE_integer('num_users', 138493, 'Number of synthetic users.')
+flags.DEFINE_integer('num_items', 26744, 'Number of synthetic items.')
+flags.DEFINE_integer('seed', 0, 'Random seed of the synthetic data.')
+
+FLAGS = flags.FLAGS
+
+
+def _random_batches():
+  """Creates random training batches in the format of the data constructors."""
+  rng = np.random.RandomState(FLAGS.seed)
+  shape = (FLAGS.batch_size, 1)
+  batches = []
+  for _ in range(FLAGS.num_batches):
+    batches.append({
+        movielens.USER_COLUMN:
+            rng.randint(FLAGS.num_users, size=shape).astype(rconst.USER_DTYPE),
+        movielens.ITEM_COLUMN:
+            rng.randint(FLAGS.num_items, size=shape).astype(rconst.ITEM_DTYPE),
+        rconst.MASK_START_INDEX:
+            np.array(FLAGS.batch_size, dtype=np.int32),
+        'labels':
+            rng.rand(*shape) < 0.2,
+    })
+  return batches
+
+
+def _run(batches, stream_files, memmap_files):
+  """Writes and reads back one epoch and returns both wall times."""
+  shard_root = tempfile.mkdtemp(prefix='ncf_benchmark_')
+  dataset_manager = data_pipeline.DatasetManager(
+      is_training=True,
+      stream_files=stream_files,
+      batches_per_epoch=len(batches),
+      shard_root=shard_root,
+      num_train_epochs=1,
+      memmap_files=memmap_files)
+
+  start = time.time()
+  dataset_manager.start_construction()
+  epoch_data_dir = dataset_manager.current_data_root
+  for i, batch in enumerate(batches):
+    dataset_manager.put(i, dict(batch))
+  dataset_manager.end_construction()
+  write_time = time.time() - start
+
+  start = time.time()
+  if stream_files:
+    # StreamingFilesDataset reads on a TPU worker, so the shards are parsed on
+    # the local host with the same deserialization instead.
+    dataset = tf.data.TFRecordDataset(
+        tf.io.gfile.glob(
+            os.path.join(epoch_data_dir, rconst.SHARD_TEMPLATE.format('*'))),
+        num_parallel_reads=rconst.NUM_FILE_SHARDS)
+    dataset = dataset.map(
+        lambda x: dataset_manager.deserialize(x, FLAGS.batch_size),
+        num_parallel_calls=16).prefetch(16)
+  else:
+    dataset = dataset_manager.get_dataset(
+        batch_size=FLAGS.batch_size, epochs_between_evals=1)
+  for _ in dataset:
+    pass
+  read_time = time.time() - start
+  tf.io.gfile.rmtree(shard_root)
+  return write_time, read_time
+
+
+def main(_):
+  batches = _random_batches()
+  num_examples = FLAGS.num_batches * FLAGS.batch_size
+  logging.info('Benchmarking %d batches of %d examples.', FLAGS.num_batches,
+               FLAGS.batch_size)
+
+  for name, stream_files, memmap_files in [('queue', False, False),
+                                           ('tfrecord', True, False),
+                                           ('memmap', False, True)]:
+    write_time, read_time = _run(batches, stream_files, memmap_files)
+    logging.info('%s: write %.0f examples/sec, read %.0f examples/sec', name,
+                 num_examples / write_time, num_examples / read_time)
+
+
+if __name__ == '__main__':
+  app.run(main)
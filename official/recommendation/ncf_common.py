@@ -56,7 +56,8 @@ def get_inputs(params):
         data_dir=FLAGS.data_dir,
         params=params,
         constructor_type=FLAGS.constructor_type,
-        deterministic=FLAGS.seed is not None)
+        deterministic=FLAGS.seed is not None,
+        num_train_workers=FLAGS.num_train_workers)
     num_train_steps = producer.train_batches_per_epoch
     num_eval_steps = producer.eval_batches_per_epoch
 
@@ -96,6 +97,7 @@ def parse_flags(flags_obj):
       "keras_use_ctl": flags_obj.keras_use_ctl,
       "hr_threshold": flags_obj.hr_threshold,
       "stream_files": flags_obj.tpu is not None,
+      "memmap_files": flags_obj.use_memmap_files,
       "train_dataset_path": flags_obj.train_dataset_path,
       "eval_dataset_path": flags_obj.eval_dataset_path,
       "input_meta_data_path": flags_obj.input_meta_data_path,
@@ -270,6 +272,23 @@ def define_ncf_flags():
           "precompute that scales badly, but a faster per-epoch construction"
           "time and can be faster on very large systems."))
 
+  flags.DEFINE_integer(
+      name="num_train_workers",
+      default=0,
+      help=flags_core.help_wrap(
+          "Number of processes used to construct training epochs. Workers "
+          "write the batches into shared memory. If 0, training batches are "
+          "constructed by a thread pool."))
+
+  flags.DEFINE_bool(
+      name="use_memmap_files",
+      default=False,
+      help=flags_core.help_wrap(
+          "If True, constructed epochs are written as memory-mapped NumPy "
+          "arrays and streamed to tf.data one batch at a time, instead of "
+          "being passed through an in-memory queue. Training epochs are "
+          "deleted once consumed. Ignored when training on TPUs."))
+
   flags.DEFINE_string(
       name="train_dataset_path",
       default=None,
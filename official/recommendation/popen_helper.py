@@ -20,7 +20,11 @@ import multiprocessing.pool
 
 
 def get_forkpool(num_workers, init_worker=None, closing=True):
-  pool = multiprocessing.Pool(processes=num_workers, initializer=init_worker)
+  # Callers rely on workers inheriting state (e.g. anonymous shared memory and
+  # unpicklable initializers), so the start method is pinned to "fork" rather
+  # than left to the platform default.
+  pool = multiprocessing.get_context("fork").Pool(
+      processes=num_workers, initializer=init_worker)
   return contextlib.closing(pool) if closing else pool
 
 
@@ -37,7 +41,9 @@ class FauxPool(object):
   for testing or debugging.
   """
   def __init__(self, *args, **kwargs):
-    pass
+    initializer = kwargs.get("initializer")
+    if initializer is not None:
+      initializer()
 
   def map(self, func, iterable, chunksize=None):
     return [func(i) for i in iterable]
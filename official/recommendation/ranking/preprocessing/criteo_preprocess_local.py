@@ -0,0 +1,554 @@
+# Copyright 2023 The TensorFlow Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Single host multiprocess preprocessing pipeline for Criteo data.
+
+This is a local alternative to `criteo_preprocess.py` which does not depend on
+Apache Beam or TensorFlow Transform. It applies the same transformations:
+1. Fill missing features with zeros.
+2. Set negative integer features to zeros.
+3. Normalize integer features using log(x+1).
+4. For categorical features (hex), convert to integer and take value modulus the
+   max_vocab_size value.
+5. Map categorical features to their index in the vocabulary, ordered by
+   descending frequency. Values missing from the vocabulary are set to -1.
+
+The input TSV files are split into byte ranges which are streamed by a pool of
+worker processes in chunks, and each chunk is transformed with vectorized NumPy
+operations. Vocabularies are counted exactly in parallel and written to the
+same location as `criteo_preprocess.py`, so either script can be used for
+either pass.
+
+Unless vocab_gen_mode is set, the output is written directly to
+num_output_files shards of roughly equal size, which makes a separate
+`shard_rebalancer.py` pass unnecessary. Uncompressed inputs are split into one
+byte range per output shard. Compressed inputs cannot be split, so each input
+file is written round-robin to a number of shards proportional to its size.
+
+Usage:
+For raw Criteo data, this script should be run twice.
+First run should set vocab_gen_mode to true.  This run is used to generate
+  vocabulary files in the temp_dir location.
+Second run should set vocab_gen_mode to false.  It is necessary to point to the
+  same temp_dir used during the first run.
+"""
+
+import argparse
+import functools
+import gzip
+import itertools
+import multiprocessing
+import os
+
+from absl import logging
+import numpy as np
+import tensorflow as tf
+
+
+NUM_NUMERIC_FEATURES = 13
+NUM_CATEGORICAL_FEATURES = 26
+NUM_COLUMNS = 1 + NUM_NUMERIC_FEATURES + NUM_CATEGORICAL_FEATURES
+
+_COMPRESSED_SUFFIXES = (".gz",)
+# Parsing a chunk takes several times its size in memory.
+_DEFAULT_CHUNK_SIZE = 4 * 1024 * 1024
+# Lookup table from ASCII hexadecimal digits to their values. Other characters,
+# including the padding of fixed width byte strings, map to -1.
+_HEX_VALUES = np.full(256, -1, dtype=np.int64)
+for _i, _c in enumerate(b"0123456789abcdef"):
+  _HEX_VALUES[_c] = _i
+for _i, _c in enumerate(b"ABCDEF"):
+  _HEX_VALUES[_c] = 10 + _i
+
+# The vocabularies of the worker processes, set by `_init_worker`.
+_WORKER_VOCABS = None
+
+
+def _vocab_path(temp_dir, idx):
+  return os.path.join(temp_dir, "tftransform_tmp",
+                      "feature_{}_vocab".format(idx))
+
+
+def _output_path(output_path, shard, num_shards):
+  return "{}-{:05d}-of-{:05d}".format(output_path, shard, num_shards)
+
+
+def plan_tasks(input_files, num_output_files, vocab_gen_mode):
+  """Splits the input files into work items.
+
+  Uncompressed files are split into byte ranges, and compressed files are read
+  in a single range. Outside of vocab_gen_mode every work item is assigned the
+  output shards it writes to, and every shard is written by exactly one work
+  item.
+
+  Args:
+    input_files: The list of input files.
+    num_output_files: The number of output shards, or the number of byte ranges
+      to count vocabularies over in vocab_gen_mode.
+    vocab_gen_mode: Whether the tasks only count vocabularies.
+
+  Returns:
+    A list of (sources, output_shards) tuples, where sources is a list of
+    (path, start, end) byte ranges, with end None for compressed files, and
+    output_shards is a list of shard indices.
+  """
+  sizes = [tf.io.gfile.stat(path).length for path in input_files]
+  total_size = max(sum(sizes), 1)
+  compressed = [path.endswith(_COMPRESSED_SUFFIXES) for path in input_files]
+
+  # Every file gets a number of ranges or shards proportional to its size.
+  # The largest remainders get the shards which are left after rounding down.
+  quotas = np.array(sizes, dtype=np.float64) / total_size * num_output_files
+  counts = np.maximum(np.floor(quotas).astype(np.int64), 0)
+  leftover = num_output_files - counts.sum()
+  if leftover > 0:
+    counts[np.argsort(counts - quotas)[:leftover]] += 1
+
+  tasks = []
+  orphans = []
+  next_shard = 0
+  for path, size, is_compressed, count in zip(input_files, sizes, compressed,
+                                              counts):
+    count = int(count)
+    if not count:
+      # Files too small to get a shard of their own are read by the task of
+      # an adjacent shard, so that there are exactly num_output_files shards.
+      orphans.append((path, 0, None if is_compressed else size))
+    elif is_compressed:
+      shards = list(range(next_shard, next_shard + count))
+      tasks.append(([(path, 0, None)], shards))
+    else:
+      bounds = np.linspace(0, size, count + 1).astype(np.int64)
+      for j in range(count):
+        tasks.append(([(path, int(bounds[j]), int(bounds[j + 1]))],
+                      [next_shard + j]))
+    if orphans and tasks:
+      tasks[-1][0].extend(orphans)
+      orphans = []
+    next_shard += count
+
+  if vocab_gen_mode:
+    tasks = [(sources, []) for sources, _ in tasks]
+  return tasks
+
+
+def read_line_chunks(path, start, end, chunk_size):
+  """Yields chunks of complete lines from a byte range of a file.
+
+  A line belongs to the range which contains its first byte, so adjacent ranges
+  read every line of a file exactly once.
+
+  Args:
+    path: The file to read.
+    start: The first byte of the range.
+    end: The end of the range, or None to read until the end of the file.
+    chunk_size: The number of bytes read at once.
+
+  Yields:
+    Byte strings of complete lines.
+  """
+  with tf.io.gfile.GFile(path, "rb") as f:
+    if path.endswith(_COMPRESSED_SUFFIXES):
+      f = gzip.GzipFile(fileobj=f)
+    buf_start = 0
+    if start > 0:
+      f.seek(start - 1)
+      f.readline()
+      buf_start = f.tell()
+    if end is not None and buf_start >= end:
+      return
+
+    buf = b""
+    while True:
+      block = f.read(chunk_size)
+      buf += block
+      if end is not None and buf_start + len(buf) >= end:
+        # The last line of the range ends at the first newline at or after the
+        # last byte of the range.
+        cut = buf.find(b"\n", end - buf_start - 1)
+        if cut >= 0 or not block:
+          yield buf if cut < 0 else buf[:cut + 1]
+          return
+        continue
+
+      if not block:
+        if buf:
+          yield buf
+        return
+      cut = buf.rfind(b"\n")
+      if cut >= 0:
+        yield buf[:cut + 1]
+        buf_start += cut + 1
+        buf = buf[cut + 1:]
+
+
+def hex_to_int_mod_range(values, max_vocab_size):
+  """Converts hexadecimal strings to integers modulo max_vocab_size.
+
+  This is the same as `int(value, 16) % max_vocab_size` for every value, for
+  hexadecimal strings of any length.
+
+  Args:
+    values: An array of hexadecimal strings. Empty strings are converted to
+      zero.
+    max_vocab_size: The modulus, which must be less than 2**59.
+
+  Returns:
+    An int64 array of the same shape as values.
+
+  Raises:
+    ValueError: If a value is not a hexadecimal string.
+  """
+  values = np.asarray(values).astype(np.bytes_)
+  width = values.dtype.itemsize
+  chars = values.view(np.uint8).reshape(values.shape + (width,))
+  digits = _HEX_VALUES[chars]
+  valid = digits >= 0
+  # Fixed width byte strings are padded at the end with zeros, so all valid
+  # digits must come before the padding.
+  if np.any(np.count_nonzero(valid, axis=-1) != np.count_nonzero(chars,
+                                                                 axis=-1)):
+    raise ValueError("Found a categorical feature which is not hexadecimal.")
+
+  # Reducing after every digit keeps the result exact regardless of the number
+  # of digits, so a value does not depend on the width of the array.
+  modulus = np.uint64(max_vocab_size)
+  result = np.zeros(values.shape, dtype=np.uint64)
+  for i in range(width):
+    result = np.where(
+        valid[..., i],
+        (result * np.uint64(16) + digits[..., i].astype(np.uint64)) % modulus,
+        result)
+  return result.astype(np.int64)
+
+
+def parse_chunk(chunk, delimiter, max_vocab_size):
+  """Parses and transforms a chunk of raw Criteo lines.
+
+  Args:
+    chunk: A byte string of complete lines.
+    delimiter: The column delimiter.
+    max_vocab_size: The modulus of the categorical features.
+
+  Returns:
+    A tuple of the float32 labels, the float32 log-normalized integer features
+    and the int64 categorical features, with one row per line.
+
+  Raises:
+    ValueError: If the lines do not have the expected number of columns.
+  """
+  text = chunk.rstrip(b"\n")
+  if not text:
+    return (np.zeros([0], np.float32),
+            np.zeros([0, NUM_NUMERIC_FEATURES], np.float32),
+            np.zeros([0, NUM_CATEGORICAL_FEATURES], np.int64))
+  delimiter = delimiter.encode("utf-8")
+  num_lines = text.count(b"\n") + 1
+  # Fields are kept as bytes, which take a quarter of the memory of str.
+  fields = np.array(text.replace(b"\n", delimiter).split(delimiter))
+  del text
+  if fields.size != num_lines * NUM_COLUMNS:
+    raise ValueError("Expected {} columns on each line.".format(NUM_COLUMNS))
+  fields = fields.reshape(num_lines, NUM_COLUMNS)
+  # Fill in missing elements with the defaults (zeros).
+  fields[fields == b""] = b"0"
+
+  labels = fields[:, 0].astype(np.float32)
+  numeric = fields[:, 1:NUM_NUMERIC_FEATURES + 1].astype(np.int64)
+  numeric = np.log(np.maximum(numeric, 0) + 1).astype(np.float32)
+  categorical = hex_to_int_mod_range(fields[:, NUM_NUMERIC_FEATURES + 1:],
+                                     max_vocab_size)
+  return labels, numeric, categorical
+
+
+def _merge_counts(values_and_counts):
+  """Sums counts of equal values over a list of (values, counts) pairs."""
+  if len(values_and_counts) == 1:
+    return values_and_counts[0]
+  values = np.concatenate([v for v, _ in values_and_counts])
+  counts = np.concatenate([c for _, c in values_and_counts])
+  unique_values, inverse = np.unique(values, return_inverse=True)
+  return unique_values, np.bincount(
+      inverse, weights=counts, minlength=len(unique_values)).astype(np.int64)
+
+
+class VocabCounter(object):
+  """Exactly counts the values of every categorical feature."""
+
+  def __init__(self, merge_every=16):
+    self._pending = [[] for _ in range(NUM_CATEGORICAL_FEATURES)]
+    self._merge_every = merge_every
+
+  def add(self, categorical):
+    """Counts a [num_lines, NUM_CATEGORICAL_FEATURES] array of values."""
+    for idx in range(NUM_CATEGORICAL_FEATURES):
+      self._pending[idx].append(
+          np.unique(categorical[:, idx], return_counts=True))
+      if len(self._pending[idx]) >= self._merge_every:
+        self._pending[idx] = [_merge_counts(self._pending[idx])]
+
+  def merge(self, other):
+    for idx in range(NUM_CATEGORICAL_FEATURES):
+      self._pending[idx].extend(other._pending[idx])  # pylint: disable=protected-access
+      self._pending[idx] = [_merge_counts(self._pending[idx])]
+
+  def result(self, idx):
+    """Returns the values of a feature and their counts."""
+    if not self._pending[idx]:
+      return np.zeros([0], np.int64), np.zeros([0], np.int64)
+    self._pending[idx] = [_merge_counts(self._pending[idx])]
+    return self._pending[idx][0]
+
+
+def write_vocabs(counter, temp_dir):
+  """Writes vocabulary files ordered by descending frequency.
+
+  Like TensorFlow Transform, ties are ordered by descending token.
+
+  Args:
+    counter: A `VocabCounter` of all data.
+    temp_dir: The directory in which "tftransform_tmp" vocabularies are written.
+  """
+  for idx in range(NUM_CATEGORICAL_FEATURES):
+    values, counts = counter.result(idx)
+    tokens = values.astype(str)
+    order = np.lexsort((tokens, counts))[::-1]
+    path = _vocab_path(temp_dir, idx)
+    tf.io.gfile.makedirs(os.path.dirname(path))
+    with tf.io.gfile.GFile(path, "w") as f:
+      f.write("".join(token + "\n" for token in tokens[order]))
+    logging.info("Wrote %d tokens to %s.", len(tokens), path)
+
+
+def load_vocabs(temp_dir):
+  """Loads vocabularies as (sorted values, index of each sorted value) pairs."""
+  vocabs = []
+  for idx in range(NUM_CATEGORICAL_FEATURES):
+    with tf.io.gfile.GFile(_vocab_path(temp_dir, idx)) as f:
+      values = np.array(f.read().split(), dtype=np.int64)
+    order = np.argsort(values, kind="stable")
+    vocabs.append((values[order], order))
+  return vocabs
+
+
+def apply_vocab(categorical, vocabs):
+  """Maps categorical values to their vocabulary index, or -1 if missing."""
+  output = np.empty_like(categorical)
+  for idx, (sorted_values, indices) in enumerate(vocabs):
+    values = categorical[:, idx]
+    if not len(sorted_values):
+      output[:, idx] = -1
+      continue
+    pos = np.minimum(np.searchsorted(sorted_values, values),
+                     len(sorted_values) - 1)
+    output[:, idx] = np.where(sorted_values[pos] == values, indices[pos], -1)
+  return output
+
+
+def format_lines(labels, numeric, categorical, delimiter):
+  """Formats transformed features as delimited lines.
+
+  Like the TensorFlow Transform CSV coder of `criteo_preprocess.py`, the label
+  and the integer features are written as float32, eg "1.0" and "0.6931472".
+  """
+  columns = np.concatenate(
+      [np.concatenate([labels[:, np.newaxis], numeric], axis=1).astype(
+          np.float32).astype(str),
+       categorical.astype(str)], axis=1)
+  return "".join(delimiter.join(row) + "\n" for row in columns.tolist())
+
+
+def _init_worker(vocabs):
+  global _WORKER_VOCABS
+  _WORKER_VOCABS = vocabs
+
+
+def process_task(task, output_path, num_output_files, delimiter,
+                 max_vocab_size, chunk_size):
+  """Counts the vocabularies of, or transforms and writes, a byte range.
+
+  Args:
+    task: A (sources, output_shards) tuple from `plan_tasks`.
+    output_path: The prefix of the output shards.
+    num_output_files: The total number of output shards.
+    delimiter: The column delimiter of the input and output.
+    max_vocab_size: The modulus of the categorical features.
+    chunk_size: The number of bytes read at once.
+
+  Returns:
+    A `VocabCounter` if the task has no output shards, otherwise the number of
+    lines written.
+  """
+  sources, output_shards = task
+  counter = None if output_shards else VocabCounter()
+  writers = [
+      tf.io.gfile.GFile(_output_path(output_path, s, num_output_files), "w")
+      for s in output_shards
+  ]
+  chunks = itertools.chain.from_iterable(
+      read_line_chunks(path, start, end, chunk_size)
+      for path, start, end in sources)
+  num_lines = 0
+  try:
+    for i, chunk in enumerate(chunks):
+      labels, numeric, categorical = parse_chunk(chunk, delimiter,
+                                                 max_vocab_size)
+      num_lines += len(labels)
+      if counter is not None:
+        counter.add(categorical)
+        continue
+      categorical = apply_vocab(categorical, _WORKER_VOCABS)
+      writers[i % len(writers)].write(
+          format_lines(labels, numeric, categorical, delimiter))
+  finally:
+    for writer in writers:
+      writer.close()
+  logging.info("Processed %d lines of %s.", num_lines,
+               ", ".join(sorted(set(path for path, _, _ in sources))))
+  return counter if counter is not None else num_lines
+
+
+def transform_data(input_path,
+                   output_path,
+                   temp_dir,
+                   vocab_gen_mode,
+                   delimiter="\t",
+                   max_vocab_size=10_000_000,
+                   num_output_files=None,
+                   num_workers=None,
+                   chunk_size=_DEFAULT_CHUNK_SIZE):
+  """Preprocesses Criteo data with a local process pool.
+
+  Args:
+    input_path: Glob pattern of the input TSV files.
+    output_path: Prefix of the output shards.
+    temp_dir: Directory of the vocabulary files.
+    vocab_gen_mode: If True, only generate vocabularies.
+    delimiter: Delimiter string for input and output.
+    max_vocab_size: Modulus of the categorical features.
+    num_output_files: Number of output shards. Defaults to the number of input
+      files.
+    num_workers: Number of worker processes. Defaults to the number of CPUs.
+    chunk_size: Number of bytes each worker reads and transforms at once.
+  """
+  input_files = sorted(tf.io.gfile.glob(input_path))
+  if not input_files:
+    raise ValueError("No files match {}".format(input_path))
+  num_workers = num_workers or os.cpu_count()
+  if vocab_gen_mode:
+    # Ranges only balance the counting work, so a few per worker are enough.
+    num_ranges = max(num_workers * 4, len(input_files))
+  else:
+    num_ranges = num_output_files or len(input_files)
+  tasks = plan_tasks(input_files, num_ranges, vocab_gen_mode)
+  num_output_files = max((s + 1 for _, shards in tasks for s in shards),
+                         default=0)
+
+  vocabs = None if vocab_gen_mode else load_vocabs(temp_dir)
+  if not vocab_gen_mode:
+    tf.io.gfile.makedirs(os.path.dirname(output_path) or ".")
+  fn = functools.partial(
+      process_task,
+      output_path=output_path,
+      num_output_files=num_output_files,
+      delimiter=delimiter,
+      max_vocab_size=max_vocab_size,
+      chunk_size=chunk_size)
+  logging.info("Processing %d files in %d tasks with %d workers.",
+               len(input_files), len(tasks), num_workers)
+  # TensorFlow is not fork-safe, so the workers are spawned.
+  with multiprocessing.get_context("spawn").Pool(
+      num_workers, initializer=_init_worker, initargs=(vocabs,)) as pool:
+    results = pool.imap_unordered(fn, tasks)
+    if vocab_gen_mode:
+      counter = VocabCounter()
+      for task_counter in results:
+        counter.merge(task_counter)
+      write_vocabs(counter, temp_dir)
+    else:
+      num_lines = sum(results)
+      logging.info("Wrote %d lines to %d shards.", num_lines,
+                   num_output_files)
+
+
+def main():
+  parser = argparse.ArgumentParser()
+  parser.add_argument(
+      "--input_path",
+      default=None,
+      required=True,
+      help="Input path. Be sure to set this to cover all data, to ensure "
+      "that sparse vocabs are complete.")
+  parser.add_argument(
+      "--output_path",
+      default=None,
+      help="Output path prefix. Required unless vocab_gen_mode is set.")
+  parser.add_argument(
+      "--temp_dir",
+      default=None,
+      required=True,
+      help="Directory to store temporary metadata. Important because vocab "
+           "dictionaries will be stored here.")
+  parser.add_argument(
+      "--csv_delimeter",
+      default="\t",
+      help="Delimeter string for input and output.")
+  parser.add_argument(
+      "--vocab_gen_mode",
+      action="store_true",
+      default=False,
+      help="If it is set, process full dataset and do not write CSV output. "
+           "In this mode, See temp_dir for vocab files. input_path should "
+           "cover all data, e.g. train, test, eval.")
+  parser.add_argument(
+      "--max_vocab_size",
+      type=int,
+      default=10_000_000,
+      help="Max index range, categorical features convert to integer and "
+           "take value modulus the max_vocab_size")
+  parser.add_argument(
+      "--num_output_files",
+      type=int,
+      default=None,
+      help="Number of balanced output shards. Defaults to the number of "
+           "input files.")
+  parser.add_argument(
+      "--num_workers",
+      type=int,
+      default=None,
+      help="Number of worker processes. Defaults to the number of CPUs.")
+  parser.add_argument(
+      "--chunk_size",
+      type=int,
+      default=_DEFAULT_CHUNK_SIZE,
+      help="Number of bytes each worker reads and transforms at once.")
+  args = parser.parse_args()
+  if not args.vocab_gen_mode and not args.output_path:
+    parser.error("--output_path is required unless --vocab_gen_mode is set.")
+
+  transform_data(
+      input_path=args.input_path,
+      output_path=args.output_path,
+      temp_dir=args.temp_dir,
+      vocab_gen_mode=args.vocab_gen_mode,
+      delimiter=args.csv_delimeter,
+      max_vocab_size=args.max_vocab_size,
+      num_output_files=args.num_output_files,
+      num_workers=args.num_workers,
+      chunk_size=args.chunk_size)
+
+
+if __name__ == "__main__":
+  logging.set_verbosity(logging.INFO)
+  main()
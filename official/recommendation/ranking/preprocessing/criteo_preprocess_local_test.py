@@ -0,0 +1,196 @@
+# Copyright 2023 The TensorFlow Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Tests for criteo_preprocess_local."""
+
+import collections
+import gzip
+import importlib.util
+import os
+import subprocess
+import sys
+
+import numpy as np
+import tensorflow as tf
+
+from official.recommendation.ranking.preprocessing import criteo_preprocess_local
+
+_MAX_VOCAB_SIZE = 1000
+
+
+def _make_lines(num_lines, seed):
+  """Returns raw Criteo lines, with missing, negative and long values."""
+  rng = np.random.RandomState(seed)
+  lines = []
+  for _ in range(num_lines):
+    fields = [str(rng.randint(2))]
+    for _ in range(criteo_preprocess_local.NUM_NUMERIC_FEATURES):
+      fields.append(rng.choice(["", "-1", "0", "3", "17", "123456"]))
+    for _ in range(criteo_preprocess_local.NUM_CATEGORICAL_FEATURES):
+      fields.append(
+          rng.choice(["", "a", "05db9164", "68fd1e64", "FFFFFFFF",
+                      "1a2b3c4d5e6f7a8b9c"]))
+    lines.append("\t".join(fields))
+  return lines
+
+
+def _beam_reference(lines, max_vocab_size):
+  """Applies the transformations of the Beam pipeline, one value at a time.
+
+  Args:
+    lines: Raw Criteo lines.
+    max_vocab_size: The modulus of the categorical features.
+
+  Returns:
+    The vocabularies, as lists of tokens, and the transformed lines.
+  """
+  rows = []
+  for line in lines:
+    values = [value or "0" for value in line.split("\t")]
+    label = values[0]
+    numeric = [
+        max(int(value), 0)
+        for value in values[1:criteo_preprocess_local.NUM_NUMERIC_FEATURES + 1]
+    ]
+    categorical = [
+        int(value, 16) % max_vocab_size
+        for value in values[criteo_preprocess_local.NUM_NUMERIC_FEATURES + 1:]
+    ]
+    rows.append((label, numeric, categorical))
+
+  vocabs = []
+  for idx in range(criteo_preprocess_local.NUM_CATEGORICAL_FEATURES):
+    counts = collections.Counter(str(row[2][idx]) for row in rows)
+    # Descending frequency, with ties in descending token order.
+    vocabs.append(sorted(counts, key=lambda t: (counts[t], t), reverse=True))
+
+  output = []
+  for label, numeric, categorical in rows:
+    # The Beam pipeline writes log(x+1) as a float64 string, which is decoded
+    # and then encoded again as float32.
+    fields = [str(np.float32(label))]
+    fields.extend(str(np.float32(str(np.log(x + 1)))) for x in numeric)
+    fields.extend(
+        str(vocabs[idx].index(str(value)))
+        for idx, value in enumerate(categorical))
+    output.append("\t".join(fields))
+  return vocabs, output
+
+
+def _read_lines(pattern):
+  lines = []
+  for path in tf.io.gfile.glob(pattern):
+    with tf.io.gfile.GFile(path) as f:
+      lines.extend(f.read().splitlines())
+  return lines
+
+
+def _read_vocabs(temp_dir):
+  vocabs = []
+  for idx in range(criteo_preprocess_local.NUM_CATEGORICAL_FEATURES):
+    with tf.io.gfile.GFile(
+        os.path.join(temp_dir, "tftransform_tmp",
+                     "feature_{}_vocab".format(idx))) as f:
+      vocabs.append(f.read().split())
+  return vocabs
+
+
+class CriteoPreprocessLocalTest(tf.test.TestCase):
+
+  def setUp(self):
+    super().setUp()
+    self.input_dir = self.create_tempdir().full_path
+    self.lines = _make_lines(60, seed=0)
+    # A large file, a compressed file and a file too small for its own shard.
+    with open(os.path.join(self.input_dir, "day_0"), "w") as f:
+      f.write("".join(line + "\n" for line in self.lines[:40]))
+    with gzip.open(os.path.join(self.input_dir, "day_1.gz"), "wt") as f:
+      f.write("".join(line + "\n" for line in self.lines[40:58]))
+    with open(os.path.join(self.input_dir, "day_2"), "w") as f:
+      f.write("".join(line + "\n" for line in self.lines[58:]))
+
+  def _run_local(self, num_output_files):
+    temp_dir = self.create_tempdir().full_path
+    output_path = os.path.join(self.create_tempdir().full_path, "out")
+    for vocab_gen_mode in (True, False):
+      criteo_preprocess_local.transform_data(
+          input_path=os.path.join(self.input_dir, "day_*"),
+          output_path=output_path,
+          temp_dir=temp_dir,
+          vocab_gen_mode=vocab_gen_mode,
+          max_vocab_size=_MAX_VOCAB_SIZE,
+          num_output_files=num_output_files,
+          num_workers=2,
+          chunk_size=512)
+    return temp_dir, output_path
+
+  def test_matches_beam_transformations(self):
+    temp_dir, output_path = self._run_local(num_output_files=4)
+    vocabs, lines = _beam_reference(self.lines, _MAX_VOCAB_SIZE)
+
+    self.assertEqual(_read_vocabs(temp_dir), vocabs)
+    self.assertLen(tf.io.gfile.glob(output_path + "-*"), 4)
+    self.assertCountEqual(_read_lines(output_path + "-*"), lines)
+
+  def test_matches_beam_pipeline(self):
+    if (importlib.util.find_spec("apache_beam") is None or
+        importlib.util.find_spec("tensorflow_transform") is None):
+      self.skipTest("The Beam pipeline requires apache_beam and "
+                    "tensorflow_transform.")
+    temp_dir, output_path = self._run_local(num_output_files=2)
+
+    beam_temp_dir = self.create_tempdir().full_path
+    beam_output_path = os.path.join(self.create_tempdir().full_path, "out")
+    script = os.path.join(os.path.dirname(__file__), "criteo_preprocess.py")
+    for vocab_gen_mode in (True, False):
+      subprocess.check_call(
+          [sys.executable, script,
+           "--input_path", os.path.join(self.input_dir, "day_*"),
+           "--output_path", beam_output_path,
+           "--temp_dir", beam_temp_dir,
+           "--max_vocab_size", str(_MAX_VOCAB_SIZE)] +
+          (["--vocab_gen_mode"] if vocab_gen_mode else []))
+
+    self.assertEqual(_read_vocabs(temp_dir), _read_vocabs(beam_temp_dir))
+    self.assertCountEqual(
+        _read_lines(output_path + "-*"), _read_lines(beam_output_path + "-*"))
+
+  def test_plan_tasks_writes_each_shard_once(self):
+    for num_output_files in (1, 2, 3, 5):
+      tasks = criteo_preprocess_local.plan_tasks(
+          tf.io.gfile.glob(os.path.join(self.input_dir, "day_*")),
+          num_output_files, vocab_gen_mode=False)
+      shards = [s for _, task_shards in tasks for s in task_shards]
+      self.assertCountEqual(shards, range(num_output_files))
+      paths = set(path for sources, _ in tasks for path, _, _ in sources)
+      self.assertLen(paths, 3)
+
+  def test_hex_to_int_mod_range(self):
+    values = ["", "0", "a", "05db9164", "FFFFFFFF", "ffffffffffffffff",
+              "1a2b3c4d5e6f7a8b9c0d"]
+    expected = [int(v or "0", 16) % 999983 for v in values]
+    self.assertAllEqual(
+        criteo_preprocess_local.hex_to_int_mod_range(values, 999983),
+        expected)
+    # Values do not depend on the other values of the array.
+    for value, expected_value in zip(values, expected):
+      self.assertAllEqual(
+          criteo_preprocess_local.hex_to_int_mod_range([value], 999983),
+          [expected_value])
+    with self.assertRaisesRegex(ValueError, "not hexadecimal"):
+      criteo_preprocess_local.hex_to_int_mod_range(["12g4"], 999983)
+
+
+if __name__ == "__main__":
+  tf.test.main()
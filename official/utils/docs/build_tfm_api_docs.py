@@ -74,7 +74,10 @@ class ExpFactoryInfo(function_page.FunctionPageInfo):
     ]
     reference_resolver = self.parser_config.reference_resolver
     api_tree = self.parser_config.api_tree
-    for name, fn in sorted(tfm.core.exp_factory._REGISTERED_CONFIGS.items()):   # pylint: disable=protected-access
+    # pylint: disable=protected-access
+    tfm.core.registry.import_lazy_modules(
+        tfm.core.exp_factory._REGISTERED_CONFIGS)
+    for name, fn in sorted(tfm.core.exp_factory._REGISTERED_CONFIGS.items()):
       fn_api_node = api_tree.node_for_object(fn)
       if fn_api_node is None:
         location = parser.get_defined_in(self.py_object, self.parser_config)
@@ -88,6 +91,7 @@ class ExpFactoryInfo(function_page.FunctionPageInfo):
         doc = ''
 
       lines.append(f'<tr><td>{link}</td><td>{doc}</td></tr>')
+    # pylint: enable=protected-access
 
     lines.append('</table>')
     return '\n'.join(lines)
@@ -13,6 +13,16 @@
 # limitations under the License.
 
 """Vision package definition."""
-# pylint: disable=unused-import
-from official.vision import configs
-from official.vision import tasks
+import importlib
+
+# Registers all vision experiments and tasks. Their modules are imported on
+# first lookup, and `configs` and `tasks` on first attribute access.
+from official.vision import registry_index  # pylint: disable=unused-import
+
+_LAZY_SUBMODULES = ('configs', 'tasks')
+
+
+def __getattr__(name):
+  if name in _LAZY_SUBMODULES:
+    return importlib.import_module(f'{__name__}.{name}')
+  raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
@@ -215,6 +215,12 @@ class MaskRCNNTask(cfg.TaskConfig):
       str, List[str]] = 'all'  # all, backbone, and/or decoder
   annotation_file: Optional[str] = None
   per_category_metrics: bool = False
+  # The COCO evaluation implementation, either `pycocotools` or `fast`.
+  coco_eval_backend: str = 'pycocotools'
+  # If set, the COCO evaluator converts every batch right away to compact
+  # annotations, spilled to `coco_annotation_store_dir` if that is also set.
+  coco_stream_annotations: bool = False
+  coco_annotation_store_dir: Optional[str] = None
   # If set, we only use masks for the specified class IDs.
   allowed_mask_class_ids: Optional[List[int]] = None
   # If set, the COCO metrics will be computed.
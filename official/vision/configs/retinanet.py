@@ -199,6 +199,12 @@ class RetinaNetTask(cfg.TaskConfig):
 
   # Sets maximum number of boxes to be evaluated by coco eval api.
   max_num_eval_detections: int = 100
+  # The COCO evaluation implementation, either `pycocotools` or `fast`.
+  coco_eval_backend: str = 'pycocotools'
+  # If set, the COCO evaluator converts every batch right away to compact
+  # annotations, spilled to `coco_annotation_store_dir` if that is also set.
+  coco_stream_annotations: bool = False
+  coco_annotation_store_dir: Optional[str] = None
 
 
 @exp_factory.register_config_factory('retinanet')
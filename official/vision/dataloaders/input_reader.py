@@ -176,7 +176,9 @@ class CombinationDatasetInputReader(input_reader.InputReader):
     self._pseudo_label_data_ratio = params.pseudo_label_data.data_ratio
     self._pseudo_label_batch_size = params.pseudo_label_data.global_batch_size
     self._pseudo_label_matched_files = input_reader.match_files(
-        self._pseudo_label_file_pattern)
+        self._pseudo_label_file_pattern,
+        manifest_dir=self._file_manifest_dir,
+        num_threads=self._num_file_listing_threads)
     if not self._drop_remainder:
       raise ValueError(
           'Must use drop_remainder=True with CombinationDatasetInputReader')
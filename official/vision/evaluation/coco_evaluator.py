@@ -27,6 +27,7 @@ See also: https://github.com/cocodataset/cocoapi/
 """
 
 import atexit
+import collections
 import tempfile
 # Import libraries
 from absl import logging
@@ -36,6 +37,13 @@ import six
 import tensorflow as tf
 
 from official.vision.evaluation import coco_utils
+from official.vision.evaluation import fast_coco_eval
+
+# The COCO evaluation implementations that can be selected by `eval_backend`.
+_EVAL_BACKENDS = {
+    'pycocotools': cocoeval.COCOeval,
+    'fast': fast_coco_eval.FastCOCOeval,
+}
 
 
 class COCOEvaluator(object):
@@ -49,7 +57,10 @@ class COCOEvaluator(object):
                need_rescale_keypoints=False,
                per_category_metrics=False,
                max_num_eval_detections=100,
-               kpt_oks_sigmas=None):
+               kpt_oks_sigmas=None,
+               eval_backend='pycocotools',
+               stream_annotations=False,
+               annotation_store_dir=None):
     """Constructs COCO evaluation class.
 
     The class provides the interface to COCO metrics_fn. The
@@ -75,9 +86,26 @@ class COCOEvaluator(object):
       kpt_oks_sigmas: The sigmas used to calculate keypoint OKS. See
         http://cocodataset.org/#keypoints-eval. When None, it will use the
         defaults in COCO.
+      eval_backend: the COCO evaluation implementation, either 'pycocotools'
+        for `pycocotools.cocoeval.COCOeval` or 'fast' for the vectorized
+        `fast_coco_eval.FastCOCOeval`, which produces the same metrics.
+      stream_annotations: If true, every batch passed to `update_state` is
+        converted right away to compact COCO annotations with RLE encoded masks,
+        keeping only the detections that can be evaluated, instead of holding
+        the raw arrays until `evaluate()`.
+      annotation_store_dir: (optional) a local directory the streamed
+        annotations are spilled to and memory-mapped from. Only used if
+        `stream_annotations` is true. If None, they are kept in host memory.
+        The files of an evaluation are removed by `reset_states`, which
+        `result` calls, or by `close`.
     Raises:
-      ValueError: if max_num_eval_detections is not an integer.
+      ValueError: if max_num_eval_detections is not an integer or
+        eval_backend is not supported.
     """
+    if eval_backend not in _EVAL_BACKENDS:
+      raise ValueError('eval_backend must be one of {}, got {}.'.format(
+          sorted(_EVAL_BACKENDS), eval_backend))
+    self._coco_eval_cls = _EVAL_BACKENDS[eval_backend]
     if annotation_file:
       if annotation_file.startswith('gs://'):
         _, local_val_json = tempfile.mkstemp(suffix='.json')
@@ -102,6 +130,8 @@ class COCOEvaluator(object):
         f'ARmax{max_num_eval_detections}', 'ARs', 'ARm', 'ARl'
     ]
     self.max_num_eval_detections = max_num_eval_detections
+    self._stream_annotations = stream_annotations
+    self._annotation_store_dir = annotation_store_dir
     self._required_prediction_fields = [
         'source_id', 'num_detections', 'detection_classes', 'detection_scores',
         'detection_boxes'
@@ -140,6 +170,30 @@ class COCOEvaluator(object):
     self._predictions = {}
     if not self._annotation_file:
       self._groundtruths = {}
+    if self._stream_annotations:
+      # The stores are created by the first `update_state`, so that no spill
+      # directory is left behind by the reset after the last evaluation.
+      self.close()
+      self._groundtruth_images = []
+      self._groundtruth_category_ids = set()
+
+  def close(self):
+    """Removes the streamed annotations, including their spilled files."""
+    for store in (getattr(self, '_prediction_store', None),
+                  getattr(self, '_groundtruth_store', None)):
+      if store is not None:
+        store.close()
+    self._prediction_store = None
+    self._groundtruth_store = None
+
+  def _maybe_create_stores(self):
+    """Creates the annotation stores of a streamed evaluation if needed."""
+    if self._prediction_store is None:
+      self._prediction_store = coco_utils.COCOAnnotationStore(
+          self._annotation_store_dir)
+    if not self._annotation_file and self._groundtruth_store is None:
+      self._groundtruth_store = coco_utils.COCOAnnotationStore(
+          self._annotation_store_dir)
 
   def result(self):
     """Evaluates detection results, and reset_states."""
@@ -157,20 +211,34 @@ class COCOEvaluator(object):
     """
     if not self._annotation_file:
       logging.info('There is no annotation_file in COCOEvaluator.')
-      gt_dataset = coco_utils.convert_groundtruths_to_coco_dataset(
-          self._groundtruths)
+      if self._stream_annotations:
+        self._maybe_create_stores()
+        gt_dataset = {
+            'images': self._groundtruth_images,
+            'categories': [
+                {'id': i} for i in self._groundtruth_category_ids
+            ],
+            'annotations': self._groundtruth_store.annotations(),
+        }
+      else:
+        gt_dataset = coco_utils.convert_groundtruths_to_coco_dataset(
+            self._groundtruths)
       coco_gt = coco_utils.COCOWrapper(
           eval_type=('mask' if self._include_mask else 'box'),
           gt_dataset=gt_dataset)
     else:
       logging.info('Using annotation file: %s', self._annotation_file)
       coco_gt = self._coco_gt
-    coco_predictions = coco_utils.convert_predictions_to_coco_annotations(
-        self._predictions)
+    if self._stream_annotations:
+      self._maybe_create_stores()
+      coco_predictions = self._prediction_store.annotations()
+    else:
+      coco_predictions = coco_utils.convert_predictions_to_coco_annotations(
+          self._predictions)
     coco_dt = coco_gt.loadRes(predictions=coco_predictions)
     image_ids = [ann['image_id'] for ann in coco_predictions]
 
-    coco_eval = cocoeval.COCOeval(coco_gt, coco_dt, iouType='bbox')
+    coco_eval = self._coco_eval_cls(coco_gt, coco_dt, iouType='bbox')
     coco_eval.params.imgIds = image_ids
     coco_eval.params.maxDets[2] = self.max_num_eval_detections
     coco_eval.evaluate()
@@ -180,7 +248,7 @@ class COCOEvaluator(object):
     metrics = coco_metrics
 
     if self._include_mask:
-      mcoco_eval = cocoeval.COCOeval(coco_gt, coco_dt, iouType='segm')
+      mcoco_eval = self._coco_eval_cls(coco_gt, coco_dt, iouType='segm')
       mcoco_eval.params.imgIds = image_ids
       mcoco_eval.evaluate()
       mcoco_eval.accumulate()
@@ -189,8 +257,8 @@ class COCOEvaluator(object):
       metrics = np.hstack((metrics, mask_coco_metrics))
 
     if self._include_keypoint:
-      kcoco_eval = cocoeval.COCOeval(coco_gt, coco_dt, iouType='keypoints',
-                                     kpt_oks_sigmas=self._kpt_oks_sigmas)
+      kcoco_eval = self._coco_eval_cls(coco_gt, coco_dt, iouType='keypoints',
+                                       kpt_oks_sigmas=self._kpt_oks_sigmas)
       kcoco_eval.params.imgIds = image_ids
       kcoco_eval.evaluate()
       kcoco_eval.accumulate()
@@ -366,6 +434,10 @@ class COCOEvaluator(object):
       self._process_bbox_predictions(predictions)
     if self._need_rescale_keypoints:
       self._process_keypoints_predictions(predictions)
+    if self._stream_annotations:
+      self._maybe_create_stores()
+      self._stream_state(groundtruths, predictions)
+      return
     for k, v in six.iteritems(predictions):
       if k not in self._predictions:
         self._predictions[k] = [v]
@@ -383,3 +455,50 @@ class COCOEvaluator(object):
           self._groundtruths[k] = [v]
         else:
           self._groundtruths[k].append(v)
+
+  def _select_evaluated_detections(self, coco_predictions):
+    """Selects the detections that COCO evaluation can take into account.
+
+    COCO evaluation only considers the top `maxDets[-1]` scoring detections of
+    each image and category, so the others are dropped. The relative order of
+    the selected detections is kept, which keeps ties ordered as before.
+
+    Args:
+      coco_predictions: a list of detections in COCO annotation format.
+
+    Returns:
+      The selected detections.
+    """
+    max_detections = max(self.max_num_eval_detections, 100)
+    detections_per_key = collections.defaultdict(list)
+    for i, ann in enumerate(coco_predictions):
+      detections_per_key[ann['image_id'], ann['category_id']].append(i)
+    selected = []
+    for indices in detections_per_key.values():
+      if len(indices) > max_detections:
+        scores = [-coco_predictions[i]['score'] for i in indices]
+        order = np.argsort(scores, kind='mergesort')[:max_detections]
+        indices = [indices[i] for i in order]
+      selected.extend(indices)
+    return [coco_predictions[i] for i in sorted(selected)]
+
+  def _stream_state(self, groundtruths, predictions):
+    """Converts a batch to COCO annotations and adds them to the stores."""
+    batch_predictions = {k: [v] for k, v in six.iteritems(predictions)}
+    self._prediction_store.append(
+        self._select_evaluated_detections(
+            coco_utils.convert_predictions_to_coco_annotations(
+                batch_predictions)))
+
+    if not self._annotation_file:
+      assert groundtruths
+      for k in self._required_groundtruth_fields:
+        if k not in groundtruths:
+          raise ValueError(
+              'Missing the required key `{}` in groundtruths!'.format(k))
+      batch_dataset = coco_utils.convert_groundtruths_to_coco_dataset(
+          {k: [v] for k, v in six.iteritems(groundtruths)})
+      self._groundtruth_images.extend(batch_dataset['images'])
+      self._groundtruth_category_ids.update(
+          category['id'] for category in batch_dataset['categories'])
+      self._groundtruth_store.append(batch_dataset['annotations'])
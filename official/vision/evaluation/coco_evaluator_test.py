@@ -0,0 +1,121 @@
+# Copyright 2023 The TensorFlow Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Tests for coco_evaluator."""
+
+import os
+
+from absl.testing import parameterized
+import numpy as np
+import tensorflow as tf
+
+from official.vision.evaluation import coco_evaluator
+
+
+def _create_batch(rng, batch_size, image_offset, num_groundtruths=6,
+                  num_detections=400, num_classes=3, image_size=64):
+  """Creates a batch of random groundtruths and near duplicate detections."""
+  ymin = rng.uniform(0, image_size / 2, [batch_size, num_groundtruths, 2])
+  size = rng.uniform(4, image_size / 2, [batch_size, num_groundtruths, 2])
+  gt_boxes = np.concatenate([ymin, ymin + size], axis=-1).astype(np.float32)
+  gt_classes = rng.randint(1, num_classes + 1, [batch_size, num_groundtruths])
+  # Groundtruth masks are PNG encoded and fill their boxes.
+  gt_masks = np.empty([batch_size, num_groundtruths], dtype=object)
+  for i in range(batch_size):
+    for j in range(num_groundtruths):
+      ymin, xmin, ymax, xmax = gt_boxes[i, j].astype(np.int32)
+      gt_mask = np.zeros([image_size, image_size, 1], dtype=np.uint8)
+      gt_mask[ymin:ymax, xmin:xmax] = 1
+      gt_masks[i, j] = tf.io.encode_png(gt_mask).numpy()
+  groundtruths = {
+      'source_id': np.arange(batch_size) + image_offset,
+      'height': np.full([batch_size], image_size),
+      'width': np.full([batch_size], image_size),
+      'num_detections': rng.randint(1, num_groundtruths + 1, [batch_size]),
+      'boxes': gt_boxes,
+      'classes': gt_classes,
+      'is_crowds': (rng.rand(batch_size, num_groundtruths) < 0.1).astype(
+          np.int32),
+      'masks': gt_masks,
+  }
+
+  indices = rng.randint(0, num_groundtruths, [batch_size, num_detections])
+  boxes = np.take_along_axis(gt_boxes, indices[..., None], axis=1)
+  boxes += rng.normal(0, 2, boxes.shape).astype(np.float32)
+  masks = rng.uniform(0.2, 1, [batch_size, num_detections, 8, 8]).astype(
+      np.float32)
+  predictions = {
+      'source_id': groundtruths['source_id'],
+      'image_info': np.tile(
+          np.array([[image_size, image_size], [image_size, image_size],
+                    [1, 1], [0, 0]], dtype=np.float32), [batch_size, 1, 1]),
+      'num_detections': np.full([batch_size], num_detections),
+      'detection_boxes': boxes,
+      'detection_classes': np.take_along_axis(gt_classes, indices, axis=1),
+      # Scores with ties, so the dropped detections must be chosen stably.
+      'detection_scores': rng.choice([0.2, 0.5, 0.9], [batch_size,
+                                                       num_detections]).astype(
+                                                           np.float32),
+      'detection_masks': masks,
+  }
+  return (tf.nest.map_structure(tf.convert_to_tensor, groundtruths),
+          tf.nest.map_structure(tf.convert_to_tensor, predictions))
+
+
+class COCOEvaluatorTest(tf.test.TestCase, parameterized.TestCase):
+
+  @parameterized.parameters((False, False), (True, False), (True, True))
+  def test_stream_annotations(self, include_mask, spill_to_disk):
+    rng = np.random.RandomState(0)
+    batches = [_create_batch(rng, 2, 2 * i) for i in range(3)]
+
+    evaluator = coco_evaluator.COCOEvaluator(
+        annotation_file=None, include_mask=include_mask)
+    streaming_evaluator = coco_evaluator.COCOEvaluator(
+        annotation_file=None,
+        include_mask=include_mask,
+        stream_annotations=True,
+        annotation_store_dir=(
+            self.create_tempdir().full_path if spill_to_disk else None))
+    for groundtruths, predictions in batches:
+      evaluator.update_state(groundtruths, predictions)
+      streaming_evaluator.update_state(groundtruths, predictions)
+
+    expected_metrics = evaluator.result()
+    metrics = streaming_evaluator.result()
+    self.assertAllClose(expected_metrics, metrics, rtol=0, atol=0)
+
+  def test_stream_annotations_removes_spilled_files(self):
+    rng = np.random.RandomState(0)
+    store_dir = self.create_tempdir().full_path
+    evaluator = coco_evaluator.COCOEvaluator(
+        annotation_file=None,
+        include_mask=False,
+        stream_annotations=True,
+        annotation_store_dir=store_dir)
+    self.assertEmpty(os.listdir(store_dir))
+    for i in range(3):
+      evaluator.update_state(*_create_batch(rng, 2, 2 * i))
+      self.assertNotEmpty(os.listdir(store_dir))
+      evaluator.result()
+      # Resetting after an evaluation leaves no files behind.
+      self.assertEmpty(os.listdir(store_dir))
+
+    evaluator.update_state(*_create_batch(rng, 2, 0))
+    evaluator.close()
+    self.assertEmpty(os.listdir(store_dir))
+
+
+if __name__ == '__main__':
+  tf.test.main()
@@ -16,6 +16,9 @@
 
 import copy
 import json
+import os
+import shutil
+import tempfile
 
 # Import libraries
 
@@ -105,6 +108,198 @@ class COCOWrapper(coco.COCO):
     return res
 
 
+class COCOAnnotationStore(object):
+  """Append-only store of compact COCO annotations.
+
+  The fixed size fields of every annotation are kept in a structured numpy
+  record, and its RLE mask counts and keypoints in a byte blob. If `directory`
+  is given, the records and blobs are appended to files in a fresh
+  sub-directory of it and read back through `np.memmap`, so the host memory
+  does not grow with the number of stored annotations.
+  """
+
+  _RECORD_DTYPE = np.dtype([
+      ('image_id', np.int64),
+      ('category_id', np.int64),
+      ('iscrowd', np.int8),
+      ('bbox', np.float64, (4,)),
+      ('score', np.float64),
+      ('area', np.float64),
+      ('num_keypoints', np.int32),
+      ('mask_size', np.int32, (2,)),
+      ('counts_offset', np.int64),
+      ('counts_size', np.int64),
+      ('keypoints_offset', np.int64),
+      ('keypoints_size', np.int64),
+  ])
+  # The optional fields, which are restored as given to `append`.
+  _OPTIONAL_FIELDS = ('iscrowd', 'score', 'area', 'num_keypoints',
+                      'segmentation', 'keypoints')
+
+  def __init__(self, directory=None):
+    """Constructs the store.
+
+    Args:
+      directory: (optional) a local directory to spill the annotations to. If
+        None, the annotations are kept in host memory.
+    """
+    self._directory = None
+    if directory:
+      os.makedirs(directory, exist_ok=True)
+      self._directory = tempfile.mkdtemp(dir=directory)
+      self._records_path = os.path.join(self._directory, 'records.bin')
+      self._blobs_path = os.path.join(self._directory, 'blobs.bin')
+      open(self._records_path, 'wb').close()
+      open(self._blobs_path, 'wb').close()
+    self._records = []
+    self._blobs = []
+    self._num_annotations = 0
+    self._blobs_size = 0
+    # The fields present in the annotations and how to restore their types.
+    self._fields = None
+    self._bbox_dtype = None
+    self._score_dtype = None
+    self._keypoints_dtype = None
+    self._counts_is_str = False
+
+  def __len__(self):
+    return self._num_annotations
+
+  def append(self, annotations):
+    """Appends annotations in COCO format.
+
+    All annotations appended to a store must have the same fields. The `id`
+    of the annotations is not stored; `annotations()` renumbers them.
+
+    Args:
+      annotations: a list of dicts with the `image_id`, `category_id` and
+        `bbox` fields and optionally the `iscrowd`, `score`, `area`,
+        `num_keypoints`, `segmentation` (RLE encoded) and `keypoints` fields.
+    """
+    if not annotations:
+      return
+    if self._fields is None:
+      ann = annotations[0]
+      self._fields = [k for k in self._OPTIONAL_FIELDS if k in ann]
+      self._bbox_dtype = np.asarray(ann['bbox']).dtype
+      if 'score' in ann:
+        self._score_dtype = np.asarray(ann['score']).dtype
+      if 'keypoints' in ann:
+        self._keypoints_dtype = np.asarray(ann['keypoints']).dtype
+      if 'segmentation' in ann:
+        self._counts_is_str = isinstance(ann['segmentation']['counts'], str)
+
+    records = np.zeros(len(annotations), dtype=self._RECORD_DTYPE)
+    blobs = []
+    offset = self._blobs_size
+    for i, ann in enumerate(annotations):
+      record = records[i]
+      record['image_id'] = ann['image_id']
+      record['category_id'] = ann['category_id']
+      record['bbox'] = ann['bbox']
+      record['iscrowd'] = ann.get('iscrowd', 0)
+      record['score'] = ann.get('score', 0.0)
+      record['area'] = ann.get('area', 0.0)
+      record['num_keypoints'] = ann.get('num_keypoints', 0)
+      record['counts_offset'] = offset
+      if 'segmentation' in ann:
+        record['mask_size'] = ann['segmentation']['size']
+        counts = six.ensure_binary(ann['segmentation']['counts'])
+        record['counts_size'] = len(counts)
+        blobs.append(counts)
+        offset += len(counts)
+      record['keypoints_offset'] = offset
+      if 'keypoints' in ann:
+        keypoints = np.asarray(ann['keypoints'], dtype=np.float64).tobytes()
+        record['keypoints_size'] = len(keypoints)
+        blobs.append(keypoints)
+        offset += len(keypoints)
+    blob = b''.join(blobs)
+
+    if self._directory:
+      with open(self._records_path, 'ab') as f:
+        f.write(records.tobytes())
+      with open(self._blobs_path, 'ab') as f:
+        f.write(blob)
+    else:
+      self._records.append(records)
+      self._blobs.append(blob)
+    self._num_annotations += len(annotations)
+    self._blobs_size = offset
+
+  def _read(self):
+    """Returns all records and the blob, memory-mapped if spilled to disk."""
+    if not self._num_annotations:
+      return np.zeros(0, dtype=self._RECORD_DTYPE), b''
+    if self._directory:
+      records = np.memmap(self._records_path, dtype=self._RECORD_DTYPE,
+                          mode='r', shape=(self._num_annotations,))
+      if self._blobs_size:
+        blob = np.memmap(self._blobs_path, dtype=np.uint8, mode='r',
+                         shape=(self._blobs_size,))
+      else:
+        blob = b''
+      return records, blob
+    if len(self._records) > 1:
+      self._records = [np.concatenate(self._records)]
+      self._blobs = [b''.join(self._blobs)]
+    return self._records[0], self._blobs[0]
+
+  def annotations(self):
+    """Returns the stored annotations in COCO format.
+
+    Returns:
+      A list of dicts with the fields given to `append`, in the order they
+      were appended, with `id` set to their 1-based position.
+    """
+    records, blob = self._read()
+    annotations = []
+    for i, record in enumerate(records):
+      ann = {
+          'image_id': int(record['image_id']),
+          'category_id': int(record['category_id']),
+          'bbox': record['bbox'].astype(self._bbox_dtype),
+      }
+      if self._bbox_dtype == np.float64:
+        ann['bbox'] = ann['bbox'].tolist()
+      for field in self._fields:
+        if field == 'iscrowd':
+          ann['iscrowd'] = int(record['iscrowd'])
+        elif field == 'score':
+          ann['score'] = self._score_dtype.type(record['score'])
+        elif field == 'area':
+          ann['area'] = float(record['area'])
+        elif field == 'num_keypoints':
+          ann['num_keypoints'] = int(record['num_keypoints'])
+        elif field == 'segmentation':
+          start = record['counts_offset']
+          counts = bytes(blob[start:start + record['counts_size']])
+          ann['segmentation'] = {
+              'size': record['mask_size'].tolist(),
+              'counts': (six.ensure_str(counts)
+                         if self._counts_is_str else counts),
+          }
+        elif field == 'keypoints':
+          start = record['keypoints_offset']
+          keypoints = np.frombuffer(
+              bytes(blob[start:start + record['keypoints_size']]),
+              dtype=np.float64)
+          ann['keypoints'] = keypoints.astype(self._keypoints_dtype).tolist()
+      ann['id'] = i + 1
+      annotations.append(ann)
+    return annotations
+
+  def close(self):
+    """Removes the spilled files, if any."""
+    if self._directory:
+      shutil.rmtree(self._directory, ignore_errors=True)
+      self._directory = None
+    self._records = []
+    self._blobs = []
+    self._num_annotations = 0
+    self._blobs_size = 0
+
+
 def convert_predictions_to_coco_annotations(predictions):
   """Converts a batch of predictions to annotations in COCO format.
 
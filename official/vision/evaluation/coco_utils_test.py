@@ -16,14 +16,16 @@
 
 import os
 
+from absl.testing import parameterized
 import numpy as np
+from pycocotools import mask as mask_api
 import tensorflow as tf
 
 from official.vision.dataloaders import tfexample_utils
 from official.vision.evaluation import coco_utils
 
 
-class CocoUtilsTest(tf.test.TestCase):
+class CocoUtilsTest(tf.test.TestCase, parameterized.TestCase):
 
   def test_scan_and_generator_annotation_file(self):
     num_samples = 10
@@ -90,6 +92,48 @@ class CocoUtilsTest(tf.test.TestCase):
       expected_keypoint_ann = expected_keypoint_ann.flatten().tolist()
       self.assertAllEqual(anns[i]['keypoints'], expected_keypoint_ann)
 
+  @parameterized.parameters(False, True)
+  def test_coco_annotation_store(self, spill_to_disk):
+    rng = np.random.RandomState(0)
+    annotations = []
+    for i in range(7):
+      binary_mask = (rng.rand(10, 12) > 0.5).astype(np.uint8)
+      annotations.append({
+          'image_id': i // 3 + 1,
+          'category_id': rng.randint(1, 5),
+          'bbox': rng.rand(4).astype(np.float32),
+          'score': np.float32(rng.rand()),
+          'segmentation': mask_api.encode(
+              np.asfortranarray(binary_mask)),
+          'keypoints': rng.randint(0, 10, size=9).tolist(),
+          'id': 100 + i,
+      })
+    directory = self.create_tempdir().full_path if spill_to_disk else None
+    store = coco_utils.COCOAnnotationStore(directory)
+    store.append(annotations[:4])
+    store.append([])
+    store.append(annotations[4:])
+    self.assertLen(store, 7)
+
+    stored_annotations = store.annotations()
+    self.assertLen(stored_annotations, 7)
+    for i, (ann, stored_ann) in enumerate(
+        zip(annotations, stored_annotations)):
+      self.assertEqual(stored_ann['id'], i + 1)
+      self.assertEqual(stored_ann['image_id'], ann['image_id'])
+      self.assertEqual(stored_ann['category_id'], ann['category_id'])
+      self.assertAllEqual(stored_ann['bbox'], ann['bbox'])
+      self.assertEqual(stored_ann['bbox'].dtype, np.float32)
+      self.assertEqual(stored_ann['score'], ann['score'])
+      self.assertEqual(stored_ann['segmentation'], ann['segmentation'])
+      self.assertEqual(stored_ann['keypoints'], ann['keypoints'])
+      self.assertNotIn('iscrowd', stored_ann)
+
+    store.close()
+    self.assertEmpty(store)
+    if spill_to_disk:
+      self.assertEmpty(os.listdir(directory))
+
 
 if __name__ == '__main__':
   tf.test.main()
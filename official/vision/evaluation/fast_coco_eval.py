@@ -0,0 +1,422 @@
+# Copyright 2023 The TensorFlow Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Vectorized COCO evaluation.
+
+`FastCOCOeval` is a drop-in replacement of `pycocotools.cocoeval.COCOeval`
+for 'bbox', 'segm' and 'keypoints' evaluation. The per image and per category
+greedy matching of `COCOeval.evaluateImg` and the per detection precision
+interpolation of `COCOeval.accumulate` are done with NumPy over all images and
+categories at once, while the IoU computation (`pycocotools.mask.iou`) and
+`summarize()` are shared with pycocotools. The resulting `stats` are identical
+to the ones of `COCOeval`.
+
+The following snippet demonstrates the use of interfaces:
+
+  coco_eval = FastCOCOeval(coco_gt, coco_dt, iouType='bbox')
+  coco_eval.evaluate()
+  coco_eval.accumulate()
+  coco_eval.summarize()
+  coco_metrics = coco_eval.stats
+"""
+
+import copy
+import datetime
+
+from absl import logging
+import numpy as np
+from pycocotools import cocoeval
+
+
+def _match_detections(ious, gt_ignore, gt_iscrowd, gt_valid, num_detections,
+                      iou_thresholds):
+  """Greedily matches detections to groundtruths like `COCOeval.evaluateImg`.
+
+  All image-category pairs, area ranges and IoU thresholds are matched at once
+  while the detections are visited in decreasing score order. A detection is
+  matched to the available groundtruth with the highest IoU above the
+  threshold, where non-ignored groundtruths are preferred over ignored ones
+  and ties go to the last groundtruth, exactly as in pycocotools.
+
+  Args:
+    ious: a float numpy array of shape [P, D, G] with the IoUs between the
+      score sorted detections and the groundtruths of P image-category pairs.
+    gt_ignore: a bool numpy array of shape [P, A, G] indicating whether a
+      groundtruth is ignored for each of the A area ranges.
+    gt_iscrowd: a bool numpy array of shape [P, G].
+    gt_valid: a bool numpy array of shape [P, G] masking out the padding.
+    num_detections: an int numpy array of shape [P] with the number of valid
+      detections of each pair, sorted in decreasing order.
+    iou_thresholds: a float numpy array of shape [T].
+
+  Returns:
+    A int numpy array of shape [P, A, T, D] with the index of the matched
+    groundtruth of each detection, or -1 if the detection is unmatched.
+  """
+  num_pairs, max_num_detections, _ = ious.shape
+  num_areas = gt_ignore.shape[1]
+  thresholds = np.minimum(iou_thresholds, 1 - 1e-10)[None, None, :, None]
+  gt_ignore = gt_ignore[:, :, None, :]
+  gt_iscrowd = gt_iscrowd[:, None, None, :]
+  gt_valid = gt_valid[:, None, None, :]
+
+  gt_matched = np.zeros(
+      (num_pairs, num_areas, len(iou_thresholds), ious.shape[2]), dtype=bool)
+  matches = -np.ones(
+      (num_pairs, num_areas, len(iou_thresholds), max_num_detections),
+      dtype=np.int64)
+  for d in range(max_num_detections):
+    # Pairs are sorted by their number of detections, so the pairs that still
+    # have a detection at position `d` form a prefix.
+    n = np.count_nonzero(num_detections > d)
+    iou = ious[:n, d, None, None, :]
+    candidates = (gt_valid[:n] & (~gt_matched[:n] | gt_iscrowd[:n]) &
+                  (iou >= thresholds))
+    regular_candidates = candidates & ~gt_ignore[:n]
+    candidates = np.where(
+        np.any(regular_candidates, axis=-1, keepdims=True),
+        regular_candidates, candidates & gt_ignore[:n])
+    candidate_ious = np.where(candidates, iou, -np.inf)
+    # Index of the last maximum, which is the one pycocotools keeps on ties.
+    best = (candidate_ious.shape[-1] - 1 -
+            np.argmax(candidate_ious[..., ::-1], axis=-1))
+    is_matched = np.any(candidates, axis=-1)
+    matches[:n, :, :, d] = np.where(is_matched, best, -1)
+    pair_ids, area_ids, threshold_ids = np.nonzero(is_matched)
+    gt_matched[pair_ids, area_ids, threshold_ids,
+               best[pair_ids, area_ids, threshold_ids]] = True
+  return matches
+
+
+class FastCOCOeval(cocoeval.COCOeval):
+  """COCOeval with vectorized `evaluate()` and `accumulate()`.
+
+  Unlike `COCOeval`, the per image results are not materialized as a list of
+  dicts in `evalImgs`; they are kept as flat arrays over all detections and
+  groundtruths that are consumed by `accumulate()`.
+  """
+
+  def __init__(self,
+               cocoGt=None,  # pylint: disable=invalid-name
+               cocoDt=None,  # pylint: disable=invalid-name
+               iouType='segm',  # pylint: disable=invalid-name
+               kpt_oks_sigmas=None,
+               max_pairs_per_chunk=4096):
+    """Constructs the evaluation object.
+
+    Args:
+      cocoGt: a COCO object with the groundtruth annotations.
+      cocoDt: a COCO object with the detection results.
+      iouType: one of 'segm', 'bbox' or 'keypoints'.
+      kpt_oks_sigmas: The sigmas used to calculate keypoint OKS. When None, it
+        will use the defaults in COCO.
+      max_pairs_per_chunk: the maximum number of image-category pairs that are
+        matched together, which bounds the memory used by `evaluate()`.
+    """
+    super(FastCOCOeval, self).__init__(cocoGt, cocoDt, iouType)
+    if kpt_oks_sigmas is not None:
+      self.params.kpt_oks_sigmas = np.array(kpt_oks_sigmas)
+    self._max_pairs_per_chunk = max_pairs_per_chunk
+    self._detections = None
+    self._groundtruths = None
+
+  def _get_anns(self, img_id, cat_id):
+    """Returns the groundtruths and score sorted detections of a pair."""
+    p = self.params
+    if p.useCats:
+      gts = self._gts[img_id, cat_id]
+      dts = self._dts[img_id, cat_id]
+    else:
+      gts = [g for c_id in p.catIds for g in self._gts[img_id, c_id]]
+      dts = [d for c_id in p.catIds for d in self._dts[img_id, c_id]]
+    order = np.argsort([-d['score'] for d in dts], kind='mergesort')
+    dts = [dts[i] for i in order[:p.maxDets[-1]]]
+    return gts, dts
+
+  def computeOks(self, imgId, catId):  # pylint: disable=invalid-name
+    """Computes the OKS between detections and groundtruths of a pair.
+
+    Same as `COCOeval.computeOks`, but computed for all detections of a
+    groundtruth at once.
+
+    Args:
+      imgId: the image id.
+      catId: the category id.
+
+    Returns:
+      A float numpy array of shape [num_detections, num_groundtruths], or an
+      empty list if there are no detections or no groundtruths.
+    """
+    gts, dts = self._get_anns(imgId, catId)
+    if not gts or not dts:
+      return []
+    sigmas = self.params.kpt_oks_sigmas
+    variances = (sigmas * 2)**2
+    num_keypoints = len(sigmas)
+    dt_keypoints = np.array([d['keypoints'] for d in dts], dtype=float)
+    xd = dt_keypoints[:, 0::3]
+    yd = dt_keypoints[:, 1::3]
+    zeros = np.zeros((len(dts), num_keypoints))
+    ious = np.zeros((len(dts), len(gts)))
+    for j, gt in enumerate(gts):
+      g = np.array(gt['keypoints'])
+      xg = g[0::3]
+      yg = g[1::3]
+      vg = g[2::3]
+      k1 = np.count_nonzero(vg > 0)
+      bb = gt['bbox']
+      x0 = bb[0] - bb[2]
+      x1 = bb[0] + bb[2] * 2
+      y0 = bb[1] - bb[3]
+      y1 = bb[1] + bb[3] * 2
+      if k1 > 0:
+        dx = xd - xg
+        dy = yd - yg
+      else:
+        dx = np.maximum(zeros, x0 - xd) + np.maximum(zeros, xd - x1)
+        dy = np.maximum(zeros, y0 - yd) + np.maximum(zeros, yd - y1)
+      e = (dx**2 + dy**2) / variances / (gt['area'] + np.spacing(1)) / 2
+      if k1 > 0:
+        e = e[:, vg > 0]
+      ious[:, j] = np.sum(np.exp(-e), axis=-1) / e.shape[-1]
+    return ious
+
+  def evaluate(self):
+    """Matches the detections of all images and categories."""
+    p = self.params
+    if p.useSegm is not None:
+      p.iouType = 'segm' if p.useSegm == 1 else 'bbox'
+    p.imgIds = list(np.unique(p.imgIds))
+    if p.useCats:
+      p.catIds = list(np.unique(p.catIds))
+    p.maxDets = sorted(p.maxDets)
+    self.params = p
+    self._prepare()
+
+    cat_ids = p.catIds if p.useCats else [-1]
+    img_index = {img_id: i for i, img_id in enumerate(p.imgIds)}
+    cat_index = {cat_id: k for k, cat_id in enumerate(cat_ids)}
+    if p.iouType == 'keypoints':
+      compute_iou = self.computeOks
+    else:
+      compute_iou = self.computeIoU
+    area_ranges = np.array(p.areaRng, dtype=float)
+    num_areas = len(area_ranges)
+    num_thresholds = len(p.iouThrs)
+
+    keys = set(self._gts) | set(self._dts)
+    if not p.useCats:
+      keys = set((img_id, -1) for img_id, _ in keys)
+    keys = sorted(
+        [key for key in keys if key[0] in img_index and key[1] in cat_index],
+        key=lambda key: (cat_index[key[1]], img_index[key[0]]))
+
+    self.ious = {}
+    pairs = []
+    for img_id, cat_id in keys:
+      gts, dts = self._get_anns(img_id, cat_id)
+      if not gts and not dts:
+        continue
+      gt_area = np.array([g['area'] for g in gts], dtype=float)
+      dt_area = np.array([d['area'] for d in dts], dtype=float)
+      pair = {
+          'cat_index': cat_index[cat_id],
+          'img_index': img_index[img_id],
+          'dt_scores': np.array([d['score'] for d in dts], dtype=float),
+          'dt_out_of_range': ((dt_area[None, :] < area_ranges[:, 0:1]) |
+                              (dt_area[None, :] > area_ranges[:, 1:2])),
+          'gt_ids': np.array([g['id'] for g in gts], dtype=np.int64),
+          'gt_iscrowd': np.array([g['iscrowd'] for g in gts], dtype=bool),
+          'gt_ignore': (np.array([g['ignore'] for g in gts], dtype=bool) |
+                        (gt_area[None, :] < area_ranges[:, 0:1]) |
+                        (gt_area[None, :] > area_ranges[:, 1:2])),
+      }
+      if gts and dts:
+        self.ious[img_id, cat_id] = compute_iou(img_id, cat_id)
+        pair['ious'] = np.asarray(self.ious[img_id, cat_id], dtype=float)
+      pairs.append(pair)
+
+    # Matching is only needed for pairs with both detections and groundtruths.
+    # Those are sorted by their number of detections and matched in chunks to
+    # bound the padding and the memory.
+    match_pairs = sorted(
+        [pair for pair in pairs if 'ious' in pair],
+        key=lambda pair: -len(pair['dt_scores']))
+    for start in range(0, len(match_pairs), self._max_pairs_per_chunk):
+      chunk = match_pairs[start:start + self._max_pairs_per_chunk]
+      max_dts = max(len(pair['dt_scores']) for pair in chunk)
+      max_gts = max(len(pair['gt_ids']) for pair in chunk)
+      ious = np.zeros((len(chunk), max_dts, max_gts))
+      gt_ignore = np.zeros((len(chunk), num_areas, max_gts), dtype=bool)
+      gt_iscrowd = np.zeros((len(chunk), max_gts), dtype=bool)
+      gt_valid = np.zeros((len(chunk), max_gts), dtype=bool)
+      for i, pair in enumerate(chunk):
+        num_dts, num_gts = pair['ious'].shape
+        ious[i, :num_dts, :num_gts] = pair['ious']
+        gt_ignore[i, :, :num_gts] = pair['gt_ignore']
+        gt_iscrowd[i, :num_gts] = pair['gt_iscrowd']
+        gt_valid[i, :num_gts] = True
+      matches = _match_detections(
+          ious, gt_ignore, gt_iscrowd, gt_valid,
+          np.array([len(pair['dt_scores']) for pair in chunk]),
+          np.array(p.iouThrs, dtype=float))
+      for i, pair in enumerate(chunk):
+        pair['matches'] = matches[i, :, :, :len(pair['dt_scores'])]
+
+    dt_matched = []
+    dt_ignore = []
+    for pair in pairs:
+      dt_out_of_range = pair['dt_out_of_range'][:, None, :]
+      if 'matches' in pair:
+        matches = pair['matches']
+        is_matched = matches >= 0
+        matches = np.maximum(matches, 0)
+        # A match with a groundtruth of id 0 is counted as unmatched, as in
+        # pycocotools.
+        matched = is_matched & (pair['gt_ids'][matches] != 0)
+        matched_gt_ignore = is_matched & np.take_along_axis(
+            np.broadcast_to(pair['gt_ignore'][:, None, :],
+                            (num_areas, num_thresholds,
+                             len(pair['gt_ids']))), matches, axis=-1)
+      else:
+        matched = np.zeros(
+            (num_areas, num_thresholds, len(pair['dt_scores'])), dtype=bool)
+        matched_gt_ignore = matched
+      dt_matched.append(matched)
+      dt_ignore.append(matched_gt_ignore | (~matched & dt_out_of_range))
+
+    self._detections = {
+        'cat_index': np.concatenate(
+            [np.full(len(pair['dt_scores']), pair['cat_index'])
+             for pair in pairs] + [np.zeros(0, dtype=int)]),
+        'img_index': np.concatenate(
+            [np.full(len(pair['dt_scores']), pair['img_index'])
+             for pair in pairs] + [np.zeros(0, dtype=int)]),
+        'rank': np.concatenate(
+            [np.arange(len(pair['dt_scores'])) for pair in pairs] +
+            [np.zeros(0, dtype=int)]),
+        'scores': np.concatenate(
+            [pair['dt_scores'] for pair in pairs] + [np.zeros(0)]),
+        'matched': np.concatenate(
+            dt_matched + [np.zeros((num_areas, num_thresholds, 0), bool)],
+            axis=-1),
+        'ignore': np.concatenate(
+            dt_ignore + [np.zeros((num_areas, num_thresholds, 0), bool)],
+            axis=-1),
+    }
+    self._groundtruths = {
+        'cat_index': np.concatenate(
+            [np.full(len(pair['gt_ids']), pair['cat_index'])
+             for pair in pairs] + [np.zeros(0, dtype=int)]),
+        'img_index': np.concatenate(
+            [np.full(len(pair['gt_ids']), pair['img_index'])
+             for pair in pairs] + [np.zeros(0, dtype=int)]),
+        'ignore': np.concatenate(
+            [pair['gt_ignore'] for pair in pairs] +
+            [np.zeros((num_areas, 0), bool)], axis=-1),
+    }
+    self.evalImgs = []
+    self._paramsEval = copy.deepcopy(self.params)
+    logging.info('Matched %d detections of %d image-category pairs.',
+                 len(self._detections['scores']), len(pairs))
+
+  def accumulate(self, p=None):
+    """Accumulates the matched detections into precision and recall.
+
+    Args:
+      p: (optional) the parameters to accumulate with. Its categories, area
+        ranges, max detections and images must be subsets of the parameters
+        used by `evaluate()`. Defaults to `self.params`.
+    """
+    if self._detections is None:
+      raise ValueError('Please run evaluate() first.')
+    if p is None:
+      p = self.params
+    p.catIds = p.catIds if p.useCats == 1 else [-1]
+    num_thresholds = len(p.iouThrs)
+    num_recalls = len(p.recThrs)
+    num_categories = len(p.catIds) if p.useCats else 1
+    num_areas = len(p.areaRng)
+    num_max_dets = len(p.maxDets)
+    precision = -np.ones(
+        (num_thresholds, num_recalls, num_categories, num_areas, num_max_dets))
+    recall = -np.ones((num_thresholds, num_categories, num_areas,
+                       num_max_dets))
+    scores = -np.ones(
+        (num_thresholds, num_recalls, num_categories, num_areas, num_max_dets))
+
+    pe = self._paramsEval
+    eval_cat_ids = list(pe.catIds) if pe.useCats else [-1]
+    eval_area_ranges = [tuple(a) for a in pe.areaRng]
+    k_list = [(k, eval_cat_ids.index(cat_id))
+              for k, cat_id in enumerate(p.catIds) if cat_id in eval_cat_ids]
+    a_list = [(a, eval_area_ranges.index(tuple(area_range)))
+              for a, area_range in enumerate(p.areaRng)
+              if tuple(area_range) in eval_area_ranges]
+    m_list = [(m, max_det) for m, max_det in enumerate(p.maxDets)
+              if max_det in pe.maxDets]
+    eval_img_ids = set(p.imgIds)
+    img_selected = np.array(
+        [img_id in eval_img_ids for img_id in pe.imgIds] + [False])
+
+    dets = self._detections
+    gts = self._groundtruths
+    det_selected = img_selected[dets['img_index']]
+    gt_selected = img_selected[gts['img_index']]
+    for k, k0 in k_list:
+      det_in_category = det_selected & (dets['cat_index'] == k0)
+      gt_in_category = gt_selected & (gts['cat_index'] == k0)
+      for a, a0 in a_list:
+        npig = np.count_nonzero(~gts['ignore'][a0][gt_in_category])
+        if npig == 0:
+          continue
+        for m, max_det in m_list:
+          det_ids = np.nonzero(det_in_category &
+                               (dets['rank'] < max_det))[0]
+          order = np.argsort(-dets['scores'][det_ids], kind='mergesort')
+          det_ids = det_ids[order]
+          dt_scores_sorted = dets['scores'][det_ids]
+          dtm = dets['matched'][a0][:, det_ids]
+          dt_ig = dets['ignore'][a0][:, det_ids]
+          tps = np.logical_and(dtm, np.logical_not(dt_ig))
+          fps = np.logical_and(np.logical_not(dtm), np.logical_not(dt_ig))
+          tp_sum = np.cumsum(tps, axis=1).astype(dtype=float)
+          fp_sum = np.cumsum(fps, axis=1).astype(dtype=float)
+          nd = len(det_ids)
+          if not nd:
+            recall[:, k, a, m] = 0
+            precision[:, :, k, a, m] = 0
+            scores[:, :, k, a, m] = 0
+            continue
+          rc = tp_sum / npig
+          pr = tp_sum / (fp_sum + tp_sum + np.spacing(1))
+          recall[:, k, a, m] = rc[:, -1]
+          # Makes the precision monotonically decreasing.
+          pr = np.maximum.accumulate(pr[:, ::-1], axis=1)[:, ::-1]
+          for t in range(num_thresholds):
+            inds = np.searchsorted(rc[t], p.recThrs, side='left')
+            valid = inds < nd
+            inds = np.minimum(inds, nd - 1)
+            precision[t, :, k, a, m] = np.where(valid, pr[t, inds], 0)
+            scores[t, :, k, a, m] = np.where(valid, dt_scores_sorted[inds], 0)
+
+    self.eval = {
+        'params': p,
+        'counts': [num_thresholds, num_recalls, num_categories, num_areas,
+                   num_max_dets],
+        'date': datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        'precision': precision,
+        'recall': recall,
+        'scores': scores,
+    }
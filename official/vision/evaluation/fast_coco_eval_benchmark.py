@@ -0,0 +1,163 @@
+# Copyright 2023 The TensorFlow Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+r"""Benchmarks `FastCOCOeval` against `pycocotools.cocoeval.COCOeval`.
+
+Both implementations run evaluate(), accumulate() and summarize() on the same
+groundtruths and detections, either synthetic or loaded from files, and the
+wall time and the summarized stats of both are reported.
+
+Example usage:
+    python fast_coco_eval_benchmark.py --iou_type=bbox --num_images=5000
+
+    python fast_coco_eval_benchmark.py --iou_type=segm \
+      --annotation_file="${VAL_ANNOTATIONS_FILE}" \
+      --detection_file="${DETECTIONS_JSON_FILE}"
+"""
+
+import contextlib
+import copy
+import io
+import json
+import time
+
+from absl import app
+from absl import flags
+from absl import logging
+import numpy as np
+from pycocotools import coco
+from pycocotools import cocoeval
+
+from official.vision.evaluation import fast_coco_eval
+
+flags.DEFINE_enum('iou_type', 'bbox', ['bbox', 'segm', 'keypoints'],
+                  'The COCO evaluation type.')
+flags.DEFINE_string(
+    'annotation_file', None, 'A COCO groundtruth JSON file. If not set, '
+    'synthetic groundtruths are generated.')
+flags.DEFINE_string(
+    'detection_file', None, 'A COCO detection results JSON file. Required '
+    'with `annotation_file`.')
+flags.DEFINE_integer('num_images', 5000, 'Number of synthetic images.')
+flags.DEFINE_integer('num_categories', 80, 'Number of synthetic categories.')
+flags.DEFINE_integer('num_groundtruths_per_image', 7,
+                     'Mean number of synthetic groundtruths per image.')
+flags.DEFINE_integer('num_detections_per_image', 100,
+                     'Number of synthetic detections per image.')
+flags.DEFINE_integer('seed', 0, 'Random seed of the synthetic data.')
+
+FLAGS = flags.FLAGS
+
+_NUM_KEYPOINTS = 17
+_IMAGE_SIZE = 640
+
+
+def _random_annotations(rng, num_annotations, num_categories):
+  """Creates random annotations with boxes, polygons and keypoints."""
+  xy = rng.uniform(0, _IMAGE_SIZE * 0.8, size=(num_annotations, 2))
+  wh = np.minimum(
+      rng.uniform(4, _IMAGE_SIZE * 0.4, size=(num_annotations, 2)),
+      _IMAGE_SIZE - 1 - xy)
+  category_ids = rng.randint(1, num_categories + 1, size=num_annotations)
+  annotations = []
+  for (x, y), (w, h), category_id in zip(xy, wh, category_ids):
+    keypoints = np.stack([
+        rng.uniform(x, x + w, _NUM_KEYPOINTS),
+        rng.uniform(y, y + h, _NUM_KEYPOINTS),
+        rng.choice([0, 2], _NUM_KEYPOINTS)
+    ], axis=-1)
+    annotations.append({
+        'category_id': int(category_id),
+        'bbox': [x, y, w, h],
+        'area': w * h,
+        'segmentation': [[x, y, x + w, y, x + w, y + h, x, y + h * 0.5]],
+        'keypoints': keypoints.reshape(-1).tolist(),
+        'num_keypoints': int(np.count_nonzero(keypoints[:, 2])),
+    })
+  return annotations
+
+
+def _create_synthetic_data():
+  """Creates synthetic groundtruths and jittered detections."""
+  rng = np.random.RandomState(FLAGS.seed)
+  images = [{'id': i + 1, 'height': _IMAGE_SIZE, 'width': _IMAGE_SIZE}
+            for i in range(FLAGS.num_images)]
+  categories = [{'id': i + 1} for i in range(FLAGS.num_categories)]
+  groundtruths = []
+  detections = []
+  for image in images:
+    image_groundtruths = _random_annotations(
+        rng, rng.poisson(FLAGS.num_groundtruths_per_image),
+        FLAGS.num_categories)
+    for ann in image_groundtruths:
+      ann['image_id'] = image['id']
+      ann['iscrowd'] = int(rng.rand() < 0.01)
+      ann['id'] = len(groundtruths) + 1
+      groundtruths.append(ann)
+    image_detections = _random_annotations(
+        rng, FLAGS.num_detections_per_image, FLAGS.num_categories)
+    for ann, det in zip(image_groundtruths, image_detections):
+      det.update(copy.deepcopy(ann))
+      det['bbox'] = (np.array(ann['bbox']) +
+                     rng.normal(0, 4, size=4)).clip(1).tolist()
+      del det['id'], det['iscrowd']
+    for det in image_detections:
+      det['image_id'] = image['id']
+      det['score'] = float(rng.rand())
+    detections.extend(image_detections)
+  gt_dataset = {'images': images, 'categories': categories,
+                'annotations': groundtruths}
+  return gt_dataset, detections
+
+
+def _run(coco_eval_cls, gt_dataset, detections):
+  """Runs a full COCO evaluation and returns the wall time and stats."""
+  with contextlib.redirect_stdout(io.StringIO()):
+    coco_gt = coco.COCO()
+    coco_gt.dataset = copy.deepcopy(gt_dataset)
+    coco_gt.createIndex()
+    coco_dt = coco_gt.loadRes(copy.deepcopy(detections))
+    start = time.time()
+    coco_eval = coco_eval_cls(coco_gt, coco_dt, iouType=FLAGS.iou_type)
+    coco_eval.evaluate()
+    coco_eval.accumulate()
+    coco_eval.summarize()
+  return time.time() - start, coco_eval.stats
+
+
+def main(_):
+  if FLAGS.annotation_file:
+    with open(FLAGS.annotation_file) as f:
+      gt_dataset = json.load(f)
+    with open(FLAGS.detection_file) as f:
+      detections = json.load(f)
+  else:
+    gt_dataset, detections = _create_synthetic_data()
+  logging.info('Evaluating %d detections on %d groundtruths.',
+               len(detections), len(gt_dataset['annotations']))
+
+  pycocotools_time, pycocotools_stats = _run(cocoeval.COCOeval, gt_dataset,
+                                             detections)
+  fast_time, fast_stats = _run(fast_coco_eval.FastCOCOeval, gt_dataset,
+                               detections)
+  logging.info('pycocotools COCOeval: %.2fs', pycocotools_time)
+  logging.info('FastCOCOeval: %.2fs (%.1fx)', fast_time,
+               pycocotools_time / fast_time)
+  logging.info('Max absolute stats difference: %g',
+               np.max(np.abs(np.array(pycocotools_stats) -
+                             np.array(fast_stats))))
+
+
+if __name__ == '__main__':
+  app.run(main)
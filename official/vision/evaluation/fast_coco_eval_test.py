@@ -0,0 +1,146 @@
+# Copyright 2023 The TensorFlow Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Tests for fast_coco_eval."""
+
+import copy
+
+from absl.testing import parameterized
+import numpy as np
+from pycocotools import coco
+from pycocotools import cocoeval
+import tensorflow as tf
+
+from official.vision.evaluation import fast_coco_eval
+
+_NUM_KEYPOINTS = 17
+
+
+def _random_annotation(rng, image_size, category_id):
+  x, y = rng.uniform(0, image_size * 0.8, size=2)
+  w, h = rng.uniform(2, image_size * 0.5, size=2)
+  w = min(w, image_size - x - 1)
+  h = min(h, image_size - y - 1)
+  keypoints = np.stack([
+      rng.uniform(x, x + w, _NUM_KEYPOINTS),
+      rng.uniform(y, y + h, _NUM_KEYPOINTS),
+      rng.choice([0, 2], _NUM_KEYPOINTS)
+  ], axis=-1)
+  return {
+      'category_id': category_id,
+      'bbox': [x, y, w, h],
+      'area': w * h,
+      'segmentation': [[x, y, x + w, y, x + w * 0.5, y + h, x, y + h * 0.5]],
+      'keypoints': keypoints.reshape(-1).tolist(),
+      'num_keypoints': int(np.count_nonzero(keypoints[:, 2])),
+  }
+
+
+def _create_datasets(seed, num_images=12, num_categories=3, image_size=200):
+  rng = np.random.RandomState(seed)
+  images = [{'id': i + 1, 'height': image_size, 'width': image_size}
+            for i in range(num_images)]
+  categories = [{'id': i + 1} for i in range(num_categories)]
+  groundtruths = []
+  detections = []
+  for image in images:
+    for _ in range(rng.randint(0, 8)):
+      ann = _random_annotation(rng, image_size,
+                               rng.randint(1, num_categories + 1))
+      ann['image_id'] = image['id']
+      ann['iscrowd'] = int(rng.rand() < 0.1)
+      ann['id'] = len(groundtruths) + 1
+      groundtruths.append(ann)
+      # Near duplicates of the groundtruth.
+      for _ in range(rng.randint(0, 3)):
+        det = copy.deepcopy(ann)
+        det['bbox'] = (np.array(det['bbox']) +
+                       rng.normal(0, 3, size=4)).clip(1).tolist()
+        det['score'] = float(rng.choice([0.3, 0.5, rng.rand()]))
+        del det['id'], det['iscrowd']
+        detections.append(det)
+    for _ in range(rng.randint(0, 6)):
+      det = _random_annotation(rng, image_size,
+                               rng.randint(1, num_categories + 1))
+      det['image_id'] = image['id']
+      det['score'] = float(rng.rand())
+      detections.append(det)
+  gt_dataset = {'images': images, 'categories': categories,
+                'annotations': groundtruths}
+  return gt_dataset, detections
+
+
+def _load_coco(gt_dataset, detections):
+  coco_gt = coco.COCO()
+  coco_gt.dataset = copy.deepcopy(gt_dataset)
+  coco_gt.createIndex()
+  coco_dt = coco_gt.loadRes(copy.deepcopy(detections))
+  return coco_gt, coco_dt
+
+
+class FastCOCOevalTest(tf.test.TestCase, parameterized.TestCase):
+
+  @parameterized.parameters(
+      ('bbox', 0), ('bbox', 1), ('segm', 2), ('keypoints', 3))
+  def test_matches_pycocotools(self, iou_type, seed):
+    gt_dataset, detections = _create_datasets(seed)
+
+    coco_gt, coco_dt = _load_coco(gt_dataset, detections)
+    expected_eval = cocoeval.COCOeval(coco_gt, coco_dt, iouType=iou_type)
+    expected_eval.evaluate()
+    expected_eval.accumulate()
+    expected_eval.summarize()
+
+    coco_gt, coco_dt = _load_coco(gt_dataset, detections)
+    fast_eval = fast_coco_eval.FastCOCOeval(
+        coco_gt, coco_dt, iouType=iou_type, max_pairs_per_chunk=5)
+    fast_eval.evaluate()
+    fast_eval.accumulate()
+    fast_eval.summarize()
+
+    self.assertAllEqual(expected_eval.eval['precision'],
+                        fast_eval.eval['precision'])
+    self.assertAllEqual(expected_eval.eval['recall'], fast_eval.eval['recall'])
+    self.assertAllEqual(expected_eval.eval['scores'], fast_eval.eval['scores'])
+    self.assertAllEqual(expected_eval.stats, fast_eval.stats)
+
+  def test_max_detections(self):
+    gt_dataset, detections = _create_datasets(seed=4)
+
+    coco_gt, coco_dt = _load_coco(gt_dataset, detections)
+    expected_eval = cocoeval.COCOeval(coco_gt, coco_dt, iouType='bbox')
+    expected_eval.params.maxDets = [1, 2, 3]
+    expected_eval.evaluate()
+    expected_eval.accumulate()
+
+    coco_gt, coco_dt = _load_coco(gt_dataset, detections)
+    fast_eval = fast_coco_eval.FastCOCOeval(coco_gt, coco_dt, iouType='bbox')
+    fast_eval.params.maxDets = [1, 2, 3]
+    fast_eval.evaluate()
+    fast_eval.accumulate()
+
+    self.assertAllEqual(expected_eval.eval['precision'],
+                        fast_eval.eval['precision'])
+    self.assertAllEqual(expected_eval.eval['recall'], fast_eval.eval['recall'])
+
+  def test_accumulate_before_evaluate_raises(self):
+    gt_dataset, detections = _create_datasets(seed=5)
+    coco_gt, coco_dt = _load_coco(gt_dataset, detections)
+    fast_eval = fast_coco_eval.FastCOCOeval(coco_gt, coco_dt, iouType='bbox')
+    with self.assertRaises(ValueError):
+      fast_eval.accumulate()
+
+
+if __name__ == '__main__':
+  tf.test.main()
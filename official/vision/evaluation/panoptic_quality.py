@@ -26,6 +26,7 @@ https://github.com/tensorflow/models/blob/master/research/deeplab/evaluation/pan
 """
 
 import collections
+import itertools
 from typing import Any, Dict, Optional, Tuple, Union
 
 import numpy as np
@@ -42,10 +43,120 @@ def realdiv_maybe_zero(x, y):
       np.less(np.abs(y), _EPSILON), np.zeros_like(x), np.divide(x, y))
 
 
-def _ids_to_counts(id_array):
-  """Given a numpy array, a mapping from each unique entry to its count."""
-  ids, counts = np.unique(id_array, return_counts=True)
-  return dict(zip(ids, counts))
+def _combine_labels(category_mask, instance_mask, max_instances_per_category):
+  """Naively creates a combined label array from categories and instances."""
+  return (category_mask.astype(np.uint32) * max_instances_per_category +
+          instance_mask.astype(np.uint32))
+
+
+def _unique_with_index(ids):
+  """Returns the unique ids, the index of each entry in them and their counts.
+
+  This is `np.unique(ids, return_inverse=True, return_counts=True)`, computed
+  with `np.bincount` and a lookup table instead of sorting when the ids are
+  small enough.
+
+  Args:
+    ids: A 1D array of non-negative integer ids.
+  """
+  max_id = int(ids.max()) if ids.size else 0
+  if max_id > 4 * ids.size:
+    return np.unique(ids, return_inverse=True, return_counts=True)
+  counts = np.bincount(ids, minlength=max_id + 1)
+  unique_ids = np.flatnonzero(counts)
+  lookup = np.zeros(max_id + 1, dtype=np.int64)
+  lookup[unique_ids] = np.arange(unique_ids.size)
+  return unique_ids.astype(ids.dtype), lookup[ids], counts[unique_ids]
+
+
+def _compare_segments(groundtruth_category_mask, groundtruth_instance_mask,
+                      predicted_category_mask, predicted_instance_mask,
+                      ignored_label, max_instances_per_category):
+  """Matches the ground-truth and predicted segments of one image.
+
+  See `PanopticQuality.compare_and_accumulate` for the meaning of the inputs.
+
+  Args:
+    groundtruth_category_mask: A 2D array of ground-truth category labels.
+    groundtruth_instance_mask: A 2D array of ground-truth instance labels.
+    predicted_category_mask: A 2D array of predicted category labels.
+    predicted_instance_mask: A 2D array of predicted instance labels.
+    ignored_label: The category id that is ignored in evaluation.
+    max_instances_per_category: The maximum number of instances per category.
+
+  Returns:
+    A tuple `(tp_categories, tp_ious, fn_categories, fp_categories)` of 1D
+    arrays: the category and IoU of every matched pair of segments, ordered by
+    ground-truth then predicted segment id, and the categories of the
+    ground-truth and predicted segments counted as false negatives and false
+    positives respectively.
+  """
+  gt_segment_id = _combine_labels(groundtruth_category_mask,
+                                  groundtruth_instance_mask,
+                                  max_instances_per_category).ravel()
+  pred_segment_id = _combine_labels(predicted_category_mask,
+                                    predicted_instance_mask,
+                                    max_instances_per_category).ravel()
+
+  # Finds the unique segments, their areas and the segment index of each pixel.
+  gt_ids, gt_index, gt_areas = _unique_with_index(gt_segment_id)
+  pred_ids, pred_index, pred_areas = _unique_with_index(pred_segment_id)
+  num_gt, num_pred = len(gt_ids), len(pred_ids)
+
+  # Counts the pixels of every non-empty intersection of a ground-truth and a
+  # predicted segment, in one pass over the compact pair indices
+  #   gt_index * num_pred + pred_index.
+  pair_index = gt_index.astype(np.int64) * num_pred + pred_index
+  if num_gt * num_pred <= pair_index.size:
+    pair_areas = np.bincount(pair_index, minlength=num_gt * num_pred)
+    pair_index = np.flatnonzero(pair_areas)
+    pair_areas = pair_areas[pair_index]
+  else:
+    pair_index, pair_areas = np.unique(pair_index, return_counts=True)
+  pair_gt, pair_pred = np.divmod(pair_index, num_pred)
+
+  gt_categories = gt_ids // max_instances_per_category
+  pred_categories = pred_ids // max_instances_per_category
+  gt_ignored = gt_categories == ignored_label
+
+  # Area of the overlap between every predicted segment and the ground-truth
+  # void segment, which we assume is unique and has instance id = 0, and the
+  # total overlap with all the ignored ground-truth segments (void and crowd).
+  is_void_pair = gt_ids[pair_gt] == ignored_label * max_instances_per_category
+  void_overlap = np.zeros(num_pred, dtype=pair_areas.dtype)
+  void_overlap[pair_pred[is_void_pair]] = pair_areas[is_void_pair]
+  is_ignored_pair = gt_ignored[pair_gt]
+  ignored_overlap = np.bincount(
+      pair_pred[is_ignored_pair],
+      weights=pair_areas[is_ignored_pair],
+      minlength=num_pred)
+
+  # Calculates the IoU of every pair of intersecting segments of the same
+  # category. The union does not include the portion of the predicted segment
+  # that consists of ground-truth "void" pixels.
+  same_category = gt_categories[pair_gt] == pred_categories[pair_pred]
+  pair_gt = pair_gt[same_category]
+  pair_pred = pair_pred[same_category]
+  pair_areas = pair_areas[same_category]
+  union = (
+      gt_areas[pair_gt] + pred_areas[pair_pred] - pair_areas -
+      void_overlap[pair_pred])
+  with np.errstate(divide='ignore', invalid='ignore'):
+    ious = pair_areas / union
+  matched = ious > 0.5
+
+  gt_matched = np.zeros(num_gt, dtype=bool)
+  gt_matched[pair_gt[matched]] = True
+  pred_matched = np.zeros(num_pred, dtype=bool)
+  pred_matched[pair_pred[matched]] = True
+
+  # Failing to detect a void segment is not a false negative, and a false
+  # positive is not penalized if it is mostly ignored in the ground-truth.
+  fn_categories = gt_categories[~gt_matched & ~gt_ignored]
+  mostly_ignored = ignored_overlap / pred_areas > 0.5
+  fp_categories = pred_categories[~pred_matched & ~mostly_ignored]
+  return (gt_categories[pair_gt[matched]], ious[matched], fn_categories,
+          fp_categories)
 
 
 class PanopticQuality:
@@ -79,8 +190,8 @@ class PanopticQuality:
 
   def _naively_combine_labels(self, category_mask, instance_mask):
     """Naively creates a combined label array from categories and instances."""
-    return (category_mask.astype(np.uint32) * self.max_instances_per_category +
-            instance_mask.astype(np.uint32))
+    return _combine_labels(category_mask, instance_mask,
+                           self.max_instances_per_category)
 
   def compare_and_accumulate(self, groundtruths, predictions):
     """Compares predictions with ground-truths, and accumulates the metrics.
@@ -106,113 +217,47 @@ class PanopticQuality:
           category labels.
         - instance_array: A 2D numpy uint16 array of predicted instance labels.
     """
-    groundtruth_category_mask = groundtruths['category_mask']
-    groundtruth_instance_mask = groundtruths['instance_mask']
-    predicted_category_mask = predictions['category_mask']
-    predicted_instance_mask = predictions['instance_mask']
-
-    # First, combine the category and instance labels so that every unique
-    # value for (category, instance) is assigned a unique integer label.
-    pred_segment_id = self._naively_combine_labels(predicted_category_mask,
-                                                   predicted_instance_mask)
-    gt_segment_id = self._naively_combine_labels(groundtruth_category_mask,
-                                                 groundtruth_instance_mask)
-
-    # Pre-calculate areas for all ground-truth and predicted segments.
-    gt_segment_areas = _ids_to_counts(gt_segment_id)
-    pred_segment_areas = _ids_to_counts(pred_segment_id)
-
-    # We assume there is only one void segment and it has instance id = 0.
-    void_segment_id = self.ignored_label * self.max_instances_per_category
-
-    # There may be other ignored ground-truth segments with instance id > 0,
-    # find those ids using the unique segment ids extracted with the area
-    # computation above.
-    ignored_segment_ids = {
-        gt_segment_id for gt_segment_id in gt_segment_areas
-        if (gt_segment_id //
-            self.max_instances_per_category) == self.ignored_label
-    }
+    self._accumulate(*_compare_segments(*self._compare_args(
+        groundtruths, predictions)))
+
+  def compare_and_accumulate_batch(self, groundtruths, predictions, pool=None):
+    """Compares and accumulates a sequence of images, optionally in parallel.
+
+    The images are compared independently, in `pool` if provided, but always
+    accumulated in order, so the metrics are identical to those of calling
+    `compare_and_accumulate` on every image in turn.
 
-    # Next, combine the ground-truth and predicted labels. Divide up the pixels
-    # based on which ground-truth segment and predicted segment they belong to,
-    # this will assign a different 32-bit integer label to each choice of
-    # (ground-truth segment, predicted segment), encoded as
-    #   gt_segment_id * offset + pred_segment_id.
-    intersection_id_array = (
-        gt_segment_id.astype(np.uint64) * self.offset +
-        pred_segment_id.astype(np.uint64))
-
-    # For every combination of (ground-truth segment, predicted segment) with a
-    # non-empty intersection, this counts the number of pixels in that
-    # intersection.
-    intersection_areas = _ids_to_counts(intersection_id_array)
-
-    # Helper function that computes the area of the overlap between a predicted
-    # segment and the ground-truth void/ignored segment.
-    def prediction_void_overlap(pred_segment_id):
-      void_intersection_id = void_segment_id * self.offset + pred_segment_id
-      return intersection_areas.get(void_intersection_id, 0)
-
-    # Compute overall ignored overlap.
-    def prediction_ignored_overlap(pred_segment_id):
-      total_ignored_overlap = 0
-      for ignored_segment_id in ignored_segment_ids:
-        intersection_id = ignored_segment_id * self.offset + pred_segment_id
-        total_ignored_overlap += intersection_areas.get(intersection_id, 0)
-      return total_ignored_overlap
-
-    # Sets that are populated with segments which ground-truth/predicted
-    # segments have been matched with overlapping predicted/ground-truth
-    # segments respectively.
-    gt_matched = set()
-    pred_matched = set()
-
-    # Calculate IoU per pair of intersecting segments of the same category.
-    for intersection_id, intersection_area in intersection_areas.items():
-      gt_segment_id = int(intersection_id // self.offset)
-      pred_segment_id = int(intersection_id % self.offset)
-
-      gt_category = int(gt_segment_id // self.max_instances_per_category)
-      pred_category = int(pred_segment_id // self.max_instances_per_category)
-      if gt_category != pred_category:
-        continue
-
-      # Union between the ground-truth and predicted segments being compared
-      # does not include the portion of the predicted segment that consists of
-      # ground-truth "void" pixels.
-      union = (
-          gt_segment_areas[gt_segment_id] +
-          pred_segment_areas[pred_segment_id] - intersection_area -
-          prediction_void_overlap(pred_segment_id))
-      iou = intersection_area / union
-      if iou > 0.5:
-        self.tp_per_class[gt_category] += 1
-        self.iou_per_class[gt_category] += iou
-        gt_matched.add(gt_segment_id)
-        pred_matched.add(pred_segment_id)
-
-    # Count false negatives for each category.
-    for gt_segment_id in gt_segment_areas:
-      if gt_segment_id in gt_matched:
-        continue
-      category = gt_segment_id // self.max_instances_per_category
-      # Failing to detect a void segment is not a false negative.
-      if category == self.ignored_label:
-        continue
-      self.fn_per_class[category] += 1
-
-    # Count false positives for each category.
-    for pred_segment_id in pred_segment_areas:
-      if pred_segment_id in pred_matched:
-        continue
-      # A false positive is not penalized if is mostly ignored in the
-      # ground-truth.
-      if (prediction_ignored_overlap(pred_segment_id) /
-          pred_segment_areas[pred_segment_id]) > 0.5:
-        continue
-      category = pred_segment_id // self.max_instances_per_category
-      self.fp_per_class[category] += 1
+    Args:
+      groundtruths: A sequence of ground-truth dictionaries, see
+        `compare_and_accumulate`.
+      predictions: A sequence of prediction dictionaries of the same length, see
+        `compare_and_accumulate`.
+      pool: An optional `multiprocessing.pool.Pool` in which to compare the
+        images.
+    """
+    args = [
+        self._compare_args(groundtruth, prediction)
+        for groundtruth, prediction in zip(groundtruths, predictions)
+    ]
+    if pool is None:
+      results = itertools.starmap(_compare_segments, args)
+    else:
+      results = pool.starmap(_compare_segments, args)
+    for result in results:
+      self._accumulate(*result)
+
+  def _compare_args(self, groundtruths, predictions):
+    return (groundtruths['category_mask'], groundtruths['instance_mask'],
+            predictions['category_mask'], predictions['instance_mask'],
+            self.ignored_label, self.max_instances_per_category)
+
+  def _accumulate(self, tp_categories, tp_ious, fn_categories, fp_categories):
+    # `np.add.at` adds repeated indices in order, so the IoU sums are the same
+    # as when accumulating the matches one at a time.
+    np.add.at(self.tp_per_class, tp_categories, 1)
+    np.add.at(self.iou_per_class, tp_categories, tp_ious)
+    np.add.at(self.fn_per_class, fn_categories, 1)
+    np.add.at(self.fp_per_class, fp_categories, 1)
 
   def _valid_categories(self):
     """Categories with a "valid" value for the metric, have > 0 instances.
@@ -26,6 +26,8 @@ The following snippet demonstrates the use of interfaces:
 See also: https://github.com/cocodataset/cocoapi/
 """
 
+import multiprocessing
+
 import numpy as np
 import tensorflow as tf
 
@@ -53,7 +55,8 @@ class PanopticQualityEvaluator:
   """Panoptic Quality metric class."""
 
   def __init__(self, num_categories, ignored_label, max_instances_per_category,
-               offset, is_thing=None, rescale_predictions=False):
+               offset, is_thing=None, rescale_predictions=False,
+               num_workers=0):
     """Constructs Panoptic Quality evaluation class.
 
     The class provides the interface to Panoptic Quality metrics_fn.
@@ -75,11 +78,20 @@ class PanopticQualityEvaluator:
       rescale_predictions: `bool`, whether to scale back prediction to original
         image sizes. If True, groundtruths['image_info'] is used to rescale
         predictions.
+      num_workers: The number of worker processes in which to compare the
+        images of each batch. If 0, images are compared in the calling process.
+        The results do not depend on this setting. The workers are started by
+        the first `update_state` call and terminated by `reset_states`, which
+        `result` calls, or by `close`. So every evaluation pays the startup
+        cost of the workers, which import the main module and with it
+        TensorFlow; this only pays off when evaluating many or large images.
     """
     self._pq_metric_module = panoptic_quality.PanopticQuality(
         num_categories, ignored_label, max_instances_per_category, offset)
     self._is_thing = is_thing
     self._rescale_predictions = rescale_predictions
+    self._num_workers = num_workers
+    self._pool = None
     self._required_prediction_fields = ['category_mask', 'instance_mask']
     self._required_groundtruth_fields = ['category_mask', 'instance_mask']
     self.reset_states()
@@ -91,6 +103,15 @@ class PanopticQualityEvaluator:
   def reset_states(self):
     """Resets internal states for a fresh run."""
     self._pq_metric_module.reset()
+    # Workers are not kept alive between evaluations.
+    self.close()
+
+  def close(self):
+    """Terminates the worker processes, if any were started."""
+    if self._pool is not None:
+      self._pool.terminate()
+      self._pool.join()
+      self._pool = None
 
   def result(self):
     """Evaluates detection results, and reset_states."""
@@ -160,35 +181,34 @@ class PanopticQualityEvaluator:
         raise ValueError(
             'Missing the required key `{}` in groundtruths!'.format(k))
 
-    if self._rescale_predictions:
-      for idx in range(len(groundtruths['category_mask'])):
+    groundtruths_list = []
+    predictions_list = []
+    for idx in range(len(groundtruths['category_mask'])):
+      groundtruths_ = {
+          'category_mask': groundtruths['category_mask'][idx],
+          'instance_mask': groundtruths['instance_mask'][idx]
+      }
+      predictions_ = {
+          'category_mask': predictions['category_mask'][idx],
+          'instance_mask': predictions['instance_mask'][idx]
+      }
+      if self._rescale_predictions:
         image_info = groundtruths['image_info'][idx]
         groundtruths_ = {
-            'category_mask':
-                _crop_padding(groundtruths['category_mask'][idx], image_info),
-            'instance_mask':
-                _crop_padding(groundtruths['instance_mask'][idx], image_info),
-            }
-        predictions_ = {
-            'category_mask':
-                _crop_padding(predictions['category_mask'][idx], image_info),
-            'instance_mask':
-                _crop_padding(predictions['instance_mask'][idx], image_info),
-            }
-        groundtruths_, predictions_ = self._convert_to_numpy(
-            groundtruths_, predictions_)
-
-        self._pq_metric_module.compare_and_accumulate(
-            groundtruths_, predictions_)
-    else:
-      for idx in range(len(groundtruths['category_mask'])):
-        groundtruths_ = {
-            'category_mask': groundtruths['category_mask'][idx],
-            'instance_mask': groundtruths['instance_mask'][idx]
+            key: _crop_padding(mask, image_info)
+            for key, mask in groundtruths_.items()
         }
         predictions_ = {
-            'category_mask': predictions['category_mask'][idx],
-            'instance_mask': predictions['instance_mask'][idx]
+            key: _crop_padding(mask, image_info)
+            for key, mask in predictions_.items()
         }
-        self._pq_metric_module.compare_and_accumulate(groundtruths_,
-                                                      predictions_)
+        groundtruths_, predictions_ = self._convert_to_numpy(
+            groundtruths_, predictions_)
+      groundtruths_list.append(groundtruths_)
+      predictions_list.append(predictions_)
+
+    if self._num_workers and self._pool is None:
+      # TensorFlow is not fork-safe, so the workers are spawned.
+      self._pool = multiprocessing.get_context('spawn').Pool(self._num_workers)
+    self._pq_metric_module.compare_and_accumulate_batch(
+        groundtruths_list, predictions_list, pool=self._pool)
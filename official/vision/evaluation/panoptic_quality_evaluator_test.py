@@ -19,6 +19,8 @@ import tensorflow as tf
 
 from official.vision.evaluation import panoptic_quality_evaluator
 
+# pylint: disable=protected-access
+
 
 class PanopticQualityEvaluatorTest(tf.test.TestCase):
 
@@ -91,6 +93,59 @@ class PanopticQualityEvaluatorTest(tf.test.TestCase):
     self.assertAlmostEqual(results['All_sq'], 0.84236111)
     self.assertEqual(results['All_num_categories'], 1)
 
+  def test_num_workers(self):
+    rng = np.random.RandomState(0)
+    category_mask = np.kron(
+        rng.randint(3, size=[4, 3, 3]), np.ones([1, 4, 4])).astype(np.uint16)
+    instance_mask = np.kron(
+        rng.randint(4, size=[4, 3, 3]), np.ones([1, 4, 4])).astype(np.uint16)
+    groundtruths = {
+        'category_mask': tf.convert_to_tensor(category_mask),
+        'instance_mask': tf.convert_to_tensor(instance_mask),
+    }
+    predictions = {
+        'category_mask': tf.convert_to_tensor(np.roll(category_mask, 1, 1)),
+        'instance_mask': tf.convert_to_tensor(np.roll(instance_mask, 1, 1)),
+    }
+
+    results = []
+    for num_workers in [0, 2]:
+      pq_evaluator = panoptic_quality_evaluator.PanopticQualityEvaluator(
+          num_categories=3,
+          ignored_label=0,
+          max_instances_per_category=16,
+          offset=256,
+          num_workers=num_workers)
+      pq_evaluator.update_state(groundtruths, predictions)
+      results.append(pq_evaluator.result())
+      # The workers are terminated once the evaluation is done.
+      self.assertIsNone(pq_evaluator._pool)
+    tf.nest.map_structure(np.testing.assert_array_equal, results[0],
+                          results[1])
+
+  def test_close(self):
+    pq_evaluator = panoptic_quality_evaluator.PanopticQualityEvaluator(
+        num_categories=3,
+        ignored_label=0,
+        max_instances_per_category=16,
+        offset=256,
+        num_workers=2)
+    mask = tf.zeros([2, 8, 8], tf.uint16)
+    masks = {'category_mask': mask, 'instance_mask': mask}
+    pq_evaluator.update_state(masks, masks)
+    pool = pq_evaluator._pool
+    self.assertIsNotNone(pool)
+
+    pq_evaluator.close()
+    self.assertIsNone(pq_evaluator._pool)
+    with self.assertRaises(ValueError):
+      pool.apply(int)
+    # Closing again is a no-op, and a new update restarts the workers.
+    pq_evaluator.close()
+    pq_evaluator.update_state(masks, masks)
+    self.assertIsNotNone(pq_evaluator._pool)
+    pq_evaluator.close()
+
 
 if __name__ == '__main__':
   tf.test.main()
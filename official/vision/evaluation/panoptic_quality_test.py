@@ -18,6 +18,8 @@ Note that this metric test class is branched from
 https://github.com/tensorflow/models/blob/master/research/deeplab/evaluation/panoptic_quality_test.py
 """
 
+import collections
+from multiprocessing import pool as mp_pool
 
 from absl.testing import absltest
 import numpy as np
@@ -26,6 +28,71 @@ import tensorflow as tf
 from official.vision.evaluation import panoptic_quality
 
 
+def _reference_compare_and_accumulate(pq_metric, groundtruths, predictions):
+  """Accumulates the metrics by iterating over every pair of segments."""
+  max_instances = pq_metric.max_instances_per_category
+  gt_segment_id = (
+      groundtruths['category_mask'].astype(np.int64) * max_instances +
+      groundtruths['instance_mask']).ravel()
+  pred_segment_id = (
+      predictions['category_mask'].astype(np.int64) * max_instances +
+      predictions['instance_mask']).ravel()
+  gt_areas = collections.Counter(gt_segment_id.tolist())
+  pred_areas = collections.Counter(pred_segment_id.tolist())
+  intersections = collections.Counter(
+      zip(gt_segment_id.tolist(), pred_segment_id.tolist()))
+  void_segment_id = pq_metric.ignored_label * max_instances
+
+  gt_matched = set()
+  pred_matched = set()
+  for (gt_id, pred_id), area in sorted(intersections.items()):
+    if gt_id // max_instances != pred_id // max_instances:
+      continue
+    union = (
+        gt_areas[gt_id] + pred_areas[pred_id] - area -
+        intersections[(void_segment_id, pred_id)])
+    iou = np.float64(area) / union
+    if iou > 0.5:
+      pq_metric.tp_per_class[gt_id // max_instances] += 1
+      pq_metric.iou_per_class[gt_id // max_instances] += iou
+      gt_matched.add(gt_id)
+      pred_matched.add(pred_id)
+  for gt_id in gt_areas:
+    if (gt_id not in gt_matched and
+        gt_id // max_instances != pq_metric.ignored_label):
+      pq_metric.fn_per_class[gt_id // max_instances] += 1
+  for pred_id in pred_areas:
+    ignored_overlap = sum(
+        intersections[(gt_id, pred_id)]
+        for gt_id in gt_areas
+        if gt_id // max_instances == pq_metric.ignored_label)
+    if (pred_id not in pred_matched and
+        ignored_overlap / pred_areas[pred_id] <= 0.5):
+      pq_metric.fp_per_class[pred_id // max_instances] += 1
+
+
+def _random_panoptic_masks(rng, num_categories, num_instances):
+  """Returns random ground-truth and predicted masks with overlapping blobs."""
+  shape = (4, 6)
+  groundtruths = {
+      'category_mask':
+          np.kron(rng.randint(num_categories, size=shape), np.ones((8, 8))),
+      'instance_mask':
+          np.kron(rng.randint(num_instances, size=shape), np.ones((8, 8))),
+  }
+  shift = rng.randint(-2, 3, size=2)
+  predictions = {
+      key: np.roll(mask, shift, axis=(0, 1))
+      for key, mask in groundtruths.items()
+  }
+  for masks in [groundtruths, predictions]:
+    noise = rng.rand(*masks['category_mask'].shape) < 0.05
+    masks['category_mask'][noise] = rng.randint(
+        num_categories, size=noise.sum())
+  return (tf.nest.map_structure(lambda x: x.astype(np.uint16), groundtruths),
+          tf.nest.map_structure(lambda x: x.astype(np.uint16), predictions))
+
+
 class PanopticQualityTest(absltest.TestCase):
 
   def test_perfect_match(self):
@@ -301,6 +368,55 @@ class PanopticQualityTest(absltest.TestCase):
     self.assertAlmostEqual(results['All_sq'], 1.0)
     self.assertEqual(results['All_num_categories'], 2)
 
+  def test_matches_reference_implementation(self):
+    rng = np.random.RandomState(0)
+    for ignored_label in [0, 2, 4]:
+      pq_metric = panoptic_quality.PanopticQuality(
+          num_categories=5,
+          ignored_label=ignored_label,
+          max_instances_per_category=16,
+          offset=256)
+      reference_metric = panoptic_quality.PanopticQuality(
+          num_categories=5,
+          ignored_label=ignored_label,
+          max_instances_per_category=16,
+          offset=256)
+      for _ in range(5):
+        groundtruths, predictions = _random_panoptic_masks(rng, 5, 4)
+        pq_metric.compare_and_accumulate(groundtruths, predictions)
+        _reference_compare_and_accumulate(reference_metric, groundtruths,
+                                          predictions)
+
+      # The results are bit-exact, including the summed IoUs.
+      for name in ['iou_per_class', 'tp_per_class', 'fn_per_class',
+                   'fp_per_class']:
+        np.testing.assert_array_equal(
+            getattr(pq_metric, name), getattr(reference_metric, name))
+
+  def test_compare_and_accumulate_batch(self):
+    rng = np.random.RandomState(1)
+    groundtruths, predictions = zip(
+        *[_random_panoptic_masks(rng, 3, 8) for _ in range(6)])
+    pq_metric = panoptic_quality.PanopticQuality(
+        num_categories=3, ignored_label=0, max_instances_per_category=16,
+        offset=256)
+    for groundtruth, prediction in zip(groundtruths, predictions):
+      pq_metric.compare_and_accumulate(groundtruth, prediction)
+
+    thread_pool = mp_pool.ThreadPool(2)
+    self.addCleanup(thread_pool.join)
+    self.addCleanup(thread_pool.close)
+    for pool in [None, thread_pool]:
+      batch_pq_metric = panoptic_quality.PanopticQuality(
+          num_categories=3, ignored_label=0, max_instances_per_category=16,
+          offset=256)
+      batch_pq_metric.compare_and_accumulate_batch(
+          groundtruths, predictions, pool=pool)
+      for name in ['iou_per_class', 'tp_per_class', 'fn_per_class',
+                   'fp_per_class']:
+        np.testing.assert_array_equal(
+            getattr(batch_pq_metric, name), getattr(pq_metric, name))
+
 
 class PanopticQualityV2Test(tf.test.TestCase):
 
@@ -0,0 +1,93 @@
+# Copyright 2023 The TensorFlow Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Lazy registration of the experiments and tasks of `official.vision`.
+
+Importing this module registers every experiment name and task defined in
+`official.vision` without importing the modules defining them. The config
+module of an experiment is imported when the experiment is first looked up by
+`exp_factory.get_exp_config`, and the module of a task when it is first
+created by `task_factory.get_task`.
+
+`official/core/registry_test.py` checks that these entries match the ones
+registered by importing the modules.
+"""
+
+from official.core import exp_factory
+from official.core import task_factory
+
+# Experiment names registered by each config module.
+EXPERIMENTS = {
+    'official.vision.configs.image_classification': [
+        'image_classification',
+        'resnet_imagenet',
+        'resnet_rs_imagenet',
+        'revnet_imagenet',
+        'mobilenet_imagenet',
+        'deit_imagenet_pretrain',
+        'vit_imagenet_pretrain',
+        'vit_imagenet_finetune',
+    ],
+    'official.vision.configs.maskrcnn': [
+        'fasterrcnn_resnetfpn_coco',
+        'maskrcnn_resnetfpn_coco',
+        'maskrcnn_spinenet_coco',
+        'cascadercnn_spinenet_coco',
+        'maskrcnn_mobilenet_coco',
+    ],
+    'official.vision.configs.retinanet': [
+        'retinanet',
+        'retinanet_resnetfpn_coco',
+        'retinanet_spinenet_coco',
+        'retinanet_mobile_coco',
+    ],
+    'official.vision.configs.semantic_segmentation': [
+        'semantic_segmentation',
+        'seg_deeplabv3_pascal',
+        'seg_deeplabv3plus_pascal',
+        'seg_resnetfpn_pascal',
+        'mnv2_deeplabv3_pascal',
+        'seg_deeplabv3plus_cityscapes',
+        'mnv2_deeplabv3_cityscapes',
+        'mnv2_deeplabv3plus_cityscapes',
+    ],
+    'official.vision.configs.video_classification': [
+        'video_classification',
+        'video_classification_ucf101',
+        'video_classification_kinetics400',
+        'video_classification_kinetics600',
+        'video_classification_kinetics700',
+        'video_classification_kinetics700_2020',
+    ],
+}
+
+# Modules registering the task of each TaskConfig class.
+TASKS = {
+    'official.vision.configs.image_classification.ImageClassificationTask':
+        'official.vision.tasks.image_classification',
+    'official.vision.configs.maskrcnn.MaskRCNNTask':
+        'official.vision.tasks.maskrcnn',
+    'official.vision.configs.retinanet.RetinaNetTask':
+        'official.vision.tasks.retinanet',
+    'official.vision.configs.semantic_segmentation.SemanticSegmentationTask':
+        'official.vision.tasks.semantic_segmentation',
+    'official.vision.configs.video_classification.VideoClassificationTask':
+        'official.vision.tasks.video_classification',
+}
+
+for _module_path, _names in EXPERIMENTS.items():
+  for _name in _names:
+    exp_factory.register_lazy_config_factory(_name, _module_path)
+for _task_config_cls_name, _module_path in TASKS.items():
+  task_factory.register_lazy_task_cls(_task_config_cls_name, _module_path)
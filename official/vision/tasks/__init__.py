@@ -13,9 +13,25 @@
 # limitations under the License.
 
 """Tasks package definition."""
+import importlib
 
-from official.vision.tasks.image_classification import ImageClassificationTask
-from official.vision.tasks.maskrcnn import MaskRCNNTask
-from official.vision.tasks.retinanet import RetinaNetTask
-from official.vision.tasks.semantic_segmentation import SemanticSegmentationTask
-from official.vision.tasks.video_classification import VideoClassificationTask
+# The task modules are imported on first access, so that importing one task
+# does not import all of them.
+_TASK_MODULES = {
+    'ImageClassificationTask': 'image_classification',
+    'MaskRCNNTask': 'maskrcnn',
+    'RetinaNetTask': 'retinanet',
+    'SemanticSegmentationTask': 'semantic_segmentation',
+    'VideoClassificationTask': 'video_classification',
+}
+
+__all__ = list(_TASK_MODULES)
+
+
+def __getattr__(name):
+  if name in _TASK_MODULES:
+    module = importlib.import_module(f'{__name__}.{_TASK_MODULES[name]}')
+    return getattr(module, name)
+  if name in _TASK_MODULES.values():
+    return importlib.import_module(f'{__name__}.{name}')
+  raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
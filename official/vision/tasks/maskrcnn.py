@@ -295,7 +295,10 @@ class MaskRCNNTask(base_task.Task):
       self.coco_metric = coco_evaluator.COCOEvaluator(
           annotation_file=self._task_config.annotation_file,
           include_mask=self._task_config.model.include_mask,
-          per_category_metrics=self._task_config.per_category_metrics)
+          per_category_metrics=self._task_config.per_category_metrics,
+          eval_backend=self._task_config.coco_eval_backend,
+          stream_annotations=self._task_config.coco_stream_annotations,
+          annotation_store_dir=self._task_config.coco_annotation_store_dir)
     else:
       # Builds COCO-style annotation file if include_mask is True, and
       # annotation_file isn't provided.
@@ -321,7 +324,10 @@ class MaskRCNNTask(base_task.Task):
       self.coco_metric = coco_evaluator.COCOEvaluator(
           annotation_file=annotation_path,
           include_mask=self._task_config.model.include_mask,
-          per_category_metrics=self._task_config.per_category_metrics)
+          per_category_metrics=self._task_config.per_category_metrics,
+          eval_backend=self._task_config.coco_eval_backend,
+          stream_annotations=self._task_config.coco_stream_annotations,
+          annotation_store_dir=self._task_config.coco_annotation_store_dir)
 
   def build_metrics(self, training: bool = True):
     """Builds detection metrics."""
@@ -278,6 +278,9 @@ class RetinaNetTask(base_task.Task):
             include_mask=False,
             per_category_metrics=self.task_config.per_category_metrics,
             max_num_eval_detections=self.task_config.max_num_eval_detections,
+            eval_backend=self.task_config.coco_eval_backend,
+            stream_annotations=self.task_config.coco_stream_annotations,
+            annotation_store_dir=self.task_config.coco_annotation_store_dir,
         )
       if self._task_config.use_wod_metrics:
         # To use Waymo open dataset metrics, please install one of the pip
@@ -33,34 +33,27 @@ class ImageScalarSummaryManager(orbit.utils.SummaryManager):
       global_step=None,
   ):
     """Initializes the `ImageScalarSummaryManager` instance."""
-    self._enabled = summary_dir is not None
-    self._summary_dir = summary_dir
+    super().__init__(summary_dir, scalar_summary_fn, global_step=global_step)
     self._scalar_summary_fn = scalar_summary_fn
     self._image_summary_fn = image_summary_fn
-    self._summary_writers = {}
     self._max_outputs = max_outputs
 
-    if global_step is None:
-      self._global_step = tf.summary.experimental.get_step()
-    else:
-      self._global_step = global_step
-
   def _write_summaries(
-      self, summary_dict: Dict[str, Any], relative_path: str = ''
+      self, summary_dict: Dict[str, Any], step: Any, relative_path: str = ''
   ):
     for name, value in summary_dict.items():
       if isinstance(value, dict):
         self._write_summaries(
-            value, relative_path=os.path.join(relative_path, name)
+            value, step, relative_path=os.path.join(relative_path, name)
         )
       else:
         with self.summary_writer(relative_path).as_default():
           if name.startswith('image/'):
             self._image_summary_fn(
-                name, value, self._global_step, max_outputs=self._max_outputs
+                name, value, step, max_outputs=self._max_outputs
             )
           else:
-            self._scalar_summary_fn(name, value, self._global_step)
+            self._scalar_summary_fn(name, value, step)
 
 
 def maybe_build_eval_summary_manager(
@@ -0,0 +1,73 @@
+# Copyright 2023 The TensorFlow Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Tests for summary_manager."""
+
+import os
+
+import tensorflow as tf
+
+from official.vision.utils import summary_manager
+
+
+def _read_tags(summary_dir):
+  """Returns the (step, tag) pairs written to `summary_dir`."""
+  tags = []
+  for event_path in tf.io.gfile.glob(os.path.join(summary_dir, 'events*')):
+    for event in tf.compat.v1.train.summary_iterator(event_path):
+      for value in event.summary.value:
+        tags.append((event.step, value.tag))
+  return sorted(tags)
+
+
+class ImageScalarSummaryManagerTest(tf.test.TestCase):
+
+  def test_write_summaries_and_flush(self):
+    summary_dir = self.get_temp_dir()
+    global_step = tf.Variable(3, dtype=tf.int64)
+    manager = summary_manager.ImageScalarSummaryManager(
+        summary_dir,
+        scalar_summary_fn=tf.summary.scalar,
+        image_summary_fn=tf.summary.image,
+        max_outputs=1,
+        global_step=global_step,
+    )
+    manager.write_summaries({
+        'loss': 1.0,
+        'image/detections': tf.zeros([2, 4, 4, 3]),
+        'coco': {'AP': 0.5},
+    })
+    manager.write_summaries({'loss': 0.5}, step=7)
+    manager.flush()
+
+    self.assertEqual(
+        _read_tags(summary_dir),
+        [(3, 'image/detections'), (3, 'loss'), (7, 'loss')],
+    )
+    self.assertEqual(
+        _read_tags(os.path.join(summary_dir, 'coco')), [(3, 'AP')]
+    )
+
+  def test_disabled_manager_is_noop(self):
+    manager = summary_manager.ImageScalarSummaryManager(
+        None,
+        scalar_summary_fn=tf.summary.scalar,
+        image_summary_fn=tf.summary.image,
+    )
+    manager.write_summaries({'loss': 1.0})
+    manager.flush()
+
+
+if __name__ == '__main__':
+  tf.test.main()
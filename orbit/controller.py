@@ -14,7 +14,10 @@
 
 """Provides a `Controller` class for managing the outer training loop."""
 
+import concurrent.futures
+import contextlib
 import pprint
+import threading
 import time
 
 from typing import Callable, Iterable, Optional, Union
@@ -23,6 +26,7 @@ from absl import logging
 
 from orbit import runner
 from orbit import utils
+from orbit.utils import instrumentation as instrumentation_lib
 
 import tensorflow as tf
 
@@ -100,10 +104,14 @@ class Controller:
       # Summary related
       summary_interval: Optional[int] = None,
       summary_dir: Optional[str] = None,
+      enable_async_summary_writing: bool = False,
       # Evaluation related
       eval_summary_dir: Optional[str] = None,
       summary_manager: Optional[utils.SummaryManagerInterface] = None,
-      eval_summary_manager: Optional[utils.SummaryManagerInterface] = None):
+      eval_summary_manager: Optional[utils.SummaryManagerInterface] = None,
+      eval_checkpoint: Optional[tf.train.Checkpoint] = None,
+      # Instrumentation related
+      instrumentation: Optional[utils.Instrumentation] = None):
     """Initializes a `Controller` instance.
 
     Note that if `checkpoint_manager` is provided and there are checkpoints in
@@ -131,7 +139,9 @@ class Controller:
         `steps_per_loop` training steps are run. These will be called with the
         output of `trainer.train`.
       eval_actions: Optional `orbit.Action`s to call after each evaluation.
-        These will be called with the output of `evaluator.evaluate`.
+        These will be called with the output of `evaluator.evaluate`. With
+        `eval_checkpoint`, they are called on the evaluation thread of
+        `train_and_evaluate`.
       steps_per_loop: Optional integer to indicate the number of steps to run in
         each inner loop of training (passed as the `num_steps` parameter of
         `trainer.train`). It can be also a callable which takes the current
@@ -153,6 +163,14 @@ class Controller:
       summary_dir: The directory to write summaries to. To use the same
         directory as for checkpointing, pass `checkpoint_manager.directory`. If
         `None`, no training summaries will be written.
+      enable_async_summary_writing: Optional bool indicating whether summaries
+        written by the `Controller` are handed over to a background thread
+        instead of being written (and flushed) after every train loop and
+        evaluation. The summary writers are then only waited on when a
+        checkpoint is saved and before `train` or `train_and_evaluate`
+        return. This applies to the summary managers created internally from
+        `summary_dir` and `eval_summary_dir`; provided `summary_manager` and
+        `eval_summary_manager` should be created in async mode by the caller.
       eval_summary_dir: The directory to write eval summaries to. If `None`, it
         will be set to `summary_dir`. If both `summary_dir` and
         `eval_summary_dir` are `None`, no eval summaries will be written.
@@ -164,12 +182,26 @@ class Controller:
         `eval_summary_dir` will be ignored. Otherwise the eval summary manager
         will be created internally for TensorBoard summaries by default from the
         `eval_summary_dir`.
+      eval_checkpoint: An optional `tf.train.Checkpoint` tracking the state of
+        `evaluator`, which must then be separate from the state of `trainer`
+        (e.g. a second copy of the model, possibly on other devices). If
+        provided, `train_and_evaluate` overlaps evaluation with training: at
+        every evaluation interval, a checkpoint is restored into
+        `eval_checkpoint` and evaluated on a background thread while training
+        continues. Requires `checkpoint_manager`.
+      instrumentation: An optional `orbit.utils.Instrumentation` instance. If
+        provided, the wall time of each phase of every training loop (running
+        the trainer, actions, summaries and checkpointing) and evaluation is
+        recorded, logged, and written to a "timing" summary subdirectory.
+        Training loops are shortened to start and stop on its profile windows.
 
     Raises:
       ValueError: If both `trainer` and `evaluator` are `None`.
       ValueError: If `steps_per_loop` is not a positive integer or a callable.
       ValueError: If `summary_interval` is not a positive integer or is not
         divisible by `steps_per_loop`.
+      ValueError: If `eval_checkpoint` is provided without `evaluator` and
+        `checkpoint_manager`, or if `evaluator` is also the `trainer`.
     """
     if trainer is None and evaluator is None:
       raise ValueError("`trainer` and `evaluator` should not both be `None`.")
@@ -197,6 +229,15 @@ class Controller:
     if not isinstance(global_step, tf.Variable):
       raise ValueError("`global_step` must be a `tf.Variable`.")
 
+    if eval_checkpoint is not None:
+      if evaluator is None or checkpoint_manager is None:
+        raise ValueError("`eval_checkpoint` requires both `evaluator` and "
+                         "`checkpoint_manager`.")
+      if evaluator is trainer:
+        raise ValueError(
+            "`eval_checkpoint` requires an `evaluator` separate from the "
+            "`trainer`, since it is restored while training continues.")
+
     self.trainer = trainer
     self.evaluator = evaluator
 
@@ -211,6 +252,11 @@ class Controller:
     self._checkpoint_options = tf.train.CheckpointOptions(
         enable_async=enable_async_checkpointing
     )
+    self._enable_async_summary_writing = enable_async_summary_writing
+    self.instrumentation = instrumentation
+    self._eval_checkpoint = eval_checkpoint
+    self._eval_executor = None
+    self._pending_eval = None
 
     if self.trainer is not None:
       self.step_timer = None
@@ -219,7 +265,10 @@ class Controller:
         self.summary_manager = summary_manager
       else:
         self.summary_manager = utils.SummaryManager(
-            summary_dir, tf.summary.scalar, global_step=self.global_step)
+            summary_dir,
+            tf.summary.scalar,
+            global_step=self.global_step,
+            async_write=enable_async_summary_writing)
       self._steps_per_loop = steps_per_loop
 
     if self.evaluator is not None:
@@ -233,7 +282,10 @@ class Controller:
           self.eval_summary_manager = eval_summary_manager
         else:
           self.eval_summary_manager = utils.SummaryManager(
-              eval_summary_dir, tf.summary.scalar, global_step=self.global_step)
+              eval_summary_dir,
+              tf.summary.scalar,
+              global_step=self.global_step,
+              async_write=enable_async_summary_writing)
 
     tf.summary.experimental.set_step(self.global_step)
 
@@ -251,9 +303,11 @@ class Controller:
     `CheckpointManager` was passed to `Controller.__init__`) and summarize
     training output (if `summary_dir` is set).
 
-    When async checkpointing is enabled, a sync is triggered at the end of this
-    method to make sure any ongoing async checkpoint saving is finished before
-    returning.
+    When async checkpointing or async summary writing is enabled, a sync is
+    triggered at the end of this method to make sure any ongoing async
+    checkpoint saving or summary writing is finished before returning. A
+    profiler trace of `instrumentation` which is still running is stopped
+    before returning as well.
 
     Args:
       steps: The global step count to train up to.
@@ -268,14 +322,23 @@ class Controller:
     while current_step < steps:
       # Calculates steps to run for the next train loop.
       num_steps = min(steps - current_step, self.steps_per_loop)
-      self._train_n_steps(num_steps)
-      self._maybe_save_checkpoint()
+      if self.instrumentation is not None:
+        num_steps = self.instrumentation.clip_num_steps(current_step, num_steps)
+      with self._record_loop("train"):
+        self._train_n_steps(num_steps)
+        with instrumentation_lib.phase("checkpoint"):
+          self._maybe_save_checkpoint()
+      self._maybe_merge_overlapped_evaluation(wait=False)
       current_step = self.global_step.numpy()
 
+    if self.instrumentation is not None:
+      self.instrumentation.stop_profiler()
+
     if checkpoint_at_completion:
       self._maybe_save_checkpoint(check_interval=False)
 
     self._sync_on_async_checkpointing()
+    self._sync_on_async_summary_writing()
 
   def evaluate(self, steps: int = -1) -> Optional[runner.Output]:
     """Runs evaluation for the given number of steps.
@@ -306,19 +369,41 @@ class Controller:
     else:
       raise ValueError(f"`steps` ({steps}) should be > 0, or == -1.")
 
+    # The evaluator must not be used by two threads at once.
+    self._maybe_merge_overlapped_evaluation(wait=True)
+    with self._record_loop("eval"):
+      return self._evaluate(steps, steps_msg)
+
+  def _evaluate(self, steps: int, steps_msg: str) -> runner.Output:
+    """Runs evaluation and writes its summaries, see `evaluate`."""
     current_step = self.global_step.numpy()
     _log(f" eval | step: {current_step: 6d} | {steps_msg}")
 
     start = time.time()
-    with self.eval_summary_manager.summary_writer().as_default():
-      steps_tensor = tf.convert_to_tensor(steps, dtype=tf.int32)
-      eval_output = self.evaluator.evaluate(steps_tensor)
+    with instrumentation_lib.phase("eval"):
+      with self.eval_summary_manager.summary_writer().as_default():
+        steps_tensor = tf.convert_to_tensor(steps, dtype=tf.int32)
+        eval_output = self.evaluator.evaluate(steps_tensor)
     elapsed = time.time() - start
+    eval_output = self._run_eval_actions(eval_output)
+    return self._process_eval_output(eval_output, steps, current_step, elapsed)
 
+  def _run_eval_actions(
+      self, eval_output: Optional[runner.Output]) -> runner.Output:
+    """Runs eval actions on `eval_output`, and returns its NumPy values."""
     eval_output = eval_output or {}
-    for action in self.eval_actions:
-      action(eval_output)
-    eval_output = tf.nest.map_structure(utils.get_value, eval_output)
+    with instrumentation_lib.phase("eval_actions"):
+      for action in self.eval_actions:
+        action(eval_output)
+    return tf.nest.map_structure(utils.get_value, eval_output)
+
+  def _process_eval_output(self,
+                           eval_output: runner.Output,
+                           steps: int,
+                           current_step: int,
+                           elapsed: float,
+                           summary_step: Optional[int] = None) -> runner.Output:
+    """Logs and summarizes the output of an evaluation."""
 
     if steps > 0:
       # Only log if steps has been specified.
@@ -333,8 +418,14 @@ class Controller:
          f"eval time: {elapsed: 6.1f} sec | "
          f"output: {_format_output(eval_output)}")
 
-    self.eval_summary_manager.write_summaries(eval_output)
-    self.eval_summary_manager.flush()
+    with instrumentation_lib.phase("eval_summary"):
+      if summary_step is None:
+        self.eval_summary_manager.write_summaries(eval_output)
+      else:
+        self.eval_summary_manager.write_summaries(
+            eval_output, step=summary_step)
+      if not self._enable_async_summary_writing:
+        self.eval_summary_manager.flush()
 
     return eval_output
 
@@ -352,9 +443,22 @@ class Controller:
     In addition, this method will run a final evaluation at the end of the
     training sequence.
 
-    When async checkpointing is enabled, a sync is triggered at the end of this
-    method to make sure any ongoing async checkpoint saving is finished before
-    returning.
+    If `eval_checkpoint` was passed to `Controller.__init__`, evaluations
+    overlap with training instead: at every `eval_interval`, a checkpoint is
+    saved (unless one already exists for the current step) and handed over to a
+    background thread, which restores it into `eval_checkpoint` and runs the
+    evaluation while training continues. At most one evaluation is in flight at
+    a time, so training waits for the previous one before handing over the next
+    checkpoint. Eval actions run on the background thread right after each
+    evaluation, while `eval_checkpoint` still holds the evaluated state, so they
+    must only use the state of the evaluator rather than that of the trainer.
+    Summaries are processed on the calling thread once an evaluation completes,
+    and are written at the step of the evaluated checkpoint. This method waits
+    for the final evaluation and stops the background thread before returning.
+
+    When async checkpointing or async summary writing is enabled, a sync is
+    triggered at the end of this method to make sure any ongoing async
+    checkpoint saving or summary writing is finished before returning.
 
     Args:
       train_steps: The global step count to train up to.
@@ -375,14 +479,28 @@ class Controller:
     output = None
     current_step = self.global_step.numpy()  # Cache, since this is expensive.
     eval_interval = eval_interval or (train_steps - current_step)
-    while current_step < train_steps:
-      interval = min(train_steps - current_step, eval_interval)
-      num_steps = current_step + interval
-      self.train(steps=num_steps, checkpoint_at_completion=False)
-      output = self.evaluate(steps=eval_steps)
-      current_step = self.global_step.numpy()
+    try:
+      while current_step < train_steps:
+        interval = min(train_steps - current_step, eval_interval)
+        num_steps = current_step + interval
+        self.train(steps=num_steps, checkpoint_at_completion=False)
+        if self._eval_checkpoint is None:
+          output = self.evaluate(steps=eval_steps)
+        else:
+          output = self._maybe_merge_overlapped_evaluation(wait=True) or output
+          self._start_overlapped_evaluation(steps=eval_steps)
+        current_step = self.global_step.numpy()
+      if self._eval_checkpoint is not None:
+        output = self._maybe_merge_overlapped_evaluation(wait=True) or output
+    finally:
+      if self._eval_executor is not None:
+        # On errors, this also waits for the evaluation in flight, if any.
+        self._eval_executor.shutdown(wait=True)
+        self._eval_executor = None
+        self._pending_eval = None
     self._maybe_save_checkpoint(check_interval=False)
     self._sync_on_async_checkpointing()
+    self._sync_on_async_summary_writing()
     return output
 
   def evaluate_continuously(
@@ -423,6 +541,7 @@ class Controller:
         timeout_fn=timeout_fn):
       self.restore_checkpoint(checkpoint_path)
       output = self.evaluate(steps)
+    self._sync_on_async_summary_writing()
     return output
 
   def restore_checkpoint(self, checkpoint_path: Optional[str] = None):
@@ -499,7 +618,8 @@ class Controller:
         should_record = lambda: (self.global_step % self.summary_interval == 0)
       with tf.summary.record_if(should_record):
         num_steps_tensor = tf.convert_to_tensor(num_steps, dtype=tf.int32)
-        train_output = self.trainer.train(num_steps_tensor)
+        with instrumentation_lib.phase("train"):
+          train_output = self.trainer.train(num_steps_tensor)
 
     # Verify that global_step was updated properly, then update current_step.
     expected_step = current_step + num_steps
@@ -511,8 +631,9 @@ class Controller:
       logging.warning(message)
 
     train_output = train_output or {}
-    for action in self.train_actions:
-      action(train_output)
+    with instrumentation_lib.phase("train_actions"):
+      for action in self.train_actions:
+        action(train_output)
     train_output = tf.nest.map_structure(utils.get_value, train_output)
 
     current_step = self.global_step.numpy()
@@ -522,8 +643,10 @@ class Controller:
          f"output: {_format_output(train_output)}")
 
     train_output["steps_per_second"] = steps_per_second
-    self.summary_manager.write_summaries(train_output)
-    self.summary_manager.flush()
+    with instrumentation_lib.phase("train_summary"):
+      self.summary_manager.write_summaries(train_output)
+      if not self._enable_async_summary_writing:
+        self.summary_manager.flush()
 
   def _maybe_save_checkpoint(self, check_interval: bool = True):
     """Conditionally saves a checkpoint.
@@ -542,15 +665,119 @@ class Controller:
       A boolean indicating whether a checkpoint was saved.
     """
     if self.checkpoint_manager and self.checkpoint_manager.checkpoint_interval:
+      if self._pending_eval is not None:
+        # Saving may delete the checkpoint being restored for evaluation.
+        self._pending_eval[2].wait()
       ckpt_path = self.checkpoint_manager.save(
           checkpoint_number=self.global_step.numpy(),
           check_interval=check_interval,
           options=self._checkpoint_options)
       if ckpt_path is not None:
         _log(f"saved checkpoint to {ckpt_path}.")
+        # Keeps the summaries on disk in step with the checkpoints, so that a
+        # restarted job doesn't lose summaries of steps it won't run again.
+        self._sync_on_async_summary_writing()
         return True
     return False
 
+  def _start_overlapped_evaluation(self, steps: int):
+    """Hands over a checkpoint of the current step to the eval thread.
+
+    Args:
+      steps: The number of evaluation steps to run, see `evaluate`.
+    """
+    if steps <= 0 and steps != -1:
+      raise ValueError(f"`steps` ({steps}) should be > 0, or == -1.")
+    current_step = int(self.global_step.numpy())
+    if self._enable_async_checkpoint_saving:
+      self._sync_on_async_checkpointing()
+    checkpoint_path = self.checkpoint_manager.latest_checkpoint
+    if (checkpoint_path is None or
+        not checkpoint_path.endswith(f"-{current_step}")):
+      checkpoint_path = self.checkpoint_manager.save(
+          checkpoint_number=current_step, check_interval=False)
+      _log(f"saved checkpoint to {checkpoint_path}.")
+
+    if self._eval_executor is None:
+      self._eval_executor = concurrent.futures.ThreadPoolExecutor(
+          max_workers=1, thread_name_prefix="orbit_eval")
+    restored = threading.Event()
+    future = self._eval_executor.submit(self._evaluate_checkpoint,
+                                        checkpoint_path, current_step, steps,
+                                        restored)
+    self._pending_eval = (current_step, steps, restored, future)
+    _log(f" eval | step: {current_step: 6d} | evaluating {checkpoint_path} "
+         "while training continues...")
+
+  def _evaluate_checkpoint(self, checkpoint_path: str, step: int, steps: int,
+                           restored: threading.Event):
+    """Restores and evaluates a checkpoint, then runs the eval actions."""
+    try:
+      self._eval_checkpoint.restore(checkpoint_path).expect_partial()
+    finally:
+      restored.set()
+    start = time.time()
+    with self.eval_summary_manager.summary_writer().as_default():
+      # The summary step is local to this thread.
+      tf.summary.experimental.set_step(step)
+      steps_tensor = tf.convert_to_tensor(steps, dtype=tf.int32)
+      eval_output = self.evaluator.evaluate(steps_tensor)
+    elapsed = time.time() - start
+    # Actions run before the next checkpoint is restored into the evaluator.
+    return self._run_eval_actions(eval_output), elapsed
+
+  def _maybe_merge_overlapped_evaluation(
+      self, wait: bool) -> Optional[runner.Output]:
+    """Processes the output of the overlapped evaluation, if it completed.
+
+    Args:
+      wait: Whether to wait for the evaluation in flight (if any) to complete.
+
+    Returns:
+      The evaluation results, or `None` if no evaluation completed.
+    """
+    if self._pending_eval is None:
+      return None
+    step, steps, _, future = self._pending_eval
+    if not wait and not future.done():
+      return None
+    self._pending_eval = None
+    with self._record_loop("eval"):
+      with instrumentation_lib.phase("eval_wait"):
+        eval_output, elapsed = future.result()
+      return self._process_eval_output(
+          eval_output, steps, step, elapsed, summary_step=step)
+
+  @contextlib.contextmanager
+  def _record_loop(self, kind: str):
+    """Records the enclosed loop with `instrumentation`, if provided.
+
+    Once the loop completes, its phase timings are logged and written under the
+    "timing" subdirectory of the train or eval summary directory.
+
+    Args:
+      kind: The kind of loop, either "train" or "eval".
+
+    Yields:
+      Nothing.
+    """
+    if self.instrumentation is None:
+      yield
+      return
+    with self.instrumentation.loop(kind, self.global_step) as record:
+      yield
+    timing = dict(record["phases"])
+    timing[f"{kind}_total"] = record["total"]
+    _log(f"{kind:>5} | step: {record['step']: 6d} | "
+         f"timing: {_format_output(timing)}")
+    if kind == "train":
+      summary_manager = self.summary_manager
+    else:
+      summary_manager = self.eval_summary_manager
+    summary_manager.write_summaries({"timing": timing})
+    if not self._enable_async_summary_writing:
+      summary_manager.flush()
+
   def _require(self, attribute, for_method):
     """Utility method to raise an error if the given `attribute` is not set."""
     if getattr(self, attribute, None) is None:
@@ -565,6 +792,19 @@ class Controller:
       logging.info("Sync on async checkpoint saving.")
       self.checkpoint_manager.save()
 
+  def _sync_on_async_summary_writing(self):
+    """Waits for the summaries enqueued for async writing (if any)."""
+    if not self._enable_async_summary_writing:
+      return
+    summary_managers = []
+    if self.trainer is not None:
+      summary_managers.append(self.summary_manager)
+    if (self.evaluator is not None and
+        self.eval_summary_manager not in summary_managers):
+      summary_managers.append(self.eval_summary_manager)
+    for summary_manager in summary_managers:
+      summary_manager.flush()
+
 
 class StepTimer:
   """Utility class for measuring steps/second."""
@@ -15,6 +15,7 @@
 """Tests for orbit.controller."""
 
 import os
+from unittest import mock
 
 from absl import logging
 from absl.testing import parameterized
@@ -429,6 +430,45 @@ class ControllerTest(tf.test.TestCase, parameterized.TestCase):
         summaries_with_matching_keyword(
             "eval_loss", os.path.join(self.model_dir, "summaries/eval")))
 
+  def test_train_and_evaluate_with_async_summary_writing(self):
+    test_runner = TestRunner()
+
+    checkpoint = tf.train.Checkpoint(
+        model=test_runner.model, optimizer=test_runner.optimizer)
+    checkpoint_manager = tf.train.CheckpointManager(
+        checkpoint,
+        self.model_dir,
+        max_to_keep=None,
+        step_counter=test_runner.global_step,
+        checkpoint_interval=10)
+    test_controller = controller.Controller(
+        trainer=test_runner,
+        evaluator=test_runner,
+        global_step=test_runner.global_step,
+        steps_per_loop=2,
+        summary_dir=os.path.join(self.model_dir, "summaries/train"),
+        enable_async_summary_writing=True,
+        checkpoint_manager=checkpoint_manager,
+        eval_summary_dir=os.path.join(self.model_dir, "summaries/eval"))
+    self.assertTrue(test_controller.summary_manager.async_write)
+    test_controller.train_and_evaluate(
+        train_steps=10, eval_steps=2, eval_interval=6)
+
+    # Checkpoints are saved.
+    self.assertNotEmpty(tf.io.gfile.glob(os.path.join(self.model_dir, "ckpt*")))
+
+    # Loss and accuracy values should be written into summaries.
+    self.assertNotEmpty(
+        tf.io.gfile.listdir(os.path.join(self.model_dir, "summaries/train")))
+    self.assertNotEmpty(
+        summaries_with_matching_keyword(
+            "loss", os.path.join(self.model_dir, "summaries/train")))
+    self.assertNotEmpty(
+        tf.io.gfile.listdir(os.path.join(self.model_dir, "summaries/eval")))
+    self.assertNotEmpty(
+        summaries_with_matching_keyword(
+            "eval_loss", os.path.join(self.model_dir, "summaries/eval")))
+
   @parameterized.named_parameters(
       ("_sync_checkpoint_saving", False),
       ("_async_checkpoint_saving", True)
@@ -778,6 +818,116 @@ class ControllerTest(tf.test.TestCase, parameterized.TestCase):
         summaries_with_matching_keyword(
             "accuracy", os.path.join(self.model_dir, "dataset2")))
 
+  def test_train_and_evaluate_overlapped(self):
+    test_runner = TestRunner()
+    eval_runner = TestRunner()
+    checkpoint = tf.train.Checkpoint(
+        model=test_runner.model, optimizer=test_runner.optimizer)
+    checkpoint_manager = tf.train.CheckpointManager(
+        checkpoint,
+        self.model_dir,
+        max_to_keep=None,
+        step_counter=test_runner.global_step,
+        checkpoint_interval=5)
+    eval_outputs = []
+    eval_weights = []
+    test_controller = controller.Controller(
+        trainer=test_runner,
+        evaluator=eval_runner,
+        global_step=test_runner.global_step,
+        steps_per_loop=2,
+        checkpoint_manager=checkpoint_manager,
+        eval_actions=[
+            eval_outputs.append,
+            lambda _: eval_weights.append(eval_runner.model.get_weights())
+        ],
+        summary_dir=os.path.join(self.model_dir, "summaries/train"),
+        eval_summary_dir=os.path.join(self.model_dir, "summaries/eval"),
+        eval_checkpoint=tf.train.Checkpoint(model=eval_runner.model))
+    output = test_controller.train_and_evaluate(
+        train_steps=10, eval_steps=2, eval_interval=6)
+
+    # Evaluations of the checkpoints at steps 6 and 10 are both merged back.
+    self.assertLen(eval_outputs, 2)
+    self.assertIn("eval_loss", output)
+    # pylint: disable=protected-access
+    self.assertIsNone(test_controller._eval_executor)
+    # pylint: enable=protected-access
+    # Eval actions see the state of the evaluated checkpoints.
+    for step, weights in zip([6, 10], eval_weights):
+      expected_model = create_model()
+      tf.train.Checkpoint(model=expected_model).restore(
+          os.path.join(self.model_dir, f"ckpt-{step}")).expect_partial()
+      for weight, expected_weight in zip(weights,
+                                         expected_model.get_weights()):
+        self.assertAllClose(weight, expected_weight)
+    self.assertNotAllClose(eval_weights[0][0], eval_weights[1][0])
+    eval_loss_steps = []
+    for event_path in tf.io.gfile.glob(
+        os.path.join(self.model_dir, "summaries/eval", "events*")):
+      for event in tf.compat.v1.train.summary_iterator(event_path):
+        if any(value.tag == "eval_loss" for value in event.summary.value):
+          eval_loss_steps.append(event.step)
+    self.assertCountEqual(eval_loss_steps, [6, 10])
+    # The evaluator holds the final weights, restored from the last checkpoint.
+    for train_weight, eval_weight in zip(test_runner.model.get_weights(),
+                                         eval_runner.model.get_weights()):
+      self.assertAllClose(train_weight, eval_weight)
+
+  def test_eval_checkpoint_requires_separate_evaluator(self):
+    test_runner = TestRunner()
+    checkpoint = tf.train.Checkpoint(model=test_runner.model)
+    checkpoint_manager = tf.train.CheckpointManager(
+        checkpoint, self.model_dir, max_to_keep=None)
+    with self.assertRaisesRegex(ValueError, "separate"):
+      controller.Controller(
+          trainer=test_runner,
+          evaluator=test_runner,
+          global_step=test_runner.global_step,
+          steps_per_loop=2,
+          checkpoint_manager=checkpoint_manager,
+          eval_checkpoint=checkpoint)
+
+  @mock.patch.object(tf.profiler.experimental, "stop", autospec=True)
+  @mock.patch.object(tf.profiler.experimental, "start", autospec=True)
+  def test_train_and_evaluate_with_instrumentation(self, mock_start,
+                                                   mock_stop):
+    test_runner = TestRunner()
+    instrumentation = orbit.utils.Instrumentation(
+        profile_steps=[(3, 5)], profile_dir=self.model_dir)
+    test_controller = controller.Controller(
+        trainer=test_runner,
+        evaluator=test_runner,
+        global_step=test_runner.global_step,
+        steps_per_loop=4,
+        summary_dir=os.path.join(self.model_dir, "summaries/train"),
+        eval_summary_dir=os.path.join(self.model_dir, "summaries/eval"),
+        instrumentation=instrumentation)
+    test_controller.train_and_evaluate(
+        train_steps=8, eval_steps=2, eval_interval=8)
+
+    # The first loop is shortened to start profiling at step 3, and the second
+    # one to stop it at step 5.
+    history = instrumentation.history
+    self.assertEqual([(r["kind"], r["step"]) for r in history],
+                     [("train", 3), ("train", 5), ("train", 8), ("eval", 8)])
+    mock_start.assert_called_once_with(self.model_dir)
+    mock_stop.assert_called_once()
+    self.assertContainsSubset(
+        ["train", "train_loop_begin", "train_steps", "train_loop_end",
+         "train_actions", "train_summary", "checkpoint"],
+        history[0]["phases"])
+    self.assertContainsSubset(["eval", "eval_steps", "eval_summary"],
+                              history[-1]["phases"])
+    self.assertNotEmpty(
+        summaries_with_matching_keyword(
+            "train_steps", os.path.join(self.model_dir, "summaries/train",
+                                        "timing")))
+    self.assertNotEmpty(
+        summaries_with_matching_keyword(
+            "eval_total", os.path.join(self.model_dir, "summaries/eval",
+                                       "timing")))
+
   def test_actions(self):
     test_runner = TestRunner()
     checkpoint = tf.train.Checkpoint(
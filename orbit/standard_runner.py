@@ -40,6 +40,7 @@ from typing import Any, Optional
 import dataclasses
 
 from orbit import runner
+from orbit.utils import instrumentation
 from orbit.utils import loop_fns
 
 import tensorflow as tf
@@ -135,16 +136,20 @@ class StandardTrainer(runner.AbstractTrainer, metaclass=abc.ABCMeta):
     Returns:
       The output of `train_loop_end`.
     """
-    self.train_loop_begin()
+    with instrumentation.phase("train_loop_begin"):
+      self.train_loop_begin()
 
     if self._train_loop_fn is None:
       self._train_loop_fn = self.create_train_loop_fn()
 
     if self._train_iter is None:
-      self._train_iter = tf.nest.map_structure(iter, self.train_dataset)
+      with instrumentation.phase("train_iterator"):
+        self._train_iter = tf.nest.map_structure(iter, self.train_dataset)
 
-    self._train_loop_fn(self._train_iter, num_steps)
-    return self.train_loop_end()
+    with instrumentation.phase("train_steps"):
+      self._train_loop_fn(self._train_iter, num_steps)
+    with instrumentation.phase("train_loop_end"):
+      return self.train_loop_end()
 
   def train_loop_begin(self):
     """Called once at the beginning of the training loop.
@@ -325,7 +330,8 @@ class StandardEvaluator(runner.AbstractEvaluator, metaclass=abc.ABCMeta):
       raise ValueError("Looping until exhausted is not supported if "
                        "`options.use_tf_while_loop` is `True`")
 
-    outputs = self.eval_begin()  # pylint: disable=assignment-from-no-return
+    with instrumentation.phase("eval_begin"):
+      outputs = self.eval_begin()  # pylint: disable=assignment-from-no-return
 
     has_state = outputs is not None
     if self._eval_loop_fn is None:
@@ -334,22 +340,25 @@ class StandardEvaluator(runner.AbstractEvaluator, metaclass=abc.ABCMeta):
     # If `recreate_iterator_for_each_eval` is `True`, `self._eval_iter` is
     # always None.
     if self._eval_iter is None:
-      eval_iter = tf.nest.map_structure(iter, self.eval_dataset)
+      with instrumentation.phase("eval_iterator"):
+        eval_iter = tf.nest.map_structure(iter, self.eval_dataset)
       if not self._eval_options.recreate_iterator_for_each_eval:
         self._eval_iter = eval_iter
     else:
       eval_iter = self._eval_iter
 
-    if self._eval_options.use_tf_while_loop and not has_state:
-      self._eval_loop_fn(eval_iter, num_steps)
-    else:
-      outputs = self._eval_loop_fn(
-          eval_iter, num_steps, state=outputs, reduce_fn=self.eval_reduce)
+    with instrumentation.phase("eval_steps"):
+      if self._eval_options.use_tf_while_loop and not has_state:
+        self._eval_loop_fn(eval_iter, num_steps)
+      else:
+        outputs = self._eval_loop_fn(
+            eval_iter, num_steps, state=outputs, reduce_fn=self.eval_reduce)
 
-    if outputs is None:
-      return self.eval_end()
-    else:
-      return self.eval_end(outputs)
+    with instrumentation.phase("eval_end"):
+      if outputs is None:
+        return self.eval_end()
+      else:
+        return self.eval_end(outputs)
 
   def eval_begin(self) -> Any:
     """Called once at the beginning of the evaluation.
@@ -20,6 +20,8 @@ from orbit.utils.common import make_distributed_dataset
 
 from orbit.utils.epoch_helper import EpochHelper
 
+from orbit.utils.instrumentation import Instrumentation
+
 from orbit.utils.loop_fns import create_loop_fn
 from orbit.utils.loop_fns import create_tf_while_loop_fn
 from orbit.utils.loop_fns import LoopFnWithSummaries
@@ -0,0 +1,209 @@
+# Copyright 2023 The Orbit Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Provides utilities for timing the phases of training and evaluation loops.
+
+An `Instrumentation` instance records, for every training or evaluation loop
+run by an `orbit.Controller`, the wall time spent in each named phase of the
+loop. Phases are delimited with the `phase` context manager, which is a no-op
+unless called while a loop is being recorded, so that runners (e.g.
+`orbit.StandardTrainer`) can mark their own phases without knowing whether
+instrumentation is enabled:
+
+    with orbit.utils.instrumentation.phase("train_iterator"):
+      iterator = iter(dataset)
+
+Nested phases are reported independently, i.e. the time of a phase includes the
+time of the phases nested inside of it.
+
+`Instrumentation` can additionally capture `tf.profiler` traces on windows of
+global steps.
+"""
+
+import collections
+import contextlib
+import threading
+import time
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from absl import logging
+import tensorflow as tf
+
+_local = threading.local()
+
+
+@contextlib.contextmanager
+def phase(name: str) -> Iterator[None]:
+  """Times the enclosed block as phase `name` of the loop being recorded.
+
+  If the same phase is entered several times in one loop, the times are summed.
+  This is a no-op when no loop is being recorded on the current thread.
+
+  Args:
+    name: The name of the phase.
+
+  Yields:
+    Nothing.
+  """
+  record = getattr(_local, "record", None)
+  if record is None:
+    yield
+    return
+  start = time.perf_counter()
+  try:
+    yield
+  finally:
+    phases = record["phases"]
+    phases[name] = phases.get(name, 0.) + time.perf_counter() - start
+
+
+class Instrumentation:
+  """Records per-loop phase timings and captures profiles on step windows."""
+
+  def __init__(self,
+               profile_steps: Optional[Iterable[Tuple[int, int]]] = None,
+               profile_dir: Optional[str] = None,
+               max_history: int = 100):
+    """Initializes the `Instrumentation` instance.
+
+    Args:
+      profile_steps: An optional iterable of `(start, stop)` global step
+        windows. A `tf.profiler` trace is started by the first training loop
+        starting at a global step in `[start, stop)`, and stopped once the
+        global step reaches `stop`. An `orbit.Controller` shortens its training
+        loops so that they begin and end on these boundaries.
+      profile_dir: The directory in which to write the profiler traces.
+        Required if `profile_steps` is set.
+      max_history: The maximum number of loop records kept in `history`.
+
+    Raises:
+      ValueError: If a window of `profile_steps` is empty, if the windows
+        overlap, or if `profile_steps` is set but `profile_dir` is not.
+    """
+    self._profile_steps = sorted(profile_steps or [])
+    for i, (start, stop) in enumerate(self._profile_steps):
+      if start < 0 or stop <= start:
+        raise ValueError(
+            f"Invalid profile window `({start}, {stop})`: `stop` must be "
+            "larger than `start`, and `start` must be non-negative.")
+      if i > 0 and start < self._profile_steps[i - 1][1]:
+        raise ValueError(
+            f"Profile windows `{self._profile_steps[i - 1]}` and "
+            f"`{(start, stop)}` overlap.")
+    if self._profile_steps and not profile_dir:
+      raise ValueError("`profile_dir` is required when `profile_steps` is set.")
+    self._profile_dir = profile_dir
+    self._profile_stop = None
+    self._history = collections.deque(maxlen=max_history)
+
+  @property
+  def history(self) -> List[Dict[str, object]]:
+    """Returns the most recent loop records, oldest first.
+
+    Each record is a dictionary with the keys:
+
+      * "kind": The kind of loop, e.g. "train" or "eval".
+      * "step": The global step at the end of the loop.
+      * "num_steps": The number of global steps run by the loop.
+      * "total": The wall time of the whole loop, in seconds.
+      * "phases": A dictionary mapping phase names to wall times, in seconds.
+    """
+    return list(self._history)
+
+  @property
+  def profiling(self) -> bool:
+    """Whether a profiler trace is currently being captured."""
+    return self._profile_stop is not None
+
+  def clip_num_steps(self, step: int, num_steps: int) -> int:
+    """Clips `num_steps` so that a loop starting at `step` ends on a boundary.
+
+    Args:
+      step: The global step at the start of the loop.
+      num_steps: The number of steps the loop would otherwise run.
+
+    Returns:
+      `num_steps`, reduced if needed so that the loop does not run past the next
+      start or stop of a profile window.
+    """
+    for start, stop in self._profile_steps:
+      for boundary in (start, stop):
+        if boundary > step:
+          return min(num_steps, boundary - step)
+    return num_steps
+
+  @contextlib.contextmanager
+  def loop(self, kind: str,
+           global_step: tf.Variable) -> Iterator[Dict[str, object]]:
+    """Records the phase timings of the enclosed loop.
+
+    Profiler traces are only started and stopped by "train" loops, since other
+    loops do not advance the global step.
+
+    Args:
+      kind: The kind of loop, e.g. "train" or "eval".
+      global_step: The global step `tf.Variable`.
+
+    Yields:
+      The loop record, see `history`. Its "phases" are filled in as phases
+      complete, and the remaining entries once the enclosed block exits.
+    """
+    if getattr(_local, "record", None) is not None:
+      raise RuntimeError("Loops cannot be recorded in a nested fashion.")
+    start_step = int(global_step.numpy())
+    if kind == "train":
+      self._maybe_start_profiler(start_step)
+    record = {"kind": kind, "phases": {}}
+    _local.record = record
+    start = time.perf_counter()
+    try:
+      yield record
+    finally:
+      _local.record = None
+      record["total"] = time.perf_counter() - start
+      record["step"] = int(global_step.numpy())
+      record["num_steps"] = record["step"] - start_step
+      self._history.append(record)
+      if (kind == "train" and self._profile_stop is not None and
+          record["step"] >= self._profile_stop):
+        self.stop_profiler()
+
+  def stop_profiler(self):
+    """Stops the profiler trace being captured, if any."""
+    if self._profile_stop is None:
+      return
+    self._profile_stop = None
+    try:
+      tf.profiler.experimental.stop()
+    except tf.errors.UnavailableError as e:
+      logging.warning("Failed to stop the profiler: %s", e)
+    else:
+      logging.info("Stopped profiling, traces written to %s.",
+                   self._profile_dir)
+
+  def _maybe_start_profiler(self, step: int):
+    if self._profile_stop is not None:
+      return
+    for start, stop in self._profile_steps:
+      if start <= step < stop:
+        try:
+          tf.profiler.experimental.start(self._profile_dir)
+        except (tf.errors.AlreadyExistsError, tf.errors.UnavailableError) as e:
+          logging.warning("Failed to start the profiler at step %d: %s", step,
+                          e)
+        else:
+          logging.info("Started profiling at step %d until step %d.", step,
+                       stop)
+          self._profile_stop = stop
+        return
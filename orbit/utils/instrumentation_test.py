@@ -0,0 +1,106 @@
+# Copyright 2023 The Orbit Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Tests for orbit.utils.instrumentation."""
+
+from unittest import mock
+
+from orbit.utils import instrumentation
+
+import tensorflow as tf
+
+
+class InstrumentationTest(tf.test.TestCase):
+
+  def test_phases_are_recorded_per_loop(self):
+    global_step = tf.Variable(0, dtype=tf.int64)
+    instr = instrumentation.Instrumentation()
+
+    with instrumentation.phase("ignored"):
+      pass
+    with instr.loop("train", global_step) as record:
+      with instrumentation.phase("outer"):
+        with instrumentation.phase("inner"):
+          global_step.assign_add(3)
+        with instrumentation.phase("inner"):
+          pass
+
+    self.assertEqual(record["kind"], "train")
+    self.assertEqual(record["step"], 3)
+    self.assertEqual(record["num_steps"], 3)
+    self.assertCountEqual(record["phases"], ["outer", "inner"])
+    self.assertGreaterEqual(record["phases"]["outer"],
+                            record["phases"]["inner"])
+    self.assertGreaterEqual(record["total"], record["phases"]["outer"])
+    self.assertEqual(instr.history, [record])
+
+  def test_history_is_bounded(self):
+    global_step = tf.Variable(0, dtype=tf.int64)
+    instr = instrumentation.Instrumentation(max_history=2)
+    for _ in range(3):
+      with instr.loop("eval", global_step):
+        pass
+    self.assertLen(instr.history, 2)
+
+  def test_nested_loops_raise(self):
+    global_step = tf.Variable(0, dtype=tf.int64)
+    instr = instrumentation.Instrumentation()
+    with instr.loop("train", global_step):
+      with self.assertRaisesRegex(RuntimeError, "nested"):
+        with instr.loop("eval", global_step):
+          pass
+
+  def test_clip_num_steps(self):
+    instr = instrumentation.Instrumentation(
+        profile_steps=[(20, 25), (5, 10)], profile_dir=self.get_temp_dir())
+    self.assertEqual(instr.clip_num_steps(0, 100), 5)
+    self.assertEqual(instr.clip_num_steps(5, 100), 5)
+    self.assertEqual(instr.clip_num_steps(7, 2), 2)
+    self.assertEqual(instr.clip_num_steps(10, 100), 10)
+    self.assertEqual(instr.clip_num_steps(22, 100), 3)
+    self.assertEqual(instr.clip_num_steps(25, 100), 100)
+
+  def test_invalid_profile_steps(self):
+    with self.assertRaisesRegex(ValueError, "Invalid profile window"):
+      instrumentation.Instrumentation(
+          profile_steps=[(5, 5)], profile_dir=self.get_temp_dir())
+    with self.assertRaisesRegex(ValueError, "overlap"):
+      instrumentation.Instrumentation(
+          profile_steps=[(0, 10), (5, 15)], profile_dir=self.get_temp_dir())
+    with self.assertRaisesRegex(ValueError, "profile_dir"):
+      instrumentation.Instrumentation(profile_steps=[(0, 10)])
+
+  @mock.patch.object(tf.profiler.experimental, "stop", autospec=True)
+  @mock.patch.object(tf.profiler.experimental, "start", autospec=True)
+  def test_profile_windows(self, mock_start, mock_stop):
+    global_step = tf.Variable(0, dtype=tf.int64)
+    profile_dir = self.get_temp_dir()
+    instr = instrumentation.Instrumentation(
+        profile_steps=[(2, 4)], profile_dir=profile_dir)
+
+    for expected_profiling in [False, False, True, True, False]:
+      with instr.loop("train", global_step):
+        self.assertEqual(instr.profiling, expected_profiling)
+        global_step.assign_add(1)
+      # Evaluations neither start nor stop traces.
+      with instr.loop("eval", global_step):
+        pass
+
+    mock_start.assert_called_once_with(profile_dir)
+    mock_stop.assert_called_once()
+    self.assertFalse(instr.profiling)
+
+
+if __name__ == "__main__":
+  tf.test.main()
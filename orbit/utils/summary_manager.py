@@ -15,7 +15,10 @@
 """Provides a utility class for managing summary writing."""
 
 import os
+import queue
+import threading
 
+from orbit.utils.common import get_value
 from orbit.utils.summary_manager_interface import SummaryManagerInterface
 
 import tensorflow as tf
@@ -24,7 +27,12 @@ import tensorflow as tf
 class SummaryManager(SummaryManagerInterface):
   """A utility class for managing summary writing."""
 
-  def __init__(self, summary_dir, summary_fn, global_step=None):
+  def __init__(self,
+               summary_dir,
+               summary_fn,
+               global_step=None,
+               async_write=False,
+               max_pending=16):
     """Initializes the `SummaryManager` instance.
 
     Args:
@@ -33,17 +41,50 @@ class SummaryManager(SummaryManagerInterface):
       summary_fn: A callable defined accepting `name`, `value`, and `step`
         parameters, making calls to `tf.summary` functions to write summaries.
       global_step: A `tf.Variable` containing the global step value.
+      async_write: Whether `write_summaries` should hand the summaries over to
+        a background thread instead of writing them on the calling thread. The
+        values and the global step are converted to NumPy when enqueued, and
+        the background thread writes all pending summaries at once before
+        flushing the writers. Call `flush()` to wait until all the enqueued
+        summaries are written.
+      max_pending: The maximum number of `write_summaries` calls which can be
+        pending in async mode. Once it is reached, `write_summaries` blocks
+        until the background thread catches up. Ignored if `async_write` is
+        `False`.
+
+    Raises:
+      ValueError: If `max_pending` is not a positive integer when
+        `async_write` is `True`.
     """
     self._enabled = summary_dir is not None
     self._summary_dir = summary_dir
     self._summary_fn = summary_fn
     self._summary_writers = {}
+    self._summary_writers_lock = threading.Lock()
 
     if global_step is None:
       self._global_step = tf.summary.experimental.get_step()
     else:
       self._global_step = global_step
 
+    self._async_write = async_write and self._enabled
+    if self._async_write:
+      if not isinstance(max_pending, int) or max_pending < 1:
+        raise ValueError(
+            f"`max_pending` ({max_pending}) must be a positive integer.")
+      self._pending = queue.Queue(maxsize=max_pending)
+      self._error = None
+      self._thread = threading.Thread(
+          target=self._write_pending_summaries,
+          name="orbit_summary_writer",
+          daemon=True)
+      self._thread.start()
+
+  @property
+  def async_write(self):
+    """Whether summaries are written by a background thread."""
+    return self._async_write
+
   def summary_writer(self, relative_path=""):
     """Returns the underlying summary writer for a specific subdirectory.
 
@@ -52,21 +93,51 @@ class SummaryManager(SummaryManagerInterface):
         the summary directory. By default it is empty, which corresponds to the
         root directory.
     """
-    if self._summary_writers and relative_path in self._summary_writers:
+    with self._summary_writers_lock:
+      if relative_path in self._summary_writers:
+        return self._summary_writers[relative_path]
+      if self._enabled:
+        self._summary_writers[relative_path] = tf.summary.create_file_writer(
+            os.path.join(self._summary_dir, relative_path))
+      else:
+        self._summary_writers[relative_path] = tf.summary.create_noop_writer()
       return self._summary_writers[relative_path]
-    if self._enabled:
-      self._summary_writers[relative_path] = tf.summary.create_file_writer(
-          os.path.join(self._summary_dir, relative_path))
-    else:
-      self._summary_writers[relative_path] = tf.summary.create_noop_writer()
-    return self._summary_writers[relative_path]
 
   def flush(self):
-    """Flushes the underlying summary writers."""
-    if self._enabled:
-      tf.nest.map_structure(tf.summary.flush, self._summary_writers)
+    """Flushes the underlying summary writers.
 
-  def write_summaries(self, summary_dict):
+    In async mode, this first waits until the background thread has written
+    all the summaries enqueued so far.
+
+    Raises:
+      Exception: In async mode, re-raises the first error encountered by the
+        background thread since the last call to `flush()`.
+    """
+    if not self._enabled:
+      return
+    if self._async_write:
+      self._pending.join()
+      self._raise_pending_error()
+    with self._summary_writers_lock:
+      summary_writers = dict(self._summary_writers)
+    tf.nest.map_structure(tf.summary.flush, summary_writers)
+
+  def close(self):
+    """Writes any pending summaries and stops the background thread.
+
+    After `close()`, further calls to `write_summaries` write synchronously.
+    This is a no-op if the instance is not in async mode.
+    """
+    if not self._async_write:
+      return
+    self._pending.join()
+    self._async_write = False
+    self._pending.put(None)
+    self._thread.join()
+    self._raise_pending_error()
+    self.flush()
+
+  def write_summaries(self, summary_dict, step=None):
     """Writes summaries for the given dictionary of values.
 
     This recursively creates subdirectories for any nested dictionaries
@@ -97,16 +168,64 @@ class SummaryManager(SummaryManagerInterface):
         name given by the corresponding key. This is performed recursively. Leaf
         values are then summarized using the summary writer instance specific to
         the parent relative path.
+      step: An optional step at which to write the summaries, e.g. for results
+        computed from an earlier checkpoint. Defaults to the global step.
+
+    Raises:
+      Exception: In async mode, re-raises the first error encountered by the
+        background thread since the last call to `flush()`.
     """
     if not self._enabled:
       return
-    self._write_summaries(summary_dict)
+    if step is None:
+      step = self._global_step
+    if not self._async_write:
+      self._write_summaries(summary_dict, step=step)
+      return
+    self._raise_pending_error()
+    # Snapshots the values and the step, since both may change (or live on an
+    # accelerator) by the time the background thread gets to them.
+    self._pending.put((tf.nest.map_structure(get_value, summary_dict),
+                       get_value(step)))
 
-  def _write_summaries(self, summary_dict, relative_path=""):
+  def _write_summaries(self, summary_dict, step, relative_path=""):
     for name, value in summary_dict.items():
       if isinstance(value, dict):
         self._write_summaries(
-            value, relative_path=os.path.join(relative_path, name))
+            value, step, relative_path=os.path.join(relative_path, name))
       else:
         with self.summary_writer(relative_path).as_default():
-          self._summary_fn(name, value, step=self._global_step)
+          self._summary_fn(name, value, step=step)
+
+  def _write_pending_summaries(self):
+    """Runs the background thread, writing summaries in batches."""
+    while True:
+      # Blocks for the first entry, then coalesces everything enqueued while
+      # the previous batch was being written, so the writers are flushed once
+      # per batch rather than once per `write_summaries` call.
+      batch = [self._pending.get()]
+      while True:
+        try:
+          batch.append(self._pending.get_nowait())
+        except queue.Empty:
+          break
+      try:
+        for entry in batch:
+          if entry is not None and self._error is None:
+            self._write_summaries(*entry)
+        if self._error is None:
+          with self._summary_writers_lock:
+            summary_writers = dict(self._summary_writers)
+          tf.nest.map_structure(tf.summary.flush, summary_writers)
+      except Exception as e:  # pylint: disable=broad-except
+        self._error = e
+      finally:
+        for _ in batch:
+          self._pending.task_done()
+      if batch[-1] is None:
+        return
+
+  def _raise_pending_error(self):
+    error, self._error = self._error, None
+    if error is not None:
+      raise error
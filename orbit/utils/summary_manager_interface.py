@@ -31,7 +31,7 @@ class SummaryManagerInterface(abc.ABC):
     raise NotImplementedError
 
   @abc.abstractmethod
-  def write_summaries(self, summary_dict):
+  def write_summaries(self, summary_dict, step=None):
     """Writes summaries for the given dictionary of values.
 
     The summary_dict can be any nested dict. The SummaryManager should
@@ -60,5 +60,7 @@ class SummaryManagerInterface(abc.ABC):
         itself a dictionary, then the function will create a new summary_dict
         with name given by the corresponding key. This is performed recursively.
         Leaf values are then summarized using the parent relative path.
+      step: An optional step at which to write the summaries. If `None`, the
+        current global step is used.
     """
     raise NotImplementedError
@@ -0,0 +1,101 @@
+# Copyright 2023 The Orbit Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Tests for orbit.utils.summary_manager."""
+
+import os
+
+from absl.testing import parameterized
+from orbit.utils import summary_manager
+
+import tensorflow as tf
+
+
+def _read_scalars(summary_dir):
+  """Returns the (step, tag, value) tuples written to `summary_dir`."""
+  scalars = []
+  for event_path in tf.io.gfile.glob(os.path.join(summary_dir, "events*")):
+    for event in tf.compat.v1.train.summary_iterator(event_path):
+      for value in event.summary.value:
+        scalars.append(
+            (event.step, value.tag, float(tf.make_ndarray(value.tensor))))
+  return sorted(scalars)
+
+
+class SummaryManagerTest(tf.test.TestCase, parameterized.TestCase):
+
+  @parameterized.named_parameters(("sync", False), ("async", True))
+  def test_write_summaries(self, async_write):
+    summary_dir = self.get_temp_dir()
+    global_step = tf.Variable(0, dtype=tf.int64)
+    manager = summary_manager.SummaryManager(
+        summary_dir,
+        tf.summary.scalar,
+        global_step=global_step,
+        async_write=async_write,
+        max_pending=2)
+    self.assertEqual(manager.async_write, async_write)
+    for step in range(5):
+      global_step.assign(step)
+      manager.write_summaries({
+          "loss": tf.constant(float(step)),
+          "dataset": {"accuracy": 0.5},
+      })
+    manager.flush()
+
+    self.assertEqual(
+        _read_scalars(summary_dir),
+        [(step, "loss", float(step)) for step in range(5)])
+    self.assertEqual(
+        _read_scalars(os.path.join(summary_dir, "dataset")),
+        [(step, "accuracy", 0.5) for step in range(5)])
+
+  def test_async_write_raises_errors_on_flush(self):
+
+    def summary_fn(name, value, step):
+      del step
+      raise ValueError(f"Cannot summarize {name}={value}.")
+
+    manager = summary_manager.SummaryManager(
+        self.get_temp_dir(),
+        summary_fn,
+        global_step=tf.Variable(0, dtype=tf.int64),
+        async_write=True)
+    manager.write_summaries({"loss": 1.0})
+    with self.assertRaisesRegex(ValueError, "Cannot summarize loss"):
+      manager.flush()
+    # The error is only raised once.
+    manager.flush()
+
+  def test_close(self):
+    summary_dir = self.get_temp_dir()
+    manager = summary_manager.SummaryManager(
+        summary_dir,
+        tf.summary.scalar,
+        global_step=tf.Variable(3, dtype=tf.int64),
+        async_write=True)
+    manager.write_summaries({"loss": 1.0})
+    manager.close()
+    self.assertFalse(manager.async_write)
+    self.assertEqual(_read_scalars(summary_dir), [(3, "loss", 1.0)])
+
+  def test_invalid_max_pending(self):
+    with self.assertRaisesRegex(ValueError, "max_pending"):
+      summary_manager.SummaryManager(
+          self.get_temp_dir(), tf.summary.scalar, async_write=True,
+          max_pending=0)
+
+
+if __name__ == "__main__":
+  tf.test.main()
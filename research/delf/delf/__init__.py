@@ -26,9 +26,11 @@ from delf.protos import feature_pb2
 from delf.python import box_io
 from delf.python import datum_io
 from delf.python import feature_aggregation_extractor
+from delf.python import feature_aggregation_index
 from delf.python import feature_aggregation_similarity
 from delf.python import feature_extractor
 from delf.python import feature_io
+from delf.python import feature_store
 from delf.python import utils
 from delf.python import whiten
 from delf.python.examples import detector
@@ -40,6 +40,7 @@ from google.protobuf import text_format
 from delf import delf_config_pb2
 from delf import datum_io
 from delf import feature_io
+from delf import feature_store
 from delf import utils
 from delf.python.datasets.revisited_op import dataset
 from delf import extractor
@@ -65,10 +66,16 @@ flags.DEFINE_string(
     'will be written to files with same name but different extension: the '
     'global feature is written to a file with extension .delg_global and the '
     'local features are written to a file with extension .delg_local.')
+flags.DEFINE_boolean(
+    'use_feature_store', False,
+    'If True, global features are appended to a packed feature store in '
+    'subdirectory "delg_global" of `output_features_dir`, instead of one '
+    '.delg_global file per image.')
 
 # Extensions.
 _DELG_GLOBAL_EXTENSION = '.delg_global'
 _DELG_LOCAL_EXTENSION = '.delg_local'
+_DELG_GLOBAL_STORE = 'delg_global'
 _IMAGE_EXTENSION = '.jpg'
 
 # Pace to report extraction log.
@@ -101,6 +108,11 @@ def main(argv):
 
   extractor_fn = extractor.MakeExtractor(config)
 
+  global_writer = None
+  if config.use_global_features and FLAGS.use_feature_store:
+    global_writer = feature_store.FeatureStoreWriter(
+        os.path.join(FLAGS.output_features_dir, _DELG_GLOBAL_STORE))
+
   start = time.time()
   for i in range(num_images):
     if i == 0:
@@ -111,6 +123,8 @@ def main(argv):
             'images took %f seconds' %
             (i, num_images, _STATUS_CHECK_ITERATIONS, elapsed))
       start = time.time()
+      if global_writer is not None:
+        global_writer.Flush()
 
     image_name = image_list[i]
     input_image_filename = os.path.join(FLAGS.images_dir,
@@ -119,7 +133,9 @@ def main(argv):
     # Compose output file name and decide if image should be skipped.
     should_skip_global = True
     should_skip_local = True
-    if config.use_global_features:
+    if global_writer is not None:
+      should_skip_global = image_name in global_writer
+    elif config.use_global_features:
       output_global_feature_filename = os.path.join(
           FLAGS.output_features_dir, image_name + _DELG_GLOBAL_EXTENSION)
       if not tf.io.gfile.exists(output_global_feature_filename):
@@ -149,7 +165,12 @@ def main(argv):
     extracted_features = extractor_fn(im, resize_factor)
     if config.use_global_features:
       global_descriptor = extracted_features['global_descriptor']
-      datum_io.WriteToFile(global_descriptor, output_global_feature_filename)
+      if global_writer is not None:
+        global_writer.Add(image_name,
+                          {feature_store.DATUM_FIELD: global_descriptor})
+      else:
+        datum_io.WriteToFile(global_descriptor,
+                             output_global_feature_filename)
     if config.use_local_features:
       locations = extracted_features['local_features']['locations']
       descriptors = extracted_features['local_features']['descriptors']
@@ -158,6 +179,9 @@ def main(argv):
       feature_io.WriteToFile(output_local_feature_filename, locations,
                              feature_scales, descriptors, attention)
 
+  if global_writer is not None:
+    global_writer.Close()
+
 
 if __name__ == '__main__':
   app.run(main)
@@ -19,6 +19,8 @@ from __future__ import absolute_import
 from __future__ import division
 from __future__ import print_function
 
+from concurrent import futures
+import multiprocessing
 import os
 import time
 
@@ -28,6 +30,7 @@ import numpy as np
 import tensorflow as tf
 
 from delf import datum_io
+from delf import feature_store
 from delf.python.datasets.revisited_op import dataset
 from delf.python.detect_to_retrieve import image_reranking
 
@@ -58,6 +61,18 @@ flags.DEFINE_boolean(
     'use_ratio_test', False,
     'Optional, only used if `use_geometric_verification` is True. '
     'Whether to use ratio test for local feature matching.')
+flags.DEFINE_integer(
+    'num_rerank_workers', 1,
+    'Optional, only used if `use_geometric_verification` is True. '
+    'Number of processes used to run geometric verification of re-ranking '
+    'candidates in parallel.')
+flags.DEFINE_integer(
+    'rerank_early_stopping_top_k', 0,
+    'Optional, only used if `use_geometric_verification` is True. If '
+    'positive, geometric verification of the candidates of a query stops once '
+    'its top `rerank_early_stopping_top_k` results are settled. The remaining '
+    'candidates are then ranked as if they had no inliers, which may change '
+    'metrics which depend on lower ranks.')
 flags.DEFINE_string(
     'output_dir', '/tmp/retrieval',
     'Directory where retrieval output will be written to. A file containing '
@@ -66,6 +81,7 @@ flags.DEFINE_string(
 # Extensions.
 _DELG_GLOBAL_EXTENSION = '.delg_global'
 _DELG_LOCAL_EXTENSION = '.delg_local'
+_DELG_GLOBAL_STORE = 'delg_global'
 
 # Precision-recall ranks to use in metric computation.
 _PR_RANKS = (1, 5, 10)
@@ -80,6 +96,9 @@ _METRICS_FILENAME = 'metrics.txt'
 def _ReadDelgGlobalDescriptors(input_dir, image_list):
   """Reads DELG global features.
 
+  If `input_dir` contains a "delg_global" feature store, features are read from
+  it. Otherwise, they are read from one file per image.
+
   Args:
     input_dir: Directory where features are located.
     image_list: List of image names for which to load features.
@@ -89,6 +108,16 @@ def _ReadDelgGlobalDescriptors(input_dir, image_list):
       corresponds to the global descriptor dimensionality.
   """
   num_images = len(image_list)
+  store_dir = os.path.join(input_dir, _DELG_GLOBAL_STORE)
+  if feature_store.IsFeatureStore(store_dir):
+    print('Reading global descriptors for %d images from feature store %s' %
+          (num_images, store_dir))
+    store = feature_store.FeatureStore(store_dir)
+    return np.array([
+        store.GetField(image_name, feature_store.DATUM_FIELD)
+        for image_name in image_list
+    ])
+
   global_descriptors = []
   print('Starting to collect global descriptors for %d images...' % num_images)
   start = time.time()
@@ -137,6 +166,13 @@ def main(argv):
                                      dtype='int32')
     hard_ranks_after_gv = np.zeros([num_query_images, num_index_images],
                                    dtype='int32')
+    feature_cache = image_reranking.LocalFeatureCache()
+    executor = None
+    if FLAGS.num_rerank_workers > 1:
+      # Workers are spawned rather than forked, since TensorFlow is loaded.
+      executor = futures.ProcessPoolExecutor(
+          FLAGS.num_rerank_workers,
+          mp_context=multiprocessing.get_context('spawn'))
   for i in range(num_query_images):
     print('Performing retrieval with query %d (%s)...' % (i, query_list[i]))
     start = time.time()
@@ -160,7 +196,10 @@ def main(argv):
           descriptor_matching_threshold=FLAGS
           .local_descriptor_matching_threshold,
           ransac_residual_threshold=FLAGS.ransac_residual_threshold,
-          use_ratio_test=FLAGS.use_ratio_test)
+          use_ratio_test=FLAGS.use_ratio_test,
+          feature_cache=feature_cache,
+          executor=executor,
+          early_stopping_top_k=FLAGS.rerank_early_stopping_top_k)
       hard_ranks_after_gv[i] = image_reranking.RerankByGeometricVerification(
           input_ranks=ranks_before_gv[i],
           initial_scores=similarities,
@@ -174,10 +213,15 @@ def main(argv):
           descriptor_matching_threshold=FLAGS
           .local_descriptor_matching_threshold,
           ransac_residual_threshold=FLAGS.ransac_residual_threshold,
-          use_ratio_test=FLAGS.use_ratio_test)
+          use_ratio_test=FLAGS.use_ratio_test,
+          feature_cache=feature_cache,
+          executor=executor,
+          early_stopping_top_k=FLAGS.rerank_early_stopping_top_k)
 
     elapsed = (time.time() - start)
     print('done! Retrieval for query %d took %f seconds' % (i, elapsed))
+  if FLAGS.use_geometric_verification and executor is not None:
+    executor.shutdown()
 
   # Create output directory if necessary.
   if not tf.io.gfile.exists(FLAGS.output_dir):
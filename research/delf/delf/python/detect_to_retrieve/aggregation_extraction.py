@@ -30,6 +30,7 @@ from delf import aggregation_config_pb2
 from delf import datum_io
 from delf import feature_aggregation_extractor
 from delf import feature_io
+from delf import feature_store
 
 # Aliases for aggregation types.
 _VLAD = aggregation_config_pb2.AggregationConfig.VLAD
@@ -74,12 +75,20 @@ def _ReadMappingBasenameToBoxNames(input_path, index_image_names):
 def ExtractAggregatedRepresentationsToFiles(image_names, features_dir,
                                             aggregation_config_path,
                                             mapping_path,
-                                            output_aggregation_dir):
+                                            output_aggregation_dir,
+                                            use_feature_store=False):
   """Extracts aggregated feature representations, saving them to files.
 
   It checks if the aggregated representation for an image already exists,
   and skips computation for those.
 
+  If `use_feature_store` is True, instead of one file per image, all aggregated
+  representations are appended to a packed feature store (see
+  `feature_store.py`) in a subdirectory of `output_aggregation_dir` named after
+  the output extension (eg, "asmk_star"). VLAD representations are stored in
+  field `feature_store.DATUM_FIELD`, and ASMK/ASMK* representations and their
+  visual words in fields `feature_store.DATUM_PAIR_FIELDS`.
+
   Args:
     image_names: List of image names. These are used to compose input file names
       for the feature files, and the output file names for aggregated
@@ -92,6 +101,8 @@ def ExtractAggregatedRepresentationsToFiles(image_names, features_dir,
       should be set. Otherwise, this is ignored.
     output_aggregation_dir: Directory where aggregation output will be written
       to.
+    use_feature_store: If True, write aggregated representations to a packed
+      feature store instead of one file per image.
 
   Raises:
     ValueError: If AggregationConfig is malformed, or `mapping_path` is
@@ -127,6 +138,11 @@ def ExtractAggregatedRepresentationsToFiles(image_names, features_dir,
   extractor = feature_aggregation_extractor.ExtractAggregatedRepresentation(
       config)
 
+  writer = None
+  if use_feature_store:
+    writer = feature_store.FeatureStoreWriter(
+        os.path.join(output_aggregation_dir, output_extension[1:]))
+
   start = time.time()
   for i in range(num_images):
     if i == 0:
@@ -137,6 +153,8 @@ def ExtractAggregatedRepresentationsToFiles(image_names, features_dir,
             'images took %f seconds' %
             (i, num_images, _STATUS_CHECK_ITERATIONS, elapsed))
       start = time.time()
+      if writer is not None:
+        writer.Flush()
 
     image_name = image_names[i]
 
@@ -144,7 +162,11 @@ def ExtractAggregatedRepresentationsToFiles(image_names, features_dir,
     # exists.
     output_aggregation_filename = os.path.join(output_aggregation_dir,
                                                image_name + output_extension)
-    if tf.io.gfile.exists(output_aggregation_filename):
+    if writer is not None:
+      already_exists = image_name in writer
+    else:
+      already_exists = tf.io.gfile.exists(output_aggregation_filename)
+    if already_exists:
       print('Skipping %s' % image_name)
       continue
 
@@ -184,10 +206,25 @@ def ExtractAggregatedRepresentationsToFiles(image_names, features_dir,
     (aggregated_descriptors,
      feature_visual_words) = extractor.Extract(descriptors,
                                                num_features_per_box)
-    if config.aggregation_type == _VLAD:
+    if writer is not None:
+      if config.aggregation_type == _VLAD:
+        writer.Add(image_name,
+                   {feature_store.DATUM_FIELD: aggregated_descriptors})
+      else:
+        writer.Add(
+            image_name,
+            dict(
+                zip(feature_store.DATUM_PAIR_FIELDS, [
+                    aggregated_descriptors,
+                    feature_visual_words.astype('uint32')
+                ])))
+    elif config.aggregation_type == _VLAD:
       datum_io.WriteToFile(aggregated_descriptors,
                            output_aggregation_filename)
     else:
       datum_io.WritePairToFile(aggregated_descriptors,
                                feature_visual_words.astype('uint32'),
                                output_aggregation_filename)
+
+  if writer is not None:
+    writer.Close()
@@ -52,7 +52,8 @@ def main(argv):
       features_dir=cmd_args.features_dir,
       aggregation_config_path=cmd_args.aggregation_config_path,
       mapping_path=cmd_args.index_mapping_path,
-      output_aggregation_dir=cmd_args.output_aggregation_dir)
+      output_aggregation_dir=cmd_args.output_aggregation_dir,
+      use_feature_store=cmd_args.use_feature_store)
 
 
 if __name__ == '__main__':
@@ -109,5 +110,14 @@ if __name__ == '__main__':
       by one of
       ['.vlad', '.asmk', '.asmk_star', '.rvlad', '.rasmk', '.rasmk_star'].
       """)
+  parser.add_argument(
+      '--use_feature_store',
+      type=lambda x: (str(x).lower() == 'true'),
+      default=False,
+      help="""
+      If True, aggregation output is written to a packed feature store, in a
+      subdirectory of `output_aggregation_dir` named after the extension (eg,
+      "asmk_star"), instead of one file per image.
+      """)
   cmd_args, unparsed = parser.parse_known_args()
   app.run(main=main, argv=[sys.argv[0]] + unparsed)
@@ -18,6 +18,8 @@ from __future__ import absolute_import
 from __future__ import division
 from __future__ import print_function
 
+import collections
+import heapq
 import io
 import os
 
@@ -41,6 +43,149 @@ _NUM_TO_RERANK = 100
 _NUM_RANSAC_TRIALS = 1000
 _MIN_RANSAC_SAMPLES = 3
 
+# Default number of images whose local features are kept in a
+# `LocalFeatureCache`.
+_DEFAULT_FEATURE_CACHE_SIZE = 1000
+
+# Number of RANSAC runs between checks of the early stopping criterion, when
+# they are executed in parallel.
+_EARLY_STOPPING_PARALLEL_BATCH_SIZE = 16
+
+
+class LocalFeatureCache(object):
+  """LRU cache of local features, and KD-trees of their descriptors.
+
+  Re-ranking the results of many queries loads and indexes the same frequently
+  retrieved index images over and over; sharing a cache across queries avoids
+  re-reading their features and re-building their KD-trees.
+
+  Args:
+    max_size: Maximum number of feature files kept in the cache. If 0, nothing
+      is cached.
+  """
+
+  def __init__(self, max_size=_DEFAULT_FEATURE_CACHE_SIZE):
+    self._max_size = max_size
+    self._entries = collections.OrderedDict()
+
+  def __len__(self):
+    return len(self._entries)
+
+  def Get(self, features_path, build_tree=False):
+    """Returns local features of a file, loading them if not cached.
+
+    Args:
+      features_path: Path to DelfFeatures file.
+      build_tree: If True, a KD-tree of the descriptors is built if not cached.
+
+    Returns:
+      locations: [#features, 2] NumPy array.
+      descriptors: [#features, depth] NumPy array.
+      tree: cKDTree of the descriptors, or None if it was not requested or if
+        there are no features.
+    """
+    entry = self._entries.pop(features_path, None)
+    if entry is None:
+      locations, _, descriptors, _, _ = feature_io.ReadFromFile(features_path)
+      entry = [locations, descriptors, None]
+    if build_tree and entry[2] is None and entry[0].shape[0]:
+      entry[2] = spatial.cKDTree(entry[1])
+
+    if self._max_size > 0:
+      self._entries[features_path] = entry
+      while len(self._entries) > self._max_size:
+        self._entries.popitem(last=False)
+    return tuple(entry)
+
+
+def _FindPutativeMatches(query_locations, query_descriptors,
+                         index_image_locations, index_image_descriptors,
+                         index_image_tree, descriptor_matching_threshold,
+                         use_ratio_test):
+  """Finds putative local feature matches between a query and an index image.
+
+  Args:
+    query_locations: [#query_features, 2] NumPy array.
+    query_descriptors: [#query_features, depth] NumPy array.
+    index_image_locations: [#index_image_features, 2] NumPy array.
+    index_image_descriptors: [#index_image_features, depth] NumPy array.
+    index_image_tree: cKDTree of `index_image_descriptors`, or None to build it.
+    descriptor_matching_threshold: See `MatchFeatures`.
+    use_ratio_test: See `MatchFeatures`.
+
+  Returns:
+    query_locations_to_use: [#matches, 2] NumPy array, or None if one of the
+      images has no features.
+    index_image_locations_to_use: [#matches, 2] NumPy array, or None if one of
+      the images has no features.
+
+  Raises:
+    ValueError: If local descriptors from query and index images have different
+      dimensionalities.
+  """
+  num_features_query = query_locations.shape[0]
+  num_features_index_image = index_image_locations.shape[0]
+  if not num_features_query or not num_features_index_image:
+    return None, None
+
+  local_feature_dim = query_descriptors.shape[1]
+  if index_image_descriptors.shape[1] != local_feature_dim:
+    raise ValueError(
+        'Local feature dimensionality is not consistent for query and index '
+        'images.')
+
+  # Construct KD-tree used to find nearest neighbors.
+  if index_image_tree is None:
+    index_image_tree = spatial.cKDTree(index_image_descriptors)
+  if use_ratio_test:
+    distances, indices = index_image_tree.query(
+        query_descriptors, k=2, n_jobs=-1)
+    is_match = (
+        distances[:, 0] < descriptor_matching_threshold * distances[:, 1])
+    indices = indices[:, 0]
+  else:
+    _, indices = index_image_tree.query(
+        query_descriptors,
+        distance_upper_bound=descriptor_matching_threshold,
+        n_jobs=-1)
+    is_match = indices != num_features_index_image
+
+  # Select feature locations for putative matches.
+  return (query_locations[is_match],
+          index_image_locations[indices[is_match]])
+
+
+def _Ransac(query_locations_to_use, index_image_locations_to_use, ransac_seed,
+            ransac_residual_threshold):
+  """Fits an affine transformation to putative matches with RANSAC.
+
+  Args:
+    query_locations_to_use: [#matches, 2] NumPy array.
+    index_image_locations_to_use: [#matches, 2] NumPy array.
+    ransac_seed: Seed used by RANSAC, or None.
+    ransac_residual_threshold: See `MatchFeatures`.
+
+  Returns:
+    inliers: Boolean NumPy array of shape [#matches], or None if no model was
+      found.
+  """
+  _, inliers = measure.ransac(
+      (index_image_locations_to_use, query_locations_to_use),
+      transform.AffineTransform,
+      min_samples=_MIN_RANSAC_SAMPLES,
+      residual_threshold=ransac_residual_threshold,
+      max_trials=_NUM_RANSAC_TRIALS,
+      random_state=ransac_seed)
+  return inliers
+
+
+def _CountRansacInliers(args):
+  """Returns the number of RANSAC inliers; used by re-ranking executors."""
+  inliers = _Ransac(*args)
+  if inliers is None:
+    return 0
+  return sum(inliers)
+
 
 def MatchFeatures(query_locations,
                   query_descriptors,
@@ -53,7 +198,8 @@ def MatchFeatures(query_locations,
                   index_im_array=None,
                   query_im_scale_factors=None,
                   index_im_scale_factors=None,
-                  use_ratio_test=False):
+                  use_ratio_test=False,
+                  index_image_tree=None):
   """Matches local features using geometric verification.
 
   First, finds putative local feature matches by matching `query_descriptors`
@@ -88,6 +234,8 @@ def MatchFeatures(query_locations,
       index image.
     use_ratio_test: If True, descriptor matching is performed via ratio test,
       instead of distance-based threshold.
+    index_image_tree: Optional. If not None, a cKDTree of
+      `index_image_descriptors`, used instead of building a new one.
 
   Returns:
     score: Number of inliers of match. If no match is found, returns 0.
@@ -99,62 +247,20 @@ def MatchFeatures(query_locations,
     ValueError: If local descriptors from query and index images have different
       dimensionalities.
   """
-  num_features_query = query_locations.shape[0]
-  num_features_index_image = index_image_locations.shape[0]
-  if not num_features_query or not num_features_index_image:
+  query_locations_to_use, index_image_locations_to_use = _FindPutativeMatches(
+      query_locations, query_descriptors, index_image_locations,
+      index_image_descriptors, index_image_tree,
+      descriptor_matching_threshold, use_ratio_test)
+  if query_locations_to_use is None:
     return 0, b''
 
-  local_feature_dim = query_descriptors.shape[1]
-  if index_image_descriptors.shape[1] != local_feature_dim:
-    raise ValueError(
-        'Local feature dimensionality is not consistent for query and index '
-        'images.')
-
-  # Construct KD-tree used to find nearest neighbors.
-  index_image_tree = spatial.cKDTree(index_image_descriptors)
-  if use_ratio_test:
-    distances, indices = index_image_tree.query(
-        query_descriptors, k=2, n_jobs=-1)
-    query_locations_to_use = np.array([
-        query_locations[i,]
-        for i in range(num_features_query)
-        if distances[i][0] < descriptor_matching_threshold * distances[i][1]
-    ])
-    index_image_locations_to_use = np.array([
-        index_image_locations[indices[i][0],]
-        for i in range(num_features_query)
-        if distances[i][0] < descriptor_matching_threshold * distances[i][1]
-    ])
-  else:
-    _, indices = index_image_tree.query(
-        query_descriptors,
-        distance_upper_bound=descriptor_matching_threshold,
-        n_jobs=-1)
-
-    # Select feature locations for putative matches.
-    query_locations_to_use = np.array([
-        query_locations[i,]
-        for i in range(num_features_query)
-        if indices[i] != num_features_index_image
-    ])
-    index_image_locations_to_use = np.array([
-        index_image_locations[indices[i],]
-        for i in range(num_features_query)
-        if indices[i] != num_features_index_image
-    ])
-
   # If there are not enough putative matches, early return 0.
   if query_locations_to_use.shape[0] <= _MIN_RANSAC_SAMPLES:
     return 0, b''
 
   # Perform geometric verification using RANSAC.
-  _, inliers = measure.ransac(
-      (index_image_locations_to_use, query_locations_to_use),
-      transform.AffineTransform,
-      min_samples=_MIN_RANSAC_SAMPLES,
-      residual_threshold=ransac_residual_threshold,
-      max_trials=_NUM_RANSAC_TRIALS,
-      random_state=ransac_seed)
+  inliers = _Ransac(query_locations_to_use, index_image_locations_to_use,
+                    ransac_seed, ransac_residual_threshold)
   match_viz_bytes = b''
 
   if inliers is None:
@@ -198,9 +304,23 @@ def RerankByGeometricVerification(input_ranks,
                                   ransac_seed=None,
                                   descriptor_matching_threshold=0.9,
                                   ransac_residual_threshold=10.0,
-                                  use_ratio_test=False):
+                                  use_ratio_test=False,
+                                  feature_cache=None,
+                                  executor=None,
+                                  early_stopping_top_k=None):
   """Re-ranks retrieval results using geometric verification.
 
+  Putative matches of the top-ranked index images are found in the calling
+  process, using KD-trees from `feature_cache`. RANSAC, which dominates the
+  cost, may then run in parallel on `executor`.
+
+  If `early_stopping_top_k` is set, RANSAC is run on candidates in decreasing
+  order of their number of putative matches, which bounds their number of
+  inliers, and stops once no remaining candidate can enter the top
+  `early_stopping_top_k` results. The order of these top results is the same
+  as without early stopping, while the remaining candidates are ranked as if
+  they had no inliers.
+
   Args:
     input_ranks: 1D NumPy array with indices of top-ranked index images, sorted
       from the most to the least similar.
@@ -222,6 +342,14 @@ def RerankByGeometricVerification(input_ranks,
       as inliers, used in RANSAC algorithm.
     use_ratio_test: If True, descriptor matching is performed via ratio test,
       instead of distance-based threshold.
+    feature_cache: Optional `LocalFeatureCache` used to load local features,
+      which may be shared across calls. If None, features are loaded without
+      caching.
+    executor: Optional `concurrent.futures.Executor` (eg, a
+      ProcessPoolExecutor) used to run RANSAC. If None, RANSAC runs in the
+      calling thread.
+    early_stopping_top_k: Optional number of top results after which re-ranking
+      may stop early.
 
   Returns:
     output_ranks: 1D NumPy array with index image indices, sorted from the most
@@ -249,19 +377,23 @@ def RerankByGeometricVerification(input_ranks,
       input_ranks_for_gv.append(ind)
   num_to_rerank = min(_NUM_TO_RERANK, len(input_ranks_for_gv))
 
+  if feature_cache is None:
+    feature_cache = LocalFeatureCache(max_size=0)
+
   # Load query image features.
   query_features_path = os.path.join(query_features_dir,
                                      query_name + local_feature_extension)
-  query_locations, _, query_descriptors, _, _ = feature_io.ReadFromFile(
-      query_features_path)
+  query_locations, query_descriptors, _ = feature_cache.Get(query_features_path)
 
   # Initialize list containing number of inliers and initial similarity scores.
   inliers_and_initial_scores = []
   for i in range(num_index_images):
     inliers_and_initial_scores.append([0, initial_scores[i]])
 
-  # Loop over top-ranked images and get results.
+  # Find putative matches for top-ranked images. Images with too few matches
+  # are not verified, and keep 0 inliers.
   print('Starting to re-rank')
+  ransac_args = {}
   for i in range(num_to_rerank):
     if i > 0 and i % _STATUS_CHECK_GV_ITERATIONS == 0:
       print('Re-ranking: i = %d out of %d' % (i, num_to_rerank))
@@ -272,18 +404,46 @@ def RerankByGeometricVerification(input_ranks,
     index_image_features_path = os.path.join(
         index_features_dir,
         index_names[index_image_id] + local_feature_extension)
-    (index_image_locations, _, index_image_descriptors, _,
-     _) = feature_io.ReadFromFile(index_image_features_path)
-
-    inliers_and_initial_scores[index_image_id][0], _ = MatchFeatures(
-        query_locations,
-        query_descriptors,
-        index_image_locations,
-        index_image_descriptors,
-        ransac_seed=ransac_seed,
-        descriptor_matching_threshold=descriptor_matching_threshold,
-        ransac_residual_threshold=ransac_residual_threshold,
-        use_ratio_test=use_ratio_test)
+    (index_image_locations, index_image_descriptors,
+     index_image_tree) = feature_cache.Get(
+         index_image_features_path, build_tree=True)
+
+    (query_locations_to_use,
+     index_image_locations_to_use) = _FindPutativeMatches(
+         query_locations, query_descriptors, index_image_locations,
+         index_image_descriptors, index_image_tree,
+         descriptor_matching_threshold, use_ratio_test)
+    if (query_locations_to_use is not None and
+        query_locations_to_use.shape[0] > _MIN_RANSAC_SAMPLES):
+      ransac_args[index_image_id] = (query_locations_to_use,
+                                     index_image_locations_to_use, ransac_seed,
+                                     ransac_residual_threshold)
+
+  # Run RANSAC on candidates, potentially in parallel and with early stopping.
+  pending_ids = list(ransac_args)
+  batch_size = len(pending_ids)
+  if early_stopping_top_k:
+    pending_ids.sort(
+        key=lambda k: (len(ransac_args[k][0]), initial_scores[k]),
+        reverse=True)
+    batch_size = 1 if executor is None else _EARLY_STOPPING_PARALLEL_BATCH_SIZE
+  while pending_ids:
+    batch_ids = pending_ids[:batch_size]
+    pending_ids = pending_ids[batch_size:]
+    batch_args = [ransac_args[k] for k in batch_ids]
+    if executor is None:
+      batch_inliers = map(_CountRansacInliers, batch_args)
+    else:
+      batch_inliers = executor.map(_CountRansacInliers, batch_args)
+    for index_image_id, num_inliers in zip(batch_ids, batch_inliers):
+      inliers_and_initial_scores[index_image_id][0] = num_inliers
+
+    if early_stopping_top_k and pending_ids and _IsTopKSettled(
+        inliers_and_initial_scores, ransac_args, pending_ids,
+        early_stopping_top_k):
+      print('Re-ranking: stopping early with %d candidates left' %
+            len(pending_ids))
+      break
 
   # Sort based on (inliers_score, initial_score).
   def _InliersInitialScoresSorting(k):
@@ -301,3 +461,32 @@ def RerankByGeometricVerification(input_ranks,
       range(num_index_images), key=_InliersInitialScoresSorting, reverse=True)
 
   return output_ranks
+
+
+def _IsTopKSettled(inliers_and_initial_scores, ransac_args, pending_ids, k):
+  """Checks if candidates pending RANSAC can no longer enter the top-k.
+
+  Args:
+    inliers_and_initial_scores: List with [number of inliers, initial score] for
+      each index image.
+    ransac_args: Dict mapping candidate index image IDs to their RANSAC
+      arguments, the first of which holds their putative matches.
+    pending_ids: List of candidate IDs for which RANSAC did not run yet.
+    k: Number of top results which must be settled.
+
+  Returns:
+    True if the k-th best (inliers, initial score) among all other index images
+    is above the best upper bound of the pending candidates.
+  """
+  pending = set(pending_ids)
+  top_settled_keys = heapq.nlargest(
+      k, (tuple(v)
+          for i, v in enumerate(inliers_and_initial_scores)
+          if i not in pending))
+  if len(top_settled_keys) < k:
+    return False
+  kth_key = top_settled_keys[-1]
+  best_pending_key = max(
+      (len(ransac_args[i][0]), inliers_and_initial_scores[i][1])
+      for i in pending_ids)
+  return kth_key > best_pending_key
@@ -0,0 +1,185 @@
+# Copyright 2019 The TensorFlow Authors All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+"""Tests for geometric verification re-ranking."""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+from concurrent import futures
+import multiprocessing
+import os
+from unittest import mock
+
+import numpy as np
+import tensorflow as tf
+
+from delf import feature_io
+from delf.python.detect_to_retrieve import image_reranking
+
+# Number of matching features of the query with each index image. Images
+# without matching features have random descriptors.
+_NUM_MATCHES = [0, 6, 0, 30, 12, 0, 20, 8]
+_NUM_QUERY_FEATURES = 40
+_DESCRIPTOR_DEPTH = 8
+
+
+def _WriteFeatures(path, locations, descriptors):
+  num_features = locations.shape[0]
+  feature_io.WriteToFile(path, locations, np.ones([num_features]), descriptors,
+                         np.ones([num_features]))
+
+
+def _RandomDescriptors(rng, num_features):
+  descriptors = rng.normal(size=[num_features, _DESCRIPTOR_DEPTH])
+  return descriptors / np.linalg.norm(descriptors, axis=1, keepdims=True)
+
+
+class ImageRerankingTest(tf.test.TestCase):
+
+  def setUp(self):
+    super(ImageRerankingTest, self).setUp()
+    rng = np.random.RandomState(0)
+    self._features_dir = self.get_temp_dir()
+    query_locations = rng.uniform(0, 100, size=[_NUM_QUERY_FEATURES, 2])
+    query_descriptors = _RandomDescriptors(rng, _NUM_QUERY_FEATURES)
+    _WriteFeatures(
+        os.path.join(self._features_dir, 'query.delf'), query_locations,
+        query_descriptors)
+
+    self._index_names = []
+    for i, num_matches in enumerate(_NUM_MATCHES):
+      # Matching features are an affine transformation of query features.
+      locations = np.concatenate([
+          query_locations[:num_matches] * 1.5 + 10.0,
+          rng.uniform(0, 100, size=[10, 2])
+      ])
+      descriptors = np.concatenate([
+          query_descriptors[:num_matches],
+          _RandomDescriptors(rng, 10)
+      ])
+      self._index_names.append('index_%d' % i)
+      _WriteFeatures(
+          os.path.join(self._features_dir, 'index_%d.delf' % i), locations,
+          descriptors)
+
+  def _Rerank(self, **kwargs):
+    num_index_images = len(self._index_names)
+    return image_reranking.RerankByGeometricVerification(
+        input_ranks=np.arange(num_index_images),
+        initial_scores=-np.arange(num_index_images, dtype='float32'),
+        query_name='query',
+        index_names=self._index_names,
+        query_features_dir=self._features_dir,
+        index_features_dir=self._features_dir,
+        junk_ids=set(),
+        ransac_seed=0,
+        descriptor_matching_threshold=0.1,
+        **kwargs)
+
+  def testLocalFeatureCache(self):
+    paths = [
+        os.path.join(self._features_dir, name + '.delf')
+        for name in self._index_names[:3]
+    ]
+    cache = image_reranking.LocalFeatureCache(max_size=2)
+    with mock.patch.object(
+        feature_io, 'ReadFromFile', wraps=feature_io.ReadFromFile) as read:
+      locations, descriptors, tree = cache.Get(paths[0])
+      self.assertIsNone(tree)
+      self.assertEqual(locations.shape, (10, 2))
+      self.assertEqual(descriptors.shape, (10, _DESCRIPTOR_DEPTH))
+
+      # The tree is built on request, and the features are not read again.
+      _, _, tree = cache.Get(paths[0], build_tree=True)
+      self.assertIsNotNone(tree)
+      self.assertIs(cache.Get(paths[0])[2], tree)
+      self.assertEqual(read.call_count, 1)
+
+      # Least recently used entries are evicted.
+      cache.Get(paths[1])
+      cache.Get(paths[0])
+      cache.Get(paths[2])
+      self.assertLen(cache, 2)
+      self.assertEqual(read.call_count, 3)
+      cache.Get(paths[0])
+      self.assertEqual(read.call_count, 3)
+      cache.Get(paths[1])
+      self.assertEqual(read.call_count, 4)
+
+    uncached = image_reranking.LocalFeatureCache(max_size=0)
+    uncached.Get(paths[0], build_tree=True)
+    self.assertEmpty(uncached)
+
+  def testRerankByGeometricVerification(self):
+    output_ranks = self._Rerank()
+
+    # Images are sorted by their number of matches, which are all inliers,
+    # and then by their initial scores.
+    expected_ranks = sorted(
+        range(len(_NUM_MATCHES)),
+        key=lambda i: (_NUM_MATCHES[i], -i),
+        reverse=True)
+    self.assertAllEqual(output_ranks, expected_ranks)
+    self.assertAllEqual(
+        self._Rerank(feature_cache=image_reranking.LocalFeatureCache()),
+        expected_ranks)
+
+  def testRerankWithExecutors(self):
+    expected_ranks = self._Rerank()
+    with futures.ThreadPoolExecutor(2) as executor:
+      self.assertAllEqual(self._Rerank(executor=executor), expected_ranks)
+    with futures.ProcessPoolExecutor(
+        2, mp_context=multiprocessing.get_context('spawn')) as executor:
+      self.assertAllEqual(self._Rerank(executor=executor), expected_ranks)
+      self.assertAllEqual(
+          self._Rerank(executor=executor, early_stopping_top_k=2)[:2],
+          expected_ranks[:2])
+
+  def testRerankWithEarlyStopping(self):
+    expected_ranks = self._Rerank()
+    for k in range(1, 4):
+      with mock.patch.object(
+          image_reranking,
+          '_CountRansacInliers',
+          wraps=image_reranking._CountRansacInliers) as count_inliers:
+        output_ranks = self._Rerank(early_stopping_top_k=k)
+      self.assertAllEqual(output_ranks[:k], expected_ranks[:k])
+      # Candidates are verified from the most putative matches down, until
+      # the top k are settled.
+      self.assertEqual(count_inliers.call_count, k)
+
+  def testIsTopKSettled(self):
+    inliers_and_initial_scores = [[20, 0.5], [0, 0.9], [0, 0.1], [0, 0.2]]
+    # Candidates 2 and 3 have 10 and 30 putative matches.
+    ransac_args = {2: (np.zeros([10, 2]),), 3: (np.zeros([30, 2]),)}
+    self.assertTrue(
+        image_reranking._IsTopKSettled(inliers_and_initial_scores,
+                                       ransac_args, [2], 1))
+    self.assertFalse(
+        image_reranking._IsTopKSettled(inliers_and_initial_scores,
+                                       ransac_args, [2, 3], 1))
+    # The second best settled image could be overtaken by candidate 2.
+    self.assertFalse(
+        image_reranking._IsTopKSettled(inliers_and_initial_scores,
+                                       ransac_args, [2], 2))
+    # There are not enough settled images.
+    self.assertFalse(
+        image_reranking._IsTopKSettled(inliers_and_initial_scores,
+                                       ransac_args, [2, 3], 3))
+
+
+if __name__ == '__main__':
+  tf.test.main()
@@ -20,6 +20,8 @@ from __future__ import division
 from __future__ import print_function
 
 import argparse
+from concurrent import futures
+import multiprocessing
 import os
 import sys
 import time
@@ -31,7 +33,8 @@ import tensorflow as tf
 from google.protobuf import text_format
 from delf import aggregation_config_pb2
 from delf import datum_io
-from delf import feature_aggregation_similarity
+from delf import feature_aggregation_index
+from delf import feature_store
 from delf.python.datasets.revisited_op import dataset
 from delf.python.detect_to_retrieve import image_reranking
 
@@ -60,6 +63,10 @@ _METRICS_FILENAME = 'metrics.txt'
 def _ReadAggregatedDescriptors(input_dir, image_list, config):
   """Reads aggregated descriptors.
 
+  If `input_dir` contains a feature store named after the extension (eg,
+  "asmk_star"), descriptors are read from it. Otherwise, they are read from one
+  file per image.
+
   Args:
     input_dir: Directory where aggregated descriptors are located.
     image_list: List of image names for which to load descriptors.
@@ -87,6 +94,28 @@ def _ReadAggregatedDescriptors(input_dir, image_list, config):
   num_images = len(image_list)
   aggregated_descriptors = []
   visual_words = []
+
+  store_dir = os.path.join(input_dir, extension[1:])
+  if feature_store.IsFeatureStore(store_dir):
+    print('Reading descriptors for %d images from feature store %s' %
+          (num_images, store_dir))
+    store = feature_store.FeatureStore(store_dir)
+    for image_name in image_list:
+      if config.aggregation_type == _VLAD:
+        aggregated_descriptors.append(
+            store.GetField(image_name, feature_store.DATUM_FIELD))
+      else:
+        d, v = [
+            store.GetField(image_name, field)
+            for field in feature_store.DATUM_PAIR_FIELDS
+        ]
+        if config.aggregation_type == _ASMK_STAR:
+          d = d.astype('uint8')
+
+        aggregated_descriptors.append(d)
+        visual_words.append(v)
+    return aggregated_descriptors, visual_words
+
   print('Starting to collect descriptors for %d images...' % num_images)
   start = time.clock()
   for i in range(num_images):
@@ -141,46 +170,64 @@ def main(argv):
   index_aggregated_descriptors, index_visual_words = _ReadAggregatedDescriptors(
       cmd_args.index_aggregation_dir, index_list, index_config)
 
-  # Create similarity computer.
-  similarity_computer = (
-      feature_aggregation_similarity.SimilarityAggregatedRepresentation(
-          index_config))
-
-  # Compute similarity between query and index images, potentially re-ranking
-  # with geometric verification.
-  ranks_before_gv = np.zeros([num_query_images, num_index_images],
-                             dtype='int32')
+  # Build index of aggregated descriptors, and compute similarity between all
+  # query and index images.
+  print('Computing similarities...')
+  start = time.time()
+  index = feature_aggregation_index.AggregatedRepresentationIndex(
+      index_config, index_aggregated_descriptors, index_visual_words or None)
+  similarities = index.ComputeSimilaritiesBatch(
+      query_aggregated_descriptors,
+      query_visual_words or None,
+      num_threads=cmd_args.num_threads)
+  ranks_before_gv = np.argsort(-similarities, axis=1).astype('int32')
+  print('done! Computing similarities took %f seconds' % (time.time() - start))
+
+  # Potentially re-rank with geometric verification.
   if cmd_args.use_geometric_verification:
     medium_ranks_after_gv = np.zeros([num_query_images, num_index_images],
                                      dtype='int32')
     hard_ranks_after_gv = np.zeros([num_query_images, num_index_images],
                                    dtype='int32')
-  for i in range(num_query_images):
-    print('Performing retrieval with query %d (%s)...' % (i, query_list[i]))
-    start = time.clock()
-
-    # Compute similarity between aggregated descriptors.
-    similarities = np.zeros([num_index_images])
-    for j in range(num_index_images):
-      similarities[j] = similarity_computer.ComputeSimilarity(
-          query_aggregated_descriptors[i], index_aggregated_descriptors[j],
-          query_visual_words[i], index_visual_words[j])
-
-    ranks_before_gv[i] = np.argsort(-similarities)
-
-    # Re-rank using geometric verification.
-    if cmd_args.use_geometric_verification:
-      medium_ranks_after_gv[i] = image_reranking.RerankByGeometricVerification(
-          ranks_before_gv[i], similarities, query_list[i], index_list,
-          cmd_args.query_features_dir, cmd_args.index_features_dir,
-          set(medium_ground_truth[i]['junk']))
+    feature_cache = image_reranking.LocalFeatureCache()
+    executor = None
+    if cmd_args.num_rerank_workers > 1:
+      # Workers are spawned rather than forked, since TensorFlow is loaded.
+      executor = futures.ProcessPoolExecutor(
+          cmd_args.num_rerank_workers,
+          mp_context=multiprocessing.get_context('spawn'))
+    for i in range(num_query_images):
+      print('Performing re-ranking with query %d (%s)...' % (i, query_list[i]))
+      start = time.clock()
+
+      medium_ranks_after_gv[i] = (
+          image_reranking.RerankByGeometricVerification(
+              ranks_before_gv[i],
+              similarities[i],
+              query_list[i],
+              index_list,
+              cmd_args.query_features_dir,
+              cmd_args.index_features_dir,
+              set(medium_ground_truth[i]['junk']),
+              feature_cache=feature_cache,
+              executor=executor,
+              early_stopping_top_k=cmd_args.rerank_early_stopping_top_k))
       hard_ranks_after_gv[i] = image_reranking.RerankByGeometricVerification(
-          ranks_before_gv[i], similarities, query_list[i], index_list,
-          cmd_args.query_features_dir, cmd_args.index_features_dir,
-          set(hard_ground_truth[i]['junk']))
+          ranks_before_gv[i],
+          similarities[i],
+          query_list[i],
+          index_list,
+          cmd_args.query_features_dir,
+          cmd_args.index_features_dir,
+          set(hard_ground_truth[i]['junk']),
+          feature_cache=feature_cache,
+          executor=executor,
+          early_stopping_top_k=cmd_args.rerank_early_stopping_top_k)
 
-    elapsed = (time.clock() - start)
-    print('done! Retrieval for query %d took %f seconds' % (i, elapsed))
+      elapsed = (time.clock() - start)
+      print('done! Re-ranking for query %d took %f seconds' % (i, elapsed))
+    if executor is not None:
+      executor.shutdown()
 
   # Create output directory if necessary.
   if not tf.io.gfile.exists(cmd_args.output_dir):
@@ -290,6 +337,34 @@ if __name__ == '__main__':
       Directory where query local image features are located, all in .delf
       format.
       """)
+  parser.add_argument(
+      '--num_threads',
+      type=int,
+      default=1,
+      help="""
+      Number of threads used to compute similarities of query images
+      concurrently.
+      """)
+  parser.add_argument(
+      '--num_rerank_workers',
+      type=int,
+      default=1,
+      help="""
+      Only used if `use_geometric_verification` is True.
+      Number of processes used to run geometric verification of re-ranking
+      candidates in parallel.
+      """)
+  parser.add_argument(
+      '--rerank_early_stopping_top_k',
+      type=int,
+      default=0,
+      help="""
+      Only used if `use_geometric_verification` is True.
+      If positive, geometric verification of the candidates of a query stops
+      once its top `rerank_early_stopping_top_k` results are settled. The
+      remaining candidates are then ranked as if they had no inliers, which
+      may change metrics which depend on lower ranks.
+      """)
   parser.add_argument(
       '--output_dir',
       type=str,
@@ -0,0 +1,373 @@
+# Copyright 2019 The TensorFlow Authors All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+"""Index for retrieval with aggregated local feature representations.
+
+The index computes the same similarities as
+`feature_aggregation_similarity.SimilarityAggregatedRepresentation`, for one
+query against all index images at once:
+
+- VLAD: the aggregated descriptors are stacked into a matrix, and similarities
+  are obtained with a matrix-vector product.
+- ASMK/ASMK*: the per-visual-word descriptors of all index images are packed
+  into a contiguous array sorted by visual word (an inverted file), so that a
+  query only touches the index descriptors of its own visual words.
+"""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+from concurrent import futures
+
+import numpy as np
+
+from delf import aggregation_config_pb2
+
+# Aliases for aggregation types.
+_VLAD = aggregation_config_pb2.AggregationConfig.VLAD
+_ASMK = aggregation_config_pb2.AggregationConfig.ASMK
+_ASMK_STAR = aggregation_config_pb2.AggregationConfig.ASMK_STAR
+
+# Number of index images per matrix-vector product for VLAD.
+_VLAD_BLOCK_SIZE = 65536
+
+
+class AggregatedRepresentationIndex(object):
+  """Index of aggregated local feature representations.
+
+  Args:
+    aggregation_config: AggregationConfig object defining type of aggregation to
+      use.
+    aggregated_descriptors: List containing #index images items, each a 1-D
+      NumPy array.
+    visual_words: Used only for ASMK/ASMK* aggregation type. List containing
+      #index images items, each a 1-D sorted NumPy integer array of unique
+      visual words corresponding to `aggregated_descriptors`.
+
+  Raises:
+    ValueError: If aggregation type is invalid, or if the descriptors are
+      inconsistent with it.
+  """
+
+  def __init__(self, aggregation_config, aggregated_descriptors,
+               visual_words=None):
+    self._feature_dimensionality = aggregation_config.feature_dimensionality
+    self._aggregation_type = aggregation_config.aggregation_type
+    self._num_images = len(aggregated_descriptors)
+
+    # Only relevant if using ASMK/ASMK*. Otherwise, ignored.
+    self._use_l2_normalization = aggregation_config.use_l2_normalization
+    self._alpha = aggregation_config.alpha
+    self._tau = aggregation_config.tau
+
+    # Only relevant if using ASMK*. Otherwise, ignored.
+    self._number_bits = np.array([bin(n).count('1') for n in range(256)])
+
+    if self._aggregation_type == _VLAD:
+      self._BuildVlad(aggregated_descriptors)
+    elif self._aggregation_type in (_ASMK, _ASMK_STAR):
+      if visual_words is None or len(visual_words) != self._num_images:
+        raise ValueError('ASMK/ASMK* index requires visual words for every '
+                         'index image.')
+      self._BuildInvertedFile(aggregated_descriptors, visual_words)
+    else:
+      raise ValueError('Invalid aggregation type: %d' % self._aggregation_type)
+
+  @property
+  def num_images(self):
+    return self._num_images
+
+  def _BuildVlad(self, aggregated_descriptors):
+    """Stacks VLAD descriptors into a [#index images, D] matrix."""
+    if not self._num_images:
+      self._vlad_descriptors = np.zeros([0, 0], dtype='float32')
+      return
+    dimensionalities = set(len(d) for d in aggregated_descriptors)
+    if len(dimensionalities) != 1:
+      raise ValueError('VLAD descriptors have different dimensionalities: %s' %
+                       sorted(dimensionalities))
+    self._vlad_descriptors = np.stack(aggregated_descriptors)
+
+  def _BuildInvertedFile(self, aggregated_descriptors, visual_words):
+    """Packs ASMK/ASMK* descriptors into an inverted file.
+
+    Args:
+      aggregated_descriptors: List of 1-D NumPy arrays.
+      visual_words: List of 1-D sorted NumPy integer arrays.
+
+    Raises:
+      ValueError: If descriptor dimensionality or type is inconsistent.
+    """
+    binarized = self._aggregation_type == _ASMK_STAR
+    self._num_visual_words = np.array([len(v) for v in visual_words],
+                                      dtype='int64')
+    non_empty = np.nonzero(self._num_visual_words)[0]
+    if binarized:
+      # All index images must use the same dimensionality per visual word.
+      per_visual_word_dimensionality = None
+      for i in non_empty:
+        if aggregated_descriptors[i].dtype != 'uint8':
+          raise ValueError('Incorrect input descriptor type: %s' %
+                           aggregated_descriptors[i].dtype)
+        dimensionality = len(aggregated_descriptors[i]) / len(visual_words[i])
+        if per_visual_word_dimensionality is None:
+          per_visual_word_dimensionality = int(dimensionality)
+        if dimensionality != per_visual_word_dimensionality:
+          raise ValueError('ASMK* dimensionality is inconsistent.')
+      dtype = 'uint8'
+    else:
+      per_visual_word_dimensionality = self._feature_dimensionality
+      for i in non_empty:
+        self._CheckAsmkDimensionality(aggregated_descriptors[i],
+                                      len(visual_words[i]), 'index %d' % i)
+      dtype = (
+          aggregated_descriptors[non_empty[0]].dtype
+          if len(non_empty) else 'float32')
+    self._per_visual_word_dimensionality = per_visual_word_dimensionality or 0
+
+    for i in non_empty:
+      if np.any(np.diff(visual_words[i]) <= 0):
+        raise ValueError('Visual words of index image %d are not sorted and '
+                         'unique.' % i)
+
+    all_visual_words = np.concatenate(
+        [np.asarray(visual_words[i], dtype='int64') for i in non_empty] or
+        [np.zeros([0], dtype='int64')])
+    image_ids = np.repeat(np.arange(self._num_images),
+                          self._num_visual_words)
+    descriptors = np.concatenate(
+        [np.asarray(aggregated_descriptors[i], dtype=dtype) for i in non_empty]
+        or [np.zeros([0], dtype=dtype)]).reshape(
+            [-1, self._per_visual_word_dimensionality])
+
+    # Sorts the (visual word, image) pairs by visual word, and then by image.
+    order = np.lexsort((image_ids, all_visual_words))
+    self._posting_image_ids = image_ids[order]
+    self._posting_descriptors = np.ascontiguousarray(descriptors[order])
+    sorted_visual_words = all_visual_words[order]
+    self._index_visual_words, self._posting_starts = np.unique(
+        sorted_visual_words, return_index=True)
+    self._posting_ends = np.append(self._posting_starts[1:],
+                                   len(sorted_visual_words))
+
+  def _CheckAsmkDimensionality(self, aggregated_descriptors, num_visual_words,
+                               descriptor_name):
+    """Checks that ASMK dimensionality is as expected.
+
+    Args:
+      aggregated_descriptors: 1-D NumPy array.
+      num_visual_words: Integer.
+      descriptor_name: String.
+
+    Raises:
+      ValueError: If descriptor dimensionality is incorrect.
+    """
+    if len(aggregated_descriptors
+          ) / num_visual_words != self._feature_dimensionality:
+      raise ValueError(
+          'Feature dimensionality for aggregated descriptor %s is invalid: %d;'
+          ' expected %d.' % (descriptor_name, len(aggregated_descriptors) /
+                             num_visual_words, self._feature_dimensionality))
+
+  def _SigmaFn(self, x):
+    """Selectivity ASMK/ASMK* similarity function.
+
+    Args:
+      x: 1-D NumPy array.
+
+    Returns:
+      result: 1-D NumPy array with output of selectivity function.
+    """
+    result = np.zeros_like(x)
+    above_tau = np.nonzero(x > self._tau)
+    result[above_tau] = np.sign(x[above_tau]) * np.power(
+        np.absolute(x[above_tau]), self._alpha)
+    return result
+
+  def ComputeSimilarities(self, aggregated_descriptors, visual_words=None):
+    """Computes similarities between a query and all index images.
+
+    Args:
+      aggregated_descriptors: 1-D NumPy array of the query.
+      visual_words: Used only for ASMK/ASMK* aggregation type. 1-D sorted NumPy
+        integer array of unique visual words corresponding to
+        `aggregated_descriptors`.
+
+    Returns:
+      similarities: 1-D NumPy array with #index images similarities. The larger,
+        the more similar.
+
+    Raises:
+      ValueError: If the query descriptors are inconsistent with the index.
+    """
+    if self._aggregation_type == _VLAD:
+      return self._VladSimilarities(aggregated_descriptors)
+    return self._AsmkSimilarities(aggregated_descriptors, visual_words)
+
+  def ComputeSimilaritiesBatch(self,
+                               aggregated_descriptors,
+                               visual_words=None,
+                               num_threads=1):
+    """Computes similarities between a batch of queries and all index images.
+
+    Args:
+      aggregated_descriptors: List containing #queries items, each a 1-D NumPy
+        array.
+      visual_words: Used only for ASMK/ASMK* aggregation type. List containing
+        #queries items, each a 1-D sorted NumPy integer array.
+      num_threads: Number of threads used to process queries concurrently.
+
+    Returns:
+      similarities: 2-D NumPy array of shape [#queries, #index images].
+    """
+    if visual_words is None:
+      visual_words = [None] * len(aggregated_descriptors)
+    similarities = np.zeros([len(aggregated_descriptors), self._num_images])
+
+    def _ComputeRow(i):
+      similarities[i] = self.ComputeSimilarities(aggregated_descriptors[i],
+                                                 visual_words[i])
+
+    if num_threads > 1:
+      with futures.ThreadPoolExecutor(num_threads) as executor:
+        # Consumes the results to propagate exceptions.
+        list(executor.map(_ComputeRow, range(len(aggregated_descriptors))))
+    else:
+      for i in range(len(aggregated_descriptors)):
+        _ComputeRow(i)
+    return similarities
+
+  def Search(self,
+             aggregated_descriptors,
+             visual_words=None,
+             top_k=None,
+             num_threads=1):
+    """Retrieves the most similar index images for a batch of queries.
+
+    Args:
+      aggregated_descriptors: List containing #queries items, each a 1-D NumPy
+        array.
+      visual_words: Used only for ASMK/ASMK* aggregation type. List containing
+        #queries items, each a 1-D sorted NumPy integer array.
+      top_k: Number of index images to return per query. If None, all index
+        images are ranked.
+      num_threads: Number of threads used to process queries concurrently.
+
+    Returns:
+      ranks: 2-D NumPy integer array of shape [#queries, top_k], with the index
+        images sorted by decreasing similarity.
+      similarities: 2-D NumPy array of shape [#queries, top_k], with the
+        corresponding similarities.
+    """
+    similarities = self.ComputeSimilaritiesBatch(aggregated_descriptors,
+                                                 visual_words, num_threads)
+    if top_k is None or top_k >= self._num_images:
+      ranks = np.argsort(-similarities, axis=1)
+    else:
+      candidates = np.argpartition(-similarities, top_k - 1, axis=1)[:, :top_k]
+      order = np.argsort(
+          -np.take_along_axis(similarities, candidates, axis=1), axis=1)
+      ranks = np.take_along_axis(candidates, order, axis=1)
+    return ranks, np.take_along_axis(similarities, ranks, axis=1)
+
+  def _VladSimilarities(self, aggregated_descriptors):
+    """Computes VLAD similarities of a query against all index images."""
+    similarities = np.zeros([self._num_images])
+    if not self._num_images:
+      return similarities
+    if len(aggregated_descriptors) != self._vlad_descriptors.shape[1]:
+      raise ValueError(
+          'Query VLAD dimensionality %d does not match index dimensionality %d'
+          % (len(aggregated_descriptors), self._vlad_descriptors.shape[1]))
+    for start in range(0, self._num_images, _VLAD_BLOCK_SIZE):
+      end = start + _VLAD_BLOCK_SIZE
+      similarities[start:end] = np.dot(self._vlad_descriptors[start:end],
+                                       aggregated_descriptors)
+    return similarities
+
+  def _AsmkSimilarities(self, aggregated_descriptors, visual_words):
+    """Computes ASMK/ASMK* similarities of a query against all index images.
+
+    Index images without visual words, or all index images if the query has
+    no visual words, get a similarity of -1.0.
+
+    Args:
+      aggregated_descriptors: 1-D NumPy array of the query.
+      visual_words: 1-D sorted NumPy integer array of the query.
+
+    Returns:
+      similarities: 1-D NumPy array with #index images similarities.
+
+    Raises:
+      ValueError: If the query descriptors are inconsistent with the index.
+    """
+    num_query_visual_words = len(visual_words)
+    if not num_query_visual_words:
+      return -np.ones([self._num_images])
+
+    binarized = self._aggregation_type == _ASMK_STAR
+    if binarized:
+      if aggregated_descriptors.dtype != 'uint8':
+        raise ValueError('Incorrect input descriptor type: %s' %
+                         aggregated_descriptors.dtype)
+      per_visual_word_dimensionality = int(
+          len(aggregated_descriptors) / num_query_visual_words)
+      if (self._posting_descriptors.size and
+          per_visual_word_dimensionality != self._per_visual_word_dimensionality
+         ):
+        raise ValueError('ASMK* dimensionality is inconsistent.')
+      # If local feature dimensionality is lower than 8, then use that to
+      # compute proper binarized inner product.
+      total_num_bits = (
+          min(self._feature_dimensionality, 8) * per_visual_word_dimensionality)
+    else:
+      per_visual_word_dimensionality = self._feature_dimensionality
+      self._CheckAsmkDimensionality(aggregated_descriptors,
+                                    num_query_visual_words, 'query')
+    query_descriptors = np.reshape(
+        aggregated_descriptors,
+        [num_query_visual_words, per_visual_word_dimensionality])
+
+    # Finds the posting lists of the query visual words in the index.
+    found = []
+    if len(self._index_visual_words):
+      positions = np.minimum(
+          np.searchsorted(self._index_visual_words, visual_words),
+          len(self._index_visual_words) - 1)
+      found = np.nonzero(self._index_visual_words[positions] == visual_words)[0]
+
+    # Visual words are visited in sorted order, so that similarities are
+    # accumulated in the same order as in the pairwise computation.
+    unnormalized_similarities = np.zeros([self._num_images])
+    for query_ind in found:
+      start = self._posting_starts[positions[query_ind]]
+      end = self._posting_ends[positions[query_ind]]
+      if binarized:
+        h = self._number_bits[np.bitwise_xor(
+            self._posting_descriptors[start:end],
+            query_descriptors[query_ind])].sum(axis=1)
+        inner_products = 1.0 - 2.0 * h / total_num_bits
+      else:
+        inner_products = np.dot(self._posting_descriptors[start:end],
+                                query_descriptors[query_ind])
+      # Each index image appears at most once in a posting list.
+      unnormalized_similarities[self._posting_image_ids[start:end]] += (
+          self._SigmaFn(inner_products.astype('float64')))
+
+    similarities = unnormalized_similarities
+    if self._use_l2_normalization:
+      similarities /= np.sqrt(num_query_visual_words * np.maximum(
+          self._num_visual_words, 1))
+    similarities[self._num_visual_words == 0] = -1.0
+    return similarities
@@ -0,0 +1,181 @@
+# Copyright 2019 The TensorFlow Authors All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+"""Tests for DELF aggregated representation index."""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import numpy as np
+import tensorflow as tf
+
+from delf import aggregation_config_pb2
+from delf import feature_aggregation_index
+from delf import feature_aggregation_similarity
+
+
+def _RandomAsmkDescriptors(rng, num_images, codebook_size, dimensionality,
+                           binarized):
+  """Creates random ASMK/ASMK* descriptors, some of them empty."""
+  aggregated_descriptors = []
+  visual_words = []
+  for i in range(num_images):
+    num_visual_words = 0 if i == 1 else rng.randint(1, codebook_size)
+    v = np.sort(
+        rng.choice(codebook_size, num_visual_words, replace=False))
+    if binarized:
+      d = rng.randint(
+          0, 256, size=num_visual_words * dimensionality, dtype='uint8')
+    else:
+      d = rng.randn(num_visual_words, dimensionality).astype('float32')
+      d /= np.linalg.norm(d, axis=1, keepdims=True)
+      d = d.reshape(-1)
+    aggregated_descriptors.append(d)
+    visual_words.append(v)
+  return aggregated_descriptors, visual_words
+
+
+class FeatureAggregationIndexTest(tf.test.TestCase):
+
+  def _ComputeExpectedSimilarities(self, config, query_descriptors,
+                                   query_visual_words, index_descriptors,
+                                   index_visual_words):
+    similarity_computer = (
+        feature_aggregation_similarity.SimilarityAggregatedRepresentation(
+            config))
+    similarities = np.zeros([len(query_descriptors), len(index_descriptors)])
+    for i in range(len(query_descriptors)):
+      for j in range(len(index_descriptors)):
+        similarities[i, j] = similarity_computer.ComputeSimilarity(
+            query_descriptors[i], index_descriptors[j],
+            query_visual_words[i] if query_visual_words else None,
+            index_visual_words[j] if index_visual_words else None)
+    return similarities
+
+  def testVladSimilaritiesMatchPairwise(self):
+    # Construct inputs.
+    rng = np.random.RandomState(0)
+    index_descriptors = list(rng.randn(20, 16).astype('float32'))
+    query_descriptors = list(rng.randn(4, 16).astype('float32'))
+    config = aggregation_config_pb2.AggregationConfig()
+    config.aggregation_type = aggregation_config_pb2.AggregationConfig.VLAD
+
+    # Run tested function.
+    index = feature_aggregation_index.AggregatedRepresentationIndex(
+        config, index_descriptors)
+    similarities = index.ComputeSimilaritiesBatch(
+        query_descriptors, num_threads=2)
+
+    # Compare actual and expected results.
+    exp_similarities = self._ComputeExpectedSimilarities(
+        config, query_descriptors, None, index_descriptors, None)
+    self.assertAllClose(similarities, exp_similarities, rtol=1e-5, atol=1e-5)
+
+  def testAsmkSimilaritiesMatchPairwise(self):
+    for use_l2_normalization in (True, False):
+      # Construct inputs.
+      rng = np.random.RandomState(1)
+      index_descriptors, index_visual_words = _RandomAsmkDescriptors(
+          rng, 30, 12, 4, binarized=False)
+      query_descriptors, query_visual_words = _RandomAsmkDescriptors(
+          rng, 5, 12, 4, binarized=False)
+      config = aggregation_config_pb2.AggregationConfig()
+      config.codebook_size = 12
+      config.feature_dimensionality = 4
+      config.aggregation_type = aggregation_config_pb2.AggregationConfig.ASMK
+      config.use_l2_normalization = use_l2_normalization
+
+      # Run tested function.
+      index = feature_aggregation_index.AggregatedRepresentationIndex(
+          config, index_descriptors, index_visual_words)
+      similarities = index.ComputeSimilaritiesBatch(query_descriptors,
+                                                    query_visual_words)
+
+      # Compare actual and expected results.
+      exp_similarities = self._ComputeExpectedSimilarities(
+          config, query_descriptors, query_visual_words, index_descriptors,
+          index_visual_words)
+      self.assertAllClose(similarities, exp_similarities)
+
+  def testAsmkStarSimilaritiesMatchPairwise(self):
+    # Construct inputs.
+    rng = np.random.RandomState(2)
+    index_descriptors, index_visual_words = _RandomAsmkDescriptors(
+        rng, 30, 12, 2, binarized=True)
+    query_descriptors, query_visual_words = _RandomAsmkDescriptors(
+        rng, 5, 12, 2, binarized=True)
+    config = aggregation_config_pb2.AggregationConfig()
+    config.codebook_size = 12
+    config.feature_dimensionality = 16
+    config.aggregation_type = aggregation_config_pb2.AggregationConfig.ASMK_STAR
+    config.use_l2_normalization = True
+
+    # Run tested function.
+    index = feature_aggregation_index.AggregatedRepresentationIndex(
+        config, index_descriptors, index_visual_words)
+    similarities = index.ComputeSimilaritiesBatch(query_descriptors,
+                                                  query_visual_words)
+
+    # Compare actual and expected results.
+    exp_similarities = self._ComputeExpectedSimilarities(
+        config, query_descriptors, query_visual_words, index_descriptors,
+        index_visual_words)
+    self.assertAllClose(similarities, exp_similarities)
+
+  def testSearchReturnsTopK(self):
+    # Construct inputs.
+    index_descriptors = [
+        np.array([1.0, 0.0]),
+        np.array([0.0, 1.0]),
+        np.array([0.6, 0.8]),
+        np.array([-1.0, 0.0])
+    ]
+    query_descriptors = [np.array([1.0, 0.0]), np.array([0.0, -1.0])]
+    config = aggregation_config_pb2.AggregationConfig()
+    config.aggregation_type = aggregation_config_pb2.AggregationConfig.VLAD
+
+    # Run tested function.
+    index = feature_aggregation_index.AggregatedRepresentationIndex(
+        config, index_descriptors)
+    ranks, similarities = index.Search(query_descriptors, top_k=2)
+
+    # Define expected results.
+    exp_ranks = [[0, 2], [0, 3]]
+    exp_similarities = [[1.0, 0.6], [0.0, 0.0]]
+
+    # Compare actual and expected results.
+    self.assertAllEqual(ranks[0], exp_ranks[0])
+    self.assertAllClose(similarities, exp_similarities)
+
+  def testAsmkEmptyQueryReturnsMinusOne(self):
+    # Construct inputs.
+    index_descriptors = [np.array([0.0, 1.0, 1.0, 0.0])]
+    index_visual_words = [np.array([1, 2])]
+    config = aggregation_config_pb2.AggregationConfig()
+    config.codebook_size = 5
+    config.feature_dimensionality = 2
+    config.aggregation_type = aggregation_config_pb2.AggregationConfig.ASMK
+
+    # Run tested function.
+    index = feature_aggregation_index.AggregatedRepresentationIndex(
+        config, index_descriptors, index_visual_words)
+    similarities = index.ComputeSimilarities(np.array([]), np.array([]))
+
+    # Compare actual and expected results.
+    self.assertAllEqual(similarities, [-1.0])
+
+
+if __name__ == '__main__':
+  tf.test.main()
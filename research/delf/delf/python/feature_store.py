@@ -0,0 +1,461 @@
+# Copyright 2019 The TensorFlow Authors All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+"""Packed, memory-mapped store of per-image feature arrays.
+
+A feature store keeps the features of many images in a few large files, instead
+of one DatumProto/DelfFeatures file per image. A store is a local directory
+containing:
+
+- `store.json`: header with the format version, the keys (eg, image names) in
+  insertion order, and the dtype and trailing shape of each field.
+- `offsets.npy`: [#fields, #keys + 1] int64 array, where the rows of field `f`
+  for the key at position `i` are `offsets[f, i]:offsets[f, i + 1]`.
+- `<field>.bin`: contiguous raw data of each field, for all keys.
+
+Each key holds one array per field. Arrays of a field share dtype and trailing
+dimensions, while their leading dimension may vary across keys (eg, number of
+local features). Stores are read with `np.memmap`, so that accessing the
+features of one image only touches its own bytes and returns zero-copy views.
+
+Stores can be appended to: new data is written to the end of the field files.
+On `Flush()`, the keys and offsets added since the previous flush are appended
+as one line to `journal.jsonl`, so a store that is interrupted while writing
+remains readable up to its last flush, and the I/O of a flush does not grow
+with the size of the store. On `Close()`, the header and offsets are replaced
+(atomically) by ones including all entries, and the journal is removed.
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import json
+import os
+
+import numpy as np
+
+from delf import datum_io
+from delf import feature_io
+
+_HEADER_FILENAME = 'store.json'
+_OFFSETS_FILENAME = 'offsets.npy'
+_JOURNAL_FILENAME = 'journal.jsonl'
+_DATA_EXTENSION = '.bin'
+_VERSION = 1
+
+# Field names used by the converters.
+DATUM_FIELD = 'datum'
+DATUM_PAIR_FIELDS = ('first', 'second')
+DELF_FEATURE_FIELDS = ('locations', 'scales', 'descriptors', 'attention',
+                       'orientations')
+
+
+def IsFeatureStore(store_dir):
+  """Returns True if `store_dir` contains a feature store."""
+  return os.path.isfile(os.path.join(store_dir, _HEADER_FILENAME))
+
+
+def _FieldSpecs(fields, specs):
+  """Returns the header entries of `fields`, given their (dtype, shape)."""
+  return [{
+      'name': field,
+      'dtype': specs[field][0].str,
+      'inner_shape': list(specs[field][1]),
+  } for field in fields]
+
+
+def _ReadIndex(store_dir):
+  """Reads header and offsets of a feature store, replaying its journal.
+
+  Args:
+    store_dir: Directory of the feature store.
+
+  Returns:
+    header: Dict with the parsed header.
+    offsets: [#fields, #keys + 1] int64 NumPy array.
+
+  Raises:
+    ValueError: If the store version is unsupported.
+  """
+  with open(os.path.join(store_dir, _HEADER_FILENAME), 'r') as f:
+    header = json.load(f)
+  if header['version'] != _VERSION:
+    raise ValueError('Unsupported feature store version: %d' %
+                     header['version'])
+  offsets = np.load(os.path.join(store_dir, _OFFSETS_FILENAME))
+  # The offsets are replaced before the header, and only grow.
+  offsets = offsets[:, :len(header['keys']) + 1]
+
+  journal_path = os.path.join(store_dir, _JOURNAL_FILENAME)
+  if os.path.isfile(journal_path):
+    with open(journal_path, 'r') as f:
+      for line in f:
+        try:
+          entry = json.loads(line)
+        except ValueError:
+          break  # Partially written by an interrupted flush.
+        if entry['start'] < len(header['keys']):
+          continue  # Already part of the header.
+        if entry['start'] > len(header['keys']):
+          break
+        header['keys'].extend(entry['keys'])
+        header['fields'] = entry['fields']
+        offsets = np.concatenate(
+            [offsets, np.array(entry['offsets'], dtype='int64')], axis=1)
+  return header, offsets
+
+
+def _RowSize(dtype, inner_shape):
+  return np.dtype(dtype).itemsize * int(np.prod(inner_shape, dtype='int64'))
+
+
+class FeatureStore(object):
+  """Read-only, memory-mapped access to a feature store.
+
+  Args:
+    store_dir: Directory of the feature store.
+  """
+
+  def __init__(self, store_dir):
+    self._store_dir = store_dir
+    header, self._offsets = _ReadIndex(store_dir)
+    self._keys = header['keys']
+    self._key_to_index = {key: i for i, key in enumerate(self._keys)}
+    self._fields = [field['name'] for field in header['fields']]
+    self._data = {}
+    for i, field in enumerate(header['fields']):
+      dtype = np.dtype(field['dtype'])
+      shape = (int(self._offsets[i, -1]),) + tuple(field['inner_shape'])
+      if shape[0] and _RowSize(dtype, shape[1:]):
+        self._data[field['name']] = np.memmap(
+            os.path.join(store_dir, field['name'] + _DATA_EXTENSION),
+            dtype=dtype,
+            mode='r',
+            shape=shape)
+      else:
+        # np.memmap does not support mapping empty files.
+        self._data[field['name']] = np.zeros(shape, dtype=dtype)
+
+  def __len__(self):
+    return len(self._keys)
+
+  def __contains__(self, key):
+    return key in self._key_to_index
+
+  @property
+  def keys(self):
+    return list(self._keys)
+
+  @property
+  def fields(self):
+    return list(self._fields)
+
+  def GetField(self, key, field):
+    """Returns the array of one field for a key, as a zero-copy view.
+
+    Args:
+      key: Key of the entry.
+      field: Name of the field.
+
+    Returns:
+      NumPy array of shape [N] + trailing shape of the field.
+
+    Raises:
+      KeyError: If the key or field is not in the store.
+    """
+    index = self._key_to_index[key]
+    field_index = self._fields.index(field)
+    start, end = self._offsets[field_index, index:index + 2]
+    return self._data[field][start:end]
+
+  def Get(self, key):
+    """Returns a dict mapping each field name to its array for a key."""
+    return {field: self.GetField(key, field) for field in self._fields}
+
+  def GetFieldData(self, field):
+    """Returns the packed data of a field and its row offsets.
+
+    Args:
+      field: Name of the field.
+
+    Returns:
+      data: NumPy array with the rows of all keys, in key order.
+      offsets: [#keys + 1] int64 NumPy array of row offsets into `data`.
+    """
+    return self._data[field], self._offsets[self._fields.index(field)]
+
+
+class FeatureStoreWriter(object):
+  """Writes, or appends to, a feature store.
+
+  Fields are fixed by the first entry added to a new store. The dtype and
+  trailing shape of a field are set by its first non-empty array. Empty arrays
+  are accepted for any field.
+
+  Args:
+    store_dir: Directory of the feature store. It is created if needed; if it
+      already contains a store, new entries are appended to it.
+  """
+
+  def __init__(self, store_dir):
+    self._store_dir = store_dir
+    if not os.path.isdir(store_dir):
+      os.makedirs(store_dir)
+
+    self._fields = None
+    self._specs = {}
+    self._keys = []
+    self._num_rows = {}
+    self._row_offsets = {}
+    self._files = {}
+    self._num_indexed_keys = 0
+    self._has_index = IsFeatureStore(store_dir)
+    if self._has_index:
+      header, offsets = _ReadIndex(store_dir)
+      self._keys = header['keys']
+      self._fields = [field['name'] for field in header['fields']]
+      for i, field in enumerate(header['fields']):
+        name = field['name']
+        self._specs[name] = (np.dtype(field['dtype']),
+                             tuple(field['inner_shape']))
+        self._row_offsets[name] = [int(o) for o in offsets[i]]
+        self._num_rows[name] = self._row_offsets[name][-1]
+        self._OpenDataFile(name)
+    self._key_set = set(self._keys)
+    if self._has_index:
+      # Compacts the journal left by an earlier writer, which may end with a
+      # partially written line.
+      self._WriteIndex()
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, exc_type, exc_value, traceback):
+    self.Close()
+
+  def __contains__(self, key):
+    return key in self._key_set
+
+  def __len__(self):
+    return len(self._keys)
+
+  def _OpenDataFile(self, field):
+    """Opens the data file of a field for appending, dropping unflushed data."""
+    path = os.path.join(self._store_dir, field + _DATA_EXTENSION)
+    f = open(path, 'ab')
+    committed_size = self._num_rows[field] * _RowSize(*self._specs[field])
+    f.truncate(committed_size)
+    f.seek(committed_size)
+    self._files[field] = f
+
+  def _InitFields(self, arrays):
+    self._fields = sorted(arrays)
+    for field in self._fields:
+      self._specs[field] = (np.asarray(arrays[field]).dtype,
+                            np.asarray(arrays[field]).shape[1:])
+      self._num_rows[field] = 0
+      self._row_offsets[field] = [0] * (len(self._keys) + 1)
+      self._OpenDataFile(field)
+
+  def Add(self, key, arrays):
+    """Adds the arrays of one entry to the store.
+
+    Args:
+      key: String key of the entry, eg the image name.
+      arrays: Dict mapping each field name to a NumPy array.
+
+    Raises:
+      ValueError: If the key already exists, or if the arrays are inconsistent
+        with the fields of the store.
+    """
+    if key in self._key_set:
+      raise ValueError('Key already exists in feature store: %s' % key)
+    if self._fields is None:
+      self._InitFields(arrays)
+    if sorted(arrays) != self._fields:
+      raise ValueError('Fields %s do not match store fields %s' %
+                       (sorted(arrays), self._fields))
+
+    for field in self._fields:
+      arr = np.asarray(arrays[field])
+      if arr.ndim == 0:
+        raise ValueError('Field %s of %s must have at least one dimension.' %
+                         (field, key))
+      if arr.size:
+        if not self._num_rows[field]:
+          # A field without rows is not bound to its dtype and shape yet.
+          self._specs[field] = (arr.dtype, arr.shape[1:])
+        dtype, inner_shape = self._specs[field]
+        if arr.dtype != dtype or arr.shape[1:] != inner_shape:
+          raise ValueError(
+              'Field %s of %s has dtype %s and shape %s; expected dtype %s and '
+              'shape [N] + %s' %
+              (field, key, arr.dtype, arr.shape, dtype, list(inner_shape)))
+        self._files[field].write(np.ascontiguousarray(arr).tobytes())
+        self._num_rows[field] += arr.shape[0]
+      self._row_offsets[field].append(self._num_rows[field])
+    self._keys.append(key)
+    self._key_set.add(key)
+
+  def AddBatch(self, keys, arrays):
+    """Adds the arrays of several entries to the store.
+
+    Args:
+      keys: List of string keys.
+      arrays: Dict mapping each field name to a list with one NumPy array per
+        key.
+    """
+    for i, key in enumerate(keys):
+      self.Add(key, {field: values[i] for field, values in arrays.items()})
+
+  def _WriteIndex(self):
+    """Atomically replaces header and offsets, and removes the journal."""
+    offsets = np.array([self._row_offsets[field] for field in self._fields],
+                       dtype='int64')
+    offsets_path = os.path.join(self._store_dir, _OFFSETS_FILENAME)
+    with open(offsets_path + '.tmp', 'wb') as f:
+      np.save(f, offsets)
+    os.replace(offsets_path + '.tmp', offsets_path)
+
+    header = {
+        'version': _VERSION,
+        'keys': self._keys,
+        'fields': _FieldSpecs(self._fields, self._specs),
+    }
+    header_path = os.path.join(self._store_dir, _HEADER_FILENAME)
+    with open(header_path + '.tmp', 'w') as f:
+      json.dump(header, f)
+    os.replace(header_path + '.tmp', header_path)
+
+    journal_path = os.path.join(self._store_dir, _JOURNAL_FILENAME)
+    if os.path.isfile(journal_path):
+      os.remove(journal_path)
+    self._has_index = True
+    self._num_indexed_keys = len(self._keys)
+
+  def Flush(self):
+    """Writes buffered data, and appends the new entries to the journal."""
+    if self._fields is None:
+      return
+    for f in self._files.values():
+      f.flush()
+
+    if not self._has_index:
+      self._WriteIndex()
+      return
+    start = self._num_indexed_keys
+    if start == len(self._keys):
+      return
+    entry = {
+        'start': start,
+        'keys': self._keys[start:],
+        'fields': _FieldSpecs(self._fields, self._specs),
+        'offsets': [self._row_offsets[field][start + 1:]
+                    for field in self._fields],
+    }
+    with open(os.path.join(self._store_dir, _JOURNAL_FILENAME), 'a') as f:
+      f.write(json.dumps(entry) + '\n')
+    self._num_indexed_keys = len(self._keys)
+
+  def Close(self):
+    """Flushes and closes the store, writing its full header and offsets."""
+    if self._fields is not None:
+      for f in self._files.values():
+        f.flush()
+      self._WriteIndex()
+    for f in self._files.values():
+      f.close()
+    self._files = {}
+
+
+def DatumFilesToStore(file_paths, keys, store_dir, pair=False):
+  """Converts DatumProto or DatumPairProto files into a feature store.
+
+  Args:
+    file_paths: List of paths to DatumProto (or DatumPairProto) files.
+    keys: List of keys, one per file.
+    store_dir: Directory of the feature store to write, or append to.
+    pair: If True, files contain DatumPairProto, stored in fields
+      DATUM_PAIR_FIELDS. Otherwise, they are stored in field DATUM_FIELD.
+  """
+  with FeatureStoreWriter(store_dir) as writer:
+    for file_path, key in zip(file_paths, keys):
+      if pair:
+        arrays = dict(
+            zip(DATUM_PAIR_FIELDS, datum_io.ReadPairFromFile(file_path)))
+      else:
+        arrays = {DATUM_FIELD: datum_io.ReadFromFile(file_path)}
+      writer.Add(key, arrays)
+
+
+def StoreToDatumFiles(store_dir, output_dir, extension):
+  """Converts a feature store of datums back into one file per key.
+
+  Args:
+    store_dir: Directory of a feature store written by `DatumFilesToStore`.
+    output_dir: Directory where files are written, named key + extension.
+    extension: File extension, including leading dot.
+  """
+  store = FeatureStore(store_dir)
+  pair = store.fields == sorted(DATUM_PAIR_FIELDS)
+  for key in store.keys:
+    file_path = os.path.join(output_dir, key + extension)
+    if pair:
+      datum_io.WritePairToFile(
+          *[np.asarray(store.GetField(key, f)) for f in DATUM_PAIR_FIELDS],
+          file_path=file_path)
+    else:
+      datum_io.WriteToFile(np.asarray(store.GetField(key, DATUM_FIELD)),
+                           file_path)
+
+
+def DelfFeatureFilesToStore(file_paths, keys, store_dir):
+  """Converts DelfFeatures files into a feature store.
+
+  Features are stored as float32, which is the precision of DelfFeatures.
+
+  Args:
+    file_paths: List of paths to DelfFeatures files.
+    keys: List of keys, one per file.
+    store_dir: Directory of the feature store to write, or append to.
+  """
+  with FeatureStoreWriter(store_dir) as writer:
+    for file_path, key in zip(file_paths, keys):
+      writer.Add(
+          key,
+          dict(
+              zip(DELF_FEATURE_FIELDS, [
+                  a.astype('float32')
+                  for a in feature_io.ReadFromFile(file_path)
+              ])))
+
+
+def StoreToDelfFeatureFiles(store_dir, output_dir, extension):
+  """Converts a feature store of DELF features back into one file per key.
+
+  Args:
+    store_dir: Directory of a feature store written by
+      `DelfFeatureFilesToStore`.
+    output_dir: Directory where files are written, named key + extension.
+    extension: File extension, including leading dot.
+  """
+  store = FeatureStore(store_dir)
+  for key in store.keys:
+    (locations, scales, descriptors, attention,
+     orientations) = [np.asarray(store.GetField(key, f))
+                      for f in DELF_FEATURE_FIELDS]
+    feature_io.WriteToFile(
+        os.path.join(output_dir, key + extension), locations, scales,
+        descriptors, attention, orientations)
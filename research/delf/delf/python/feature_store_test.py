@@ -0,0 +1,178 @@
+# Copyright 2019 The TensorFlow Authors All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+"""Tests for the packed feature store."""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import os
+
+import numpy as np
+import tensorflow as tf
+
+from delf import datum_io
+from delf import feature_io
+from delf import feature_store
+
+
+class FeatureStoreTest(tf.test.TestCase):
+
+  def testWriteAndRead(self):
+    store_dir = os.path.join(self.get_temp_dir(), 'write_and_read')
+    descriptors = [
+        np.arange(6, dtype='float32').reshape(3, 2),
+        np.zeros([0, 2], dtype='float32'),
+        np.ones([1, 2], dtype='float32')
+    ]
+    visual_words = [np.array([1, 4, 7]), np.array([]), np.array([2])]
+    with feature_store.FeatureStoreWriter(store_dir) as writer:
+      writer.AddBatch(['a', 'b', 'c'], {
+          'descriptors': descriptors,
+          'visual_words': visual_words
+      })
+
+    store = feature_store.FeatureStore(store_dir)
+    self.assertTrue(feature_store.IsFeatureStore(store_dir))
+    self.assertEqual(store.keys, ['a', 'b', 'c'])
+    self.assertIn('b', store)
+    for key, d, v in zip(store.keys, descriptors, visual_words):
+      self.assertAllEqual(store.GetField(key, 'descriptors'), d)
+      self.assertAllEqual(store.Get(key)['visual_words'], v)
+    self.assertEqual(store.GetField('b', 'descriptors').shape, (0, 2))
+    data, offsets = store.GetFieldData('descriptors')
+    self.assertIsInstance(data, np.memmap)
+    self.assertAllEqual(offsets, [0, 3, 3, 4])
+
+  def testAppendDropsUnflushedData(self):
+    store_dir = os.path.join(self.get_temp_dir(), 'append')
+    with feature_store.FeatureStoreWriter(store_dir) as writer:
+      writer.Add('a', {'global': np.array([1.0, 2.0])})
+
+    # Simulates data written after the last flush, eg by an interrupted writer.
+    with open(os.path.join(store_dir, 'global.bin'), 'ab') as f:
+      f.write(np.array([9.0, 9.0]).tobytes())
+    with feature_store.FeatureStoreWriter(store_dir) as writer:
+      self.assertIn('a', writer)
+      writer.Add('b', {'global': np.array([3.0, 4.0])})
+
+    store = feature_store.FeatureStore(store_dir)
+    self.assertEqual(store.keys, ['a', 'b'])
+    self.assertAllEqual(store.GetField('b', 'global'), [3.0, 4.0])
+
+  def testFlushAppendsToJournal(self):
+    store_dir = os.path.join(self.get_temp_dir(), 'journal')
+    journal_path = os.path.join(store_dir, 'journal.jsonl')
+    writer = feature_store.FeatureStoreWriter(store_dir)
+    for i in range(4):
+      writer.Add(str(i), {'x': np.full([i, 2], i, dtype='float32')})
+      writer.Flush()
+      # Flushing again without new entries does not touch the journal.
+      writer.Flush()
+
+    # The first flush writes the index, the later ones append to the journal.
+    with open(journal_path, 'r') as f:
+      self.assertLen(f.readlines(), 3)
+    store = feature_store.FeatureStore(store_dir)
+    self.assertEqual(store.keys, ['0', '1', '2', '3'])
+    self.assertAllEqual(store.GetFieldData('x')[1], [0, 0, 1, 3, 6])
+    self.assertAllEqual(store.GetField('3', 'x'), np.full([3, 2], 3))
+
+    # Simulates a flush interrupted while writing the journal.
+    with open(journal_path, 'a') as f:
+      f.write('{"start": 4, "keys": ["4"')
+    self.assertEqual(feature_store.FeatureStore(store_dir).keys,
+                     ['0', '1', '2', '3'])
+
+    with feature_store.FeatureStoreWriter(store_dir) as appender:
+      self.assertLen(appender, 4)
+      self.assertFalse(os.path.exists(journal_path))
+      appender.Add('5', {'x': np.ones([2, 2], dtype='float32')})
+    self.assertFalse(os.path.exists(journal_path))
+    store = feature_store.FeatureStore(store_dir)
+    self.assertEqual(store.keys, ['0', '1', '2', '3', '5'])
+    self.assertAllEqual(store.GetField('5', 'x'), np.ones([2, 2]))
+
+  def testAddInconsistentArraysRaises(self):
+    store_dir = os.path.join(self.get_temp_dir(), 'inconsistent')
+    with feature_store.FeatureStoreWriter(store_dir) as writer:
+      writer.Add('a', {'x': np.zeros([2, 3], dtype='float32')})
+      with self.assertRaisesRegex(ValueError, 'already exists'):
+        writer.Add('a', {'x': np.zeros([2, 3], dtype='float32')})
+      with self.assertRaisesRegex(ValueError, 'do not match'):
+        writer.Add('b', {'y': np.zeros([2, 3], dtype='float32')})
+      with self.assertRaisesRegex(ValueError, 'expected dtype'):
+        writer.Add('b', {'x': np.zeros([2, 4], dtype='float32')})
+
+  def testDatumPairConversion(self):
+    input_dir = os.path.join(self.get_temp_dir(), 'datum_pair_input')
+    output_dir = os.path.join(self.get_temp_dir(), 'datum_pair_output')
+    store_dir = os.path.join(self.get_temp_dir(), 'datum_pair_store')
+    tf.io.gfile.makedirs(input_dir)
+    tf.io.gfile.makedirs(output_dir)
+    pairs = {
+        'im1': (np.array([0.5, -1.0, 2.0, 3.0]), np.array([3, 8], 'uint32')),
+        'im2': (np.array([]), np.array([], 'uint32')),
+    }
+    for key, (arr_1, arr_2) in pairs.items():
+      datum_io.WritePairToFile(arr_1, arr_2,
+                               os.path.join(input_dir, key + '.asmk'))
+
+    feature_store.DatumFilesToStore(
+        [os.path.join(input_dir, key + '.asmk') for key in pairs],
+        list(pairs), store_dir, pair=True)
+    feature_store.StoreToDatumFiles(store_dir, output_dir, '.asmk')
+
+    store = feature_store.FeatureStore(store_dir)
+    for key, (arr_1, arr_2) in pairs.items():
+      self.assertAllEqual(store.GetField(key, 'first'), arr_1)
+      self.assertAllEqual(store.GetField(key, 'second'), arr_2)
+      read_1, read_2 = datum_io.ReadPairFromFile(
+          os.path.join(output_dir, key + '.asmk'))
+      self.assertAllEqual(read_1, arr_1)
+      self.assertAllEqual(read_2, arr_2)
+
+  def testDelfFeatureConversion(self):
+    input_dir = os.path.join(self.get_temp_dir(), 'delf_input')
+    output_dir = os.path.join(self.get_temp_dir(), 'delf_output')
+    store_dir = os.path.join(self.get_temp_dir(), 'delf_store')
+    tf.io.gfile.makedirs(input_dir)
+    tf.io.gfile.makedirs(output_dir)
+    locations = np.array([[1, 2], [3, 4]], dtype='float32')
+    scales = np.array([1.0, 0.5], dtype='float32')
+    descriptors = np.arange(6, dtype='float32').reshape(2, 3)
+    attention = np.array([0.25, 0.75], dtype='float32')
+    feature_io.WriteToFile(
+        os.path.join(input_dir, 'im1.delf'), locations, scales, descriptors,
+        attention)
+
+    feature_store.DelfFeatureFilesToStore(
+        [os.path.join(input_dir, 'im1.delf')], ['im1'], store_dir)
+    feature_store.StoreToDelfFeatureFiles(store_dir, output_dir, '.delf')
+
+    store = feature_store.FeatureStore(store_dir)
+    self.assertAllEqual(store.GetField('im1', 'descriptors'), descriptors)
+    (locations_out, scales_out, descriptors_out, attention_out,
+     orientations_out) = feature_io.ReadFromFile(
+         os.path.join(output_dir, 'im1.delf'))
+    self.assertAllEqual(locations_out, locations)
+    self.assertAllEqual(scales_out, scales)
+    self.assertAllEqual(descriptors_out, descriptors)
+    self.assertAllEqual(attention_out, attention)
+    self.assertAllEqual(orientations_out, [0.0, 0.0])
+
+
+if __name__ == '__main__':
+  tf.test.main()
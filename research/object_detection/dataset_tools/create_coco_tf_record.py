@@ -38,7 +38,6 @@ import io
 import json
 import logging
 import os
-import contextlib2
 import numpy as np
 import PIL.Image
 
@@ -78,6 +77,13 @@ tf.flags.DEFINE_boolean('remove_non_person_annotations', False, 'Whether to '
                         'remove all annotations for non-person objects.')
 tf.flags.DEFINE_boolean('remove_non_person_images', False, 'Whether to '
                         'remove all examples that do not contain a person.')
+tf.flags.DEFINE_integer('num_workers', 8, 'Number of workers converting '
+                        'images to tf.Examples. If 0, images are converted '
+                        'sequentially.')
+tf.flags.DEFINE_boolean('use_processes', False, 'Whether to convert images in '
+                        'worker processes rather than threads.')
+tf.flags.DEFINE_boolean('resumable', False, 'Whether to checkpoint progress '
+                        'and resume an interrupted conversion.')
 
 FLAGS = flags.FLAGS
 
@@ -365,7 +371,10 @@ def _create_tf_record_from_coco_annotations(annotations_file, image_dir,
                                             keypoint_annotations_file='',
                                             densepose_annotations_file='',
                                             remove_non_person_annotations=False,
-                                            remove_non_person_images=False):
+                                            remove_non_person_images=False,
+                                            num_workers=8,
+                                            use_processes=False,
+                                            resumable=False):
   """Loads COCO annotation json files and converts to tf.Record format.
 
   Args:
@@ -384,11 +393,12 @@ def _create_tf_record_from_coco_annotations(annotations_file, image_dir,
       not the "person" class.
     remove_non_person_images: Whether to remove any images that do not contain
       at least one "person" annotation.
+    num_workers: Number of workers converting images to tf.Examples.
+    use_processes: Whether to convert images in processes rather than threads.
+    resumable: Whether to checkpoint progress and resume an interrupted
+      conversion.
   """
-  with contextlib2.ExitStack() as tf_record_close_stack, \
-      tf.gfile.GFile(annotations_file, 'r') as fid:
-    output_tfrecords = tf_record_creation_util.open_sharded_output_tfrecords(
-        tf_record_close_stack, output_path, num_shards)
+  with tf.gfile.GFile(annotations_file, 'r') as fid:
     groundtruth_data = json.load(fid)
     images = groundtruth_data['images']
     category_index = label_map_util.create_category_index(
@@ -433,12 +443,7 @@ def _create_tf_record_from_coco_annotations(annotations_file, image_dir,
             densepose_annotations_index[image_id] = {}
           densepose_annotations_index[image_id][annotation['id']] = annotation
 
-    total_num_annotations_skipped = 0
-    total_num_keypoint_annotations_skipped = 0
-    total_num_densepose_annotations_skipped = 0
-    for idx, image in enumerate(images):
-      if idx % 100 == 0:
-        logging.info('On image %d of %d', idx, len(images))
+    def convert(image):
       annotations_list = annotations_index[image['id']]
       keypoint_annotations_dict = None
       if keypoint_annotations_file:
@@ -455,21 +460,31 @@ def _create_tf_record_from_coco_annotations(annotations_file, image_dir,
            image, annotations_list, image_dir, category_index, include_masks,
            keypoint_annotations_dict, densepose_annotations_dict,
            remove_non_person_annotations, remove_non_person_images)
-      total_num_annotations_skipped += num_annotations_skipped
-      total_num_keypoint_annotations_skipped += num_keypoint_annotations_skipped
-      total_num_densepose_annotations_skipped += (
-          num_densepose_annotations_skipped)
-      shard_idx = idx % num_shards
-      if tf_example:
-        output_tfrecords[shard_idx].write(tf_example.SerializeToString())
+      return tf_example, (num_annotations_skipped,
+                          num_keypoint_annotations_skipped,
+                          num_densepose_annotations_skipped)
+
+    total_num_skipped = np.zeros(3, dtype=np.int64)
+    def accumulate_skipped(num_skipped):
+      total_num_skipped[:] += num_skipped
+
+    tf_record_creation_util.write_tfrecords_in_parallel(
+        images,
+        convert,
+        tf_record_creation_util.sharded_output_filenames(
+            output_path, num_shards),
+        aux_fn=accumulate_skipped,
+        num_workers=num_workers,
+        use_processes=use_processes,
+        resumable=resumable)
     logging.info('Finished writing, skipped %d annotations.',
-                 total_num_annotations_skipped)
+                 total_num_skipped[0])
     if keypoint_annotations_file:
       logging.info('Finished writing, skipped %d keypoint annotations.',
-                   total_num_keypoint_annotations_skipped)
+                   total_num_skipped[1])
     if densepose_annotations_file:
       logging.info('Finished writing, skipped %d DensePose annotations.',
-                   total_num_densepose_annotations_skipped)
+                   total_num_skipped[2])
 
 
 def main(_):
@@ -495,7 +510,10 @@ def main(_):
       keypoint_annotations_file=FLAGS.train_keypoint_annotations_file,
       densepose_annotations_file=FLAGS.train_densepose_annotations_file,
       remove_non_person_annotations=FLAGS.remove_non_person_annotations,
-      remove_non_person_images=FLAGS.remove_non_person_images)
+      remove_non_person_images=FLAGS.remove_non_person_images,
+      num_workers=FLAGS.num_workers,
+      use_processes=FLAGS.use_processes,
+      resumable=FLAGS.resumable)
   _create_tf_record_from_coco_annotations(
       FLAGS.val_annotations_file,
       FLAGS.val_image_dir,
@@ -505,13 +523,19 @@ def main(_):
       keypoint_annotations_file=FLAGS.val_keypoint_annotations_file,
       densepose_annotations_file=FLAGS.val_densepose_annotations_file,
       remove_non_person_annotations=FLAGS.remove_non_person_annotations,
-      remove_non_person_images=FLAGS.remove_non_person_images)
+      remove_non_person_images=FLAGS.remove_non_person_images,
+      num_workers=FLAGS.num_workers,
+      use_processes=FLAGS.use_processes,
+      resumable=FLAGS.resumable)
   _create_tf_record_from_coco_annotations(
       FLAGS.testdev_annotations_file,
       FLAGS.test_image_dir,
       testdev_output_path,
       FLAGS.include_masks,
-      num_shards=50)
+      num_shards=50,
+      num_workers=FLAGS.num_workers,
+      use_processes=FLAGS.use_processes,
+      resumable=FLAGS.resumable)
 
 
 if __name__ == '__main__':
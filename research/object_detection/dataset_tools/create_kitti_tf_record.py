@@ -44,6 +44,7 @@ import numpy as np
 import PIL.Image as pil
 import tensorflow.compat.v1 as tf
 
+from object_detection.dataset_tools import tf_record_creation_util
 from object_detection.utils import dataset_util
 from object_detection.utils import label_map_util
 from object_detection.utils.np_box_ops import iou
@@ -66,11 +67,20 @@ tf.app.flags.DEFINE_string('label_map_path', 'data/kitti_label_map.pbtxt',
                            'Path to label map proto.')
 tf.app.flags.DEFINE_integer('validation_set_size', '500', 'Number of images to'
                             'be used as a validation set.')
+tf.app.flags.DEFINE_integer('num_workers', 8, 'Number of workers converting '
+                            'images to tf.Examples. If 0, images are '
+                            'converted sequentially.')
+tf.app.flags.DEFINE_boolean('use_processes', False, 'Whether to convert images '
+                            'in worker processes rather than threads.')
+tf.app.flags.DEFINE_boolean('resumable', False, 'Whether to checkpoint progress '
+                            'and resume an interrupted conversion.')
 FLAGS = tf.app.flags.FLAGS
 
 
 def convert_kitti_to_tfrecords(data_dir, output_path, classes_to_use,
-                               label_map_path, validation_set_size):
+                               label_map_path, validation_set_size,
+                               num_workers=8, use_processes=False,
+                               resumable=False):
   """Convert the KITTI detection dataset to TFRecords.
 
   Args:
@@ -90,10 +100,12 @@ def convert_kitti_to_tfrecords(data_dir, output_path, classes_to_use,
     validation_set_size: How many images should be left as the validation set.
       (Ffirst `validation_set_size` examples are selected to be in the
       validation set).
+    num_workers: Number of workers converting images to tf.Examples.
+    use_processes: Whether to convert images in processes rather than threads.
+    resumable: Whether to checkpoint progress and resume an interrupted
+      conversion.
   """
   label_map_dict = label_map_util.get_label_map_dict(label_map_path)
-  train_count = 0
-  val_count = 0
 
   annotation_dir = os.path.join(data_dir,
                                 'training',
@@ -104,15 +116,15 @@ def convert_kitti_to_tfrecords(data_dir, output_path, classes_to_use,
                            'training',
                            'image_2')
 
-  train_writer = tf.python_io.TFRecordWriter('%s_train.tfrecord'%
-                                             output_path)
-  val_writer = tf.python_io.TFRecordWriter('%s_val.tfrecord'%
-                                           output_path)
+  output_filenames = ['%s_train.tfrecord' % output_path,
+                      '%s_val.tfrecord' % output_path]
 
-  images = sorted(tf.gfile.ListDirectory(image_dir))
-  for img_name in images:
+  def is_validation_img(unused_idx, img_name):
+    img_num = int(img_name.split('.')[0])
+    return int(img_num < validation_set_size)
+
+  def convert(img_name):
     img_num = int(img_name.split('.')[0])
-    is_validation_img = img_num < validation_set_size
     img_anno = read_annotation_file(os.path.join(annotation_dir,
                                                  str(img_num).zfill(6)+'.txt'))
 
@@ -123,16 +135,17 @@ def convert_kitti_to_tfrecords(data_dir, output_path, classes_to_use,
     # TODO(talremez) filter out targets that are truncated or heavily occluded.
     annotation_for_image = filter_annotations(img_anno, classes_to_use)
 
-    example = prepare_example(image_path, annotation_for_image, label_map_dict)
-    if is_validation_img:
-      val_writer.write(example.SerializeToString())
-      val_count += 1
-    else:
-      train_writer.write(example.SerializeToString())
-      train_count += 1
+    return prepare_example(image_path, annotation_for_image, label_map_dict)
 
-  train_writer.close()
-  val_writer.close()
+  images = sorted(tf.gfile.ListDirectory(image_dir))
+  tf_record_creation_util.write_tfrecords_in_parallel(
+      images,
+      convert,
+      output_filenames,
+      shard_fn=is_validation_img,
+      num_workers=num_workers,
+      use_processes=use_processes,
+      resumable=resumable)
 
 
 def prepare_example(image_path, annotations, label_map_dict):
@@ -304,7 +317,10 @@ def main(_):
       output_path=FLAGS.output_path,
       classes_to_use=FLAGS.classes_to_use.split(','),
       label_map_path=FLAGS.label_map_path,
-      validation_set_size=FLAGS.validation_set_size)
+      validation_set_size=FLAGS.validation_set_size,
+      num_workers=FLAGS.num_workers,
+      use_processes=FLAGS.use_processes,
+      resumable=FLAGS.resumable)
 
 if __name__ == '__main__':
   tf.app.run()
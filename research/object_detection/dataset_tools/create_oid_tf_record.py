@@ -38,7 +38,6 @@ from __future__ import print_function
 
 import os
 
-import contextlib2
 import pandas as pd
 import tensorflow.compat.v1 as tf
 
@@ -59,6 +58,13 @@ tf.flags.DEFINE_string(
     'Path to the output TFRecord. The shard index and the number of shards '
     'will be appended for each output shard.')
 tf.flags.DEFINE_integer('num_shards', 100, 'Number of TFRecord shards')
+tf.flags.DEFINE_integer('num_workers', 8, 'Number of workers converting '
+                        'images to tf.Examples. If 0, images are converted '
+                        'sequentially.')
+tf.flags.DEFINE_boolean('use_processes', False, 'Whether to convert images in '
+                        'worker processes rather than threads.')
+tf.flags.DEFINE_boolean('resumable', False, 'Whether to checkpoint progress '
+                        'and resume an interrupted conversion.')
 
 FLAGS = tf.flags.FLAGS
 
@@ -91,26 +97,30 @@ def main(_):
 
   tf.logging.log(tf.logging.INFO, 'Found %d images...', len(all_image_ids))
 
-  with contextlib2.ExitStack() as tf_record_close_stack:
-    output_tfrecords = tf_record_creation_util.open_sharded_output_tfrecords(
-        tf_record_close_stack, FLAGS.output_tf_record_path_prefix,
-        FLAGS.num_shards)
-
-    for counter, image_data in enumerate(all_annotations.groupby('ImageID')):
-      tf.logging.log_every_n(tf.logging.INFO, 'Processed %d images...', 1000,
-                             counter)
-
-      image_id, image_annotations = image_data
-      # In OID image file names are formed by appending ".jpg" to the image ID.
-      image_path = os.path.join(FLAGS.input_images_directory, image_id + '.jpg')
-      with tf.gfile.Open(image_path) as image_file:
-        encoded_image = image_file.read()
-
-      tf_example = oid_tfrecord_creation.tf_example_from_annotations_data_frame(
-          image_annotations, label_map, encoded_image)
-      if tf_example:
-        shard_idx = int(image_id, 16) % FLAGS.num_shards
-        output_tfrecords[shard_idx].write(tf_example.SerializeToString())
+  def convert(image_data):
+    image_id, image_annotations = image_data
+    # In OID image file names are formed by appending ".jpg" to the image ID.
+    image_path = os.path.join(FLAGS.input_images_directory, image_id + '.jpg')
+    with tf.gfile.Open(image_path) as image_file:
+      encoded_image = image_file.read()
+
+    return oid_tfrecord_creation.tf_example_from_annotations_data_frame(
+        image_annotations, label_map, encoded_image)
+
+  def shard_fn(unused_idx, image_data):
+    return int(image_data[0], 16) % FLAGS.num_shards
+
+  grouped_annotations = all_annotations.groupby('ImageID')
+  tf_record_creation_util.write_tfrecords_in_parallel(
+      grouped_annotations,
+      convert,
+      tf_record_creation_util.sharded_output_filenames(
+          FLAGS.output_tf_record_path_prefix, FLAGS.num_shards),
+      shard_fn=shard_fn,
+      num_workers=FLAGS.num_workers,
+      use_processes=FLAGS.use_processes,
+      resumable=FLAGS.resumable,
+      num_items=grouped_annotations.ngroups)
 
 
 if __name__ == '__main__':
@@ -34,6 +34,7 @@ from lxml import etree
 import PIL.Image
 import tensorflow.compat.v1 as tf
 
+from object_detection.dataset_tools import tf_record_creation_util
 from object_detection.utils import dataset_util
 from object_detection.utils import label_map_util
 
@@ -50,6 +51,12 @@ flags.DEFINE_string('label_map_path', 'data/pascal_label_map.pbtxt',
                     'Path to label map proto')
 flags.DEFINE_boolean('ignore_difficult_instances', False, 'Whether to ignore '
                      'difficult instances')
+flags.DEFINE_integer('num_workers', 8, 'Number of workers converting images '
+                     'to tf.Examples. If 0, images are converted sequentially.')
+flags.DEFINE_boolean('use_processes', False, 'Whether to convert images in '
+                     'worker processes rather than threads.')
+flags.DEFINE_boolean('resumable', False, 'Whether to checkpoint progress and '
+                     'resume an interrupted conversion.')
 FLAGS = flags.FLAGS
 
 SETS = ['train', 'val', 'trainval', 'test']
@@ -155,30 +162,35 @@ def main(_):
   if FLAGS.year != 'merged':
     years = [FLAGS.year]
 
-  writer = tf.python_io.TFRecordWriter(FLAGS.output_path)
-
   label_map_dict = label_map_util.get_label_map_dict(FLAGS.label_map_path)
 
+  annotation_paths = []
   for year in years:
     logging.info('Reading from PASCAL %s dataset.', year)
     examples_path = os.path.join(data_dir, year, 'ImageSets', 'Main',
                                  'aeroplane_' + FLAGS.set + '.txt')
     annotations_dir = os.path.join(data_dir, year, FLAGS.annotations_dir)
     examples_list = dataset_util.read_examples_list(examples_path)
-    for idx, example in enumerate(examples_list):
-      if idx % 100 == 0:
-        logging.info('On image %d of %d', idx, len(examples_list))
-      path = os.path.join(annotations_dir, example + '.xml')
-      with tf.gfile.GFile(path, 'r') as fid:
-        xml_str = fid.read()
-      xml = etree.fromstring(xml_str)
-      data = dataset_util.recursive_parse_xml_to_dict(xml)['annotation']
-
-      tf_example = dict_to_tf_example(data, FLAGS.data_dir, label_map_dict,
-                                      FLAGS.ignore_difficult_instances)
-      writer.write(tf_example.SerializeToString())
-
-  writer.close()
+    annotation_paths.extend(
+        os.path.join(annotations_dir, example + '.xml')
+        for example in examples_list)
+
+  def convert(path):
+    with tf.gfile.GFile(path, 'r') as fid:
+      xml_str = fid.read()
+    xml = etree.fromstring(xml_str)
+    data = dataset_util.recursive_parse_xml_to_dict(xml)['annotation']
+
+    return dict_to_tf_example(data, FLAGS.data_dir, label_map_dict,
+                              FLAGS.ignore_difficult_instances)
+
+  tf_record_creation_util.write_tfrecords_in_parallel(
+      annotation_paths,
+      convert,
+      [FLAGS.output_path],
+      num_workers=FLAGS.num_workers,
+      use_processes=FLAGS.use_processes,
+      resumable=FLAGS.resumable)
 
 
 if __name__ == '__main__':
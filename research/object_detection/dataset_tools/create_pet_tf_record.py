@@ -33,7 +33,6 @@ import os
 import random
 import re
 
-import contextlib2
 from lxml import etree
 import numpy as np
 import PIL.Image
@@ -55,6 +54,12 @@ flags.DEFINE_boolean('faces_only', True, 'If True, generates bounding boxes '
 flags.DEFINE_string('mask_type', 'png', 'How to represent instance '
                     'segmentation masks. Options are "png" or "numerical".')
 flags.DEFINE_integer('num_shards', 10, 'Number of TFRecord shards')
+flags.DEFINE_integer('num_workers', 8, 'Number of workers converting images '
+                     'to tf.Examples. If 0, images are converted sequentially.')
+flags.DEFINE_boolean('use_processes', False, 'Whether to convert images in '
+                     'worker processes rather than threads.')
+flags.DEFINE_boolean('resumable', False, 'Whether to checkpoint progress and '
+                     'resume an interrupted conversion.')
 
 FLAGS = flags.FLAGS
 
@@ -218,7 +223,10 @@ def create_tf_record(output_filename,
                      image_dir,
                      examples,
                      faces_only=True,
-                     mask_type='png'):
+                     mask_type='png',
+                     num_workers=8,
+                     use_processes=False,
+                     resumable=False):
   """Creates a TFRecord file from examples.
 
   Args:
@@ -232,37 +240,43 @@ def create_tf_record(output_filename,
       generates bounding boxes (as well as segmentations for full pet bodies).
     mask_type: 'numerical' or 'png'. 'png' is recommended because it leads to
       smaller file sizes.
+    num_workers: Number of workers converting images to tf.Examples.
+    use_processes: Whether to convert images in processes rather than threads.
+    resumable: Whether to checkpoint progress and resume an interrupted
+      conversion.
   """
-  with contextlib2.ExitStack() as tf_record_close_stack:
-    output_tfrecords = tf_record_creation_util.open_sharded_output_tfrecords(
-        tf_record_close_stack, output_filename, num_shards)
-    for idx, example in enumerate(examples):
-      if idx % 100 == 0:
-        logging.info('On image %d of %d', idx, len(examples))
-      xml_path = os.path.join(annotations_dir, 'xmls', example + '.xml')
-      mask_path = os.path.join(annotations_dir, 'trimaps', example + '.png')
-
-      if not os.path.exists(xml_path):
-        logging.warning('Could not find %s, ignoring example.', xml_path)
-        continue
-      with tf.gfile.GFile(xml_path, 'r') as fid:
-        xml_str = fid.read()
-      xml = etree.fromstring(xml_str)
-      data = dataset_util.recursive_parse_xml_to_dict(xml)['annotation']
-
-      try:
-        tf_example = dict_to_tf_example(
-            data,
-            mask_path,
-            label_map_dict,
-            image_dir,
-            faces_only=faces_only,
-            mask_type=mask_type)
-        if tf_example:
-          shard_idx = idx % num_shards
-          output_tfrecords[shard_idx].write(tf_example.SerializeToString())
-      except ValueError:
-        logging.warning('Invalid example: %s, ignoring.', xml_path)
+  def convert(example):
+    xml_path = os.path.join(annotations_dir, 'xmls', example + '.xml')
+    mask_path = os.path.join(annotations_dir, 'trimaps', example + '.png')
+
+    if not os.path.exists(xml_path):
+      logging.warning('Could not find %s, ignoring example.', xml_path)
+      return None
+    with tf.gfile.GFile(xml_path, 'r') as fid:
+      xml_str = fid.read()
+    xml = etree.fromstring(xml_str)
+    data = dataset_util.recursive_parse_xml_to_dict(xml)['annotation']
+
+    try:
+      return dict_to_tf_example(
+          data,
+          mask_path,
+          label_map_dict,
+          image_dir,
+          faces_only=faces_only,
+          mask_type=mask_type)
+    except ValueError:
+      logging.warning('Invalid example: %s, ignoring.', xml_path)
+      return None
+
+  tf_record_creation_util.write_tfrecords_in_parallel(
+      examples,
+      convert,
+      tf_record_creation_util.sharded_output_filenames(
+          output_filename, num_shards),
+      num_workers=num_workers,
+      use_processes=use_processes,
+      resumable=resumable)
 
 
 # TODO(derekjchow): Add test for pet/PASCAL main files.
@@ -302,7 +316,10 @@ def main(_):
       image_dir,
       train_examples,
       faces_only=FLAGS.faces_only,
-      mask_type=FLAGS.mask_type)
+      mask_type=FLAGS.mask_type,
+      num_workers=FLAGS.num_workers,
+      use_processes=FLAGS.use_processes,
+      resumable=FLAGS.resumable)
   create_tf_record(
       val_output_path,
       FLAGS.num_shards,
@@ -311,7 +328,10 @@ def main(_):
       image_dir,
       val_examples,
       faces_only=FLAGS.faces_only,
-      mask_type=FLAGS.mask_type)
+      mask_type=FLAGS.mask_type,
+      num_workers=FLAGS.num_workers,
+      use_processes=FLAGS.use_processes,
+      resumable=FLAGS.resumable)
 
 
 if __name__ == '__main__':
@@ -18,10 +18,36 @@ from __future__ import absolute_import
 from __future__ import division
 from __future__ import print_function
 
+import collections
+from concurrent import futures
+import itertools
+import json
+import logging
+import multiprocessing
+import os
+import threading
+
+from six.moves import queue
 from six.moves import range
 import tensorflow.compat.v1 as tf
 
 
+def sharded_output_filenames(base_path, num_shards):
+  """Returns the filenames of all shards of a sharded TFRecord.
+
+  Args:
+    base_path: The base path for all shards
+    num_shards: The number of shards
+
+  Returns:
+    The list of filenames. Position k in the list corresponds to shard k.
+  """
+  return [
+      '{}-{:05d}-of-{:05d}'.format(base_path, idx, num_shards)
+      for idx in range(num_shards)
+  ]
+
+
 def open_sharded_output_tfrecords(exit_stack, base_path, num_shards):
   """Opens all TFRecord shards for writing and adds them to an exit stack.
 
@@ -34,10 +60,7 @@ def open_sharded_output_tfrecords(exit_stack, base_path, num_shards):
   Returns:
     The list of opened TFRecords. Position k in the list corresponds to shard k.
   """
-  tf_record_output_filenames = [
-      '{}-{:05d}-of-{:05d}'.format(base_path, idx, num_shards)
-      for idx in range(num_shards)
-  ]
+  tf_record_output_filenames = sharded_output_filenames(base_path, num_shards)
 
   tfrecords = [
       exit_stack.enter_context(tf.python_io.TFRecordWriter(file_name))
@@ -45,3 +68,256 @@ def open_sharded_output_tfrecords(exit_stack, base_path, num_shards):
   ]
 
   return tfrecords
+
+
+# The conversion function of worker processes, set by `_init_convert_worker`.
+_WORKER_CONVERT_FN = None
+
+
+def _init_convert_worker(convert_fn):
+  global _WORKER_CONVERT_FN
+  _WORKER_CONVERT_FN = convert_fn
+
+
+def _convert_and_serialize(convert_fn, item):
+  """Converts an item and serializes the resulting tf.train.Example."""
+  if convert_fn is None:
+    convert_fn = _WORKER_CONVERT_FN
+  result = convert_fn(item)
+  example, aux = result if isinstance(result, tuple) else (result, None)
+  if example is not None and not isinstance(example, bytes):
+    example = example.SerializeToString()
+  return example, aux
+
+
+def _progress_path(output_filenames):
+  dirname, basename = os.path.split(output_filenames[0])
+  return os.path.join(dirname, '.{}.progress'.format(basename))
+
+
+class _ShardWriterThread(threading.Thread):
+  """Writes serialized examples from a bounded queue to a set of shards."""
+
+  def __init__(self, writers, max_queue_size):
+    super(_ShardWriterThread, self).__init__()
+    self.daemon = True
+    self.queue = queue.Queue(maxsize=max_queue_size)
+    self.error = None
+    self._writers = writers
+
+  def run(self):
+    while True:
+      item = self.queue.get()
+      try:
+        if item is None:
+          return
+        if self.error is None:
+          shard_idx, serialized_example = item
+          self._writers[shard_idx].write(serialized_example)
+      except Exception as e:  # pylint: disable=broad-except
+        self.error = e
+      finally:
+        self.queue.task_done()
+
+
+def _restore_committed_records(filename, num_records):
+  """Truncates a shard to the records recorded in a progress checkpoint."""
+  if not tf.gfile.Exists(filename):
+    if num_records:
+      raise ValueError('Cannot resume, {} is missing.'.format(filename))
+    return tf.python_io.TFRecordWriter(filename)
+  partial_filename = filename + '.partial'
+  tf.gfile.Rename(filename, partial_filename, overwrite=True)
+  writer = tf.python_io.TFRecordWriter(filename)
+  records = tf.python_io.tf_record_iterator(partial_filename)
+  for record in itertools.islice(records, num_records):
+    writer.write(record)
+  tf.gfile.Remove(partial_filename)
+  return writer
+
+
+def write_tfrecords_in_parallel(items,
+                                convert_fn,
+                                output_filenames,
+                                shard_fn=None,
+                                aux_fn=None,
+                                num_workers=8,
+                                use_processes=False,
+                                num_writer_threads=4,
+                                max_pending=256,
+                                resumable=False,
+                                checkpoint_every=1000,
+                                num_items=None):
+  """Converts items to tf.train.Examples in parallel and writes them to shards.
+
+  The conversion runs in a pool of worker threads or processes, while the
+  main thread keeps the results in the input order and hands them to writer
+  threads which each own a subset of the output files. The number of items in
+  flight and the queues of the writer threads are bounded, so the memory use
+  does not depend on the dataset size. Every output file receives its examples
+  in the same order as with a sequential loop.
+
+  If `resumable` is True, all output files are flushed every
+  `checkpoint_every` items and the number of items and of records per file is
+  saved to a hidden progress file next to the first output file. A later call
+  with the same arguments truncates the outputs to the last checkpoint and
+  resumes from there, and a finished conversion is not repeated. The `aux_fn`
+  is not called for items before the checkpoint.
+
+  Args:
+    items: An iterable of items to convert, e.g. image annotations.
+    convert_fn: A function which maps an item to a tf.train.Example, its
+      serialized bytes or None to skip the item. If `aux_fn` is set it must
+      return a tuple of the example and an auxiliary result instead. With
+      `use_processes` it is passed to workers forked with the "fork" start
+      method, without being pickled, so it may be a closure.
+    output_filenames: The list of output TFRecord files.
+    shard_fn: A function which maps the index and the item to the index of
+      its output file. Defaults to the index modulo the number of files.
+    aux_fn: An optional function called in the main thread, in input order,
+      with the auxiliary result of every converted item.
+    num_workers: The number of conversion workers. If 0, items are converted
+      in the main thread.
+    use_processes: Whether to convert in processes rather than threads.
+      Conversion which is dominated by Python code, e.g. building large
+      protos, only scales with processes. Requires a platform which supports
+      the "fork" start method.
+    num_writer_threads: The number of threads writing output files.
+    max_pending: The maximum number of items which are being converted or
+      waiting to be written.
+    resumable: Whether to checkpoint progress and resume from a checkpoint.
+    checkpoint_every: The number of items between checkpoints.
+    num_items: The number of items, used for progress logging. Defaults to
+      len(items) if it is defined.
+
+  Returns:
+    The number of items converted and the number of examples written by
+    this call.
+
+  Raises:
+    ValueError: If a checkpoint does not match the output files.
+  """
+  num_outputs = len(output_filenames)
+  if shard_fn is None:
+    shard_fn = lambda idx, _: idx % num_outputs
+  if num_items is None and hasattr(items, '__len__'):
+    num_items = len(items)
+
+  progress_path = _progress_path(output_filenames)
+  start_idx = 0
+  records_per_output = [0] * num_outputs
+  if resumable and tf.gfile.Exists(progress_path):
+    with tf.gfile.GFile(progress_path, 'r') as f:
+      progress = json.load(f)
+    if progress['output_filenames'] != list(output_filenames):
+      raise ValueError('Cannot resume, {} was written for other outputs.'
+                       .format(progress_path))
+    if progress['finished']:
+      logging.info('Skipping finished conversion to %s.', output_filenames[0])
+      return 0, 0
+    start_idx = progress['num_items']
+    records_per_output = progress['num_records']
+    logging.info('Resuming conversion to %s from item %d.',
+                 output_filenames[0], start_idx)
+
+  def save_progress(num_done, finished):
+    tmp_path = progress_path + '.tmp'
+    with tf.gfile.GFile(tmp_path, 'w') as f:
+      json.dump({
+          'output_filenames': list(output_filenames),
+          'num_items': num_done,
+          'num_records': records_per_output,
+          'finished': finished
+      }, f)
+    tf.gfile.Rename(tmp_path, progress_path, overwrite=True)
+
+  writers = []
+  threads = []
+  executor = None
+  pending = collections.deque()
+  num_converted = 0
+  num_restored = sum(records_per_output)
+  try:
+    # The conversion function is handed to the workers by forking, so they
+    # are started before the writer threads, which a forked child would not
+    # have.
+    if num_workers and use_processes:
+      executor = futures.ProcessPoolExecutor(
+          num_workers,
+          mp_context=multiprocessing.get_context('fork'),
+          initializer=_init_convert_worker,
+          initargs=(convert_fn,))
+      # The first task starts all the workers of a fork based executor.
+      executor.submit(int).result()
+      worker_convert_fn = None
+    elif num_workers:
+      executor = futures.ThreadPoolExecutor(num_workers)
+      worker_convert_fn = convert_fn
+
+    for filename, num_records in zip(output_filenames, records_per_output):
+      if start_idx:
+        writers.append(_restore_committed_records(filename, num_records))
+      else:
+        writers.append(tf.python_io.TFRecordWriter(filename))
+    num_writer_threads = max(1, min(num_writer_threads, num_outputs))
+    for thread_idx in range(num_writer_threads):
+      threads.append(_ShardWriterThread(writers, max_pending))
+      threads[thread_idx].start()
+
+    def wait_for_writers():
+      for thread in threads:
+        thread.queue.join()
+        if thread.error is not None:
+          raise thread.error
+
+    def write(idx, item, result):
+      example, aux = result
+      if aux_fn is not None:
+        aux_fn(aux)
+      if example is not None:
+        shard_idx = shard_fn(idx, item)
+        threads[shard_idx % num_writer_threads].queue.put((shard_idx, example))
+        records_per_output[shard_idx] += 1
+
+    for idx, item in itertools.islice(enumerate(items), start_idx, None):
+      if executor is None:
+        write(idx, item, _convert_and_serialize(convert_fn, item))
+      else:
+        pending.append((idx, item, executor.submit(
+            _convert_and_serialize, worker_convert_fn, item)))
+        while len(pending) >= max_pending:
+          write(*_pop_result(pending))
+      num_converted += 1
+      if idx % 100 == 0:
+        logging.info('On image %d of %s', idx, num_items or '?')
+      if resumable and (idx + 1) % checkpoint_every == 0:
+        while pending:
+          write(*_pop_result(pending))
+        wait_for_writers()
+        for writer in writers:
+          writer.flush()
+        save_progress(idx + 1, False)
+
+    while pending:
+      write(*_pop_result(pending))
+    wait_for_writers()
+  finally:
+    if executor is not None:
+      for _, _, future in pending:
+        future.cancel()
+      executor.shutdown()
+    for thread in threads:
+      thread.queue.put(None)
+    for thread in threads:
+      thread.join()
+    for writer in writers:
+      writer.close()
+
+  if resumable:
+    save_progress(start_idx + num_converted, True)
+  return num_converted, sum(records_per_output) - num_restored
+
+
+def _pop_result(pending):
+  idx, item, future = pending.popleft()
+  return idx, item, future.result()
@@ -44,5 +44,104 @@ class OpenOutputTfrecordsTests(tf.test.TestCase):
       self.assertAllEqual(records, ['test_{}'.format(idx).encode('utf-8')])
 
 
+def _make_example(value):
+  return tf.train.Example(features=tf.train.Features(feature={
+      'value': tf.train.Feature(int64_list=tf.train.Int64List(value=[value]))
+  }))
+
+
+class WriteTfrecordsInParallelTests(tf.test.TestCase):
+
+  def _read_values(self, filenames):
+    values = []
+    for filename in filenames:
+      values.append([
+          tf.train.Example.FromString(record).features.feature['value']
+          .int64_list.value[0]
+          for record in tf.python_io.tf_record_iterator(filename)
+      ])
+    return values
+
+  def _convert(self, value):
+    # Odd values are skipped.
+    return _make_example(value) if value % 2 == 0 else None
+
+  def test_writes_shards_in_input_order(self):
+    for use_processes in (False, True):
+      filenames = tf_record_creation_util.sharded_output_filenames(
+          os.path.join(self.get_temp_dir(), 'ordered_%d' % use_processes), 3)
+      num_converted, num_written = (
+          tf_record_creation_util.write_tfrecords_in_parallel(
+              list(range(50)), self._convert, filenames, num_workers=4,
+              use_processes=use_processes, num_writer_threads=2,
+              max_pending=5))
+
+      self.assertEqual(num_converted, 50)
+      self.assertEqual(num_written, 25)
+      self.assertAllEqual(self._read_values(filenames), [
+          list(range(0, 50, 6)),
+          list(range(4, 50, 6)),
+          list(range(2, 50, 6))
+      ])
+
+  def test_processes_accept_closures(self):
+    # The create_*_tf_record.py scripts pass nested, unpicklable functions.
+    offset = 100
+
+    def convert(value):
+      return _make_example(value + offset)
+
+    filenames = tf_record_creation_util.sharded_output_filenames(
+        os.path.join(self.get_temp_dir(), 'closure'), 2)
+    tf_record_creation_util.write_tfrecords_in_parallel(
+        list(range(6)), convert, filenames, num_workers=2, use_processes=True)
+
+    self.assertAllEqual(self._read_values(filenames),
+                        [[100, 102, 104], [101, 103, 105]])
+
+  def test_shard_fn_and_aux_fn(self):
+    filenames = [os.path.join(self.get_temp_dir(), name)
+                 for name in ('train.tfrecord', 'val.tfrecord')]
+    aux_results = []
+    tf_record_creation_util.write_tfrecords_in_parallel(
+        range(10), lambda value: (_make_example(value), value * 10),
+        filenames, shard_fn=lambda idx, value: int(value < 3),
+        aux_fn=aux_results.append, num_workers=3)
+
+    self.assertAllEqual(self._read_values(filenames),
+                        [list(range(3, 10)), [0, 1, 2]])
+    self.assertAllEqual(aux_results, list(range(0, 100, 10)))
+
+  def test_resumes_from_checkpoint(self):
+    filenames = tf_record_creation_util.sharded_output_filenames(
+        os.path.join(self.get_temp_dir(), 'resumed'), 2)
+
+    def failing_convert(value):
+      if value == 13:
+        raise ValueError('Conversion failed.')
+      return _make_example(value)
+
+    with self.assertRaisesRegex(ValueError, 'Conversion failed.'):
+      tf_record_creation_util.write_tfrecords_in_parallel(
+          list(range(20)), failing_convert, filenames, num_workers=2,
+          resumable=True, checkpoint_every=5)
+
+    converted = []
+    def convert(value):
+      converted.append(value)
+      return _make_example(value)
+    tf_record_creation_util.write_tfrecords_in_parallel(
+        list(range(20)), convert, filenames, num_workers=2, resumable=True,
+        checkpoint_every=5)
+
+    self.assertAllEqual(sorted(converted), list(range(10, 20)))
+    self.assertAllEqual(self._read_values(filenames),
+                        [list(range(0, 20, 2)), list(range(1, 20, 2))])
+    # A finished conversion is skipped.
+    self.assertEqual(
+        tf_record_creation_util.write_tfrecords_in_parallel(
+            list(range(20)), convert, filenames, resumable=True), (0, 0))
+
+
 if __name__ == '__main__':
   tf.test.main()
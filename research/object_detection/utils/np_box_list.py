@@ -19,7 +19,12 @@ from __future__ import absolute_import
 from __future__ import division
 from __future__ import print_function
 import numpy as np
-from six.moves import range
+
+
+def _is_valid_boxes(data):
+  """Returns whether all [..., 4] boxes have ymin <= ymax and xmin <= xmax."""
+  return not np.any(
+      np.logical_or(data[..., 0] > data[..., 2], data[..., 1] > data[..., 3]))
 
 
 class BoxList(object):
@@ -130,8 +135,160 @@ class BoxList(object):
       a boolean indicating whether all ymax of boxes are equal or greater than
           ymin, and all xmax of boxes are equal or greater than xmin.
     """
-    if data.shape[0] > 0:
-      for i in range(data.shape[0]):
-        if data[i, 0] > data[i, 2] or data[i, 1] > data[i, 3]:
-          return False
-    return True
+    return _is_valid_boxes(data)
+
+
+class BoxListBatch(object):
+  """Batch of box collections stored as padded columnar arrays.
+
+  BoxListBatch holds the boxes of a batch of images in a single numpy array of
+  shape [batch_size, max_num_boxes, 4] together with the number of valid boxes
+  in each image. For image i only the first num_valid_boxes[i] rows are valid,
+  the remaining rows are padding. Additional fields are stored as arrays of
+  shape [batch_size, max_num_boxes, ...], so that operations can be applied to
+  the whole batch at once instead of looping over per-image BoxLists.
+  """
+
+  def __init__(self, data, num_valid_boxes=None):
+    """Constructs a batch of box collections.
+
+    Args:
+      data: a numpy array of shape [batch_size, max_num_boxes, 4] representing
+        box coordinates.
+      num_valid_boxes: (optional) a numpy array of shape [batch_size] holding
+        the number of valid boxes in each image. If None, all boxes are valid.
+
+    Raises:
+      ValueError: if bbox data is not a numpy array
+      ValueError: if invalid dimensions for bbox data or num_valid_boxes
+    """
+    if not isinstance(data, np.ndarray):
+      raise ValueError('data must be a numpy array.')
+    if len(data.shape) != 3 or data.shape[2] != 4:
+      raise ValueError('Invalid dimensions for box data.')
+    if data.dtype != np.float32 and data.dtype != np.float64:
+      raise ValueError('Invalid data type for box data: float is required.')
+    if num_valid_boxes is None:
+      num_valid_boxes = np.full(data.shape[0], data.shape[1], dtype=np.int32)
+    num_valid_boxes = np.asarray(num_valid_boxes, dtype=np.int32)
+    if num_valid_boxes.shape != (data.shape[0],):
+      raise ValueError('Invalid dimensions for num_valid_boxes.')
+    if np.any(num_valid_boxes < 0) or np.any(num_valid_boxes > data.shape[1]):
+      raise ValueError('num_valid_boxes must be in [0, max_num_boxes].')
+    self.num_valid_boxes = num_valid_boxes
+    self.data = {'boxes': data}
+    if not _is_valid_boxes(data[self.valid_mask()]):
+      raise ValueError('Invalid box data. data must be a numpy array of '
+                       'batch_size*max_num_boxes*[y_min, x_min, y_max, x_max]')
+
+  @classmethod
+  def from_boxlists(cls, boxlists, fields=None):
+    """Pads and stacks a list of BoxLists into a BoxListBatch.
+
+    Args:
+      boxlists: list of BoxList objects.
+      fields: (optional) list of fields to stack. If None (default), the extra
+        fields of the first BoxList are stacked.
+
+    Returns:
+      a BoxListBatch holding the boxes and fields of all BoxLists.
+
+    Raises:
+      ValueError: if boxlists is empty.
+    """
+    if not boxlists:
+      raise ValueError('boxlists must be a non-empty list.')
+    if fields is None:
+      fields = boxlists[0].get_extra_fields()
+    num_valid_boxes = np.array([boxlist.num_boxes() for boxlist in boxlists],
+                               dtype=np.int32)
+    max_num_boxes = int(np.max(num_valid_boxes))
+
+    def stack(field):
+      values = [boxlist.get_field(field) for boxlist in boxlists]
+      padded = np.zeros((len(values), max_num_boxes) + values[0].shape[1:],
+                        dtype=np.result_type(*values))
+      for i, value in enumerate(values):
+        padded[i, :value.shape[0]] = value
+      return padded
+
+    boxlist_batch = cls(stack('boxes'), num_valid_boxes)
+    for field in fields:
+      boxlist_batch.add_field(field, stack(field))
+    return boxlist_batch
+
+  def to_boxlists(self):
+    """Splits the batch into a list of per-image BoxLists without padding."""
+    boxlists = []
+    for i, num_boxes in enumerate(self.num_valid_boxes):
+      boxlist = BoxList(self.get()[i, :num_boxes])
+      for field in self.get_extra_fields():
+        boxlist.add_field(field, self.get_field(field)[i, :num_boxes])
+      boxlists.append(boxlist)
+    return boxlists
+
+  def batch_size(self):
+    """Return number of images in the batch."""
+    return self.data['boxes'].shape[0]
+
+  def max_num_boxes(self):
+    """Return the padded number of boxes per image."""
+    return self.data['boxes'].shape[1]
+
+  def valid_mask(self):
+    """Return a boolean array of shape [batch_size, max_num_boxes].
+
+    The entry [i, j] is True iff the j-th box of image i is not padding.
+    """
+    return (np.arange(self.max_num_boxes())[np.newaxis, :] <
+            self.num_valid_boxes[:, np.newaxis])
+
+  def get_extra_fields(self):
+    """Return all non-box fields."""
+    return [k for k in self.data.keys() if k != 'boxes']
+
+  def has_field(self, field):
+    return field in self.data
+
+  def add_field(self, field, field_data):
+    """Add data to a specified field.
+
+    Args:
+      field: a string parameter used to speficy a related field to be accessed.
+      field_data: a numpy array of [batch_size, max_num_boxes, ...]
+        representing the data associated with the field.
+    Raises:
+      ValueError: if the field is already exist or the dimension of the field
+          data does not matches the padded boxes.
+    """
+    if self.has_field(field):
+      raise ValueError('Field ' + field + 'already exists')
+    if (len(field_data.shape) < 2 or
+        field_data.shape[:2] != self.data['boxes'].shape[:2]):
+      raise ValueError('Invalid dimensions for field data')
+    self.data[field] = field_data
+
+  def get(self):
+    """Convenience function for accesssing box coordinates.
+
+    Returns:
+      a numpy array of shape [batch_size, max_num_boxes, 4] representing box
+      corners
+    """
+    return self.get_field('boxes')
+
+  def get_field(self, field):
+    """Accesses data associated with the specified field in the batch.
+
+    Args:
+      field: a string parameter used to speficy a related field to be accessed.
+
+    Returns:
+      a numpy array of shape [batch_size, max_num_boxes, ...]
+
+    Raises:
+      ValueError: if invalid field
+    """
+    if not self.has_field(field):
+      raise ValueError('field {} does not exist'.format(field))
+    return self.data[field]
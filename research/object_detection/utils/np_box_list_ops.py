@@ -157,7 +157,7 @@ def sort_by_field(boxlist, field, order=SortOrder.DESCEND):
     raise ValueError('Invalid sort order')
 
   field_to_sort = boxlist.get_field(field)
-  sorted_indices = np.argsort(field_to_sort)
+  sorted_indices = np.argsort(field_to_sort, kind='stable')
   if order == SortOrder.DESCEND:
     sorted_indices = sorted_indices[::-1]
   return gather(boxlist, sorted_indices)
@@ -310,6 +310,224 @@ def multi_class_non_max_suppression(boxlist, score_thresh, iou_thresh,
   return sorted_boxes
 
 
+def batch_gather(boxlist_batch, indices, num_valid_indices=None, fields=None):
+  """Gathers boxes of every image of a BoxListBatch according to indices.
+
+  This is the batched version of gather: row i of indices selects boxes of
+  image i. Only the first num_valid_indices[i] indices of image i are used,
+  the remaining rows of the result are zero padded.
+
+  Args:
+    boxlist_batch: BoxListBatch holding [batch_size, N] boxes.
+    indices: a 2-d numpy array of shape [batch_size, K] of type int_.
+    num_valid_indices: (optional) a numpy array of shape [batch_size] holding
+      the number of valid indices of each image. If None, all K indices are
+      valid.
+    fields: (optional) list of fields to also gather from.  If None (default),
+        all fields are gathered from.  Pass an empty fields list to only gather
+        the box coordinates.
+
+  Returns:
+    a BoxListBatch holding [batch_size, K] boxes.
+
+  Raises:
+    ValueError: if indices do not have shape [batch_size, K] or if a valid
+      index is out of the valid range of its image.
+  """
+  indices = np.asarray(indices)
+  if (len(indices.shape) != 2 or
+      indices.shape[0] != boxlist_batch.batch_size()):
+    raise ValueError('indices must have shape [batch_size, K].')
+  if num_valid_indices is None:
+    num_valid_indices = np.full(indices.shape[0], indices.shape[1])
+  is_valid = (np.arange(indices.shape[1])[np.newaxis, :] <
+              np.asarray(num_valid_indices)[:, np.newaxis])
+  if np.any(np.logical_and(
+      is_valid,
+      np.logical_or(indices < 0,
+                    indices >= boxlist_batch.num_valid_boxes[:, np.newaxis]))):
+    raise ValueError('indices are out of valid range.')
+  indices = np.where(is_valid, indices, 0)
+
+  def gather_field(field_data):
+    expanded_shape = indices.shape + (1,) * (len(field_data.shape) - 2)
+    gathered = np.take_along_axis(
+        field_data, np.reshape(indices, expanded_shape), axis=1)
+    return np.where(np.reshape(is_valid, expanded_shape), gathered,
+                    np.zeros_like(gathered))
+
+  subboxlist_batch = np_box_list.BoxListBatch(
+      gather_field(boxlist_batch.get()), num_valid_indices)
+  if fields is None:
+    fields = boxlist_batch.get_extra_fields()
+  for field in fields:
+    subboxlist_batch.add_field(field,
+                               gather_field(boxlist_batch.get_field(field)))
+  return subboxlist_batch
+
+
+def batch_sort_by_field(boxlist_batch, field, order=SortOrder.DESCEND):
+  """Sorts the boxes of every image of a BoxListBatch by a scalar field.
+
+  Padding boxes are kept at the end of each image.
+
+  Args:
+    boxlist_batch: BoxListBatch holding [batch_size, N] boxes.
+    field: A BoxListBatch field of shape [batch_size, N] for sorting and
+      reordering the boxes.
+    order: (Optional) 'descend' or 'ascend'. Default is descend.
+
+  Returns:
+    sorted_boxlist_batch: A BoxListBatch sorted by the field in the specified
+      order.
+
+  Raises:
+    ValueError: if specified field does not exist or is not of shape
+      [batch_size, N].
+    ValueError: if the order is not either descend or ascend.
+  """
+  if not boxlist_batch.has_field(field):
+    raise ValueError('Field ' + field + ' does not exist')
+  if len(boxlist_batch.get_field(field).shape) != 2:
+    raise ValueError('Field ' + field + 'should be of shape [batch_size, N].')
+  if order != SortOrder.DESCEND and order != SortOrder.ASCEND:
+    raise ValueError('Invalid sort order')
+
+  sorted_indices = _batch_argsort(boxlist_batch.get_field(field),
+                                  boxlist_batch.valid_mask(), order)
+  return batch_gather(boxlist_batch, sorted_indices,
+                      boxlist_batch.num_valid_boxes)
+
+
+def batch_non_max_suppression(boxlist_batch,
+                              max_output_size=10000,
+                              iou_threshold=1.0,
+                              score_threshold=-10.0):
+  """Non maximum suppression applied to all images of a BoxListBatch at once.
+
+  The result for every image is the same as the one of non_max_suppression,
+  including the order of boxes with equal scores, but the greedy selection
+  advances through the score-sorted boxes of all images in lockstep so that
+  each step is a single vectorized operation.
+
+  Args:
+    boxlist_batch: BoxListBatch holding [batch_size, N] boxes.  Must contain a
+      'scores' field of shape [batch_size, N] representing detection scores.
+      All scores belong to the same class.
+    max_output_size: maximum number of retained boxes per image.
+    iou_threshold: intersection over union threshold.
+    score_threshold: minimum score threshold. Remove the boxes with scores
+                     less than this value.
+
+  Returns:
+    a BoxListBatch holding [batch_size, M] boxes sorted by decreasing scores,
+      where M <= max_output_size.
+  Raises:
+    ValueError: if 'scores' field does not exist
+    ValueError: if threshold is not in [0, 1]
+    ValueError: if max_output_size < 0
+  """
+  if not boxlist_batch.has_field('scores'):
+    raise ValueError('Field scores does not exist')
+  if iou_threshold < 0. or iou_threshold > 1.0:
+    raise ValueError('IOU threshold must be in [0, 1]')
+  if max_output_size < 0:
+    raise ValueError('max_output_size must be bigger than 0.')
+
+  scores = boxlist_batch.get_field('scores')[:, np.newaxis, :]
+  is_valid = np.logical_and(boxlist_batch.valid_mask()[:, np.newaxis, :],
+                            scores > score_threshold)
+  is_selected = _batch_greedy_nms(boxlist_batch.get(), scores, is_valid,
+                                  iou_threshold, max_output_size)[:, 0, :]
+  num_selected = np.sum(is_selected, axis=1)
+  sorted_indices = _batch_argsort(scores[:, 0, :], is_selected)
+  return batch_gather(boxlist_batch,
+                      sorted_indices[:, :np.max(num_selected, initial=0)],
+                      num_selected)
+
+
+def batch_multi_class_non_max_suppression(boxlist_batch, score_thresh,
+                                          iou_thresh, max_output_size):
+  """Multi-class non maximum suppression applied to a whole BoxListBatch.
+
+  The result for every image is the same as the one of
+  multi_class_non_max_suppression, including the order of boxes with equal
+  scores. NMS runs for all images and classes
+  simultaneously: the pairwise IOUs are computed once per image and shared by
+  all classes, and each greedy step is a single vectorized operation over the
+  [batch_size, num_classes] problems.
+
+  Args:
+    boxlist_batch: BoxListBatch holding [batch_size, N] boxes.  Must contain a
+      'scores' field of shape [batch_size, N] (in the case of a single class)
+      or [batch_size, N, num_classes].
+    score_thresh: scalar threshold for score (low scoring boxes are removed).
+    iou_thresh: scalar threshold for IOU (boxes that that high IOU overlap
+      with previously selected boxes are removed).
+    max_output_size: maximum number of retained boxes per class.
+
+  Returns:
+    a BoxListBatch holding [batch_size, M] boxes with a 'scores' field
+      of shape [batch_size, M] sorted in decreasing order for each image and a
+      'classes' field of shape [batch_size, M] representing the class label of
+      each box.
+  Raises:
+    ValueError: if iou_thresh is not in [0, 1] or if input boxlist_batch does
+      not have a valid scores field.
+  """
+  if not 0 <= iou_thresh <= 1.0:
+    raise ValueError('thresh must be between 0 and 1')
+  if not isinstance(boxlist_batch, np_box_list.BoxListBatch):
+    raise ValueError('boxlist_batch must be a BoxListBatch')
+  if not boxlist_batch.has_field('scores'):
+    raise ValueError('input boxlist_batch must have \'scores\' field')
+  scores = boxlist_batch.get_field('scores')
+  if len(scores.shape) == 2:
+    scores = scores[:, :, np.newaxis]
+  elif len(scores.shape) != 3:
+    raise ValueError('scores field must be of rank 2 or 3')
+  batch_size, num_boxes, num_classes = scores.shape
+
+  # [batch_size, num_classes, num_boxes] so that each class is one NMS problem.
+  scores = np.transpose(scores, [0, 2, 1])
+  is_valid = np.logical_and(boxlist_batch.valid_mask()[:, np.newaxis, :],
+                            scores > score_thresh)
+  is_selected = _batch_greedy_nms(boxlist_batch.get(), scores, is_valid,
+                                  iou_thresh, max_output_size)
+
+  # Merges the selections of all classes and sorts them by score.
+  flat_scores = np.reshape(scores, [batch_size, num_classes * num_boxes])
+  flat_is_selected = np.reshape(is_selected,
+                                [batch_size, num_classes * num_boxes])
+  num_selected = np.sum(flat_is_selected, axis=1)
+  # Equal scores are ordered like the stable sort of the per-class results
+  # concatenated in class order, which multi_class_non_max_suppression
+  # reverses: by decreasing class and then by increasing box index.
+  flat_indices = np.arange(num_classes * num_boxes)
+  sorted_indices = np.lexsort(
+      (np.broadcast_to(flat_indices % num_boxes, flat_scores.shape),
+       np.broadcast_to(-(flat_indices // num_boxes), flat_scores.shape),
+       -flat_scores, np.logical_not(flat_is_selected)),
+      axis=1)
+  sorted_indices = sorted_indices[:, :np.max(num_selected, initial=0)]
+  is_valid = (np.arange(sorted_indices.shape[1])[np.newaxis, :] <
+              num_selected[:, np.newaxis])
+
+  box_indices = sorted_indices % num_boxes
+  selected_boxes = np.take_along_axis(
+      boxlist_batch.get(), box_indices[:, :, np.newaxis], axis=1)
+  selected_boxes *= is_valid[:, :, np.newaxis]
+  selected_scores = np.take_along_axis(flat_scores, sorted_indices, axis=1)
+  selected_scores = np.where(is_valid, selected_scores, 0)
+  selected_classes = np.where(
+      is_valid, sorted_indices // num_boxes, 0).astype(selected_scores.dtype)
+
+  nms_result = np_box_list.BoxListBatch(selected_boxes, num_selected)
+  nms_result.add_field('scores', selected_scores)
+  nms_result.add_field('classes', selected_classes)
+  return nms_result
+
+
 def scale(boxlist, y_scale, x_scale):
   """Scale box coordinates in x and y dimensions.
 
@@ -561,3 +779,88 @@ def _update_valid_indices_by_removing_high_iou_boxes(
     selected_indices, is_index_valid, intersect_over_union, threshold):
   max_iou = np.max(intersect_over_union[:, selected_indices], axis=1)
   return np.logical_and(is_index_valid, max_iou <= threshold)
+
+
+def _batch_argsort(values, is_valid, order=SortOrder.DESCEND):
+  """Sorts the valid entries of every row of values.
+
+  Args:
+    values: a numpy array of shape [batch_size, N].
+    is_valid: a boolean numpy array of shape [batch_size, N].
+    order: 'descend' or 'ascend'.
+
+  Returns:
+    a numpy array of shape [batch_size, N] holding, for every row, the indices
+    of the valid entries in sorted order followed by the indices of the
+    invalid entries. Equal values are ordered as by sort_by_field, that is by
+    increasing index when ascending and by decreasing index when descending.
+  """
+  if order == SortOrder.DESCEND:
+    indices = np.broadcast_to(-np.arange(values.shape[1]), values.shape)
+    return np.lexsort((indices, -values, np.logical_not(is_valid)), axis=1)
+  return np.lexsort((values, np.logical_not(is_valid)), axis=1)
+
+
+def _batch_greedy_nms(boxes, scores, is_valid, iou_threshold, max_output_size):
+  """Runs greedy NMS for a batch of images and classes in lockstep.
+
+  Step i of the greedy selection considers the box with the i-th highest score
+  of every [image, class] problem at once, so the number of Python iterations
+  is bounded by the number of candidate boxes per problem rather than by the
+  total number of boxes of the batch.
+
+  Args:
+    boxes: a numpy array of shape [batch_size, N, 4].
+    scores: a numpy array of shape [batch_size, num_classes, N].
+    is_valid: a boolean numpy array of shape [batch_size, num_classes, N]
+      which is False for padding and boxes below the score threshold.
+    iou_threshold: boxes whose IOU with a selected box of the same problem is
+      not <= iou_threshold are suppressed.
+    max_output_size: maximum number of boxes selected per problem.
+
+  Returns:
+    a boolean numpy array of shape [batch_size, num_classes, N] which is True
+    for the selected boxes.
+  """
+  batch_size, num_classes, num_boxes = scores.shape
+  is_selected = np.zeros([batch_size, num_classes, num_boxes], dtype=bool)
+  num_valid = np.sum(is_valid, axis=2)
+  num_candidates = np.max(num_valid, initial=0)
+  if num_candidates == 0 or max_output_size == 0:
+    return is_selected
+
+  sorted_indices = np.reshape(
+      _batch_argsort(
+          np.reshape(scores, [batch_size * num_classes, num_boxes]),
+          np.reshape(is_valid, [batch_size * num_classes, num_boxes])),
+      [batch_size, num_classes, num_boxes])
+  if iou_threshold >= 1.0:
+    # NMS is disabled, as in non_max_suppression: the top scoring boxes are
+    # kept, even degenerate ones.
+    is_top = (np.arange(num_boxes) <
+              np.minimum(num_valid, max_output_size)[:, :, np.newaxis])
+    np.put_along_axis(is_selected, sorted_indices, is_top, axis=2)
+    return is_selected
+
+  with np.errstate(divide='ignore', invalid='ignore'):
+    intersect_over_union = np_box_ops.batch_iou(boxes, boxes)
+  # Comparisons with NaN IOUs of degenerate boxes suppress, as in
+  # non_max_suppression.
+  is_overlapping = np.logical_not(intersect_over_union <= iou_threshold)
+
+  is_suppressed = np.logical_not(is_valid)
+  num_output = np.zeros([batch_size, num_classes], dtype=np.int32)
+  batch_indices = np.arange(batch_size)[:, np.newaxis]
+  for i in range(num_candidates):
+    index = sorted_indices[:, :, i:i + 1]
+    is_new = np.logical_and(
+        np.logical_not(np.take_along_axis(is_suppressed, index, axis=2)),
+        num_output[:, :, np.newaxis] < max_output_size)
+    np.put_along_axis(is_selected, index, is_new, axis=2)
+    num_output += is_new[:, :, 0]
+    is_suppressed |= np.logical_and(
+        is_new, is_overlapping[batch_indices, index[:, :, 0]])
+    if np.all(np.logical_or(is_suppressed.all(axis=2),
+                            num_output >= max_output_size)):
+      break
+  return is_selected
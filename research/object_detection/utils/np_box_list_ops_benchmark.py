@@ -0,0 +1,126 @@
+# Copyright 2020 The TensorFlow Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+r"""Benchmarks batched numpy BoxList ops against the per-image ops.
+
+Random detections are generated for a batch of images, and the throughput in
+images/sec of the per-image np_box_list_ops functions is compared with the one
+of their batched counterparts operating on a padded BoxListBatch.
+
+Example usage:
+    python object_detection/utils/np_box_list_ops_benchmark.py \
+      --batch_size=64 --num_boxes=300 --num_classes=90
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import time
+
+from absl import app
+from absl import flags
+import numpy as np
+
+from object_detection.utils import np_box_list
+from object_detection.utils import np_box_list_ops
+
+flags.DEFINE_integer('batch_size', 64, 'Number of images in a batch.')
+flags.DEFINE_integer('num_boxes', 300, 'Maximum number of boxes per image.')
+flags.DEFINE_integer('num_classes', 90, 'Number of classes.')
+flags.DEFINE_float('score_thresh', 0.5, 'Score threshold of NMS.')
+flags.DEFINE_float('iou_thresh', 0.6, 'IOU threshold of NMS.')
+flags.DEFINE_integer('max_output_size', 100,
+                     'Maximum number of boxes per class kept by NMS.')
+flags.DEFINE_integer('num_iterations', 5, 'Number of timed iterations.')
+flags.DEFINE_integer('seed', 0, 'Random seed of the synthetic detections.')
+
+FLAGS = flags.FLAGS
+
+
+def _random_boxlists():
+  """Creates a list of BoxLists with random boxes and class scores."""
+  rng = np.random.RandomState(FLAGS.seed)
+  boxlists = []
+  for _ in range(FLAGS.batch_size):
+    num_boxes = rng.randint(FLAGS.num_boxes // 2, FLAGS.num_boxes + 1)
+    corners = rng.rand(num_boxes, 2) * 0.8
+    boxes = np.concatenate(
+        [corners, corners + rng.rand(num_boxes, 2) * 0.2], axis=1)
+    boxlist = np_box_list.BoxList(boxes.astype(np.float32))
+    boxlist.add_field(
+        'scores',
+        rng.rand(num_boxes, FLAGS.num_classes).astype(np.float32)**4)
+    boxlists.append(boxlist)
+  return boxlists
+
+
+def _single_class(boxlist):
+  single_class_boxlist = np_box_list.BoxList(boxlist.get())
+  single_class_boxlist.add_field('scores', boxlist.get_field('scores')[..., 0])
+  return single_class_boxlist
+
+
+def _time(fn):
+  """Returns the best wall time of FLAGS.num_iterations calls of fn."""
+  fn()
+  best_time = float('inf')
+  for _ in range(FLAGS.num_iterations):
+    start = time.time()
+    fn()
+    best_time = min(best_time, time.time() - start)
+  return best_time
+
+
+def main(_):
+  boxlists = _random_boxlists()
+  boxlist_batch = np_box_list.BoxListBatch.from_boxlists(boxlists)
+  single_class_boxlists = [_single_class(boxlist) for boxlist in boxlists]
+  single_class_boxlist_batch = np_box_list.BoxListBatch.from_boxlists(
+      single_class_boxlists)
+
+  benchmarks = [
+      ('sort_by_field',
+       lambda: [np_box_list_ops.sort_by_field(b, 'scores')
+                for b in single_class_boxlists],
+       lambda: np_box_list_ops.batch_sort_by_field(
+           single_class_boxlist_batch, 'scores')),
+      ('non_max_suppression',
+       lambda: [np_box_list_ops.non_max_suppression(
+           b, FLAGS.max_output_size, FLAGS.iou_thresh, FLAGS.score_thresh)
+                for b in single_class_boxlists],
+       lambda: np_box_list_ops.batch_non_max_suppression(
+           single_class_boxlist_batch, FLAGS.max_output_size,
+           FLAGS.iou_thresh, FLAGS.score_thresh)),
+      ('multi_class_non_max_suppression',
+       lambda: [np_box_list_ops.multi_class_non_max_suppression(
+           b, FLAGS.score_thresh, FLAGS.iou_thresh, FLAGS.max_output_size)
+                for b in boxlists],
+       lambda: np_box_list_ops.batch_multi_class_non_max_suppression(
+           boxlist_batch, FLAGS.score_thresh, FLAGS.iou_thresh,
+           FLAGS.max_output_size)),
+  ]
+  print('batch_size=%d num_boxes<=%d num_classes=%d' %
+        (FLAGS.batch_size, FLAGS.num_boxes, FLAGS.num_classes))
+  for name, per_image_fn, batched_fn in benchmarks:
+    per_image_time = _time(per_image_fn)
+    batched_time = _time(batched_fn)
+    print('%-32s per-image: %9.1f images/sec  batched: %9.1f images/sec  '
+          '(%.1fx)' % (name, FLAGS.batch_size / per_image_time,
+                       FLAGS.batch_size / batched_time,
+                       per_image_time / batched_time))
+
+
+if __name__ == '__main__':
+  app.run(main)
@@ -414,5 +414,183 @@ class NonMaximumSuppressionTest(tf.test.TestCase):
     self.assertAllClose(boxes, expected_boxes)
 
 
+
+class BatchOpsTest(tf.test.TestCase):
+
+  def setUp(self):
+    rng = np.random.RandomState(0)
+    self.boxlists = []
+    for num_boxes in [6, 0, 25, 1]:
+      corners = rng.rand(num_boxes, 2) * 0.8
+      boxes = np.concatenate(
+          [corners, corners + rng.rand(num_boxes, 2) * 0.3], axis=1)
+      boxlist = np_box_list.BoxList(boxes)
+      boxlist.add_field('scores', rng.rand(num_boxes, 4))
+      boxlist.add_field('ids', np.arange(num_boxes))
+      self.boxlists.append(boxlist)
+
+  def _single_class_boxlists(self):
+    boxlists = []
+    for boxlist in self.boxlists:
+      single_class_boxlist = np_box_list.BoxList(boxlist.get())
+      single_class_boxlist.add_field('scores',
+                                     boxlist.get_field('scores')[:, 0])
+      single_class_boxlist.add_field('ids', boxlist.get_field('ids'))
+      boxlists.append(single_class_boxlist)
+    return boxlists
+
+  def _assert_boxlists_equal(self, boxlists, expected_boxlists, fields):
+    self.assertEqual(len(boxlists), len(expected_boxlists))
+    for boxlist, expected_boxlist in zip(boxlists, expected_boxlists):
+      self.assertAllClose(boxlist.get(), expected_boxlist.get())
+      for field in fields:
+        self.assertAllClose(boxlist.get_field(field),
+                            expected_boxlist.get_field(field))
+
+  def test_batch_gather(self):
+    boxlist_batch = np_box_list.BoxListBatch.from_boxlists(self.boxlists)
+    indices = np.array([[5, 0], [0, 0], [3, 24], [0, 0]])
+    num_valid_indices = np.array([2, 0, 2, 1])
+    subboxlists = np_box_list_ops.batch_gather(
+        boxlist_batch, indices, num_valid_indices, fields=['ids']).to_boxlists()
+    expected_boxlists = [
+        np_box_list_ops.gather(boxlist, index[:num_valid], fields=['ids'])
+        for boxlist, index, num_valid in zip(self.boxlists, indices,
+                                             num_valid_indices)]
+    self._assert_boxlists_equal(subboxlists, expected_boxlists, ['ids'])
+
+  def test_batch_gather_with_out_of_range_indices(self):
+    boxlist_batch = np_box_list.BoxListBatch.from_boxlists(self.boxlists)
+    with self.assertRaises(ValueError):
+      np_box_list_ops.batch_gather(boxlist_batch,
+                                   np.array([[0], [0], [0], [0]]))
+
+  def test_batch_sort_by_field(self):
+    boxlists = self._single_class_boxlists()
+    boxlist_batch = np_box_list.BoxListBatch.from_boxlists(boxlists)
+    for order in [np_box_list_ops.SortOrder.ASCEND,
+                  np_box_list_ops.SortOrder.DESCEND]:
+      sorted_boxlists = np_box_list_ops.batch_sort_by_field(
+          boxlist_batch, 'scores', order).to_boxlists()
+      expected_boxlists = [
+          np_box_list_ops.sort_by_field(boxlist, 'scores', order)
+          for boxlist in boxlists]
+      self._assert_boxlists_equal(sorted_boxlists, expected_boxlists,
+                                  ['scores', 'ids'])
+
+  def test_batch_nms_matches_per_image_nms(self):
+    boxlists = self._single_class_boxlists()
+    boxlist_batch = np_box_list.BoxListBatch.from_boxlists(boxlists)
+    for max_output_size, iou_threshold, score_threshold in [(10, 0.3, -10.0),
+                                                             (3, 0.6, 0.4),
+                                                             (5, 1.0, -10.0)]:
+      nms_boxlists = np_box_list_ops.batch_non_max_suppression(
+          boxlist_batch, max_output_size, iou_threshold,
+          score_threshold).to_boxlists()
+      expected_boxlists = [
+          np_box_list_ops.non_max_suppression(boxlist, max_output_size,
+                                              iou_threshold, score_threshold)
+          for boxlist in boxlists]
+      self._assert_boxlists_equal(nms_boxlists, expected_boxlists,
+                                  ['scores', 'ids'])
+
+  def test_batch_multiclass_nms_matches_per_image_nms(self):
+    boxlist_batch = np_box_list.BoxListBatch.from_boxlists(
+        self.boxlists, fields=['scores'])
+    for score_thresh, iou_thresh, max_output_size in [(0.25, 0.1, 3),
+                                                      (0.5, 0.5, 10),
+                                                      (0.0, 1.0, 2)]:
+      nms_boxlists = np_box_list_ops.batch_multi_class_non_max_suppression(
+          boxlist_batch, score_thresh, iou_thresh,
+          max_output_size).to_boxlists()
+      expected_boxlists = [
+          np_box_list_ops.multi_class_non_max_suppression(
+              boxlist, score_thresh, iou_thresh, max_output_size)
+          for boxlist in self.boxlists]
+      self._assert_boxlists_equal(nms_boxlists, expected_boxlists,
+                                  ['scores', 'classes'])
+
+  def test_batch_ops_match_per_image_ops_with_tied_scores(self):
+    for boxlist in self.boxlists:
+      boxlist.add_field('scores', np.round(boxlist.get_field('scores') * 2) / 2)
+    boxlists = self._single_class_boxlists()
+    boxlist_batch = np_box_list.BoxListBatch.from_boxlists(boxlists)
+    for order in [np_box_list_ops.SortOrder.ASCEND,
+                  np_box_list_ops.SortOrder.DESCEND]:
+      self._assert_boxlists_equal(
+          np_box_list_ops.batch_sort_by_field(
+              boxlist_batch, 'scores', order).to_boxlists(),
+          [np_box_list_ops.sort_by_field(boxlist, 'scores', order)
+           for boxlist in boxlists],
+          ['scores', 'ids'])
+    for iou_threshold in [0.3, 1.0]:
+      self._assert_boxlists_equal(
+          np_box_list_ops.batch_non_max_suppression(
+              boxlist_batch, 10, iou_threshold).to_boxlists(),
+          [np_box_list_ops.non_max_suppression(boxlist, 10, iou_threshold)
+           for boxlist in boxlists],
+          ['scores', 'ids'])
+
+    boxlist_batch = np_box_list.BoxListBatch.from_boxlists(
+        self.boxlists, fields=['scores'])
+    for iou_thresh in [0.3, 1.0]:
+      self._assert_boxlists_equal(
+          np_box_list_ops.batch_multi_class_non_max_suppression(
+              boxlist_batch, 0.0, iou_thresh, 10).to_boxlists(),
+          [np_box_list_ops.multi_class_non_max_suppression(
+              boxlist, 0.0, iou_thresh, 10) for boxlist in self.boxlists],
+          ['scores', 'classes'])
+
+  def test_batch_nms_keeps_degenerate_boxes_at_iou_threshold_one(self):
+    boxlist = np_box_list.BoxList(
+        np.array([[0.5, 0.5, 0.5, 0.5], [0.5, 0.5, 0.5, 0.5],
+                  [0.1, 0.1, 0.1, 0.4], [0.1, 0.1, 0.4, 0.4]],
+                 dtype=np.float32))
+    boxlist.add_field('scores', np.array([0.9, 0.8, 0.7, 0.6]))
+    boxlist_batch = np_box_list.BoxListBatch.from_boxlists([boxlist])
+    expected_boxlist = np_box_list_ops.non_max_suppression(boxlist, 3, 1.0)
+    self.assertEqual(expected_boxlist.num_boxes(), 3)
+    self._assert_boxlists_equal(
+        np_box_list_ops.batch_non_max_suppression(
+            boxlist_batch, 3, 1.0).to_boxlists(),
+        [expected_boxlist], ['scores'])
+
+    boxlist.add_field('scores', np.stack([boxlist.get_field('scores')] * 2,
+                                         axis=1))
+    boxlist_batch = np_box_list.BoxListBatch.from_boxlists(
+        [boxlist], fields=['scores'])
+    expected_boxlist = np_box_list_ops.multi_class_non_max_suppression(
+        boxlist, 0.0, 1.0, 4)
+    self.assertEqual(expected_boxlist.num_boxes(), 8)
+    self._assert_boxlists_equal(
+        np_box_list_ops.batch_multi_class_non_max_suppression(
+            boxlist_batch, 0.0, 1.0, 4).to_boxlists(),
+        [expected_boxlist], ['scores', 'classes'])
+
+  def test_batch_multiclass_nms_with_example(self):
+    boxlist = np_box_list.BoxList(
+        np.array(
+            [[0.2, 0.4, 0.8, 0.8], [0.4, 0.2, 0.8, 0.8], [0.6, 0.0, 1.0, 1.0]],
+            dtype=np.float32))
+    scores = np.array([[-0.2, 0.1, 0.5, -0.4, 0.3],
+                       [0.7, -0.7, 0.6, 0.2, -0.9],
+                       [0.4, 0.34, -0.9, 0.2, 0.31]],
+                      dtype=np.float32)
+    boxlist.add_field('scores', scores)
+    boxlist_batch = np_box_list.BoxListBatch.from_boxlists([boxlist, boxlist])
+    boxlist_batch_clean = (
+        np_box_list_ops.batch_multi_class_non_max_suppression(
+            boxlist_batch, score_thresh=0.25, iou_thresh=0.1,
+            max_output_size=3))
+
+    expected_scores = np.array([0.7, 0.6, 0.34, 0.31])
+    expected_classes = np.array([0, 2, 1, 4])
+    self.assertAllEqual(boxlist_batch_clean.num_valid_boxes, [4, 4])
+    self.assertAllClose(boxlist_batch_clean.get_field('scores'),
+                        [expected_scores, expected_scores])
+    self.assertAllClose(boxlist_batch_clean.get_field('classes'),
+                        [expected_classes, expected_classes])
+
+
 if __name__ == '__main__':
   tf.test.main()
@@ -135,5 +135,57 @@ class AddExtraFieldTest(tf.test.TestCase):
     self.assertEquals(boxlist.num_boxes(), expected_num_boxes)
 
 
+
+class BoxListBatchTest(tf.test.TestCase):
+
+  def setUp(self):
+    boxlist1 = np_box_list.BoxList(
+        np.array([[0.0, 0.0, 1.0, 1.0], [1.0, 2.0, 3.0, 4.0]], dtype=float))
+    boxlist1.add_field('scores', np.array([0.5, 0.7]))
+    boxlist2 = np_box_list.BoxList(np.zeros([0, 4], dtype=float))
+    boxlist2.add_field('scores', np.zeros([0]))
+    self.boxlists = [boxlist1, boxlist2]
+
+  def test_invalid_box_data(self):
+    with self.assertRaises(ValueError):
+      np_box_list.BoxListBatch(np.array([[0, 0, 1, 1]], dtype=float))
+
+    with self.assertRaises(ValueError):
+      np_box_list.BoxListBatch(
+          np.array([[[0, 1, 1, 3], [3, 1, 1, 5]]], dtype=float))
+
+    with self.assertRaises(ValueError):
+      np_box_list.BoxListBatch(np.zeros([2, 3, 4]), np.array([1, 4]))
+
+  def test_invalid_padding_is_ignored(self):
+    boxes = np.array([[[0, 1, 1, 3], [3, 1, 1, 5]]], dtype=float)
+    boxlist_batch = np_box_list.BoxListBatch(boxes, np.array([1]))
+    self.assertAllEqual(boxlist_batch.valid_mask(), [[True, False]])
+
+  def test_from_boxlists(self):
+    boxlist_batch = np_box_list.BoxListBatch.from_boxlists(self.boxlists)
+    self.assertEqual(boxlist_batch.batch_size(), 2)
+    self.assertEqual(boxlist_batch.max_num_boxes(), 2)
+    self.assertAllEqual(boxlist_batch.num_valid_boxes, [2, 0])
+    self.assertAllEqual(boxlist_batch.valid_mask(),
+                        [[True, True], [False, False]])
+    self.assertAllClose(boxlist_batch.get_field('scores'),
+                        [[0.5, 0.7], [0.0, 0.0]])
+    self.assertAllClose(boxlist_batch.get()[1], np.zeros([2, 4]))
+
+  def test_to_boxlists(self):
+    boxlists = np_box_list.BoxListBatch.from_boxlists(
+        self.boxlists).to_boxlists()
+    for boxlist, expected_boxlist in zip(boxlists, self.boxlists):
+      self.assertAllClose(boxlist.get(), expected_boxlist.get())
+      self.assertAllClose(boxlist.get_field('scores'),
+                          expected_boxlist.get_field('scores'))
+
+  def test_add_field_with_invalid_shape(self):
+    boxlist_batch = np_box_list.BoxListBatch.from_boxlists(self.boxlists)
+    with self.assertRaises(ValueError):
+      boxlist_batch.add_field('classes', np.zeros([2, 3]))
+
+
 if __name__ == '__main__':
   tf.test.main()
@@ -100,3 +100,30 @@ def ioa(boxes1, boxes2):
   intersect = intersection(boxes1, boxes2)
   areas = np.expand_dims(area(boxes2), axis=0)
   return intersect / areas
+
+
+def batch_iou(boxes1, boxes2):
+  """Computes pairwise intersection-over-union for each image of a batch.
+
+  Args:
+    boxes1: a numpy array with shape [batch_size, N, 4] holding N boxes per
+      image.
+    boxes2: a numpy array with shape [batch_size, M, 4] holding M boxes per
+      image.
+
+  Returns:
+    a numpy array with shape [batch_size, N, M] representing pairwise iou
+    scores.
+  """
+  y_min1, x_min1, y_max1, x_max1 = [
+      boxes1[:, :, np.newaxis, i] for i in range(4)]
+  y_min2, x_min2, y_max2, x_max2 = [
+      boxes2[:, np.newaxis, :, i] for i in range(4)]
+  intersect_heights = np.maximum(
+      np.minimum(y_max1, y_max2) - np.maximum(y_min1, y_min2), 0.0)
+  intersect_widths = np.maximum(
+      np.minimum(x_max1, x_max2) - np.maximum(x_min1, x_min2), 0.0)
+  intersect = intersect_heights * intersect_widths
+  area1 = (y_max1 - y_min1) * (x_max1 - x_min1)
+  area2 = (y_max2 - y_min2) * (x_max2 - x_min2)
+  return intersect / (area1 + area2 - intersect)
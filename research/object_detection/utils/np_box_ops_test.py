@@ -68,5 +68,14 @@ class BoxOpsTests(tf.test.TestCase):
     self.assertAllClose(ioa21, expected_ioa21)
 
 
+  def testBatchIOU(self):
+    boxes1 = np.stack([self.boxes1, self.boxes1[::-1]])
+    boxes2 = np.stack([self.boxes2, self.boxes2[::-1]])
+    iou = np_box_ops.batch_iou(boxes1, boxes2)
+    self.assertAllClose(iou[0], np_box_ops.iou(self.boxes1, self.boxes2))
+    self.assertAllClose(iou[1], np_box_ops.iou(self.boxes1[::-1],
+                                               self.boxes2[::-1]))
+
+
 if __name__ == '__main__':
   tf.test.main()
@@ -34,7 +34,9 @@ from __future__ import print_function
 from abc import ABCMeta
 from abc import abstractmethod
 import collections
+import functools
 import logging
+import multiprocessing
 import unicodedata
 import numpy as np
 import six
@@ -1078,6 +1080,43 @@ ObjectDetectionEvaluationState = collections.namedtuple(
     ])
 
 
+def _compute_detection_state_for_images(per_image_eval, num_class,
+                                        image_infos):
+  """Computes the detection part of the evaluation state for several images.
+
+  This is a module level function so that it can be pickled and run in the
+  worker processes used by
+  `ObjectDetectionEvaluation.add_batched_detected_image_info`.
+
+  Args:
+    per_image_eval: The per image evaluation object, e.g. an instance of
+      per_image_evaluation.PerImageEvaluation.
+    num_class: Number of ground-truth classes.
+    image_infos: A list of dicts, one per image, holding the keyword arguments
+      of `per_image_eval.compute_object_detection_metrics`.
+
+  Returns:
+    An ObjectDetectionEvaluationState holding the scores, tp/fp labels and
+    CorLoc counts of the images. The groundtruth statistics are all zero.
+  """
+  scores_per_class = [[] for _ in range(num_class)]
+  tp_fp_labels_per_class = [[] for _ in range(num_class)]
+  num_images_correctly_detected_per_class = np.zeros(num_class)
+  for image_info in image_infos:
+    scores, tp_fp_labels, is_class_correctly_detected_in_image = (
+        per_image_eval.compute_object_detection_metrics(**image_info))
+    for i in range(num_class):
+      if scores[i].shape[0] > 0:
+        scores_per_class[i].append(scores[i])
+        tp_fp_labels_per_class[i].append(tp_fp_labels[i])
+    num_images_correctly_detected_per_class += (
+        is_class_correctly_detected_in_image)
+  return ObjectDetectionEvaluationState(
+      np.zeros(num_class, dtype=float), scores_per_class,
+      tp_fp_labels_per_class, np.zeros(num_class, dtype=int),
+      num_images_correctly_detected_per_class)
+
+
 class ObjectDetectionEvaluation(object):
   """Internal implementation of Pascal object detection metrics."""
 
@@ -1288,11 +1327,167 @@ class ObjectDetectionEvaluation(object):
           '[%d, %d, %d]' % len(detected_boxes), len(detected_scores),
           len(detected_class_labels))
 
+    image_info = self._get_detected_image_info(image_key, detected_boxes,
+                                               detected_scores,
+                                               detected_class_labels,
+                                               detected_masks)
+    if image_info is None:
+      return
+    self.merge_internal_state(
+        _compute_detection_state_for_images(self.per_image_eval,
+                                            self.num_class, [image_info]))
+
+  def add_batched_ground_truth_image_info(self,
+                                          image_keys,
+                                          groundtruth_boxes,
+                                          groundtruth_class_labels,
+                                          num_groundtruth_boxes=None,
+                                          groundtruth_is_difficult_list=None,
+                                          groundtruth_is_group_of_list=None,
+                                          groundtruth_masks=None):
+    """Adds groundtruth for a batch of images given as padded arrays.
+
+    Args:
+      image_keys: A list of B unique string/integer identifiers.
+      groundtruth_boxes: float32 numpy array of shape [B, M, 4] containing
+        padded groundtruth boxes of the format [ymin, xmin, ymax, xmax] in
+        absolute image coordinates.
+      groundtruth_class_labels: integer numpy array of shape [B, M] containing
+        padded 0-indexed groundtruth classes for the boxes.
+      num_groundtruth_boxes: (optional) integer numpy array of shape [B] with
+        the number of valid boxes of each image. If None, all M boxes of each
+        image are used.
+      groundtruth_is_difficult_list: (optional) numpy boolean array of shape
+        [B, M] denoting whether a ground truth box is a difficult instance.
+      groundtruth_is_group_of_list: (optional) numpy boolean array of shape
+        [B, M] denoting whether a ground truth box is a group-of box.
+      groundtruth_masks: (optional) uint8 numpy array of shape
+        [B, M, height, width] containing padded groundtruth masks.
+    """
+    if num_groundtruth_boxes is None:
+      num_groundtruth_boxes = np.full(
+          len(image_keys), groundtruth_boxes.shape[1], dtype=int)
+    for i, image_key in enumerate(image_keys):
+      num_boxes = num_groundtruth_boxes[i]
+      self.add_single_ground_truth_image_info(
+          image_key,
+          groundtruth_boxes[i, :num_boxes],
+          groundtruth_class_labels[i, :num_boxes],
+          groundtruth_is_difficult_list=(
+              None if groundtruth_is_difficult_list is None else
+              groundtruth_is_difficult_list[i, :num_boxes]),
+          groundtruth_is_group_of_list=(
+              None if groundtruth_is_group_of_list is None else
+              groundtruth_is_group_of_list[i, :num_boxes]),
+          groundtruth_masks=(None if groundtruth_masks is None else
+                             groundtruth_masks[i, :num_boxes]))
+
+  def add_batched_detected_image_info(self,
+                                      image_keys,
+                                      detected_boxes,
+                                      detected_scores,
+                                      detected_class_labels,
+                                      num_detections=None,
+                                      detected_masks=None,
+                                      num_workers=1):
+    """Adds detections for a batch of images given as padded arrays.
+
+    The per image matching of the batch is optionally sharded across a pool of
+    `num_workers` processes. Every worker reduces its shard into an
+    ObjectDetectionEvaluationState, and the shard states are merged with
+    `merge_internal_state` in image order, so the resulting metrics are
+    identical to adding the images one by one with
+    `add_single_detected_image_info`. The pool is created once per call, so
+    large batches amortize its startup cost best.
+
+    Args:
+      image_keys: A list of B unique string/integer identifiers.
+      detected_boxes: float32 numpy array of shape [B, N, 4] containing padded
+        detection boxes of the format [ymin, xmin, ymax, xmax] in absolute
+        image coordinates.
+      detected_scores: float32 numpy array of shape [B, N] containing padded
+        detection scores for the boxes.
+      detected_class_labels: integer numpy array of shape [B, N] containing
+        padded 0-indexed detection classes for the boxes.
+      num_detections: (optional) integer numpy array of shape [B] with the
+        number of valid detections of each image. If None, all N detections of
+        each image are used.
+      detected_masks: (optional) np.uint8 numpy array of shape
+        [B, N, height, width] containing padded detection masks.
+      num_workers: Number of processes used to compute the per image metrics.
+        If 1, the metrics are computed in the calling process.
+
+    Raises:
+      ValueError: if the number of image keys, boxes, scores and class labels
+        differ in length.
+    """
+    if (len(image_keys) != len(detected_boxes) or
+        len(image_keys) != len(detected_scores) or
+        len(image_keys) != len(detected_class_labels)):
+      raise ValueError(
+          'image_keys, detected_boxes, detected_scores and '
+          'detected_class_labels should all have the same batch size. Got '
+          '[%d, %d, %d, %d]' % (len(image_keys), len(detected_boxes),
+                                len(detected_scores),
+                                len(detected_class_labels)))
+    if num_detections is None:
+      num_detections = np.full(
+          len(image_keys), detected_boxes.shape[1], dtype=int)
+
+    image_infos = []
+    for i, image_key in enumerate(image_keys):
+      num_boxes = num_detections[i]
+      image_info = self._get_detected_image_info(
+          image_key, detected_boxes[i, :num_boxes],
+          detected_scores[i, :num_boxes],
+          detected_class_labels[i, :num_boxes],
+          None if detected_masks is None else detected_masks[i, :num_boxes])
+      if image_info is not None:
+        image_infos.append(image_info)
+
+    if num_workers <= 1 or len(image_infos) <= 1:
+      self.merge_internal_state(
+          _compute_detection_state_for_images(self.per_image_eval,
+                                              self.num_class, image_infos))
+      return
+
+    num_shards = min(num_workers, len(image_infos))
+    shard_size = int(np.ceil(len(image_infos) / float(num_shards)))
+    shards = [
+        image_infos[i:i + shard_size]
+        for i in range(0, len(image_infos), shard_size)
+    ]
+    compute_fn = functools.partial(_compute_detection_state_for_images,
+                                   self.per_image_eval, self.num_class)
+    # TensorFlow is not fork-safe, so the workers are spawned.
+    with multiprocessing.get_context('spawn').Pool(num_shards) as pool:
+      shard_states = pool.map(compute_fn, shards)
+    for shard_state in shard_states:
+      self.merge_internal_state(shard_state)
+
+  def _get_detected_image_info(self, image_key, detected_boxes,
+                               detected_scores, detected_class_labels,
+                               detected_masks):
+    """Collects the detections and groundtruth of an image for matching.
+
+    Args:
+      image_key: A unique string/integer identifier for the image.
+      detected_boxes: float32 numpy array of shape [num_boxes, 4].
+      detected_scores: float32 numpy array of shape [num_boxes].
+      detected_class_labels: integer numpy array of shape [num_boxes].
+      detected_masks: np.uint8 numpy array of shape [num_boxes, height, width]
+        or None.
+
+    Returns:
+      A dict with the keyword arguments of
+      `PerImageEvaluation.compute_object_detection_metrics`, or None if the
+      detections of the image have already been added.
+    """
     if image_key in self.detection_keys:
       logging.warning(
           'image %s has already been added to the detection result database',
           image_key)
-      return
+      return None
 
     self.detection_keys.add(image_key)
     if image_key in self.groundtruth_boxes:
@@ -1314,23 +1509,16 @@ class ObjectDetectionEvaluation(object):
         groundtruth_masks = np.empty(shape=[0, 1, 1], dtype=float)
       groundtruth_is_difficult_list = np.array([], dtype=bool)
       groundtruth_is_group_of_list = np.array([], dtype=bool)
-    scores, tp_fp_labels, is_class_correctly_detected_in_image = (
-        self.per_image_eval.compute_object_detection_metrics(
-            detected_boxes=detected_boxes,
-            detected_scores=detected_scores,
-            detected_class_labels=detected_class_labels,
-            groundtruth_boxes=groundtruth_boxes,
-            groundtruth_class_labels=groundtruth_class_labels,
-            groundtruth_is_difficult_list=groundtruth_is_difficult_list,
-            groundtruth_is_group_of_list=groundtruth_is_group_of_list,
-            detected_masks=detected_masks,
-            groundtruth_masks=groundtruth_masks))
-    for i in range(self.num_class):
-      if scores[i].shape[0] > 0:
-        self.scores_per_class[i].append(scores[i])
-        self.tp_fp_labels_per_class[i].append(tp_fp_labels[i])
-    (self.num_images_correctly_detected_per_class
-    ) += is_class_correctly_detected_in_image
+    return dict(
+        detected_boxes=detected_boxes,
+        detected_scores=detected_scores,
+        detected_class_labels=detected_class_labels,
+        groundtruth_boxes=groundtruth_boxes,
+        groundtruth_class_labels=groundtruth_class_labels,
+        groundtruth_is_difficult_list=groundtruth_is_difficult_list,
+        groundtruth_is_group_of_list=groundtruth_is_group_of_list,
+        detected_masks=detected_masks,
+        groundtruth_masks=groundtruth_masks)
 
   def _update_ground_truth_statistics(self, groundtruth_class_labels,
                                       groundtruth_is_difficult_list,
@@ -1350,18 +1538,20 @@ class ObjectDetectionEvaluation(object):
       groundtruth_is_group_of_list: A boolean numpy array of length M denoting
         whether a ground truth box is a group-of box or not
     """
-    for class_index in range(self.num_class):
-      num_gt_instances = np.sum(groundtruth_class_labels[
-          ~groundtruth_is_difficult_list
-          & ~groundtruth_is_group_of_list] == class_index)
-      num_groupof_gt_instances = self.group_of_weight * np.sum(
-          groundtruth_class_labels[
-              groundtruth_is_group_of_list
-              & ~groundtruth_is_difficult_list] == class_index)
-      self.num_gt_instances_per_class[
-          class_index] += num_gt_instances + num_groupof_gt_instances
-      if np.any(groundtruth_class_labels == class_index):
-        self.num_gt_imgs_per_class[class_index] += 1
+    def count_per_class(labels):
+      labels = labels[(labels >= 0) & (labels < self.num_class)]
+      return np.bincount(labels.astype(int), minlength=self.num_class)
+
+    num_gt_instances = count_per_class(
+        groundtruth_class_labels[~groundtruth_is_difficult_list
+                                 & ~groundtruth_is_group_of_list])
+    num_groupof_gt_instances = self.group_of_weight * count_per_class(
+        groundtruth_class_labels[groundtruth_is_group_of_list
+                                 & ~groundtruth_is_difficult_list])
+    self.num_gt_instances_per_class += (
+        num_gt_instances + num_groupof_gt_instances)
+    self.num_gt_imgs_per_class += (
+        count_per_class(groundtruth_class_labels) > 0).astype(int)
 
   def evaluate(self):
     """Compute evaluation result.
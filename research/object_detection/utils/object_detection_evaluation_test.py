@@ -1055,6 +1055,87 @@ class ObjectDetectionEvaluationTest(tf.test.TestCase):
     self.assertAlmostEqual(copy_mean_corloc, mean_corloc)
 
 
+class BatchedObjectDetectionEvaluationTest(tf.test.TestCase,
+                                            parameterized.TestCase):
+
+  def setUp(self):
+    self.num_groundtruth_classes = 3
+    self.image_keys = ['img1', 'img2', 'img3']
+    self.groundtruth_boxes = np.array(
+        [[[0, 0, 1, 1], [0, 0, 2, 2], [0, 0, 3, 3]],
+         [[10, 10, 11, 11], [500, 500, 510, 510], [10, 10, 12, 12]],
+         [[0, 0, 1, 1], [0, 0, 0, 0], [0, 0, 0, 0]]], dtype=float)
+    self.groundtruth_class_labels = np.array(
+        [[0, 2, 0], [0, 0, 2], [1, 0, 0]], dtype=int)
+    self.num_groundtruth_boxes = np.array([3, 3, 1], dtype=int)
+    self.groundtruth_is_difficult_list = np.array(
+        [[False, False, False], [False, True, False], [False, False, False]],
+        dtype=bool)
+    self.groundtruth_is_group_of_list = np.array(
+        [[False, False, False], [False, False, True], [False, False, False]],
+        dtype=bool)
+    self.detected_boxes = np.array(
+        [[[0, 0, 1, 1], [0, 0, 2.5, 2.5], [0, 0, 0, 0]],
+         [[10, 10, 11, 11], [100, 100, 120, 120], [10, 10, 11.5, 11.5]],
+         [[0, 0, 1, 1], [0, 0, 1, 1], [0, 0, 0, 0]]], dtype=float)
+    self.detected_scores = np.array(
+        [[0.9, 0.6, 0.0], [0.7, 0.8, 0.9], [0.4, 0.3, 0.0]], dtype=float)
+    self.detected_class_labels = np.array(
+        [[0, 2, 0], [0, 0, 2], [1, 1, 0]], dtype=int)
+    self.num_detections = np.array([2, 3, 2], dtype=int)
+
+  def _evaluate_single(self):
+    od_eval = object_detection_evaluation.ObjectDetectionEvaluation(
+        self.num_groundtruth_classes)
+    for i, image_key in enumerate(self.image_keys):
+      num_gt = self.num_groundtruth_boxes[i]
+      od_eval.add_single_ground_truth_image_info(
+          image_key, self.groundtruth_boxes[i, :num_gt],
+          self.groundtruth_class_labels[i, :num_gt],
+          self.groundtruth_is_difficult_list[i, :num_gt],
+          self.groundtruth_is_group_of_list[i, :num_gt])
+    for i, image_key in enumerate(self.image_keys):
+      num_det = self.num_detections[i]
+      od_eval.add_single_detected_image_info(
+          image_key, self.detected_boxes[i, :num_det],
+          self.detected_scores[i, :num_det],
+          self.detected_class_labels[i, :num_det])
+    return od_eval.evaluate()
+
+  @parameterized.parameters({'num_workers': 1}, {'num_workers': 2})
+  def test_batched_evaluation_matches_single_image_evaluation(
+      self, num_workers):
+    od_eval = object_detection_evaluation.ObjectDetectionEvaluation(
+        self.num_groundtruth_classes)
+    od_eval.add_batched_ground_truth_image_info(
+        self.image_keys, self.groundtruth_boxes,
+        self.groundtruth_class_labels,
+        num_groundtruth_boxes=self.num_groundtruth_boxes,
+        groundtruth_is_difficult_list=self.groundtruth_is_difficult_list,
+        groundtruth_is_group_of_list=self.groundtruth_is_group_of_list)
+    od_eval.add_batched_detected_image_info(
+        self.image_keys, self.detected_boxes, self.detected_scores,
+        self.detected_class_labels, num_detections=self.num_detections,
+        num_workers=num_workers)
+    (average_precision_per_class, mean_ap, precisions_per_class,
+     recalls_per_class, corloc_per_class, mean_corloc) = od_eval.evaluate()
+
+    (expected_average_precision_per_class, expected_mean_ap,
+     expected_precisions_per_class, expected_recalls_per_class,
+     expected_corloc_per_class,
+     expected_mean_corloc) = self._evaluate_single()
+
+    for i in range(self.num_groundtruth_classes):
+      self.assertAllClose(expected_precisions_per_class[i],
+                          precisions_per_class[i])
+      self.assertAllClose(expected_recalls_per_class[i], recalls_per_class[i])
+    self.assertAllClose(expected_average_precision_per_class,
+                        average_precision_per_class)
+    self.assertAllClose(expected_corloc_per_class, corloc_per_class)
+    self.assertAlmostEqual(expected_mean_ap, mean_ap)
+    self.assertAlmostEqual(expected_mean_corloc, mean_corloc)
+
+
 @unittest.skipIf(tf_version.is_tf2(), 'Eval Metrics ops are supported in TF1.X '
                  'only.')
 class ObjectDetectionEvaluatorTest(tf.test.TestCase, parameterized.TestCase):
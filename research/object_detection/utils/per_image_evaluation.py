@@ -178,7 +178,11 @@ class PerImageEvaluation(object):
 
     is_class_correctly_detected_in_image = np.zeros(
         self.num_groundtruth_classes, dtype=int)
-    for i in range(self.num_groundtruth_classes):
+    # Only classes with both detections and groundtruth in this image can be
+    # correctly detected, so the remaining classes are left at zero.
+    for i in np.intersect1d(
+        self._get_present_class_indices(detected_class_labels),
+        self._get_present_class_indices(groundtruth_class_labels)):
       (gt_boxes_at_ith_class, gt_masks_at_ith_class,
        detected_boxes_at_ith_class, detected_scores_at_ith_class,
        detected_masks_at_ith_class) = self._get_ith_class_arrays(
@@ -293,9 +297,16 @@ class PerImageEvaluation(object):
       raise ValueError(
           'Groundtruth masks is available but detected masks is not.')
 
-    result_scores = []
-    result_tp_fp_labels = []
-    for i in range(self.num_groundtruth_classes):
+    # Classes without detections in this image always yield empty results, so
+    # the per-class matching below only runs for the classes that were
+    # detected.
+    result_scores = [
+        np.array([], dtype=float) for _ in range(self.num_groundtruth_classes)
+    ]
+    result_tp_fp_labels = [
+        np.array([], dtype=bool) for _ in range(self.num_groundtruth_classes)
+    ]
+    for i in self._get_present_class_indices(detected_class_labels):
       groundtruth_is_difficult_list_at_ith_class = (
           groundtruth_is_difficult_list[groundtruth_class_labels == i])
       groundtruth_is_group_of_list_at_ith_class = (
@@ -314,10 +325,24 @@ class PerImageEvaluation(object):
           groundtruth_is_group_of_list=groundtruth_is_group_of_list_at_ith_class,
           detected_masks=detected_masks_at_ith_class,
           groundtruth_masks=gt_masks_at_ith_class)
-      result_scores.append(scores)
-      result_tp_fp_labels.append(tp_fp_labels)
+      result_scores[i] = scores
+      result_tp_fp_labels[i] = tp_fp_labels
     return result_scores, result_tp_fp_labels
 
+  def _get_present_class_indices(self, class_labels):
+    """Returns the sorted unique class indices that occur in `class_labels`.
+
+    Args:
+      class_labels: An integer numpy array of class labels.
+
+    Returns:
+      A sorted integer numpy array with the unique labels of `class_labels`
+      that lie in [0, num_groundtruth_classes).
+    """
+    class_indices = np.unique(class_labels).astype(int)
+    return class_indices[(class_indices >= 0)
+                         & (class_indices < self.num_groundtruth_classes)]
+
   def _get_overlaps_and_scores_mask_mode(self, detected_boxes, detected_scores,
                                          detected_masks, groundtruth_boxes,
                                          groundtruth_masks,
@@ -515,21 +540,23 @@ class PerImageEvaluation(object):
           processed.
       """
       max_overlap_gt_ids = np.argmax(iou, axis=1)
-      is_gt_detected = np.zeros(iou.shape[1], dtype=bool)
-      for i in range(num_detected_boxes):
-        gt_id = max_overlap_gt_ids[i]
-        is_evaluatable = (not tp_fp_labels[i] and
-                          not is_matched_to_difficult[i] and
-                          iou[i, gt_id] >= self.matching_iou_threshold and
-                          not is_matched_to_group_of[i])
-        if is_evaluatable:
-          if not groundtruth_nongroup_of_is_difficult_list[gt_id]:
-            if not is_gt_detected[gt_id]:
-              tp_fp_labels[i] = True
-              is_gt_detected[gt_id] = True
-              is_matched_to_box[i] = is_box
-          else:
-            is_matched_to_difficult[i] = True
+      max_overlaps = iou[np.arange(iou.shape[0]), max_overlap_gt_ids]
+      is_evaluatable = (~tp_fp_labels & ~is_matched_to_difficult
+                        & (max_overlaps >= self.matching_iou_threshold)
+                        & ~is_matched_to_group_of)
+      is_matched_gt_difficult = groundtruth_nongroup_of_is_difficult_list[
+          max_overlap_gt_ids].astype(bool)
+      is_matched_to_difficult[is_evaluatable & is_matched_gt_difficult] = True
+      # Detections are sorted by decreasing score, so each non-difficult
+      # groundtruth box is claimed by the first evaluatable detection that
+      # matches it; later detections matching the same box stay false
+      # positives.
+      candidate_ids = np.where(is_evaluatable & ~is_matched_gt_difficult)[0]
+      _, first_match_ids = np.unique(
+          max_overlap_gt_ids[candidate_ids], return_index=True)
+      true_positive_ids = candidate_ids[first_match_ids]
+      tp_fp_labels[true_positive_ids] = True
+      is_matched_to_box[true_positive_ids] = is_box
 
     def compute_match_ioa(ioa, is_box):
       """Computes TP/FP for group-of box matching.
@@ -554,16 +581,15 @@ class PerImageEvaluation(object):
       tp_fp_labels_group_of = self.group_of_weight * np.ones(
           ioa.shape[1], dtype=float)
       max_overlap_group_of_gt_ids = np.argmax(ioa, axis=1)
-      for i in range(num_detected_boxes):
-        gt_id = max_overlap_group_of_gt_ids[i]
-        is_evaluatable = (not tp_fp_labels[i] and
-                          not is_matched_to_difficult[i] and
-                          ioa[i, gt_id] >= self.matching_iou_threshold and
-                          not is_matched_to_group_of[i])
-        if is_evaluatable:
-          is_matched_to_group_of[i] = True
-          is_matched_to_box[i] = is_box
-          scores_group_of[gt_id] = max(scores_group_of[gt_id], scores[i])
+      max_overlaps = ioa[np.arange(ioa.shape[0]), max_overlap_group_of_gt_ids]
+      is_evaluatable = (~tp_fp_labels & ~is_matched_to_difficult
+                        & (max_overlaps >= self.matching_iou_threshold)
+                        & ~is_matched_to_group_of)
+      is_matched_to_group_of[is_evaluatable] = True
+      is_matched_to_box[is_evaluatable] = is_box
+      np.maximum.at(scores_group_of,
+                    max_overlap_group_of_gt_ids[is_evaluatable],
+                    scores[is_evaluatable])
       selector = np.where((scores_group_of > 0) & (tp_fp_labels_group_of > 0))
       scores_group_of = scores_group_of[selector]
       tp_fp_labels_group_of = tp_fp_labels_group_of[selector]